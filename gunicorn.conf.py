@@ -0,0 +1,58 @@
+"""Gunicorn configuration preloading the API in the master process.
+
+Gunicorn reads this file from the directory it is started in. The application is
+imported, and the state shared by all workers built, once in the master. Workers
+are then forked from it, sharing that state copy-on-write, and reset anything
+inherited that cannot be used across a fork (see `api.preload`).
+
+The number of workers and the address are given on the command line, e.g.
+
+    gunicorn --workers 9 --bind localhost:8000
+"""
+import gc
+
+wsgi_app = "api.main:app"
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Objects freed in the master leave holes in pages shared with the workers, and
+# collections in the workers write to the objects they traverse. Collection is
+# disabled in the master, everything it holds is frozen before each fork, and
+# workers collect only what they allocate themselves.
+gc.disable()
+
+
+def on_starting(server) -> None:
+    """Build the shared state once the application has been preloaded.
+
+    Args:
+        server (Arbiter): Gunicorn master
+    """
+    if server.cfg.preload_app:
+        from api.preload import preload_app
+
+        preload_app()
+
+
+def pre_fork(server, worker) -> None:  # noqa: ARG001
+    """Move everything the master holds out of reach of the garbage collector.
+
+    Args:
+        server (Arbiter): Gunicorn master
+        worker (Worker): Worker about to be forked
+    """
+    gc.freeze()
+
+
+def post_fork(server, worker) -> None:  # noqa: ARG001
+    """Reset state inherited from the master in a newly forked worker.
+
+    Args:
+        server (Arbiter): Gunicorn master
+        worker (Worker): Forked worker
+    """
+    gc.enable()
+    if server.cfg.preload_app:
+        from api.preload import after_fork
+
+        after_fork()
@@ -0,0 +1,146 @@
+"""Circuit breaker protecting calls to upstream services."""
+import time
+from collections.abc import Callable
+from threading import Lock
+
+
+class CircuitBreakerOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open."""
+
+    def __init__(self, retry_after: float):
+        """Class constructor.
+
+        Args:
+            retry_after (float): Seconds until the circuit allows a probe call.
+        """
+        self.retry_after = retry_after
+        super().__init__(f"Circuit open, retry after {retry_after:.1f} seconds.")
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream errors.
+
+    The circuit starts closed and calls pass through. After `failure_threshold`
+    consecutive failures it opens and rejects calls for `recovery_time` seconds.
+    It then becomes half-open, allowing up to `half_open_max_calls` probe calls:
+    a successful probe closes the circuit again, a failed one re-opens it. Calls
+    that end without an outcome, e.g. when cancelled, must `release` their slot.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    # Seconds to wait before retrying when every probe call is already in use
+    HALF_OPEN_RETRY_AFTER = 1.0
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        recovery_time: float,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Class constructor.
+
+        Args:
+            failure_threshold (int): Consecutive failures before opening the circuit
+            recovery_time (float): Seconds to stay open before allowing probe calls
+            half_open_max_calls (int, optional):
+                Concurrent probe calls allowed while half-open. Defaults to 1.
+            clock (Callable[[], float], optional):
+                Monotonic clock in seconds. Defaults to time.monotonic.
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+
+        self._lock = Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        """Retrieve the current state, moving from open to half-open when due.
+
+        Returns
+        -------
+            str: One of "closed", "open" or "half_open"
+        """
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if (
+            self._state == self.OPEN
+            and self.clock() - self._opened_at >= self.recovery_time
+        ):
+            self._state = self.HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def before_call(self) -> None:
+        """Check whether a call may proceed.
+
+        Raises
+        ------
+            CircuitBreakerOpenError: If the circuit is open or all probe calls are in use.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return
+            self.rejected += 1
+            if state == self.HALF_OPEN:
+                raise CircuitBreakerOpenError(self.HALF_OPEN_RETRY_AFTER)
+            retry_after = max(
+                self.recovery_time - (self.clock() - self._opened_at),
+                0.0,
+            )
+            raise CircuitBreakerOpenError(retry_after)
+
+    def release(self) -> None:
+        """Release the probe slot of a call that ended without an outcome."""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_success(self) -> None:
+        """Record a successful call, closing the circuit."""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def record_failure(self) -> None:
+        """Record a failed call, opening the circuit if required."""
+        with self._lock:
+            self._failures += 1
+            if (
+                self._state == self.HALF_OPEN
+                or self._failures >= self.failure_threshold
+            ):
+                self._state = self.OPEN
+                self._opened_at = self.clock()
+                self._probes = 0
+
+    def as_dict(self) -> dict:
+        """Summarise the breaker state.
+
+        Returns
+        -------
+            dict: Current state, consecutive failures and rejected call count
+        """
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                "rejected": self.rejected,
+            }
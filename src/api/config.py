@@ -1,5 +1,7 @@
 # mypy: disable-error-code="call-arg"
 """Module to define the main settings class for the API."""
+from functools import lru_cache
+from pathlib import Path
 
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -11,7 +13,83 @@ class Settings(BaseSettings):
     db_url: str = "http://virgodb.dur.ac.uk:8080/Eagle/"
     jwt_secret_key: SecretStr
 
+    db_max_connections: int = 10
+    db_max_keepalive_connections: int = 5
+    db_keepalive_expiry: float = 30.0
+    db_timeout: float = 10.0
+    db_connect_timeout: float = 3.0
+    db_read_timeout: float = 10.0
+    db_breaker_failure_threshold: int = 5
+    db_breaker_recovery_time: float = 30.0
+    db_breaker_half_open_max_calls: int = 1
+    db_max_cookie_users: int = 1024
+
+    snapshot_roots: list[Path] = []
+    catalogue_path: Path | None = None
+    catalogue_pattern: str = "*.hdf5"
+    catalogue_poll_interval: float = 60.0
+
+    prewarm_snapshots: list[str] = []
+    jit_cache_dir: Path | None = None
+    jit_warmup_dtypes: list[str] = [
+        "float32",
+        "float64",
+        "int32",
+        "int64",
+        "uint32",
+        "uint64",
+    ]
+
+    distributed_read_workers: int = 4
+    derived_field_block_size: int = 1_048_576
+    precision_block_size: int = 1_048_576
+    dataset_page_bytes: int = 16_777_216
+
+    zone_map_dir: Path | None = None
+    zone_map_rows: int = 65536
+
+    batch_aperture_max: int = 100_000
+    batch_aperture_group_size: int = 256
+
+    result_cache_bytes: int = 268_435_456
+    result_cache_dir: Path | None = None
+    result_cache_disk_bytes: int = 4_294_967_296
+    result_cache_sendfile_bytes: int = 1_048_576
+
+    job_dir: Path | None = None
+    job_workers: int = 2
+    job_user_limit: int = 2
+    job_ttl: float = 86400.0
+    job_stale_after: float = 900.0
+
+    export_dir: Path | None = None
+    export_compression: int = 4
+
+    mask_handle_dir: Path | None = None
+    mask_handle_max: int = 1024
+    mask_handle_ttl: float = 3600.0
+
+    mask_store_dir: Path | None = None
+    mask_store_user_bytes: int = 67_108_864
+    mask_store_ttl: float = 3600.0
+
+    stream_frame_bytes: int = 1_048_576
+    stream_window: int = 8
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
     )
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """Retrieve an instance of the Settings object.
+
+    Required by FastAPI when used with Depends.
+
+    Returns
+    -------
+        Settings: Settings object
+    """
+    return Settings()
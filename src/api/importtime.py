@@ -0,0 +1,110 @@
+"""Profile the time taken to import the application.
+
+Workers import `api.main` when they boot, so time spent importing delays both
+scaling up and the first health check. Run as `python -m api.importtime` to import
+the application in a fresh interpreter with `-X importtime` and summarise where the
+time goes.
+"""
+import subprocess
+import sys
+from dataclasses import dataclass
+
+IMPORT_TIME_PREFIX = "import time:"
+HEAVY_MODULES = ("swiftsimio", "unyt", "sympy", "numba", "h5py", "cloudpickle")
+
+
+@dataclass(frozen=True)
+class ImportRecord:
+    """Time taken to import one module, as reported by `-X importtime`."""
+
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def profile_imports(module: str = "api.main") -> list[ImportRecord]:
+    """Import a module in a fresh interpreter and record the time taken.
+
+    Args:
+        module (str, optional): Module to import. Defaults to "api.main".
+
+    Raises
+    ------
+        RuntimeError: Raised if the module could not be imported.
+
+    Returns
+    -------
+        list[ImportRecord]: Every module imported, in the order they finished
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],  # noqa: S603
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode:
+        message = f"Failed to import {module}:\n{result.stderr}"
+        raise RuntimeError(message)
+
+    records = []
+    for line in result.stderr.splitlines():
+        if not line.startswith(IMPORT_TIME_PREFIX):
+            continue
+        self_us, cumulative_us, name = line.removeprefix(IMPORT_TIME_PREFIX).split("|")
+        if not self_us.strip().isdigit():
+            continue
+        records.append(
+            ImportRecord(
+                module=name.strip(),
+                self_us=int(self_us),
+                cumulative_us=int(cumulative_us),
+                depth=(len(name) - len(name.lstrip()) - 1) // 2,
+            ),
+        )
+    return records
+
+
+def total_seconds(records: list[ImportRecord]) -> float:
+    """Sum the time taken by the modules imported at the top level.
+
+    Args:
+        records (list[ImportRecord]): Import profile
+
+    Returns
+    -------
+        float: Seconds spent importing
+    """
+    return sum(record.cumulative_us for record in records if record.depth == 0) / 1e6
+
+
+def summarise(records: list[ImportRecord], count: int = 20) -> str:
+    """Describe the total import time and the slowest modules.
+
+    Args:
+        records (list[ImportRecord]): Import profile
+        count (int, optional): Number of modules listed. Defaults to 20.
+
+    Returns
+    -------
+        str: Human-readable summary
+    """
+    imported = {record.module.split(".")[0] for record in records}
+    lines = [
+        f"Total import time: {total_seconds(records):.3f}s "
+        f"({len(records)} modules)",
+        "Heavy modules imported: "
+        + (", ".join(sorted(imported.intersection(HEAVY_MODULES))) or "none"),
+        f"{'cumulative [s]':>14} {'self [s]':>10}  module",
+    ]
+    slowest = sorted(records, key=lambda record: record.cumulative_us, reverse=True)
+    lines.extend(
+        f"{record.cumulative_us / 1e6:>14.3f} {record.self_us / 1e6:>10.3f}  "
+        f"{'  ' * record.depth}{record.module}"
+        for record in slowest[:count]
+    )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    print(summarise(profile_imports(*sys.argv[1:])))  # noqa: T201
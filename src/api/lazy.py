@@ -0,0 +1,45 @@
+"""Defer importing heavy modules until they are first used.
+
+swiftsimio, unyt, h5py, numba and cloudpickle take seconds to import between them,
+most of it in sympy and unit registries. Modules refer to them through stand-ins
+from `lazy_import`, so that importing the application, and answering health
+checks, does not wait for them. The real module is imported, through the normal
+import lock, when one of its attributes is first used.
+
+Annotations naming lazily imported types must not be evaluated at definition time,
+so they are written as strings, e.g. `handle: "h5py.File"`.
+"""
+import importlib
+import sys
+from types import ModuleType
+from typing import Any
+
+
+class LazyModule(ModuleType):
+    """Stand-in for a module, importing it when an attribute is first used."""
+
+    def __getattr__(self, name: str) -> Any:
+        """Look up an attribute of the real module, importing it if needed.
+
+        Args:
+            name (str): Attribute name
+
+        Returns
+        -------
+            Any: Attribute of the real module
+        """
+        return getattr(importlib.import_module(self.__name__), name)
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Refer to a module without importing it yet.
+
+    Args:
+        name (str): Absolute module name, e.g. "swiftsimio.accelerated"
+
+    Returns
+    -------
+        ModuleType: The module if already imported, otherwise a stand-in for it
+    """
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
@@ -1,12 +1,20 @@
 """Entry point and main file for the FastAPI backend."""
 
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from importlib import metadata
 
 import uvicorn
 from fastapi import FastAPI
 from loguru import logger
 
-from api.routers import auth, file_processing
+from api.config import get_settings
+from api.processing.catalogue import get_snapshot_catalogue
+from api.processing.jit_warmup import DEFAULT_JIT_CACHE_DIR, start_jit_warmup
+from api.processing.jobs import get_job_manager
+from api.processing.prewarm import get_warmup_progress, start_prewarm
+from api.processing.result_cache import get_result_cache
+from api.routers import auth, file_processing, jobs, monitoring, streaming
 
 logger.info("API starting")
 
@@ -19,18 +27,51 @@ Authenticated users can access
 * Unmasked data
 * Metadata
 * Units
+* Background extraction jobs
+* Streaming connections for interactive tools
 
 Users must have existing access to [VirgoDB](https://virgodb.dur.ac.uk/)
 """
 
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """Manage resources that live for the lifetime of a worker.
+
+    Args:
+        _ (FastAPI): Application instance
+    """
+    settings = get_settings()
+    start_jit_warmup(
+        settings.jit_cache_dir or DEFAULT_JIT_CACHE_DIR,
+        settings.jit_warmup_dtypes,
+    )
+
+    catalogue = get_snapshot_catalogue()
+    catalogue.start_polling(settings.catalogue_poll_interval)
+    if settings.prewarm_snapshots:
+        start_prewarm(settings.prewarm_snapshots, catalogue, get_warmup_progress())
+
+    yield
+
+    catalogue.stop_polling()
+    get_job_manager().shutdown()
+    get_result_cache().close()
+    await auth.get_virgodb_client().aclose()
+
+
 app = FastAPI(
     title="SWIFTsimIO API",
     description=description,
     version=metadata.version("dirac-swift-api"),
+    lifespan=lifespan,
 )
 
 app.include_router(file_processing.router)
 app.include_router(auth.router)
+app.include_router(monitoring.router)
+app.include_router(jobs.router)
+app.include_router(streaming.router)
 
 
 @app.get("/ping")
@@ -44,6 +85,20 @@ async def ping() -> dict[str, str]:
     return {"ping": "pong"}
 
 
+@app.get("/ready")
+async def ready() -> dict:
+    """Report readiness to serve requests and snapshot warm-up progress.
+
+    The API is ready as soon as it has started; warm-up continues in the
+    background and only affects the latency of the first requests for a snapshot.
+
+    Returns
+    -------
+        dict: Readiness status and warm-up progress
+    """
+    return {"status": "ready", "warmup": get_warmup_progress().as_dict()}
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "api.main:app",
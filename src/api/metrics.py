@@ -0,0 +1,62 @@
+"""In-process metrics reported by the monitoring routes."""
+import math
+from threading import Lock
+
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram with per-outcome counts."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        """Class constructor.
+
+        Args:
+            buckets (tuple[float, ...], optional):
+                Upper bounds of histogram buckets in seconds.
+                Defaults to DEFAULT_LATENCY_BUCKETS.
+        """
+        self.buckets = (*sorted(buckets), math.inf)
+        self._lock = Lock()
+        self._counts = [0] * len(self.buckets)
+        self._outcomes: dict[str, int] = {}
+        self._total = 0.0
+        self._max = 0.0
+
+    def observe(self, seconds: float, outcome: str) -> None:
+        """Record the duration of a call.
+
+        Args:
+            seconds (float): Duration of the call
+            outcome (str): Short label for the call outcome, e.g. "success"
+        """
+        with self._lock:
+            for index, upper in enumerate(self.buckets):
+                if seconds <= upper:
+                    self._counts[index] += 1
+                    break
+            self._outcomes[outcome] = self._outcomes.get(outcome, 0) + 1
+            self._total += seconds
+            self._max = max(self._max, seconds)
+
+    def as_dict(self) -> dict:
+        """Summarise the recorded latencies.
+
+        Returns
+        -------
+            dict: Call count, mean and max latency, outcomes and cumulative buckets
+        """
+        with self._lock:
+            count = sum(self._counts)
+            cumulative = 0
+            buckets = {}
+            for upper, bucket_count in zip(self.buckets, self._counts, strict=True):
+                cumulative += bucket_count
+                buckets["+Inf" if math.isinf(upper) else str(upper)] = cumulative
+            return {
+                "count": count,
+                "mean_seconds": self._total / count if count else 0.0,
+                "max_seconds": self._max,
+                "outcomes": dict(self._outcomes),
+                "buckets": buckets,
+            }
@@ -0,0 +1,89 @@
+"""Share state built once in a gunicorn master with the workers it forks.
+
+With `preload_app` set (see `gunicorn.conf.py`), gunicorn imports the application
+in the master and forks workers from it. `preload_app` then builds the state every
+worker would otherwise build for itself: the snapshot catalogue, the numba-compiled
+readers, and the serialised units, metadata and masks of the snapshots configured
+for warm-up. Workers share these copy-on-write. Serialised blobs and the alias
+index are packed into shared memory, and the remaining objects are frozen out of
+reach of the garbage collector, so that workers do not copy the pages holding them.
+
+Open HDF5 files, loguru sinks, SQLite connections, HTTP connection pools and
+executors are not safe to use across a fork, so `after_fork` closes or replaces
+them in each worker before it serves requests. They are opened again on first use.
+"""
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from api.config import get_settings
+from api.lazy import lazy_import
+from api.processing.catalogue import get_snapshot_catalogue
+from api.processing.jit_warmup import DEFAULT_JIT_CACHE_DIR, prepare_jit
+from api.processing.jobs import get_job_manager
+from api.processing.prewarm import resolve_target
+from api.processing.shared_blobs import pack_shared_blobs
+from api.routers import auth
+
+h5py = lazy_import("h5py")
+
+
+def preload_app() -> None:
+    """Build the state shared by all workers, before they are forked."""
+    start = time.perf_counter()
+    settings = get_settings()
+
+    catalogue = get_snapshot_catalogue()
+    try:
+        catalogue.refresh()
+    except (OSError, sqlite3.Error) as error:
+        logger.error(f"Snapshot catalogue refresh failed: {error}")
+
+    prepare_jit(
+        settings.jit_cache_dir or DEFAULT_JIT_CACHE_DIR,
+        settings.jit_warmup_dtypes,
+    )
+
+    filenames = []
+    for target in settings.prewarm_snapshots:
+        try:
+            filenames.append(Path(resolve_target(target, catalogue)))
+        except FileNotFoundError as error:
+            logger.warning(f"Failed to preload {target}: {error}")
+    pack_shared_blobs(filenames)
+    catalogue.freeze()
+
+    logger.info(f"Preloaded shared state in {time.perf_counter() - start:.2f}s")
+
+
+def close_hdf5_files() -> int:
+    """Close every HDF5 file open in this process, and the objects within them.
+
+    Returns
+    -------
+        int: Number of files closed
+    """
+    if "h5py" not in sys.modules:
+        return 0
+    files = h5py.h5f.get_obj_ids(types=h5py.h5f.OBJ_FILE)
+    for file_id in files:
+        h5py.File(file_id).close()
+    return len(files)
+
+
+def after_fork() -> None:
+    """Replace state inherited from the gunicorn master that is not fork-safe."""
+    closed = close_hdf5_files()
+
+    logger.remove()
+    logger.add(sys.stderr)
+
+    get_snapshot_catalogue().after_fork()
+    auth.get_virgodb_client.cache_clear()
+    get_job_manager.cache_clear()
+
+    if closed:
+        logger.info(f"Closed {closed} HDF5 files inherited from the master")
@@ -0,0 +1,283 @@
+"""Select particles within spherical or box-shaped apertures.
+
+Candidate cells are chosen from the cell metadata held by `sw.mask`, using the
+periodic distance between the aperture and each cell. The coordinates of the
+particles in those cells are then read and the exact periodic distance cut is
+applied, so only particles inside the aperture are returned.
+"""
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+from api.config import get_settings
+from api.lazy import lazy_import
+from api.processing.data_processing import SWIFTProcessor
+from api.processing.derived_fields import iterate_blocks
+from api.processing.distributed import part_type_index
+from api.processing.filtering import union_ranges
+from api.processing.masks import load_mask
+from api.processing.metadata import load_swift_metadata
+
+accelerated = lazy_import("swiftsimio.accelerated")
+particle = lazy_import("swiftsimio.metadata.particle")
+
+
+class ApertureError(Exception):
+    """Custom exception for aperture query errors."""
+
+
+class CellMetadata:
+    """Cell layout of a snapshot, in the units of one particle type's coordinates."""
+
+    def __init__(self, filename: str, part_type: str):
+        """Class constructor.
+
+        Args:
+            filename (str): Path to HDF5 file
+            part_type (str): Particle type, e.g. "PartType0"
+
+        Raises
+        ------
+            ApertureError: If the particle type is not present in the snapshot.
+        """
+        try:
+            particle_name = particle.particle_name_underscores[
+                part_type_index(f"{part_type}/")
+            ]
+        except KeyError as error:
+            message = f"Unknown particle type {part_type}."
+            raise ApertureError(message) from error
+
+        mask = load_mask(Path(filename))
+        if particle_name not in mask.counts:
+            message = f"Particle type {part_type} not present in {filename}."
+            raise ApertureError(message)
+
+        metadata = load_swift_metadata(filename)
+        properties = getattr(metadata, f"{particle_name}_properties")
+        units = dict(zip(properties.field_paths, properties.field_units, strict=True))
+        coordinate_unit = units[f"{part_type}/Coordinates"]
+
+        self.part_type = part_type
+        self.units = str(coordinate_unit.units)
+        self.scale = float(coordinate_unit.value)
+        self.centres = mask.centers.to(coordinate_unit.units).value
+        self.cell_size = mask.cell_size.to(coordinate_unit.units).value
+        self.boxsize = metadata.boxsize.to(coordinate_unit.units).value
+        self.offsets = np.asarray(mask.offsets[particle_name], dtype=np.int64)
+        self.counts = np.asarray(mask.counts[particle_name], dtype=np.int64)
+
+    def cell_ranges(self, cells: npt.NDArray) -> npt.NDArray:
+        """Convert a cell selection into merged half-open particle row ranges.
+
+        Args:
+            cells (npt.NDArray): Boolean array selecting cells
+
+        Returns
+        -------
+            npt.NDArray: Sorted, disjoint row ranges with shape (N, 2)
+        """
+        selected = np.flatnonzero(cells & (self.counts > 0))
+        if not selected.size:
+            return np.empty((0, 2), dtype=np.int64)
+        order = np.argsort(self.offsets[selected])
+        starts = self.offsets[selected][order]
+        ends = starts + self.counts[selected][order]
+        group_starts = np.flatnonzero(np.concatenate(([True], starts[1:] != ends[:-1])))
+        group_ends = np.append(group_starts[1:], starts.size) - 1
+        return np.stack((starts[group_starts], ends[group_ends]), axis=1)
+
+
+def periodic_offsets(
+    positions: npt.NDArray,
+    centre: npt.NDArray,
+    boxsize: npt.NDArray,
+) -> npt.NDArray:
+    """Compute the periodic separation of positions from a centre.
+
+    Args:
+        positions (npt.NDArray): Positions with shape (N, 3)
+        centre (npt.NDArray): Centre with shape (3,)
+        boxsize (npt.NDArray): Side lengths of the periodic box
+
+    Returns
+    -------
+        npt.NDArray: Separations in [-boxsize / 2, boxsize / 2)
+    """
+    return (positions - centre + 0.5 * boxsize) % boxsize - 0.5 * boxsize
+
+
+def inside_aperture(
+    offsets: npt.NDArray,
+    radius: float | None = None,
+    half_widths: npt.NDArray | None = None,
+) -> npt.NDArray:
+    """Test whether separations lie within a sphere or box.
+
+    Args:
+        offsets (npt.NDArray): Separations from the centre with shape (N, 3)
+        radius (float | None, optional): Radius of a spherical aperture. Defaults to None.
+        half_widths (npt.NDArray | None, optional):
+            Half side lengths of a box aperture. Defaults to None.
+
+    Returns
+    -------
+        npt.NDArray: Boolean array, True for separations inside the aperture
+    """
+    if radius is not None:
+        return np.einsum("ij,ij->i", offsets, offsets) <= radius**2
+    return np.all(np.abs(offsets) <= half_widths, axis=1)
+
+
+def candidate_cells(
+    cells: CellMetadata,
+    centre: npt.NDArray,
+    radius: float | None = None,
+    half_widths: npt.NDArray | None = None,
+) -> npt.NDArray:
+    """Find the cells that overlap an aperture.
+
+    Args:
+        cells (CellMetadata): Cell layout of the snapshot
+        centre (npt.NDArray): Centre of the aperture
+        radius (float | None, optional): Radius of a spherical aperture. Defaults to None.
+        half_widths (npt.NDArray | None, optional):
+            Half side lengths of a box aperture. Defaults to None.
+
+    Returns
+    -------
+        npt.NDArray: Boolean array, True for cells that may contain particles inside
+    """
+    separation = np.abs(periodic_offsets(cells.centres, centre, cells.boxsize))
+    gaps = np.maximum(separation - 0.5 * cells.cell_size, 0.0)
+    return inside_aperture(gaps, radius, half_widths)
+
+
+def validate_aperture(
+    centre: list[float],
+    radius: float | None,
+    half_widths: list[float] | None,
+) -> None:
+    """Check an aperture specification.
+
+    Args:
+        centre (list[float]): Centre of the aperture
+        radius (float | None): Radius of a spherical aperture
+        half_widths (list[float] | None): Half side lengths of a box aperture
+
+    Raises
+    ------
+        ApertureError: For invalid aperture specifications.
+    """
+    dimensions = 3
+    if len(centre) != dimensions:
+        message = "The aperture centre must have three coordinates."
+        raise ApertureError(message)
+    if (radius is None) == (half_widths is None):
+        message = "Exactly one of a radius or box half widths is required."
+        raise ApertureError(message)
+    if radius is not None and radius < 0:
+        message = "The aperture radius must not be negative."
+        raise ApertureError(message)
+    if half_widths is not None and (
+        len(half_widths) != dimensions or min(half_widths) < 0
+    ):
+        message = "Box half widths must be three non-negative lengths."
+        raise ApertureError(message)
+
+
+def select_rows(
+    filename: str,
+    cells: CellMetadata,
+    ranges: npt.NDArray,
+    block_size: int,
+) -> Iterator[tuple[npt.NDArray, npt.NDArray]]:
+    """Read the coordinates of particles in a set of ranges, block by block.
+
+    Args:
+        filename (str): Path to HDF5 file
+        cells (CellMetadata): Cell layout of the snapshot
+        ranges (npt.NDArray): Half-open row ranges
+        block_size (int): Maximum number of rows read at once
+
+    Yields
+    ------
+        tuple[npt.NDArray, npt.NDArray]:
+            Row indices and coordinates, in the units of the cell layout
+    """
+    field = f"{cells.part_type}/Coordinates"
+    for block_ranges, start, end in iterate_blocks(ranges, block_size):
+        coordinates = SWIFTProcessor.get_array_ranges(
+            filename,
+            field,
+            block_ranges,
+            end - start,
+        )
+        lengths = block_ranges[:, 1] - block_ranges[:, 0]
+        rows = np.repeat(block_ranges[:, 0] - (np.cumsum(lengths) - lengths), lengths)
+        rows += np.arange(end - start)
+        yield rows, coordinates * cells.scale
+
+
+def aperture_ranges(
+    filename: str,
+    part_type: str,
+    centre: list[float],
+    radius: float | None = None,
+    half_widths: list[float] | None = None,
+) -> tuple[npt.NDArray, dict]:
+    """Find the particles of one type within an aperture.
+
+    The centre, radius and half widths are in the units of the particle coordinates.
+
+    Args:
+        filename (str): Path to HDF5 file
+        part_type (str): Particle type, e.g. "PartType0"
+        centre (list[float]): Centre of the aperture
+        radius (float | None, optional): Radius of a spherical aperture. Defaults to None.
+        half_widths (list[float] | None, optional):
+            Half side lengths of a box aperture. Defaults to None.
+
+    Raises
+    ------
+        ApertureError: For invalid apertures or particle types.
+
+    Returns
+    -------
+        tuple[npt.NDArray, dict]:
+            Half-open ranges of rows inside the aperture, and statistics on the
+            cells and rows read.
+    """
+    validate_aperture(centre, radius, half_widths)
+    cells = CellMetadata(filename, part_type)
+    centre_array = np.asarray(centre, dtype=np.float64)
+    widths = None if half_widths is None else np.asarray(half_widths, np.float64)
+
+    selected_cells = candidate_cells(cells, centre_array, radius, widths)
+    candidates = cells.cell_ranges(selected_cells)
+
+    matches = [np.empty((0, 2), dtype=np.int64)]
+    for rows, coordinates in select_rows(
+        filename,
+        cells,
+        candidates,
+        get_settings().derived_field_block_size,
+    ):
+        inside = inside_aperture(
+            periodic_offsets(coordinates, centre_array, cells.boxsize),
+            radius,
+            widths,
+        )
+        if np.any(inside):
+            matches.append(accelerated.ranges_from_array(rows[inside]))
+
+    matching = union_ranges(np.concatenate(matches), matches[0])
+    return matching, {
+        "units": cells.units,
+        "cells_total": int(selected_cells.size),
+        "cells_read": int(np.count_nonzero(selected_cells)),
+        "rows_read": int(np.diff(candidates, axis=1).sum()),
+        "rows_matched": int(np.diff(matching, axis=1).sum()),
+    }
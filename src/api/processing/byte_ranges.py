@@ -0,0 +1,262 @@
+"""Serve byte ranges of binary results, so that dropped downloads can resume.
+
+Binary results have a stable representation: the same request for an unchanged
+file always produces the same bytes. Each is identified by a strong entity tag,
+derived from the request and the modification time and size of the source file.
+Clients resume a download by repeating the request with a `Range` header, and an
+`If-Range` header holding the entity tag or modification date of the bytes they
+already have. Only single ranges are served. Requests for several ranges, or with
+a stale `If-Range`, receive the whole result, as HTTP allows.
+
+Results stored as files are served from the start of the range. Arrays
+computed for the request are written as raw C-order little-endian bytes, and only
+the rows overlapping the range are read. Raw fields stored contiguously, without
+compression, already hold exactly those bytes, so their rows are sent straight
+from the snapshot as segments of the file.
+"""
+import hashlib
+from collections.abc import Callable, Iterator
+from email.utils import formatdate
+
+import numpy as np
+import numpy.typing as npt
+
+from api.lazy import lazy_import
+from api.processing.pagination import select_rows
+
+h5py = lazy_import("h5py")
+
+
+class ByteRangeError(Exception):
+    """Custom exception for byte range errors."""
+
+
+class UnsatisfiableRangeError(ByteRangeError):
+    """Raised for ranges starting beyond the end of the result."""
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Parse a `Range` header for a result of a known size.
+
+    Args:
+        header (str): Value of the header, e.g. "bytes=100-199", "bytes=100-"
+            or "bytes=-100" for the last 100 bytes
+        size (int): Size of the result in bytes
+
+    Raises
+    ------
+        UnsatisfiableRangeError: For ranges that select none of the result.
+
+    Returns
+    -------
+        tuple[int, int] | None:
+            Half-open byte range, or None to send the whole result for malformed
+            headers and requests for several ranges
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    first, dash, last = (part.strip() for part in ranges.partition("-"))
+    if not dash or not (first or last):
+        return None
+    if (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+
+    if not first:
+        start, end = size - min(int(last), size), size
+    else:
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+        if last and int(last) < start:
+            return None
+    if start >= end:
+        message = f"The range {header} is outside the {size} bytes of the result."
+        raise UnsatisfiableRangeError(message)
+    return start, end
+
+
+def entity_tag(*parts: object) -> str:
+    """Build a strong entity tag for a result.
+
+    Args:
+        *parts (object): Values identifying the bytes of the result
+
+    Returns
+    -------
+        str: Quoted entity tag
+    """
+    return f'"{hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()}"'
+
+
+def http_date(mtime_ns: int) -> str:
+    """Format a modification time as an HTTP date.
+
+    Args:
+        mtime_ns (int): Modification time in nanoseconds
+
+    Returns
+    -------
+        str: Date for `Last-Modified` headers
+    """
+    return formatdate(mtime_ns / 1e9, usegmt=True)
+
+
+def range_applies(if_range: str | None, etag: str, last_modified: str) -> bool:
+    """Check whether a `Range` header applies to the current result.
+
+    Args:
+        if_range (str | None): Value of the `If-Range` header, if sent
+        etag (str): Entity tag of the current result
+        last_modified (str): Modification date of the current result
+
+    Returns
+    -------
+        bool: True if the range should be served
+    """
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(("W/", '"')):
+        return if_range == etag
+    return if_range == last_modified
+
+
+def content_range(span: tuple[int, int] | None, size: int) -> str:
+    """Format a `Content-Range` header.
+
+    Args:
+        span (tuple[int, int] | None): Half-open byte range, or None if unsatisfiable
+        size (int): Size of the result in bytes
+
+    Returns
+    -------
+        str: Value of the header
+    """
+    if span is None:
+        return f"bytes */{size}"
+    return f"bytes {span[0]}-{span[1] - 1}/{size}"
+
+
+def row_span(start: int, end: int, row_bytes: int) -> tuple[int, int]:
+    """Find the rows of an array overlapping a byte range.
+
+    Args:
+        start (int): First byte of the range
+        end (int): Byte after the last of the range
+        row_bytes (int): Bytes in each row
+
+    Returns
+    -------
+        tuple[int, int]: First row and the number of rows overlapping the range
+    """
+    first = start // row_bytes
+    return first, -(-end // row_bytes) - first
+
+
+def little_endian(array: npt.NDArray) -> npt.NDArray:
+    """Convert an array to C-order little-endian, if it is not already.
+
+    Args:
+        array (npt.NDArray): Array read from a snapshot
+
+    Returns
+    -------
+        npt.NDArray: The array with a little-endian data type
+    """
+    return np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+
+
+def iter_array_range(
+    read: Callable[[npt.NDArray, int], npt.NDArray],
+    ranges: npt.NDArray,
+    row_bytes: int,
+    start: int,
+    end: int,
+    block_rows: int,
+) -> Iterator[bytes]:
+    """Read the rows of an array overlapping a byte range, a block at a time.
+
+    Args:
+        read (Callable[[npt.NDArray, int], npt.NDArray]):
+            Function reading the rows in some half-open row ranges, given the
+            ranges and the number of rows
+        ranges (npt.NDArray): Half-open row ranges of the whole result
+        row_bytes (int): Bytes in each row
+        start (int): First byte of the range
+        end (int): Byte after the last of the range
+        block_rows (int): Maximum number of rows read at once
+
+    Yields
+    ------
+        Iterator[bytes]: Raw little-endian bytes of the range
+    """
+    first, rows = row_span(start, end, row_bytes)
+    skip = start - first * row_bytes
+    for offset in range(first, first + rows, block_rows):
+        count = min(block_rows, first + rows - offset)
+        block = read(select_rows(ranges, offset, count), count)
+        content = little_endian(block).tobytes()
+        block_end = (offset + count) * row_bytes
+        yield content[skip : len(content) - max(block_end - end, 0)]
+        skip = 0
+
+
+def contiguous_offset(filename: str, field: str) -> int | None:
+    """Find where a field is stored, if its rows can be sent straight from the file.
+
+    Args:
+        filename (str): Path to HDF5 file
+        field (str): Raw field path
+
+    Returns
+    -------
+        int | None:
+            Byte offset of the field within the file, or None for fields that are
+            chunked, filtered, virtual, stored elsewhere or big-endian
+    """
+    try:
+        with h5py.File(filename, "r") as snapshot:
+            dataset = snapshot[field]
+            if (
+                dataset.is_virtual
+                or dataset.chunks is not None
+                or dataset.external
+                or dataset.dtype != dataset.dtype.newbyteorder("<")
+            ):
+                return None
+            return dataset.id.get_offset()
+    except (KeyError, OSError, TypeError):
+        return None
+
+
+def file_segments(
+    ranges: npt.NDArray,
+    offset: int,
+    row_bytes: int,
+    start: int,
+    end: int,
+) -> list[tuple[int, int]]:
+    """Map a byte range of an array to segments of the file it is stored in.
+
+    Args:
+        ranges (npt.NDArray): Half-open row ranges of the whole result
+        offset (int): Byte offset of the field within the file
+        row_bytes (int): Bytes in each row
+        start (int): First byte of the range
+        end (int): Byte after the last of the range
+
+    Returns
+    -------
+        list[tuple[int, int]]: Byte offset and length of each segment, in order
+    """
+    first, rows = row_span(start, end, row_bytes)
+    segments = [
+        [offset + int(row_start) * row_bytes, int(row_end - row_start) * row_bytes]
+        for row_start, row_end in select_rows(ranges, first, rows)
+    ]
+    if segments:
+        skip = start - first * row_bytes
+        segments[0][0] += skip
+        segments[0][1] -= skip
+        segments[-1][1] -= (first + rows) * row_bytes - end
+    return [(segment_offset, count) for segment_offset, count in segments]
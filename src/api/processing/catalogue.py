@@ -0,0 +1,394 @@
+"""Maintain an index of the SWIFT snapshots available on the server.
+
+Snapshots found under the configured root directories are recorded in a local
+SQLite database, so that alias resolution and existence checks are indexed
+lookups rather than filesystem calls made on every request. The index is updated
+incrementally by comparing file modification times and sizes, either on demand
+or periodically from a background thread.
+
+A gunicorn master preloading the application freezes the aliases into a read-only
+index in shared memory before forking, which workers consult without locking until
+a refresh finds that the indexed snapshots differ from it, whichever process
+changed them. Each worker then replaces the SQLite connection it inherited, as
+connections must not be used across a fork.
+"""
+import hashlib
+import json
+import sqlite3
+from functools import lru_cache
+from pathlib import Path
+from threading import Event, Lock, Thread
+
+import numpy as np
+from loguru import logger
+
+from api.config import get_settings
+from api.lazy import lazy_import
+from api.processing.shared_blobs import SharedBlobs
+
+h5py = lazy_import("h5py")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    alias TEXT PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    particle_counts TEXT NOT NULL,
+    redshift REAL,
+    fields TEXT NOT NULL
+)
+"""
+
+
+class SnapshotCatalogueError(Exception):
+    """Custom exception for snapshot catalogue errors."""
+
+
+def read_snapshot_info(filename: Path) -> dict:
+    """Read the catalogue information for a single snapshot.
+
+    Args:
+        filename (Path): Path to a SWIFT snapshot
+
+    Raises
+    ------
+        SnapshotCatalogueError: If the file is not a readable SWIFT snapshot.
+
+    Returns
+    -------
+        dict: Particle counts per particle type, redshift and available fields
+    """
+    try:
+        with h5py.File(filename, "r") as handle:
+            header = handle["Header"].attrs
+            counts = np.asarray(header["NumPart_Total"], dtype=np.int64)
+            if "NumPart_Total_HighWord" in header:
+                high_word = np.asarray(header["NumPart_Total_HighWord"], dtype=np.int64)
+                counts[: high_word.size] += high_word << 32
+            redshift = header.get("Redshift")
+
+            fields = []
+            for group_name, group in handle.items():
+                if group_name.startswith("PartType") and isinstance(group, h5py.Group):
+                    fields.extend(
+                        f"{group_name}/{name}"
+                        for name, item in group.items()
+                        if isinstance(item, h5py.Dataset)
+                    )
+    except (OSError, KeyError) as error:
+        message = f"Unable to read snapshot information from {filename}: {error}"
+        raise SnapshotCatalogueError(message) from error
+
+    return {
+        "particle_counts": {
+            f"PartType{index}": int(count) for index, count in enumerate(counts)
+        },
+        "redshift": None if redshift is None else float(np.ravel(redshift)[0]),
+        "fields": sorted(fields),
+    }
+
+
+def index_version(rows: list[tuple[str, str, float, int]]) -> str:
+    """Summarise the indexed snapshots, to tell whether the index has changed.
+
+    Args:
+        rows (list[tuple[str, str, float, int]]):
+            Alias, path, modification time and size of each indexed snapshot
+
+    Returns
+    -------
+        str: Hex digest of the rows, independent of their order
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for row in sorted(rows):
+        digest.update(json.dumps(row).encode())
+    return digest.hexdigest()
+
+
+class SnapshotCatalogue:
+    """Persistent index of snapshots found under a set of root directories.
+
+    The catalogue behaves like the dataset alias map used by `SWIFTProcessor`,
+    mapping aliases to resolved file paths. The alias of a snapshot is its path
+    relative to the root it was found in, without the file suffix.
+    """
+
+    def __init__(
+        self,
+        roots: list[Path],
+        index_path: Path | None = None,
+        pattern: str = "*.hdf5",
+    ):
+        """Class constructor.
+
+        Args:
+            roots (list[Path]): Directories to search for snapshots
+            index_path (Path | None, optional):
+                Location of the SQLite index. Defaults to None, in which case the
+                index is held in memory and rebuilt on each start.
+            pattern (str, optional): Glob pattern matching snapshot files.
+                Defaults to "*.hdf5".
+        """
+        self.roots = [Path(root).resolve() for root in roots]
+        self.index_path = index_path
+        self.pattern = pattern
+
+        self._lock = Lock()
+        self._stop = Event()
+        self._poller: Thread | None = None
+        self._frozen: SharedBlobs | None = None
+        self._frozen_version: str | None = None
+        self._connection = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        database = ":memory:" if self.index_path is None else str(self.index_path)
+        connection = sqlite3.connect(database, check_same_thread=False, timeout=30)
+        if self.index_path is not None:
+            connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(SCHEMA)
+        connection.commit()
+        return connection
+
+    def get(self, alias: str, default: str | None = None) -> str | None:
+        """Retrieve the resolved file path for an alias.
+
+        Args:
+            alias (str): Snapshot alias
+            default (str | None, optional): Value returned for unknown aliases.
+                Defaults to None.
+
+        Returns
+        -------
+            str | None: Resolved path to the snapshot
+        """
+        frozen = self._frozen
+        if frozen is not None:
+            path = frozen.get(f"alias:{alias}")
+            return default if path is None else path.decode()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT path FROM snapshots WHERE alias = ?",
+                (alias,),
+            ).fetchone()
+        return default if row is None else row[0]
+
+    def contains_path(self, filename: str | Path) -> bool:
+        """Check whether a file path is present in the index.
+
+        Args:
+            filename (str | Path): Path to check
+
+        Returns
+        -------
+            bool: True if the path is indexed
+        """
+        frozen = self._frozen
+        if frozen is not None:
+            return f"path:{filename}" in frozen
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM snapshots WHERE path = ?",
+                (str(filename),),
+            ).fetchone()
+        return row is not None
+
+    def records(self) -> list[dict]:
+        """List every indexed snapshot.
+
+        Returns
+        -------
+            list[dict]: Catalogue information for each snapshot, ordered by alias
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT alias, path, mtime, size, particle_counts, redshift, fields "
+                "FROM snapshots ORDER BY alias",
+            ).fetchall()
+        return [
+            {
+                "alias": alias,
+                "path": path,
+                "mtime": mtime,
+                "size": size,
+                "particle_counts": json.loads(particle_counts),
+                "redshift": redshift,
+                "fields": json.loads(fields),
+            }
+            for alias, path, mtime, size, particle_counts, redshift, fields in rows
+        ]
+
+    def _version(self) -> str:
+        rows = self._connection.execute(
+            "SELECT alias, path, mtime, size FROM snapshots",
+        ).fetchall()
+        return index_version(rows)
+
+    def _scan(self) -> dict[str, tuple[str, float, int]]:
+        found: dict[str, tuple[str, float, int]] = {}
+        for root in self.roots:
+            if not root.is_dir():
+                logger.warning(f"Snapshot root {root} is not a directory")
+                continue
+            for filename in sorted(root.rglob(self.pattern)):
+                if not filename.is_file():
+                    continue
+                alias = filename.relative_to(root).with_suffix("").as_posix()
+                if alias in found:
+                    logger.warning(
+                        f"Alias {alias} for {filename} already used by {found[alias][0]}",
+                    )
+                    continue
+                stat = filename.stat()
+                found[alias] = (str(filename.resolve()), stat.st_mtime, stat.st_size)
+        return found
+
+    def refresh(self) -> dict[str, int]:
+        """Bring the index up to date with the snapshot roots.
+
+        Only files that are new, or whose modification time or size changed, are
+        opened to read their information. Entries for removed files are deleted.
+        The frozen index is dropped if the indexed snapshots no longer match it,
+        including when another process sharing the index file changed them.
+
+        Returns
+        -------
+            dict[str, int]: Number of snapshots added, updated and removed
+        """
+        found = self._scan()
+
+        with self._lock:
+            indexed = {
+                alias: (path, mtime, size)
+                for alias, path, mtime, size in self._connection.execute(
+                    "SELECT alias, path, mtime, size FROM snapshots",
+                )
+            }
+
+        changes = {"added": 0, "updated": 0, "removed": 0}
+        rows = []
+        for alias, (path, mtime, size) in found.items():
+            if indexed.get(alias) == (path, mtime, size):
+                continue
+            try:
+                info = read_snapshot_info(Path(path))
+            except SnapshotCatalogueError as error:
+                logger.warning(str(error))
+                continue
+            changes["updated" if alias in indexed else "added"] += 1
+            rows.append(
+                (
+                    alias,
+                    path,
+                    mtime,
+                    size,
+                    json.dumps(info["particle_counts"]),
+                    info["redshift"],
+                    json.dumps(info["fields"]),
+                ),
+            )
+        removed = [(alias,) for alias in indexed if alias not in found]
+        changes["removed"] = len(removed)
+
+        with self._lock:
+            self._connection.executemany(
+                "DELETE FROM snapshots WHERE alias = ?",
+                removed,
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._connection.commit()
+            if self._frozen is not None and self._version() != self._frozen_version:
+                self._frozen = None
+
+        if any(changes.values()):
+            logger.info(f"Snapshot catalogue refreshed: {changes}")
+        return changes
+
+    def freeze(self) -> int:
+        """Hold the indexed aliases in a read-only index in shared memory.
+
+        Lookups use the frozen index, without locking, until a refresh finds that
+        the indexed snapshots differ from those frozen.
+
+        Returns
+        -------
+            int: Number of snapshots in the frozen index
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT alias, path, mtime, size FROM snapshots",
+            ).fetchall()
+            items = {f"alias:{alias}": path.encode() for alias, path, _, _ in rows}
+            items.update({f"path:{path}": b"" for _, path, _, _ in rows})
+            self._frozen = SharedBlobs(items)
+            self._frozen_version = index_version(rows)
+        return len(rows)
+
+    def after_fork(self) -> None:
+        """Replace the connection, lock and poller inherited from a forked parent.
+
+        An in-memory index is copied to a new connection, a file index reopened.
+        """
+        self._lock = Lock()
+        self._stop = Event()
+        self._poller = None
+        inherited, self._connection = self._connection, self._connect()
+        if self.index_path is None:
+            inherited.backup(self._connection)
+        inherited.close()
+
+    def _poll(self, interval: float) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except (OSError, sqlite3.Error) as error:
+                logger.error(f"Snapshot catalogue refresh failed: {error}")
+            if interval <= 0:
+                return
+            self._stop.wait(interval)
+
+    def start_polling(self, interval: float) -> None:
+        """Refresh the index periodically from a background thread.
+
+        The first refresh happens immediately.
+
+        Args:
+            interval (float):
+                Seconds between refreshes. If not positive, the index is refreshed once.
+        """
+        if self._poller is not None and self._poller.is_alive():
+            return
+        self._stop.clear()
+        self._poller = Thread(
+            target=self._poll,
+            args=(interval,),
+            name="snapshot-catalogue",
+            daemon=True,
+        )
+        self._poller.start()
+
+    def stop_polling(self) -> None:
+        """Stop the background refresh thread, if running."""
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join()
+            self._poller = None
+
+
+@lru_cache
+def get_snapshot_catalogue() -> SnapshotCatalogue:
+    """Retrieve the snapshot catalogue configured in the settings.
+
+    Returns
+    -------
+        SnapshotCatalogue: Snapshot catalogue for this worker
+    """
+    settings = get_settings()
+    return SnapshotCatalogue(
+        settings.snapshot_roots,
+        index_path=settings.catalogue_path,
+        pattern=settings.catalogue_pattern,
+    )
@@ -0,0 +1,147 @@
+"""Share one computation between identical concurrent requests.
+
+When many clients request the same data at the same moment, for example at the
+start of a tutorial, only the first request reads the snapshot. Identical requests
+arriving while it is in flight wait for its result instead of repeating the work,
+and receive the same exception if it fails.
+"""
+import hashlib
+from collections.abc import Callable, Hashable
+from concurrent.futures import Future
+from functools import lru_cache
+from threading import Lock
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into a single call."""
+
+    def __init__(self):
+        """Class constructor."""
+        self._lock = Lock()
+        self._calls: dict[Hashable, Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key: Hashable, function: Callable[..., T], *args, **kwargs) -> T:
+        """Call a function, or wait for an identical call already in flight.
+
+        The calling thread runs the function if no call with the same key is in
+        flight. The in-flight entry is always resolved and removed when the call
+        finishes, including when it is interrupted, so waiting threads never block
+        indefinitely. Calls starting after that run the function afresh.
+
+        Args:
+            key (Hashable): Key identifying identical calls
+            function (Callable[..., T]): Function to call
+            *args: Positional arguments for the function
+            **kwargs: Keyword arguments for the function
+
+        Raises
+        ------
+            BaseException: Any exception raised by the shared call.
+
+        Returns
+        -------
+            T: Result of the shared call
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                future.set_running_or_notify_cancel()
+                self._calls[key] = future
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as error:
+            self._forget(key)
+            future.set_exception(error)
+            raise
+        self._forget(key)
+        future.set_result(result)
+        return result
+
+    def _forget(self, key: Hashable) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def as_dict(self) -> dict:
+        """Summarise how often calls were shared.
+
+        Returns
+        -------
+            dict: Calls run, calls that waited for another and calls in flight
+        """
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "followers": self.followers,
+                "in_flight": len(self._calls),
+            }
+
+
+def digest(value: str | bytes | None) -> str | None:
+    """Summarise a potentially large request parameter, such as a mask, for a key.
+
+    Args:
+        value (str | bytes | None): Value to summarise
+
+    Returns
+    -------
+        str | None: Hex digest of the value, or None if no value was given
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.encode()
+    return hashlib.blake2b(value, digest_size=16).hexdigest()
+
+
+def request_key(
+    path: str,
+    field: str | None = None,
+    columns: Any = None,
+    mask: str | bytes | None = None,
+    response_format: str = "json",
+    **parameters: Any,
+) -> tuple:
+    """Build the key identifying identical data requests.
+
+    Args:
+        path (str): Path to the requested file
+        field (str | None, optional): Requested field. Defaults to None.
+        columns (Any, optional): Column selector. Defaults to None.
+        mask (str | bytes | None, optional): Serialised mask. Defaults to None.
+        response_format (str, optional): Format of the response. Defaults to "json".
+        **parameters (Any): Any other parameters changing the response
+
+    Returns
+    -------
+        tuple: Hashable key
+    """
+    extra = tuple(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in sorted(parameters.items())
+    )
+    return (path, field, columns, digest(mask), response_format, extra)
+
+
+@lru_cache
+def get_request_flight() -> SingleFlight:
+    """Retrieve the coalescer for data requests in this worker.
+
+    Returns
+    -------
+        SingleFlight: Coalescer shared by the data routes
+    """
+    return SingleFlight()
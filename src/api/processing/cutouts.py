@@ -0,0 +1,373 @@
+"""Extract particles around many spherical apertures in one pass.
+
+Catalogue-driven analyses select particles around thousands of halo centres in a
+single snapshot. The candidate cells of every aperture are found together and the
+coordinates of each needed cell are read once, however many apertures overlap it.
+Particles are assigned to apertures with vectorised periodic distance tests, and
+the results are streamed back one aperture per line as newline-delimited JSON.
+"""
+from collections.abc import Iterator
+
+import numpy as np
+import numpy.typing as npt
+import orjson
+
+from api.config import get_settings
+from api.lazy import lazy_import
+from api.processing.apertures import ApertureError, CellMetadata, periodic_offsets
+from api.processing.data_processing import SWIFTProcessor, SWIFTProcessorError
+from api.processing.metadata import encode_metadata_value
+
+accelerated = lazy_import("swiftsimio.accelerated")
+h5py = lazy_import("h5py")
+
+# Upper limit on aperture-cell pairs tested at once when choosing candidate cells
+CANDIDATE_PAIR_BUDGET = 1_000_000
+
+
+def candidate_pairs(
+    cells: CellMetadata,
+    centres: npt.NDArray,
+    radii: npt.NDArray,
+) -> tuple[npt.NDArray, npt.NDArray]:
+    """Find every pair of an aperture and a cell it overlaps.
+
+    Args:
+        cells (CellMetadata): Cell layout of the snapshot
+        centres (npt.NDArray): Aperture centres with shape (N, 3)
+        radii (npt.NDArray): Aperture radii with shape (N,)
+
+    Returns
+    -------
+        tuple[npt.NDArray, npt.NDArray]: Aperture and cell index of each pair
+    """
+    group = max(CANDIDATE_PAIR_BUDGET // max(len(cells.centres), 1), 1)
+    apertures, cell_indices = [], []
+    for start in range(0, len(centres), group):
+        separation = np.abs(
+            periodic_offsets(
+                cells.centres[None, :, :],
+                centres[start : start + group, None, :],
+                cells.boxsize,
+            ),
+        )
+        gaps = np.maximum(separation - 0.5 * cells.cell_size, 0.0)
+        overlaps = np.einsum("acd,acd->ac", gaps, gaps) <= (
+            radii[start : start + group, None] ** 2
+        )
+        aperture_index, cell_index = np.nonzero(overlaps)
+        apertures.append(aperture_index + start)
+        cell_indices.append(cell_index)
+    return (
+        np.concatenate(apertures).astype(np.int64),
+        np.concatenate(cell_indices).astype(np.int64),
+    )
+
+
+def block_boundaries(counts: npt.NDArray, block_size: int) -> list[tuple[int, int]]:
+    """Split consecutive items into blocks of bounded total count.
+
+    Args:
+        counts (npt.NDArray): Count of each item
+        block_size (int):
+            Maximum total count of a block, unless a single item exceeds it
+
+    Returns
+    -------
+        list[tuple[int, int]]: Half-open index ranges of each block
+    """
+    boundaries = []
+    block_start, total = 0, 0
+    for position, count in enumerate(counts):
+        if total and total + count > block_size:
+            boundaries.append((block_start, position))
+            block_start, total = position, 0
+        total += count
+    if block_start < len(counts):
+        boundaries.append((block_start, len(counts)))
+    return boundaries
+
+
+def expand_pairs(
+    starts: npt.NDArray,
+    counts: npt.NDArray,
+) -> tuple[npt.NDArray, npt.NDArray]:
+    """Expand pairs into one entry per particle of the paired cell.
+
+    Args:
+        starts (npt.NDArray): Index of the first particle of each pair's cell
+        counts (npt.NDArray): Number of particles in each pair's cell
+
+    Returns
+    -------
+        tuple[npt.NDArray, npt.NDArray]:
+            Pair index and particle index of each entry
+    """
+    pair = np.repeat(np.arange(counts.size), counts)
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return pair, starts[pair] + within
+
+
+def assign_particles(
+    filename: str,
+    cells: CellMetadata,
+    centres: npt.NDArray,
+    radii: npt.NDArray,
+    block_size: int,
+) -> tuple[npt.NDArray, npt.NDArray, dict]:
+    """Find the particles inside each aperture.
+
+    Args:
+        filename (str): Path to HDF5 file
+        cells (CellMetadata): Cell layout of the snapshot
+        centres (npt.NDArray): Aperture centres with shape (N, 3)
+        radii (npt.NDArray): Aperture radii with shape (N,)
+        block_size (int): Maximum number of particles read or tested at once
+
+    Returns
+    -------
+        tuple[npt.NDArray, npt.NDArray, dict]:
+            Aperture index and row of each selected particle, sorted by aperture
+            and then row, and statistics on the cells and rows read.
+    """
+    pair_apertures, pair_cells = candidate_pairs(cells, centres, radii)
+
+    # Order the needed cells by their position in the file, so each block of
+    # cells is read with as few ranges as possible
+    needed = np.unique(pair_cells)
+    needed = needed[cells.counts[needed] > 0]
+    needed = needed[np.argsort(cells.offsets[needed], kind="stable")]
+    rank = np.full(cells.counts.size, -1, dtype=np.int64)
+    rank[needed] = np.arange(needed.size)
+
+    pair_rank = rank[pair_cells]
+    order = np.argsort(pair_rank, kind="stable")
+    order = order[pair_rank[order] >= 0]
+    pair_apertures, pair_cells, pair_rank = (
+        pair_apertures[order],
+        pair_cells[order],
+        pair_rank[order],
+    )
+
+    field = f"{cells.part_type}/Coordinates"
+    selected = [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))]
+    rows_read = 0
+    for first, last in block_boundaries(cells.counts[needed], block_size):
+        block = needed[first:last]
+        block_counts = cells.counts[block]
+        block_rows = int(block_counts.sum())
+        ranges = np.stack(
+            (cells.offsets[block], cells.offsets[block] + block_counts),
+            1,
+        )
+        coordinates = SWIFTProcessor.get_array_ranges(
+            filename,
+            field,
+            ranges,
+            block_rows,
+        )
+        coordinates = coordinates * cells.scale
+        rows_read += block_rows
+
+        # Position of the first particle of each cell within the block
+        buffer_starts = np.zeros(cells.counts.size, dtype=np.int64)
+        buffer_starts[block] = np.cumsum(block_counts) - block_counts
+
+        in_block = slice(*np.searchsorted(pair_rank, [first, last], side="left"))
+        apertures, paired_cells = pair_apertures[in_block], pair_cells[in_block]
+        for pair_first, pair_last in block_boundaries(
+            cells.counts[paired_cells],
+            block_size,
+        ):
+            chunk = slice(pair_first, pair_last)
+            pair, particle = expand_pairs(
+                buffer_starts[paired_cells[chunk]],
+                cells.counts[paired_cells[chunk]],
+            )
+            aperture = apertures[chunk][pair]
+            offsets = periodic_offsets(
+                coordinates[particle],
+                centres[aperture],
+                cells.boxsize,
+            )
+            inside = np.einsum("ij,ij->i", offsets, offsets) <= radii[aperture] ** 2
+            cell = paired_cells[chunk][pair[inside]]
+            rows = cells.offsets[cell] + particle[inside] - buffer_starts[cell]
+            selected.append((aperture[inside], rows))
+
+    apertures = np.concatenate([aperture for aperture, _ in selected])
+    rows = np.concatenate([row for _, row in selected])
+    order = np.lexsort((rows, apertures))
+    return (
+        apertures[order],
+        rows[order],
+        {
+            "units": cells.units,
+            "cells_total": int(cells.counts.size),
+            "cells_read": int(needed.size),
+            "rows_read": rows_read,
+            "rows_matched": int(rows.size),
+        },
+    )
+
+
+def validate_batch(
+    filename: str,
+    part_type: str,
+    centres: list[list[float]],
+    radii: list[float],
+    fields: list[str],
+) -> None:
+    """Check a batch of apertures and the requested fields before streaming.
+
+    Args:
+        filename (str): Path to HDF5 file
+        part_type (str): Particle type, e.g. "PartType0"
+        centres (list[list[float]]): Aperture centres
+        radii (list[float]): Aperture radii
+        fields (list[str]): Fields to return for each aperture
+
+    Raises
+    ------
+        ApertureError: For invalid apertures or fields.
+    """
+    dimensions = 3
+    if not centres or any(len(centre) != dimensions for centre in centres):
+        message = "At least one centre is required, each with three coordinates."
+        raise ApertureError(message)
+    if len(radii) not in (1, len(centres)) or min(radii) < 0:
+        message = "Give one non-negative radius, or one for each centre."
+        raise ApertureError(message)
+    if len(centres) > get_settings().batch_aperture_max:
+        message = f"At most {get_settings().batch_aperture_max} apertures are allowed."
+        raise ApertureError(message)
+
+    with h5py.File(filename, "r") as handle:
+        for field in fields:
+            if not field.strip("/").startswith(f"{part_type}/"):
+                message = f"Field {field} is not a {part_type} field."
+                raise ApertureError(message)
+            try:
+                derived = SWIFTProcessor.is_derived_field(field)
+            except SWIFTProcessorError as error:
+                raise ApertureError(str(error)) from error
+            if not derived and field not in handle:
+                message = f"Field {field} not found in {filename}."
+                raise ApertureError(message)
+
+
+def read_group_fields(
+    filename: str,
+    fields: list[str],
+    rows: npt.NDArray,
+) -> dict[str, tuple[npt.NDArray, str | None]]:
+    """Read fields once for the union of rows selected by a group of apertures.
+
+    Args:
+        filename (str): Path to HDF5 file
+        fields (list[str]): Raw or derived field paths
+        rows (npt.NDArray): Sorted, unique rows to read
+
+    Returns
+    -------
+        dict[str, tuple[npt.NDArray, str | None]]:
+            Values of each field for the rows, and units for derived fields
+    """
+    ranges = (
+        accelerated.ranges_from_array(rows)
+        if rows.size
+        else np.empty((0, 2), dtype=np.int64)
+    )
+    values = {}
+    for field in fields:
+        if SWIFTProcessor.is_derived_field(field):
+            values[field] = SWIFTProcessor.get_array_derived(filename, field, ranges)
+        else:
+            array = SWIFTProcessor.get_array_ranges(filename, field, ranges, rows.size)
+            values[field] = (array, None)
+    return values
+
+
+def dump_line(payload: dict) -> bytes:
+    """Serialise one line of newline-delimited JSON.
+
+    Args:
+        payload (dict): Object to serialise
+
+    Returns
+    -------
+        bytes: JSON followed by a newline
+    """
+    return orjson.dumps(
+        payload,
+        default=encode_metadata_value,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE,
+    )
+
+
+def stream_cutouts(
+    filename: str,
+    part_type: str,
+    centres: list[list[float]],
+    radii: list[float],
+    fields: list[str],
+) -> Iterator[bytes]:
+    """Stream the particles within each of a batch of spherical apertures.
+
+    The first line summarises the batch. Each following line holds the index of an
+    aperture, the half-open ranges of its rows and the requested fields for them.
+    Fields are read once for each group of apertures, covering the union of the
+    rows they select.
+
+    Args:
+        filename (str): Path to HDF5 file
+        part_type (str): Particle type, e.g. "PartType0"
+        centres (list[list[float]]): Aperture centres, in the coordinate units
+        radii (list[float]): Aperture radii, or a single radius for every aperture
+        fields (list[str]): Fields to return for each aperture
+
+    Yields
+    ------
+        bytes: Lines of newline-delimited JSON
+    """
+    settings = get_settings()
+    cells = CellMetadata(filename, part_type)
+    centre_array = np.asarray(centres, dtype=np.float64)
+    radius_array = np.broadcast_to(
+        np.asarray(radii, dtype=np.float64),
+        centre_array.shape[:1],
+    )
+
+    apertures, rows, stats = assign_particles(
+        filename,
+        cells,
+        centre_array,
+        radius_array,
+        settings.derived_field_block_size,
+    )
+    yield dump_line({"apertures": len(centres), "stats": stats})
+
+    bounds = np.searchsorted(apertures, np.arange(len(centres) + 1))
+    group_size = settings.batch_aperture_group_size
+    for group_start in range(0, len(centres), group_size):
+        group_end = min(group_start + group_size, len(centres))
+        group_rows = np.unique(rows[bounds[group_start] : bounds[group_end]])
+        values = read_group_fields(filename, fields, group_rows)
+
+        for index in range(group_start, group_end):
+            aperture_rows = rows[bounds[index] : bounds[index + 1]]
+            positions = np.searchsorted(group_rows, aperture_rows)
+            line = {
+                "index": index,
+                "count": int(aperture_rows.size),
+                "ranges": accelerated.ranges_from_array(aperture_rows)
+                if aperture_rows.size
+                else np.empty((0, 2), dtype=np.int64),
+                "fields": {},
+            }
+            for field, (array, units) in values.items():
+                selected = array[positions]
+                line["fields"][field] = {"array": selected, "dtype": selected.dtype.str}
+                if units is not None:
+                    line["fields"][field]["units"] = units
+            yield dump_line(line)
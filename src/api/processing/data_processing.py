@@ -6,25 +6,23 @@ version 3 from the SWIFTsimIO library https://github.com/SWIFTSIM/swiftsimio/.
 
 """
 import json
+from contextlib import nullcontext
 
-import h5py
 import numpy as np
 import numpy.typing as npt
 from loguru import logger
-from swiftsimio.accelerated import read_ranges_from_file
 
+from api.lazy import lazy_import
+from api.processing.catalogue import SnapshotCatalogue
+from api.processing.derived_fields import (
+    DerivedFieldError,
+    compute_derived_field,
+    get_derived_field,
+)
+from api.processing.distributed import load_distributed_snapshot
 
-def get_dataset_alias_map():
-    """Retrieve a dictionary mapping of aliases to file paths.
-
-    Returns
-    -------
-        _type_: _description_
-    """
-    return {
-        "downloaded_file": "/path/to/downloaded_file",
-        "sample_file": "/path/to/sample_file",
-    }
+accelerated = lazy_import("swiftsimio.accelerated")
+h5py = lazy_import("h5py")
 
 
 class SWIFTProcessorError(Exception):
@@ -37,14 +35,29 @@ class SWIFTProcessor:
     Performs processing steps to return numpy arrays from HDF5 files as reuqested by users.
     """
 
-    def __init__(self, data_alias_map: dict):
+    def __init__(self, data_alias_map: dict | SnapshotCatalogue):
         """Class constructor.
 
         Args:
-            data_alias_map (dict): Dictionary mapping dataset aliases to file paths.
+            data_alias_map (dict | SnapshotCatalogue):
+                Dictionary or snapshot catalogue mapping dataset aliases to file paths.
         """
         self.data_alias_map = data_alias_map
 
+    def is_indexed(self, filename: str) -> bool:
+        """Check whether a file is known to exist from the snapshot catalogue.
+
+        Args:
+            filename (str): Path to a file
+
+        Returns
+        -------
+            bool: True if the file is present in the snapshot catalogue
+        """
+        if isinstance(self.data_alias_map, SnapshotCatalogue):
+            return self.data_alias_map.contains_path(filename)
+        return False
+
     def retrieve_filename(self, dataset_alias: str | None) -> str | None:
         """Retrieve a full path to a file from an alias.
 
@@ -109,6 +122,65 @@ class SWIFTProcessor:
             "dtype": data_type,
         }
 
+    @staticmethod
+    def is_derived_field(field: str) -> bool:
+        """Check whether a field path names a derived field.
+
+        Args:
+            field (str): Field path
+
+        Raises
+        ------
+            SWIFTProcessorError: If the derived field is not defined for the particle type.
+
+        Returns
+        -------
+            bool: True if the field is computed from the derived field registry
+        """
+        try:
+            return get_derived_field(field) is not None
+        except DerivedFieldError as error:
+            raise SWIFTProcessorError(str(error)) from error
+
+    @staticmethod
+    def get_array_derived(
+        filename: str,
+        field: str,
+        ranges: npt.NDArray | None = None,
+        columns: None | np.lib.index_tricks.IndexExpression = None,
+        centre: list[float] | None = None,
+    ) -> tuple[npt.NDArray, str]:
+        """Compute a derived field, optionally masked.
+
+        Args:
+            filename (str): Path to HDF5 file
+            field (str): Derived field path, e.g. "PartType0/temperature"
+            ranges (npt.NDArray | None, optional):
+                Half-open row ranges to compute the field for. Defaults to None,
+                in which case the field is computed for every particle.
+            columns (None | np.lib.index_tricks.IndexExpression, optional):
+                Selector for columns in the case of multidim arrays. Defaults to None.
+            centre (list[float] | None, optional):
+                Point to periodically recentre coordinates about, in the comoving
+                units of the coordinates. Defaults to None.
+
+        Raises
+        ------
+            SWIFTProcessorError: If the field or one of its inputs is unavailable.
+
+        Returns
+        -------
+            tuple[npt.NDArray, str]: Array with requested elements and its units
+        """
+        try:
+            array, units = compute_derived_field(filename, field, ranges, centre)
+        except DerivedFieldError as error:
+            raise SWIFTProcessorError(str(error)) from error
+
+        if columns is not None and array.ndim > 1:
+            array = array[:, columns]
+        return array, units
+
     @staticmethod
     def get_array_masked(
         filename: str,
@@ -120,6 +192,9 @@ class SWIFTProcessor:
     ) -> npt.NDArray | None:
         """Retrieve a masked array.
 
+        If the file is the master file of a distributed snapshot, the mask is
+        applied to the snapshot as a whole and the sub-files are read concurrently.
+
         Args:
             filename (str): Path to HDF5 file
             field (str): Field path to retrieve
@@ -141,12 +216,53 @@ class SWIFTProcessor:
             data_type=mask_data_type,
         )
 
+        return SWIFTProcessor.get_array_ranges(
+            filename,
+            field,
+            mask,
+            mask_size,
+            columns,
+        )
+
+    @staticmethod
+    def get_array_ranges(
+        filename: str,
+        field: str,
+        ranges: npt.NDArray,
+        mask_size: int,
+        columns: None | np.lib.index_tricks.IndexExpression = None,
+        handle: "h5py.File | None" = None,
+    ) -> npt.NDArray:
+        """Retrieve the rows of a field within a set of ranges.
+
+        Args:
+            filename (str): Path to HDF5 file
+            field (str): Field path to retrieve
+            ranges (npt.NDArray): Half-open row ranges with shape (N, 2)
+            mask_size (int): Total number of rows in the ranges
+            columns (None | np.lib.index_tricks.IndexExpression, optional):
+                Selector for columns in the case of multidim arrays. Defaults to None.
+            handle (h5py.File | None, optional):
+                The file, already open for reading. Defaults to None, in which case
+                it is opened for the call.
+
+        Raises
+        ------
+            SWIFTProcessorError: If the field is not found in the file.
+
+        Returns
+        -------
+            npt.NDArray: Array with requested elements.
+        """
         use_columns = columns is not None
 
         if not use_columns:
             columns = np.s_[:]
 
-        with h5py.File(filename, "r") as handle:
+        distributed = load_distributed_snapshot(filename)
+
+        opened = nullcontext(handle) if handle is not None else h5py.File(filename, "r")
+        with opened as handle:
             try:
                 first_value = handle[field][0]
                 output_type = first_value.dtype
@@ -156,9 +272,19 @@ class SWIFTProcessor:
                     output_shape = (mask_size, output_size)
                 else:
                     output_shape = mask_size  # type: ignore
-                return read_ranges_from_file(
+                if not len(ranges):
+                    return np.empty(output_shape, dtype=output_type)
+                if distributed is not None:
+                    return distributed.read_ranges(
+                        field,
+                        ranges,
+                        output_shape=output_shape,
+                        output_type=output_type,
+                        columns=columns,
+                    )
+                return accelerated.read_ranges_from_file(
                     handle[field],
-                    mask,
+                    ranges,
                     output_shape=output_shape,
                     output_type=output_type,
                     columns=columns,
@@ -175,6 +301,9 @@ class SWIFTProcessor:
     ) -> np.array:
         """Retrieve an unmasked array.
 
+        If the file is the master file of a distributed snapshot, the sub-files are
+        read concurrently and concatenated.
+
         Args:
             filename (str): Path to HDF5 file
             field (str): Field to retrieve
@@ -189,6 +318,15 @@ class SWIFTProcessor:
 
         if not use_columns:
             columns = np.s_[:]
+
+        distributed = load_distributed_snapshot(filename)
+        if distributed is not None:
+            try:
+                return distributed.read_all(field, columns)
+            except KeyError:
+                logger.error(f"Could not read {field}")
+                return None
+
         with h5py.File(filename, "r") as handle:
             try:
                 result_array = (
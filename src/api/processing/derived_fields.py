@@ -0,0 +1,408 @@
+"""Compute derived particle fields on the server.
+
+Derived fields combine one or more raw snapshot fields into a single quantity, so
+that users do not need to download every input field to compute it themselves.
+Each derived field is a vectorised function of `unyt` arrays built from the raw
+fields and the units recorded in the snapshot metadata, converted from comoving
+to physical values with the a-scale exponent of each dataset. Rows are read and
+evaluated in blocks, so memory use is bounded by the block size rather than by the
+number of particles requested.
+
+Derived fields are requested as `PartType<N>/<name>`, with lower case names to
+distinguish them from the raw fields stored in the snapshot.
+"""
+import re
+from collections.abc import Callable, Iterator
+
+import numpy as np
+import numpy.typing as npt
+
+from api.config import get_settings
+from api.lazy import lazy_import
+from api.processing.distributed import load_distributed_snapshot
+from api.processing.metadata import load_swift_metadata
+
+accelerated = lazy_import("swiftsimio.accelerated")
+h5py = lazy_import("h5py")
+unyt = lazy_import("unyt")
+physical_constants = lazy_import("unyt.physical_constants")
+
+DERIVED_FIELD_PATTERN = re.compile(r"^/?(?P<part_type>PartType\d+)/(?P<name>[a-z_]+)$")
+
+# Mean molecular weight of neutral primordial gas with hydrogen mass fraction 0.76
+NEUTRAL_MEAN_MOLECULAR_WEIGHT = 4.0 / (1.0 + 3.0 * 0.76)
+
+
+class DerivedFieldError(Exception):
+    """Custom exception for derived field errors."""
+
+
+class DerivedField:
+    """A particle field computed from raw snapshot fields."""
+
+    def __init__(
+        self,
+        name: str,
+        inputs: tuple[tuple[str, ...], ...],
+        function: "Callable[..., unyt.unyt_array]",
+        units: str | None = None,
+        part_types: tuple[str, ...] | None = None,
+        description: str = "",
+    ):
+        """Class constructor.
+
+        Args:
+            name (str): Name of the derived field
+            inputs (tuple[tuple[str, ...], ...]):
+                Raw fields passed to the function, in order. Each input lists
+                alternative dataset names, the first present in the snapshot is used.
+            function (Callable[..., unyt.unyt_array]):
+                Vectorised function of the input arrays, which also receives a
+                dictionary of snapshot properties and request parameters
+            units (str | None, optional):
+                Units of the output. Defaults to None, in which case the units
+                resulting from the function are used.
+            part_types (tuple[str, ...] | None, optional):
+                Particle types the field is defined for. Defaults to None,
+                meaning every particle type.
+            description (str, optional): Description of the field. Defaults to "".
+        """
+        self.name = name
+        self.inputs = inputs
+        self.function = function
+        self.units = units
+        self.part_types = part_types
+        self.description = description
+
+
+def recentre(
+    coordinates: "unyt.unyt_array",
+    centre: "unyt.unyt_array",
+    boxsize: "unyt.unyt_array",
+) -> "unyt.unyt_array":
+    """Shift coordinates to be relative to a point in a periodic box.
+
+    Args:
+        coordinates (unyt.unyt_array): Particle coordinates with shape (N, 3)
+        centre (unyt.unyt_array): Point to recentre about
+        boxsize (unyt.unyt_array): Side lengths of the periodic box
+
+    Returns
+    -------
+        unyt.unyt_array: Coordinates relative to the centre, in [-boxsize / 2, boxsize / 2)
+    """
+    boxsize = boxsize.to(coordinates.units)
+    half_box = 0.5 * boxsize
+    return (coordinates - centre.to(coordinates.units) + half_box) % boxsize - half_box
+
+
+def _norm(vectors: "unyt.unyt_array") -> "unyt.unyt_array":
+    return np.sqrt((vectors**2).sum(axis=1))
+
+
+def _relative_coordinates(
+    coordinates: "unyt.unyt_array",
+    context: dict,
+) -> "unyt.unyt_array":
+    if context["centre"] is None:
+        return coordinates
+    return recentre(coordinates, context["centre"], context["boxsize"])
+
+
+def _radius(coordinates: "unyt.unyt_array", context: dict) -> "unyt.unyt_array":
+    return _norm(_relative_coordinates(coordinates, context))
+
+
+def _speed(velocities: "unyt.unyt_array", _: dict) -> "unyt.unyt_array":
+    return _norm(velocities)
+
+
+def _specific_kinetic_energy(
+    velocities: "unyt.unyt_array",
+    _: dict,
+) -> "unyt.unyt_array":
+    return 0.5 * (velocities**2).sum(axis=1)
+
+
+def _specific_total_energy(
+    velocities: "unyt.unyt_array",
+    internal_energies: "unyt.unyt_array",
+    context: dict,
+) -> "unyt.unyt_array":
+    return _specific_kinetic_energy(velocities, context) + internal_energies
+
+
+def _temperature(
+    internal_energies: "unyt.unyt_array",
+    context: dict,
+) -> "unyt.unyt_array":
+    return (
+        (context["gas_gamma"] - 1.0)
+        * NEUTRAL_MEAN_MOLECULAR_WEIGHT
+        * physical_constants.mp
+        * internal_energies
+        / physical_constants.kb
+    )
+
+
+COORDINATES = ("Coordinates",)
+VELOCITIES = ("Velocities",)
+INTERNAL_ENERGIES = ("InternalEnergies", "InternalEnergy")
+
+DERIVED_FIELDS: dict[str, DerivedField] = {
+    field.name: field
+    for field in (
+        DerivedField(
+            "relative_coordinates",
+            (COORDINATES,),
+            _relative_coordinates,
+            description="Coordinates relative to the centre, wrapped periodically.",
+        ),
+        DerivedField(
+            "radius",
+            (COORDINATES,),
+            _radius,
+            description="Distance from the centre, wrapped periodically.",
+        ),
+        DerivedField(
+            "speed",
+            (VELOCITIES,),
+            _speed,
+            description="Magnitude of the velocity.",
+        ),
+        DerivedField(
+            "specific_kinetic_energy",
+            (VELOCITIES,),
+            _specific_kinetic_energy,
+            description="Kinetic energy per unit mass.",
+        ),
+        DerivedField(
+            "specific_total_energy",
+            (VELOCITIES, INTERNAL_ENERGIES),
+            _specific_total_energy,
+            part_types=("PartType0",),
+            description="Kinetic plus internal energy per unit mass.",
+        ),
+        DerivedField(
+            "temperature",
+            (INTERNAL_ENERGIES,),
+            _temperature,
+            units="K",
+            part_types=("PartType0",),
+            description="Temperature assuming neutral primordial gas.",
+        ),
+    )
+}
+
+
+def get_derived_field(field: str) -> tuple[str, DerivedField] | None:
+    """Look up a derived field from a field path.
+
+    Args:
+        field (str): Field path, e.g. "PartType0/temperature"
+
+    Raises
+    ------
+        DerivedFieldError: If the field is not defined for the particle type.
+
+    Returns
+    -------
+        tuple[str, DerivedField] | None:
+            Particle type and derived field, or None if the path does not name a
+            derived field.
+    """
+    match = DERIVED_FIELD_PATTERN.match(field)
+    if match is None or match["name"] not in DERIVED_FIELDS:
+        return None
+    derived_field = DERIVED_FIELDS[match["name"]]
+    if (
+        derived_field.part_types is not None
+        and match["part_type"] not in derived_field.part_types
+    ):
+        message = (
+            f"Derived field {field} is only defined for {derived_field.part_types}."
+        )
+        raise DerivedFieldError(message)
+    return match["part_type"], derived_field
+
+
+def iterate_blocks(
+    ranges: npt.NDArray,
+    block_size: int,
+) -> Iterator[tuple[npt.NDArray, int, int]]:
+    """Group half-open row ranges into blocks of at most `block_size` rows.
+
+    Ranges longer than the block size are split.
+
+    Args:
+        ranges (npt.NDArray): Half-open row ranges with shape (N, 2)
+        block_size (int): Maximum number of rows in a block
+
+    Yields
+    ------
+        tuple[npt.NDArray, int, int]:
+            Ranges in the block and the start and end of the block in the output
+    """
+    pieces = []
+    for start, end in np.asarray(ranges, dtype=np.int64).reshape(-1, 2):
+        pieces.extend(
+            (piece_start, min(piece_start + block_size, end))
+            for piece_start in range(start, end, block_size)
+        )
+
+    output_start = 0
+    block: list[tuple[int, int]] = []
+    block_rows = 0
+    for start, end in pieces:
+        if block and block_rows + end - start > block_size:
+            yield np.array(block), output_start, output_start + block_rows
+            output_start += block_rows
+            block, block_rows = [], 0
+        block.append((start, end))
+        block_rows += end - start
+    if block:
+        yield np.array(block), output_start, output_start + block_rows
+
+
+def scale_factor_exponent(dataset: "h5py.Dataset") -> float:
+    """Read the power of the scale factor converting a dataset to physical values.
+
+    Args:
+        dataset (h5py.Dataset): Raw snapshot dataset
+
+    Returns
+    -------
+        float: The "a-scale exponent" attribute, or 0 if it is not recorded
+    """
+    exponent = dataset.attrs.get("a-scale exponent")
+    return 0.0 if exponent is None else float(np.ravel(exponent)[0])
+
+
+def _read_block(
+    filename: str,
+    handle: "h5py.File",
+    path: str,
+    ranges: npt.NDArray,
+    rows: int,
+) -> npt.NDArray:
+    dataset = handle[path]
+    output_shape = (rows, *dataset.shape[1:])
+    distributed = load_distributed_snapshot(filename)
+    if distributed is not None:
+        return distributed.read_ranges(path, ranges, output_shape, dataset.dtype)
+    return accelerated.read_ranges_from_file(
+        dataset,
+        ranges,
+        output_shape,
+        dataset.dtype,
+    )
+
+
+def compute_derived_field(
+    filename: str,
+    field: str,
+    ranges: npt.NDArray | None = None,
+    centre: list[float] | None = None,
+    block_size: int | None = None,
+) -> tuple[npt.NDArray, str]:
+    """Compute a derived field for the requested rows of a snapshot.
+
+    Args:
+        filename (str): Path to HDF5 file
+        field (str): Derived field path, e.g. "PartType0/temperature"
+        ranges (npt.NDArray | None, optional):
+            Half-open row ranges to compute the field for. Defaults to None,
+            meaning every particle.
+        centre (list[float] | None, optional):
+            Point to recentre coordinates about, in the comoving units of the
+            coordinates. Defaults to None.
+        block_size (int | None, optional):
+            Maximum number of rows read at once. Defaults to None, in which case
+            the configured block size is used.
+
+    Raises
+    ------
+        DerivedFieldError: If the field or one of its inputs is unavailable.
+
+    Returns
+    -------
+        tuple[npt.NDArray, str]: Values of the derived field and their units
+    """
+    lookup = get_derived_field(field)
+    if lookup is None:
+        message = f"{field} is not a derived field."
+        raise DerivedFieldError(message)
+    part_type, derived_field = lookup
+
+    if block_size is None:
+        block_size = get_settings().derived_field_block_size
+
+    metadata = load_swift_metadata(filename)
+    field_units = {}
+    for name in metadata.present_particle_names:
+        properties = getattr(metadata, f"{name}_properties")
+        field_units.update(
+            zip(properties.field_paths, properties.field_units, strict=True),
+        )
+
+    input_paths = []
+    for alternatives in derived_field.inputs:
+        paths = [f"{part_type}/{name}" for name in alternatives]
+        available = [path for path in paths if path in field_units]
+        if not available:
+            message = f"None of {paths} required for {field} found in {filename}."
+            raise DerivedFieldError(message)
+        input_paths.append(available[0])
+
+    output = None
+    units = None
+    with h5py.File(filename, "r") as handle:
+        scale_factors = {
+            path: metadata.a ** scale_factor_exponent(handle[path])
+            for path in input_paths
+        }
+        coordinates_path = f"{part_type}/Coordinates"
+        coordinate_units = field_units.get(coordinates_path)
+        # Centres and box sizes are comoving, like the coordinates
+        coordinate_scale = (
+            metadata.a ** scale_factor_exponent(handle[coordinates_path])
+            if coordinates_path in handle
+            else 1.0
+        )
+        context = {
+            "gas_gamma": metadata.gas_gamma,
+            "boxsize": metadata.boxsize * coordinate_scale,
+            "centre": None
+            if centre is None
+            else unyt.unyt_array(
+                centre,
+                getattr(coordinate_units, "units", "dimensionless"),
+            )
+            * coordinate_scale,
+        }
+
+        if ranges is None:
+            ranges = np.array([[0, handle[input_paths[0]].shape[0]]])
+        total_rows = int(np.diff(np.asarray(ranges).reshape(-1, 2), axis=1).sum())
+
+        for block_ranges, start, end in iterate_blocks(ranges, block_size):
+            inputs = []
+            for path in input_paths:
+                values = _read_block(filename, handle, path, block_ranges, end - start)
+                unit = field_units[path]
+                if unit is None:
+                    unit = unyt.unyt_quantity(1.0, "dimensionless")
+                inputs.append(values * unit * scale_factors[path])
+
+            result = derived_field.function(*inputs, context)
+            if derived_field.units is not None:
+                result = result.to(derived_field.units)
+            if output is None:
+                units = str(result.units)
+                output = np.empty((total_rows, *result.shape[1:]), result.dtype)
+            output[start:end] = result.to(units).value
+
+    if output is None:
+        output = np.empty(0)
+        units = derived_field.units or "dimensionless"
+    return output, units
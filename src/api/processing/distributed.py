@@ -0,0 +1,268 @@
+"""Read distributed SWIFT snapshots as a single logical snapshot.
+
+Large SWIFT runs write each snapshot as a set of sub-files, `snap_0042.0.hdf5` to
+`snap_0042.N.hdf5`, alongside a virtual master file `snap_0042.hdf5` whose datasets
+reference the sub-files. Row indices in masks created from the master file are
+global, so they are translated here into ranges within each sub-file using the
+particle counts recorded in each sub-file's header. The sub-files are then read
+concurrently and assembled into a single output array.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+from itertools import pairwise
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+from api.config import get_settings
+from api.lazy import lazy_import
+from api.processing.result_cache import stamped_lru_cache
+
+accelerated = lazy_import("swiftsimio.accelerated")
+h5py = lazy_import("h5py")
+
+PART_TYPE_PATTERN = re.compile(r"^/?PartType(?P<index>\d+)/")
+
+
+def distributed_file_paths(filename: str | Path) -> list[Path] | None:
+    """Find the sub-files of a distributed snapshot from its master file.
+
+    Args:
+        filename (str | Path): Path to the virtual master file of a snapshot
+
+    Returns
+    -------
+        list[Path] | None:
+            Paths to each sub-file in order, or None if the file is not the master
+            file of a distributed snapshot or any sub-file is missing.
+    """
+    filename = Path(filename)
+    with h5py.File(filename, "r") as handle:
+        header = handle["Header"].attrs if "Header" in handle else {}
+        num_files = int(np.ravel(header.get("NumFilesPerSnapshot", 1))[0])
+
+    if num_files <= 1:
+        return None
+
+    files = [
+        filename.with_name(f"{filename.stem}.{index}{filename.suffix}")
+        for index in range(num_files)
+    ]
+    if not all(path.is_file() for path in files):
+        return None
+    return files
+
+
+def part_type_index(field: str) -> int:
+    """Retrieve the particle type index from a field path.
+
+    Args:
+        field (str): Field path, e.g. "PartType0/Coordinates"
+
+    Raises
+    ------
+        KeyError: If the field is not within a particle type group.
+
+    Returns
+    -------
+        int: Particle type index
+    """
+    match = PART_TYPE_PATTERN.match(field)
+    if match is None:
+        message = f"Field {field} is not a particle dataset."
+        raise KeyError(message)
+    return int(match["index"])
+
+
+def split_ranges(
+    ranges: npt.NDArray,
+    offsets: npt.NDArray,
+) -> list[tuple[npt.NDArray, npt.NDArray]]:
+    """Translate global row ranges into ranges within each sub-file.
+
+    Args:
+        ranges (npt.NDArray): Half-open global row ranges with shape (N, 2)
+        offsets (npt.NDArray):
+            Global row of the first particle in each sub-file, followed by the total
+            number of particles
+
+    Returns
+    -------
+        list[tuple[npt.NDArray, npt.NDArray]]:
+            For each sub-file, the half-open ranges within that file and the position
+            in the output of the first row of each range.
+    """
+    ranges = np.asarray(ranges, dtype=np.int64).reshape(-1, 2)
+    lengths = ranges[:, 1] - ranges[:, 0]
+    output_starts = np.cumsum(lengths) - lengths
+
+    pieces = []
+    for file_start, file_end in pairwise(offsets):
+        starts = np.maximum(ranges[:, 0], file_start)
+        ends = np.minimum(ranges[:, 1], file_end)
+        selected = starts < ends
+        pieces.append(
+            (
+                np.stack((starts[selected], ends[selected]), axis=1) - file_start,
+                output_starts[selected] + starts[selected] - ranges[selected, 0],
+            ),
+        )
+    return pieces
+
+
+class DistributedSnapshot:
+    """A distributed snapshot read as one logical snapshot."""
+
+    def __init__(self, files: list[Path], max_workers: int = 4):
+        """Class constructor.
+
+        Args:
+            files (list[Path]): Paths to each sub-file in order
+            max_workers (int, optional):
+                Maximum number of sub-files read concurrently. Defaults to 4.
+        """
+        self.files = files
+        self.max_workers = max_workers
+
+        counts = []
+        for filename in files:
+            with h5py.File(filename, "r") as handle:
+                counts.append(
+                    np.asarray(handle["Header"].attrs["NumPart_ThisFile"], np.int64),
+                )
+        self.counts = np.stack(counts)
+        self.offsets = np.concatenate(
+            (np.zeros((1, self.counts.shape[1]), np.int64), np.cumsum(self.counts, 0)),
+        )
+
+    def _map(self, function, *iterables) -> list:
+        workers = max(min(self.max_workers, len(self.files)), 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(function, *iterables))
+
+    def read_ranges(
+        self,
+        field: str,
+        ranges: npt.NDArray,
+        output_shape: int | tuple[int, int],
+        output_type: np.dtype,
+        columns: np.lib.index_tricks.IndexExpression = np.s_[:],
+    ) -> npt.NDArray:
+        """Read global row ranges of a field from the sub-files.
+
+        Args:
+            field (str): Field path to read
+            ranges (npt.NDArray): Half-open global row ranges with shape (N, 2)
+            output_shape (int | tuple[int, int]): Shape of the output array
+            output_type (np.dtype): Data type of the output array
+            columns (np.lib.index_tricks.IndexExpression, optional):
+                Selector for columns in the case of multidim arrays.
+                Defaults to np.s_[:].
+
+        Returns
+        -------
+            npt.NDArray: Array with requested elements, in the order of the ranges
+        """
+        pieces = split_ranges(ranges, self.offsets[:, part_type_index(field)])
+        output = np.empty(output_shape, dtype=output_type)
+
+        def read_file(filename: Path, file_ranges: npt.NDArray, positions) -> None:
+            if not len(file_ranges):
+                return
+            lengths = file_ranges[:, 1] - file_ranges[:, 0]
+            with h5py.File(filename, "r") as handle:
+                values = accelerated.read_ranges_from_file(
+                    handle[field],
+                    file_ranges,
+                    output_shape=(lengths.sum(), *np.shape(output)[1:]),
+                    output_type=output_type,
+                    columns=columns,
+                )
+            within = np.arange(lengths.sum()) - np.repeat(
+                np.cumsum(lengths) - lengths,
+                lengths,
+            )
+            output[np.repeat(positions, lengths) + within] = values
+
+        self._map(
+            read_file,
+            self.files,
+            *zip(*pieces, strict=True),
+        )
+        return output
+
+    def read_all(
+        self,
+        field: str,
+        columns: np.lib.index_tricks.IndexExpression = np.s_[:],
+    ) -> npt.NDArray:
+        """Read every row of a field from the sub-files.
+
+        Args:
+            field (str): Field path to read
+            columns (np.lib.index_tricks.IndexExpression, optional):
+                Selector for columns in the case of multidim arrays.
+                Defaults to np.s_[:].
+
+        Raises
+        ------
+            KeyError: If no sub-file holds the field.
+
+        Returns
+        -------
+            npt.NDArray: Array with the field values from every sub-file, in order
+        """
+        offsets = self.offsets[:, part_type_index(field)]
+
+        # Sub-files without particles of a type may not hold its group at all
+        first = None
+        for filename in self.files:
+            with h5py.File(filename, "r") as handle:
+                if field not in handle:
+                    continue
+                dataset = handle[field]
+                first = (
+                    np.empty((0, *dataset.shape[1:]), dataset.dtype)[:, columns]
+                    if dataset.ndim > 1
+                    else np.empty(0, dataset.dtype)
+                )
+                break
+        if first is None:
+            message = f"Field {field} not found in any sub-file."
+            raise KeyError(message)
+        output = np.empty((offsets[-1], *first.shape[1:]), dtype=first.dtype)
+
+        def read_file(filename: Path, start: int, end: int) -> None:
+            if start == end:
+                return
+            with h5py.File(filename, "r") as handle:
+                dataset = handle[field]
+                output[start:end] = (
+                    dataset[:, columns] if dataset.ndim > 1 else dataset[:]
+                )
+
+        self._map(read_file, self.files, offsets[:-1], offsets[1:])
+        return output
+
+
+@stamped_lru_cache(maxsize=32)
+def load_distributed_snapshot(filename: str) -> DistributedSnapshot | None:
+    """Load the layout of a distributed snapshot, if the file is one.
+
+    Args:
+        filename (str): Path to a snapshot file
+
+    Returns
+    -------
+        DistributedSnapshot | None:
+            Distributed snapshot with precomputed sub-file offsets, or None if the
+            file is not the master file of a distributed snapshot.
+    """
+    files = distributed_file_paths(filename)
+    if files is None:
+        return None
+    return DistributedSnapshot(
+        files,
+        max_workers=get_settings().distributed_read_workers,
+    )
@@ -0,0 +1,263 @@
+"""Export selected particles to a new SWIFT-compatible snapshot file.
+
+Clients can open the exported file locally with `swiftsimio.load`, instead of
+requesting many separate arrays. Metadata groups such as `Header`, `Units` and
+`Cosmology` are copied from the source snapshot, and the selected rows of each
+field are written block by block into chunked, compressed datasets carrying the
+attributes of the source datasets. The particle counts in the header are updated
+to match the subset. The `Cells` group is not copied, as its offsets describe the
+source snapshot rather than the subset.
+"""
+import re
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+from api.lazy import lazy_import
+from api.processing.apertures import ApertureError, aperture_ranges
+from api.processing.data_processing import SWIFTProcessor, SWIFTProcessorError
+from api.processing.derived_fields import iterate_blocks
+from api.processing.distributed import part_type_index
+from api.processing.mask_store import MaskStoreError, check_ranges
+
+h5py = lazy_import("h5py")
+
+PART_TYPE_GROUP_PATTERN = re.compile(r"^PartType\d+$")
+EXCLUDED_GROUPS = ("Cells",)
+EXPORT_CHUNK_ROWS = 65536
+
+
+class ExportError(Exception):
+    """Custom exception for snapshot export errors."""
+
+
+def group_fields(fields: list[str]) -> dict[str, list[str]]:
+    """Group field paths by particle type.
+
+    Args:
+        fields (list[str]): Raw field paths, e.g. "PartType0/Masses"
+
+    Raises
+    ------
+        ExportError: For fields outside a particle type, or derived fields.
+
+    Returns
+    -------
+        dict[str, list[str]]: Field paths for each particle type group name
+    """
+    if not fields:
+        message = "At least one field is required."
+        raise ExportError(message)
+
+    grouped: dict[str, list[str]] = {}
+    for field in fields:
+        try:
+            index = part_type_index(field)
+            derived = SWIFTProcessor.is_derived_field(field)
+        except (KeyError, SWIFTProcessorError) as error:
+            raise ExportError(str(error)) from error
+        if derived:
+            message = f"Derived field {field} cannot be exported to a snapshot."
+            raise ExportError(message)
+        part_type = f"PartType{index}"
+        path = f"{part_type}/{field.strip('/').split('/', 1)[1]}"
+        if path not in grouped.setdefault(part_type, []):
+            grouped[part_type].append(path)
+    return grouped
+
+
+def region_ranges(
+    filename: str,
+    part_types: list[str],
+    centre: list[float],
+    radius: float | None = None,
+    half_widths: list[float] | None = None,
+) -> dict[str, npt.NDArray]:
+    """Find the rows of each particle type within a spatial region.
+
+    Args:
+        filename (str): Path to HDF5 file
+        part_types (list[str]): Particle type group names
+        centre (list[float]): Centre of the region
+        radius (float | None, optional): Radius of a spherical region. Defaults to None.
+        half_widths (list[float] | None, optional):
+            Half side lengths of a box region. Defaults to None.
+
+    Raises
+    ------
+        ExportError: For invalid regions.
+
+    Returns
+    -------
+        dict[str, npt.NDArray]: Half-open row ranges for each particle type
+    """
+    ranges = {}
+    for part_type in part_types:
+        try:
+            ranges[part_type], _ = aperture_ranges(
+                filename,
+                part_type,
+                centre,
+                radius,
+                half_widths,
+            )
+        except ApertureError as error:
+            raise ExportError(str(error)) from error
+    return ranges
+
+
+def copy_metadata(source: "h5py.File", output: "h5py.File") -> None:
+    """Copy the metadata groups and file attributes of a snapshot.
+
+    Args:
+        source (h5py.File): Source snapshot
+        output (h5py.File): Exported snapshot
+    """
+    output.attrs.update(source.attrs)
+    for name, item in source.items():
+        if PART_TYPE_GROUP_PATTERN.match(name) or name in EXCLUDED_GROUPS:
+            continue
+        source.copy(item, output, name=name)
+
+
+def update_header(output: "h5py.File", counts: dict[str, int]) -> None:
+    """Set the particle counts of the exported snapshot.
+
+    Args:
+        output (h5py.File): Exported snapshot
+        counts (dict[str, int]): Number of exported particles of each type
+    """
+    header = output.require_group("Header").attrs
+    total = np.zeros(np.size(header.get("NumPart_Total", np.zeros(7))), np.int64)
+    for part_type, count in counts.items():
+        total[part_type_index(f"{part_type}/")] = count
+
+    # Following SWIFT, totals hold the low 32 bits and the high word the rest
+    high_word = "NumPart_Total_HighWord" in header
+    values = {
+        "NumPart_ThisFile": total,
+        "NumPart_Total": total & 0xFFFFFFFF if high_word else total,
+    }
+    if high_word:
+        values["NumPart_Total_HighWord"] = total >> 32
+    for name, value in values.items():
+        existing = np.asarray(header.get(name, value))
+        header[name] = value[: existing.size].astype(existing.dtype)
+    header["NumFilesPerSnapshot"] = np.asarray(
+        header.get("NumFilesPerSnapshot", 1),
+    ).dtype.type(1)
+
+
+def write_field(
+    filename: str,
+    source: "h5py.Dataset",
+    output: "h5py.Group",
+    name: str,
+    ranges: npt.NDArray,
+    block_size: int,
+    compression: int,
+) -> None:
+    """Copy the selected rows of a dataset, block by block.
+
+    Args:
+        filename (str): Path to the source HDF5 file
+        source (h5py.Dataset): Source dataset
+        output (h5py.Group): Particle type group of the exported snapshot
+        name (str): Name of the dataset within the group
+        ranges (npt.NDArray): Half-open row ranges to copy
+        block_size (int): Maximum number of rows read at once
+        compression (int): gzip compression level
+    """
+    rows = int(np.diff(ranges, axis=1).sum())
+    shape = (rows, *source.shape[1:])
+    options = {}
+    if rows:
+        options = {
+            "chunks": (min(rows, EXPORT_CHUNK_ROWS), *source.shape[1:]),
+            "compression": "gzip",
+            "compression_opts": compression,
+            "shuffle": True,
+        }
+    dataset = output.create_dataset(name, shape=shape, dtype=source.dtype, **options)
+    dataset.attrs.update(source.attrs)
+
+    field = f"{output.name.strip('/')}/{name}"
+    for block_ranges, start, end in iterate_blocks(ranges, block_size):
+        dataset[start:end] = SWIFTProcessor.get_array_ranges(
+            filename,
+            field,
+            block_ranges,
+            end - start,
+        )
+
+
+def export_snapshot(
+    filename: str,
+    output_path: Path,
+    fields: list[str],
+    ranges: dict[str, npt.NDArray],
+    block_size: int,
+    compression: int = 4,
+) -> dict[str, int]:
+    """Write the selected rows of fields to a new snapshot file.
+
+    Args:
+        filename (str): Path to the source HDF5 file
+        output_path (Path): Path to the exported snapshot
+        fields (list[str]): Raw field paths to export
+        ranges (dict[str, npt.NDArray]):
+            Half-open row ranges to export for each particle type
+        block_size (int): Maximum number of rows read at once
+        compression (int, optional): gzip compression level. Defaults to 4.
+
+    Raises
+    ------
+        ExportError:
+            For unknown fields, particle types without a selection, or ranges
+            outside the fields.
+
+    Returns
+    -------
+        dict[str, int]: Number of exported particles of each type
+    """
+    grouped = group_fields(fields)
+    missing = sorted(set(grouped) - set(ranges))
+    if missing:
+        message = f"No mask or region given for {', '.join(missing)}."
+        raise ExportError(message)
+    selections = {
+        part_type: np.asarray(ranges[part_type], dtype=np.int64).reshape(-1, 2)
+        for part_type in grouped
+    }
+
+    counts = {}
+    with h5py.File(filename, "r") as source, h5py.File(output_path, "w") as output:
+        for part_type, paths in grouped.items():
+            for path in paths:
+                if path not in source:
+                    message = f"Field {path} not found in {filename}."
+                    raise ExportError(message)
+                try:
+                    check_ranges(selections[part_type], source[path].shape[0], path)
+                except MaskStoreError as error:
+                    raise ExportError(str(error)) from error
+
+        copy_metadata(source, output)
+        for part_type, paths in grouped.items():
+            selected = selections[part_type]
+            group = output.create_group(part_type)
+            group.attrs.update(source[part_type].attrs)
+            for path in paths:
+                write_field(
+                    filename,
+                    source[path],
+                    group,
+                    path.split("/", 1)[1],
+                    selected,
+                    block_size,
+                    compression,
+                )
+            counts[part_type] = int(np.diff(selected, axis=1).sum())
+        update_header(output, counts)
+    return counts
@@ -0,0 +1,566 @@
+"""Select particles using comparison predicates on their fields.
+
+Predicates are evaluated with the help of zone maps: the minimum and maximum of a
+field within each zone of consecutive rows. Zones follow the HDF5 chunking of the
+field where it is chunked, so zones whose range of values cannot satisfy a
+predicate are skipped without their chunks being read or decompressed. Zone maps
+are built once per field and stored in sidecar files alongside the snapshot, or in
+the configured zone map directory, and rebuilt if the snapshot changes.
+"""
+import hashlib
+import operator
+import tempfile
+from collections.abc import Callable
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+from loguru import logger
+
+from api.config import get_settings
+from api.lazy import lazy_import
+from api.processing.derived_fields import iterate_blocks
+
+accelerated = lazy_import("swiftsimio.accelerated")
+h5py = lazy_import("h5py")
+
+COMPARISONS: dict[str, Callable[[npt.NDArray, float], npt.NDArray]] = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+ZONE_TESTS: dict[str, Callable[[npt.NDArray, npt.NDArray, float], npt.NDArray]] = {
+    "<": lambda low, _, value: low < value,
+    "<=": lambda low, _, value: low <= value,
+    ">": lambda _, high, value: high > value,
+    ">=": lambda _, high, value: high >= value,
+    "==": lambda low, high, value: (low <= value) & (high >= value),
+    "!=": lambda low, high, value: (low != value) | (high != value),
+}
+
+
+class FilterError(Exception):
+    """Custom exception for predicate filtering errors."""
+
+
+class ZoneMap:
+    """Per-zone minimum and maximum values of a field."""
+
+    def __init__(
+        self,
+        zone_rows: int,
+        rows: int,
+        minimum: npt.NDArray,
+        maximum: npt.NDArray,
+    ):
+        """Class constructor.
+
+        Args:
+            zone_rows (int): Number of rows in each zone, except possibly the last
+            rows (int): Total number of rows in the field
+            minimum (npt.NDArray): Minimum of each zone, per column for 2D fields
+            maximum (npt.NDArray): Maximum of each zone, per column for 2D fields
+        """
+        self.zone_rows = zone_rows
+        self.rows = rows
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def check_column(self, column: int | None) -> None:
+        """Check that a column can be selected from the field.
+
+        Args:
+            column (int | None): Column of 2D fields, or None for every column
+
+        Raises
+        ------
+            FilterError:
+                If a column is given for a 1D field, or is outside a 2D field.
+        """
+        if column is None:
+            return
+        if self.minimum.ndim == 1:
+            message = "Columns cannot be selected from one-dimensional fields."
+            raise FilterError(message)
+        if not 0 <= column < self.minimum.shape[1]:
+            message = (
+                f"Column {column} out of range for a field with "
+                f"{self.minimum.shape[1]} columns."
+            )
+            raise FilterError(message)
+
+    def candidate_zones(
+        self,
+        comparison: str,
+        value: float,
+        column: int | None = None,
+    ) -> npt.NDArray:
+        """Find the zones that may contain rows satisfying a comparison.
+
+        Args:
+            comparison (str): Comparison operator, one of COMPARISONS
+            value (float): Value compared against
+            column (int | None, optional): Column of 2D fields. Defaults to None.
+
+        Raises
+        ------
+            FilterError: If the column does not exist in the field.
+
+        Returns
+        -------
+            npt.NDArray: Boolean array, True for zones that may match
+        """
+        self.check_column(column)
+        minimum, maximum = self.minimum, self.maximum
+        if column is not None:
+            minimum = minimum[:, column]
+            maximum = maximum[:, column]
+        # Zones of NaN values have NaN bounds, so only match inequality
+        return ZONE_TESTS[comparison](minimum, maximum, value)
+
+    def zone_ranges(self, zones: npt.NDArray) -> npt.NDArray:
+        """Convert a zone selection into half-open row ranges.
+
+        Args:
+            zones (npt.NDArray): Boolean array selecting zones
+
+        Returns
+        -------
+            npt.NDArray: Row ranges with shape (N, 2)
+        """
+        indices = np.flatnonzero(zones)
+        if not indices.size:
+            return np.empty((0, 2), dtype=np.int64)
+        zone_ranges = accelerated.ranges_from_array(indices) * self.zone_rows
+        return np.minimum(zone_ranges, self.rows).astype(np.int64)
+
+    def zones_touched(self, ranges: npt.NDArray) -> int:
+        """Count the zones overlapping a set of row ranges.
+
+        Args:
+            ranges (npt.NDArray): Sorted, disjoint half-open row ranges
+
+        Returns
+        -------
+            int: Number of zones containing at least one of the rows
+        """
+        touched = np.zeros(self.minimum.shape[0] + 1, dtype=np.int64)
+        np.add.at(touched, ranges[:, 0] // self.zone_rows, 1)
+        np.add.at(touched, -(-ranges[:, 1] // self.zone_rows), -1)
+        return int(np.count_nonzero(np.cumsum(touched)[:-1]))
+
+
+def zone_rows_for(dataset: "h5py.Dataset") -> int:
+    """Choose the zone size for a dataset, following its chunking where possible.
+
+    Args:
+        dataset (h5py.Dataset): HDF5 dataset
+
+    Returns
+    -------
+        int: Number of rows per zone
+    """
+    if dataset.chunks is not None:
+        return dataset.chunks[0]
+    return get_settings().zone_map_rows
+
+
+def build_zone_map(dataset: "h5py.Dataset", block_rows: int = 1_048_576) -> ZoneMap:
+    """Compute the zone map of a dataset, reading it in blocks of whole zones.
+
+    Args:
+        dataset (h5py.Dataset): HDF5 dataset with particles along the first axis
+        block_rows (int, optional):
+            Approximate number of rows read at once. Defaults to 1048576.
+
+    Returns
+    -------
+        ZoneMap: Zone map of the dataset
+    """
+    zone_rows = zone_rows_for(dataset)
+    rows = dataset.shape[0]
+    block_rows = max(block_rows // zone_rows, 1) * zone_rows
+
+    minima, maxima = [], []
+    for start in range(0, rows, block_rows):
+        values = dataset[start : min(start + block_rows, rows)]
+        zone_starts = np.arange(0, values.shape[0], zone_rows)
+        with np.errstate(invalid="ignore"):
+            minima.append(np.fmin.reduceat(values, zone_starts, axis=0))
+            maxima.append(np.fmax.reduceat(values, zone_starts, axis=0))
+
+    empty = np.empty((0, *dataset.shape[1:]), dtype=dataset.dtype)
+    return ZoneMap(
+        zone_rows,
+        rows,
+        np.concatenate(minima) if minima else empty,
+        np.concatenate(maxima) if maxima else empty,
+    )
+
+
+def zone_map_path(filename: str, field: str) -> Path:
+    """Locate the sidecar file holding the zone map of a field.
+
+    Args:
+        filename (str): Path to HDF5 file
+        field (str): Field path
+
+    Returns
+    -------
+        Path: Path to the sidecar file
+    """
+    zone_map_dir = get_settings().zone_map_dir
+    name = field.strip("/").replace("/", ".")
+    if zone_map_dir is None:
+        return Path(f"{filename}.zonemaps") / f"{name}.npz"
+    digest = hashlib.sha1(str(filename).encode(), usedforsecurity=False).hexdigest()
+    return Path(zone_map_dir) / digest / f"{name}.npz"
+
+
+def save_zone_map(path: Path, zone_map: ZoneMap, mtime: float, size: int) -> None:
+    """Write a zone map sidecar file atomically.
+
+    Args:
+        path (Path): Path to the sidecar file
+        zone_map (ZoneMap): Zone map to save
+        mtime (float): Modification time of the snapshot the zone map describes
+        size (int): Size of the snapshot the zone map describes
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent,
+        suffix=".npz",
+        delete=False,
+    ) as handle:
+        np.savez(
+            handle,
+            zone_rows=zone_map.zone_rows,
+            rows=zone_map.rows,
+            minimum=zone_map.minimum,
+            maximum=zone_map.maximum,
+            mtime=mtime,
+            size=size,
+        )
+    Path(handle.name).replace(path)
+
+
+def load_zone_map_file(path: Path, mtime: float, size: int) -> ZoneMap | None:
+    """Read a zone map sidecar file, if it is up to date.
+
+    Args:
+        path (Path): Path to the sidecar file
+        mtime (float): Current modification time of the snapshot
+        size (int): Current size of the snapshot
+
+    Returns
+    -------
+        ZoneMap | None: Zone map, or None if missing, unreadable or out of date
+    """
+    try:
+        with np.load(path) as stored:
+            if float(stored["mtime"]) != mtime or int(stored["size"]) != size:
+                return None
+            return ZoneMap(
+                int(stored["zone_rows"]),
+                int(stored["rows"]),
+                stored["minimum"],
+                stored["maximum"],
+            )
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=256)
+def _get_zone_map(filename: str, field: str, mtime: float, size: int) -> ZoneMap:
+    path = zone_map_path(filename, field)
+    zone_map = load_zone_map_file(path, mtime, size)
+    if zone_map is not None:
+        return zone_map
+
+    with h5py.File(filename, "r") as handle:
+        zone_map = build_zone_map(handle[field])
+    try:
+        save_zone_map(path, zone_map, mtime, size)
+    except OSError as error:
+        logger.warning(f"Unable to save zone map for {field} at {path}: {error}")
+    return zone_map
+
+
+def get_zone_map(filename: str, field: str) -> ZoneMap:
+    """Retrieve the zone map of a field, building and saving it if required.
+
+    Args:
+        filename (str): Path to HDF5 file
+        field (str): Field path
+
+    Returns
+    -------
+        ZoneMap: Zone map of the field
+    """
+    stat = Path(filename).stat()
+    return _get_zone_map(filename, field, stat.st_mtime, stat.st_size)
+
+
+def intersect_ranges(first: npt.NDArray, second: npt.NDArray) -> npt.NDArray:
+    """Intersect two sorted sets of disjoint half-open ranges.
+
+    Args:
+        first (npt.NDArray): Sorted, disjoint ranges with shape (N, 2)
+        second (npt.NDArray): Sorted, disjoint ranges with shape (M, 2)
+
+    Returns
+    -------
+        npt.NDArray: Sorted, disjoint ranges covered by both inputs
+    """
+    low = np.searchsorted(second[:, 1], first[:, 0], side="right")
+    high = np.searchsorted(second[:, 0], first[:, 1], side="left")
+    counts = np.maximum(high - low, 0)
+
+    first_index = np.repeat(np.arange(len(first)), counts)
+    second_index = (
+        np.arange(counts.sum())
+        - np.repeat(np.cumsum(counts) - counts, counts)
+        + np.repeat(low, counts)
+    )
+    starts = np.maximum(first[first_index, 0], second[second_index, 0])
+    ends = np.minimum(first[first_index, 1], second[second_index, 1])
+    overlapping = starts < ends
+    return np.stack((starts[overlapping], ends[overlapping]), axis=1).astype(np.int64)
+
+
+def union_ranges(first: npt.NDArray, second: npt.NDArray) -> npt.NDArray:
+    """Merge two sets of half-open ranges.
+
+    Args:
+        first (npt.NDArray): Ranges with shape (N, 2)
+        second (npt.NDArray): Ranges with shape (M, 2)
+
+    Returns
+    -------
+        npt.NDArray: Sorted, disjoint ranges covered by either input
+    """
+    ranges = np.concatenate((first, second)).reshape(-1, 2).astype(np.int64)
+    if not ranges.size:
+        return ranges
+    ranges = ranges[np.argsort(ranges[:, 0], kind="stable")]
+    furthest_end = np.maximum.accumulate(ranges[:, 1])
+    group_starts = np.flatnonzero(
+        np.concatenate(([True], ranges[1:, 0] > furthest_end[:-1])),
+    )
+    return np.stack(
+        (ranges[group_starts, 0], np.maximum.reduceat(ranges[:, 1], group_starts)),
+        axis=1,
+    )
+
+
+def validate_predicates(predicates: list[dict], combine: str) -> None:
+    """Check that a set of predicates can be evaluated together.
+
+    Args:
+        predicates (list[dict]): Predicates to check
+        combine (str): How the predicates are combined
+
+    Raises
+    ------
+        FilterError: For invalid predicates or combinations.
+    """
+    if not predicates:
+        message = "At least one predicate is required."
+        raise FilterError(message)
+    if combine not in ("and", "or"):
+        message = f"Predicates can only be combined with 'and' or 'or', not {combine}."
+        raise FilterError(message)
+    part_types = {
+        predicate["field"].strip("/").split("/")[0] for predicate in predicates
+    }
+    if len(part_types) > 1:
+        message = "All predicate fields must belong to the same particle type."
+        raise FilterError(message)
+    for predicate in predicates:
+        if predicate["comparison"] not in COMPARISONS:
+            message = (
+                f"Unknown comparison {predicate['comparison']}. "
+                f"Available comparisons are {list(COMPARISONS)}."
+            )
+            raise FilterError(message)
+
+
+def load_zone_maps(filename: str, predicates: list[dict]) -> list[ZoneMap]:
+    """Retrieve the zone map of the field of each predicate.
+
+    Args:
+        filename (str): Path to HDF5 file
+        predicates (list[dict]): Predicates to evaluate
+
+    Raises
+    ------
+        FilterError:
+            For unknown fields or columns, or fields that cannot be compared together.
+
+    Returns
+    -------
+        list[ZoneMap]: Zone map for each predicate
+    """
+    try:
+        zone_maps = [
+            get_zone_map(filename, predicate["field"]) for predicate in predicates
+        ]
+    except KeyError as error:
+        message = f"Predicate field not found in {filename}: {error}"
+        raise FilterError(message) from error
+    if len({zone_map.rows for zone_map in zone_maps}) > 1:
+        message = "All predicate fields must have the same number of rows."
+        raise FilterError(message)
+    for predicate, zone_map in zip(predicates, zone_maps, strict=True):
+        if zone_map.minimum.ndim > 1 and predicate.get("column") is None:
+            message = f"A column is required for predicates on {predicate['field']}."
+            raise FilterError(message)
+        zone_map.check_column(predicate.get("column"))
+    return zone_maps
+
+
+def candidate_ranges(
+    predicates: list[dict],
+    zone_maps: list[ZoneMap],
+    combine: str,
+) -> npt.NDArray:
+    """Find the rows in zones that may satisfy the combined predicates.
+
+    Args:
+        predicates (list[dict]): Predicates to evaluate
+        zone_maps (list[ZoneMap]): Zone map for each predicate
+        combine (str): How the predicates are combined
+
+    Returns
+    -------
+        npt.NDArray: Sorted, disjoint half-open row ranges
+    """
+    candidates = None
+    for predicate, zone_map in zip(predicates, zone_maps, strict=True):
+        ranges = zone_map.zone_ranges(
+            zone_map.candidate_zones(
+                predicate["comparison"],
+                predicate["value"],
+                predicate.get("column"),
+            ),
+        )
+        if candidates is None:
+            candidates = ranges
+        elif combine == "and":
+            candidates = intersect_ranges(candidates, ranges)
+        else:
+            candidates = union_ranges(candidates, ranges)
+    return candidates
+
+
+def evaluate_predicates(
+    handle: "h5py.File",
+    predicates: list[dict],
+    combine: str,
+    ranges: npt.NDArray,
+    rows: int,
+) -> npt.NDArray:
+    """Evaluate the combined predicates for the rows within a set of ranges.
+
+    Args:
+        handle (h5py.File): Open HDF5 file
+        predicates (list[dict]): Predicates to evaluate
+        combine (str): How the predicates are combined
+        ranges (npt.NDArray): Half-open row ranges
+        rows (int): Total number of rows in the ranges
+
+    Returns
+    -------
+        npt.NDArray: Boolean array, True for rows satisfying the predicates
+    """
+    selected = None
+    for predicate in predicates:
+        dataset = handle[predicate["field"]]
+        column = predicate.get("column")
+        values = accelerated.read_ranges_from_file(
+            dataset,
+            ranges,
+            output_shape=rows if column is not None else (rows, *dataset.shape[1:]),
+            output_type=dataset.dtype,
+            columns=np.s_[:] if column is None else column,
+        )
+        result = COMPARISONS[predicate["comparison"]](values, predicate["value"])
+        if selected is None:
+            selected = result
+        elif combine == "and":
+            selected &= result
+        else:
+            selected |= result
+    return selected
+
+
+def filter_ranges(
+    filename: str,
+    predicates: list[dict],
+    combine: str = "and",
+    block_size: int | None = None,
+) -> tuple[npt.NDArray, dict]:
+    """Find the rows satisfying a set of predicates.
+
+    Args:
+        filename (str): Path to HDF5 file
+        predicates (list[dict]):
+            Predicates with "field", "comparison", "value" and optional "column" keys.
+            All fields must belong to the same particle type.
+        combine (str, optional):
+            Whether rows must satisfy every predicate ("and") or any ("or").
+            Defaults to "and".
+        block_size (int | None, optional):
+            Maximum number of rows read at once. Defaults to None, in which case
+            the configured derived field block size is used.
+
+    Raises
+    ------
+        FilterError: For invalid predicates or unknown fields.
+
+    Returns
+    -------
+        tuple[npt.NDArray, dict]:
+            Half-open ranges of matching rows, and statistics on the zones and
+            rows read.
+    """
+    validate_predicates(predicates, combine)
+    if block_size is None:
+        block_size = get_settings().derived_field_block_size
+
+    zone_maps = load_zone_maps(filename, predicates)
+    candidates = candidate_ranges(predicates, zone_maps, combine)
+
+    matches = [np.empty((0, 2), dtype=np.int64)]
+    with h5py.File(filename, "r") as handle:
+        for block_ranges, start, end in iterate_blocks(candidates, block_size):
+            selected = evaluate_predicates(
+                handle,
+                predicates,
+                combine,
+                block_ranges,
+                end - start,
+            )
+            if not np.any(selected):
+                continue
+            lengths = block_ranges[:, 1] - block_ranges[:, 0]
+            rows = np.repeat(
+                block_ranges[:, 0] - (np.cumsum(lengths) - lengths),
+                lengths,
+            )
+            rows += np.arange(end - start)
+            matches.append(accelerated.ranges_from_array(rows[selected]))
+
+    matching = union_ranges(np.concatenate(matches), matches[0])
+    return matching, {
+        "rows_total": zone_maps[0].rows,
+        "rows_read": int(np.diff(candidates, axis=1).sum()),
+        "rows_matched": int(np.diff(matching, axis=1).sum()),
+        "zones_total": sum(zone_map.minimum.shape[0] for zone_map in zone_maps),
+        "zones_read": sum(zone_map.zones_touched(candidates) for zone_map in zone_maps),
+    }
@@ -0,0 +1,154 @@
+"""Compile the numba-accelerated readers of swiftsimio before the first request.
+
+`read_ranges_from_file` and `ranges_from_array` in `swiftsimio.accelerated` call
+functions compiled by numba the first time they see each combination of argument
+types, which adds seconds to the first masked request served by every worker. At
+startup, each worker reads a few rows of small chunked datasets of every data type
+served, from an HDF5 file held in memory, to compile them in advance.
+
+The accelerated functions are not declared with `cache=True`, so caching is enabled
+on them here, with compiled code written to a configurable directory. Workers
+started after the first then load the compiled code rather than compiling it again.
+Both run in a background thread, so that workers answer health checks while the
+readers are compiled.
+"""
+import importlib
+import tempfile
+import time
+from pathlib import Path
+from threading import Thread
+
+import numpy as np
+from loguru import logger
+
+from api.lazy import lazy_import
+
+accelerated = lazy_import("swiftsimio.accelerated")
+h5py = lazy_import("h5py")
+numba = lazy_import("numba")
+
+DEFAULT_JIT_CACHE_DIR = Path(tempfile.gettempdir()) / "swift_api_numba"
+WARMUP_ROWS = 64
+WARMUP_CHUNK_ROWS = 8
+WARMUP_COLUMNS = 3
+
+
+def jit_functions() -> "dict[str, numba.core.dispatcher.Dispatcher]":
+    """Find the numba-compiled functions of `swiftsimio.accelerated`.
+
+    Returns
+    -------
+        dict[str, numba.core.dispatcher.Dispatcher]: Compiled functions by name
+    """
+    return {
+        name: function
+        for name, function in vars(
+            importlib.import_module(accelerated.__name__),
+        ).items()
+        if isinstance(function, numba.core.dispatcher.Dispatcher)
+    }
+
+
+def enable_jit_cache(cache_dir: Path) -> list[str]:
+    """Cache code compiled for the accelerated functions on disk.
+
+    Args:
+        cache_dir (Path): Directory holding the compiled code
+
+    Returns
+    -------
+        list[str]: Names of the functions cached
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    numba.config.CACHE_DIR = str(cache_dir)
+    functions = jit_functions()
+    for function in functions.values():
+        function.enable_caching()
+    return sorted(functions)
+
+
+def warm_jit(dtypes: list[str]) -> float:
+    """Compile the accelerated functions for the data types served.
+
+    Args:
+        dtypes (list[str]): Data types of the fields served, e.g. "float32"
+
+    Returns
+    -------
+        float: Seconds spent compiling, or loading compiled code
+    """
+    start = time.perf_counter()
+    ranges = np.array([[1, 3], [10, 12], [40, 41]], dtype=np.int64)
+    rows = int(np.diff(ranges, axis=1).sum())
+    try:
+        accelerated.ranges_from_array(np.arange(WARMUP_ROWS, dtype=np.int64))
+        with h5py.File(
+            "jit_warmup.hdf5",
+            "w",
+            driver="core",
+            backing_store=False,
+        ) as snapshot:
+            for dtype in map(np.dtype, dtypes):
+                for shape in ((WARMUP_ROWS,), (WARMUP_ROWS, WARMUP_COLUMNS)):
+                    dataset = snapshot.create_dataset(
+                        f"{dtype.name}_{len(shape)}",
+                        data=np.zeros(shape, dtype=dtype),
+                        chunks=(WARMUP_CHUNK_ROWS, *shape[1:]),
+                    )
+                    if len(shape) == 1:
+                        accelerated.read_ranges_from_file(dataset, ranges, rows, dtype)
+                    else:
+                        accelerated.read_ranges_from_file(
+                            dataset,
+                            ranges,
+                            (rows, *shape[1:]),
+                            dtype,
+                        )
+                        accelerated.read_ranges_from_file(
+                            dataset,
+                            ranges,
+                            rows,
+                            dtype,
+                            0,
+                        )
+    except Exception as error:  # noqa: BLE001
+        logger.warning(f"Failed to compile accelerated readers: {error!r}")
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Compiled accelerated readers for {', '.join(dtypes)} in {elapsed:.2f}s",
+    )
+    return elapsed
+
+
+def prepare_jit(cache_dir: Path, dtypes: list[str]) -> None:
+    """Enable caching of compiled code, then compile the accelerated functions.
+
+    Args:
+        cache_dir (Path): Directory holding the compiled code
+        dtypes (list[str]): Data types of the fields served, e.g. "float32"
+    """
+    enable_jit_cache(cache_dir)
+    if dtypes:
+        warm_jit(dtypes)
+
+
+def start_jit_warmup(cache_dir: Path, dtypes: list[str]) -> Thread:
+    """Compile the accelerated functions in a background thread.
+
+    Args:
+        cache_dir (Path): Directory holding the compiled code
+        dtypes (list[str]): Data types of the fields served, e.g. "float32"
+
+    Returns
+    -------
+        Thread: The started compilation thread
+    """
+    thread = Thread(
+        target=prepare_jit,
+        args=(cache_dir, dtypes),
+        name="jit-warmup",
+        daemon=True,
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,724 @@
+"""Run very large extractions as background jobs.
+
+Whole-snapshot extractions can take longer than a reverse proxy allows for a single
+request. Jobs are instead submitted to a bounded process pool, which reads the
+requested fields block by block and writes them to a scratch directory. Each job
+has a directory holding a `job.json` record of its state and progress, written
+atomically, so any API worker can report on a job and serve its result.
+
+Every API worker has its own pool, so before it starts each job takes one of a
+fixed number of slots, locked files in the job directory, bounding the jobs run at
+once by all of the workers sharing it. Records name the host and process of the
+API worker that submitted the job, and running jobs update them as each block is
+read. Jobs whose API worker has exited, or that have not made progress for a
+while, are recorded as failed. Finished jobs are removed once their time to live
+has passed.
+"""
+import fcntl
+import json
+import os
+import re
+import shutil
+import socket
+import tempfile
+import time
+import uuid
+import zipfile
+from collections.abc import Callable, Iterator
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from multiprocessing import get_context
+from pathlib import Path
+from typing import BinaryIO
+
+import numpy as np
+import numpy.typing as npt
+from loguru import logger
+
+from api.config import get_settings
+from api.lazy import lazy_import
+from api.processing.data_processing import SWIFTProcessor, SWIFTProcessorError
+from api.processing.derived_fields import iterate_blocks
+from api.processing.distributed import part_type_index
+from api.processing.mask_store import MaskStoreError, check_ranges
+from api.processing.result_cache import process_alive
+
+h5py = lazy_import("h5py")
+
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+ACTIVE_STATES = ("queued", "running")
+FINISHED_STATES = ("finished", "failed")
+SLOT_POLL_INTERVAL = 0.5
+
+
+class JobError(Exception):
+    """Custom exception for job errors."""
+
+
+class JobNotFoundError(JobError):
+    """Raised for unknown jobs, or jobs belonging to another user."""
+
+
+class JobLimitError(JobError):
+    """Raised when a user already has the maximum number of active jobs."""
+
+
+def read_job_record(job_path: Path) -> dict | None:
+    """Read the record of a job.
+
+    Args:
+        job_path (Path): Directory of the job
+
+    Returns
+    -------
+        dict | None: Job record, or None if it does not exist or cannot be read
+    """
+    try:
+        return json.loads((job_path / "job.json").read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def write_job_record(job_path: Path, record: dict) -> None:
+    """Atomically replace the record of a job.
+
+    Args:
+        job_path (Path): Directory of the job
+        record (dict): Job record
+    """
+    temporary = job_path / f"job.{uuid.uuid4().hex}.tmp"
+    temporary.write_text(json.dumps(record))
+    temporary.replace(job_path / "job.json")
+
+
+def update_job_record(job_path: Path, **changes) -> dict:
+    """Update fields of a job record.
+
+    Args:
+        job_path (Path): Directory of the job
+        **changes: Fields to update
+
+    Returns
+    -------
+        dict: Updated job record
+    """
+    record = read_job_record(job_path) or {}
+    record.update(changes)
+    write_job_record(job_path, record)
+    return record
+
+
+@contextmanager
+def locked(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock on a file, shared by every process using it.
+
+    Args:
+        path (Path): Path to the lock file, created if required
+
+    Yields
+    ------
+        None: While the lock is held
+    """
+    with path.open("ab") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def acquire_slot(job_dir: Path, slots: int) -> BinaryIO:
+    """Wait for one of a fixed number of job slots shared through the job directory.
+
+    A slot is an exclusive lock on a file, so it is released when the file is
+    closed, including when the process holding it exits.
+
+    Args:
+        job_dir (Path): Scratch directory shared by every API worker
+        slots (int): Number of slots
+
+    Returns
+    -------
+        BinaryIO: Open slot file, to close once the job has finished
+    """
+    slot_dir = job_dir / ".slots"
+    slot_dir.mkdir(parents=True, exist_ok=True)
+    while True:
+        for index in range(slots):
+            slot = (slot_dir / f"slot_{index}.lock").open("ab")
+            try:
+                fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                slot.close()
+                continue
+            return slot
+        time.sleep(SLOT_POLL_INTERVAL)
+
+
+def field_ranges(
+    filename: str,
+    fields: list[str],
+    ranges: npt.NDArray | None,
+) -> dict[str, npt.NDArray]:
+    """Find the rows to extract for each field.
+
+    Args:
+        filename (str): Path to HDF5 file
+        fields (list[str]): Raw or derived field paths
+        ranges (npt.NDArray | None):
+            Half-open row ranges applied to every field, or None for every row
+
+    Raises
+    ------
+        JobError:
+            For unknown fields, a mask applied to several particle types, or mask
+            ranges outside a field.
+
+    Returns
+    -------
+        dict[str, npt.NDArray]: Half-open row ranges for each field
+    """
+    if not fields:
+        message = "At least one field is required."
+        raise JobError(message)
+
+    try:
+        part_types = {part_type_index(field) for field in fields}
+    except KeyError as error:
+        raise JobError(str(error)) from error
+    if ranges is not None and len(part_types) > 1:
+        message = "A mask can only be applied to fields of a single particle type."
+        raise JobError(message)
+
+    selected = {}
+    with h5py.File(filename, "r") as handle:
+        for field in fields:
+            try:
+                derived = SWIFTProcessor.is_derived_field(field)
+            except SWIFTProcessorError as error:
+                raise JobError(str(error)) from error
+            if not derived and field not in handle:
+                message = f"Field {field} not found in {filename}."
+                raise JobError(message)
+
+            rows_field = (
+                f"PartType{part_type_index(field)}/Coordinates" if derived else field
+            )
+            rows = handle[rows_field].shape[0]
+            if ranges is None:
+                selected[field] = np.array([[0, rows]], dtype=np.int64)
+                continue
+            try:
+                check_ranges(ranges, rows, field)
+            except MaskStoreError as error:
+                raise JobError(str(error)) from error
+            selected[field] = ranges
+    return selected
+
+
+def read_field_block(
+    filename: str,
+    field: str,
+    ranges: npt.NDArray,
+    rows: int,
+) -> tuple:
+    """Read one block of a raw or derived field.
+
+    Args:
+        filename (str): Path to HDF5 file
+        field (str): Field path
+        ranges (npt.NDArray): Half-open row ranges in the block
+        rows (int): Number of rows in the block
+
+    Returns
+    -------
+        tuple: Values of the field, and their units for derived fields
+    """
+    if SWIFTProcessor.is_derived_field(field):
+        return SWIFTProcessor.get_array_derived(filename, field, ranges)
+    return SWIFTProcessor.get_array_ranges(filename, field, ranges, rows), None
+
+
+def write_npz(job_path: Path, arrays: dict[str, Path]) -> Path:
+    """Combine `.npy` files into an uncompressed `.npz` archive.
+
+    Args:
+        job_path (Path): Directory of the job
+        arrays (dict[str, Path]): Path to the `.npy` file of each field
+
+    Returns
+    -------
+        Path: Path to the archive, readable with `numpy.load`
+    """
+    result = job_path / "result.npz"
+    with zipfile.ZipFile(result, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for field, path in arrays.items():
+            archive.write(path, f"{field.strip('/')}.npy")
+            path.unlink()
+    return result
+
+
+def extract_field(
+    filename: str,
+    field: str,
+    ranges: npt.NDArray,
+    path: Path,
+    block_size: int,
+    on_block: Callable[[int], None],
+) -> str | None:
+    """Extract one field to a `.npy` file, block by block.
+
+    Args:
+        filename (str): Path to HDF5 file
+        field (str): Raw or derived field path
+        ranges (npt.NDArray): Half-open row ranges to extract
+        path (Path): Path to the `.npy` file to write
+        block_size (int): Maximum number of rows read at once
+        on_block (Callable[[int], None]): Called with the number of rows in each block
+
+    Returns
+    -------
+        str | None: Units of a derived field, or None for raw fields
+    """
+    rows = int(np.diff(ranges, axis=1).sum())
+    output, units = None, None
+    for block_ranges, start, end in iterate_blocks(ranges, block_size):
+        values, units = read_field_block(filename, field, block_ranges, end - start)
+        if output is None:
+            output = np.lib.format.open_memmap(
+                path,
+                mode="w+",
+                dtype=values.dtype,
+                shape=(rows, *values.shape[1:]),
+            )
+        output[start:end] = values
+        on_block(end - start)
+
+    if output is None:
+        values, units = read_field_block(
+            filename,
+            field,
+            np.empty((0, 2), dtype=np.int64),
+            0,
+        )
+        np.save(path, values)
+    else:
+        output.flush()
+    return units
+
+
+JOB_WRITERS = {"npz": write_npz}
+JOB_FORMATS = tuple(JOB_WRITERS)
+
+
+def run_job(
+    job_path: str,
+    filename: str,
+    ranges: dict[str, npt.NDArray],
+    response_format: str,
+    block_size: int,
+    slots: int | None = None,
+) -> None:
+    """Extract fields to the job directory, once a job slot is free.
+
+    Runs in a worker process of the job pool.
+
+    Args:
+        job_path (str): Directory of the job
+        filename (str): Path to HDF5 file
+        ranges (dict[str, npt.NDArray]): Half-open row ranges for each field
+        response_format (str): Format of the result, one of JOB_FORMATS
+        block_size (int): Maximum number of rows read at once
+        slots (int | None, optional):
+            Number of jobs run at once by every API worker sharing the job directory.
+            Defaults to None, in which case the job starts immediately.
+    """
+    job_path = Path(job_path)
+    if slots is None:
+        extract_job(job_path, filename, ranges, response_format, block_size)
+        return
+    with acquire_slot(job_path.parent, slots):
+        extract_job(job_path, filename, ranges, response_format, block_size)
+
+
+def extract_job(
+    job_path: Path,
+    filename: str,
+    ranges: dict[str, npt.NDArray],
+    response_format: str,
+    block_size: int,
+) -> None:
+    """Extract fields to the job directory, recording progress as blocks are read.
+
+    Args:
+        job_path (Path): Directory of the job
+        filename (str): Path to HDF5 file
+        ranges (dict[str, npt.NDArray]): Half-open row ranges for each field
+        response_format (str): Format of the result, one of JOB_FORMATS
+        block_size (int): Maximum number of rows read at once
+    """
+    rows_total = int(
+        sum(np.diff(selected, axis=1).sum() for selected in ranges.values()),
+    )
+    started_at = time.time()
+    update_job_record(
+        job_path,
+        state="running",
+        started_at=started_at,
+        updated_at=started_at,
+        rows_total=rows_total,
+        rows_done=0,
+    )
+
+    rows_done = 0
+
+    def on_block(rows: int) -> None:
+        nonlocal rows_done
+        rows_done += int(rows)
+        update_job_record(
+            job_path,
+            updated_at=time.time(),
+            rows_done=rows_done,
+            progress=rows_done / rows_total,
+        )
+
+    try:
+        arrays, units = {}, {}
+        for number, (field, selected) in enumerate(ranges.items()):
+            arrays[field] = job_path / f"field_{number}.npy"
+            units[field] = extract_field(
+                filename,
+                field,
+                selected,
+                arrays[field],
+                block_size,
+                on_block,
+            )
+        result = JOB_WRITERS[response_format](job_path, arrays)
+    except Exception as error:  # noqa: BLE001
+        update_job_record(
+            job_path,
+            state="failed",
+            finished_at=time.time(),
+            error=str(error),
+        )
+        return
+
+    update_job_record(
+        job_path,
+        state="finished",
+        finished_at=time.time(),
+        progress=1.0,
+        result=result.name,
+        size=result.stat().st_size,
+        units={field: unit for field, unit in units.items() if unit is not None},
+    )
+
+
+class JobManager:
+    """Submit extraction jobs to a process pool and track them on disk."""
+
+    def __init__(
+        self,
+        job_dir: Path,
+        max_workers: int,
+        user_limit: int,
+        ttl: float,
+        executor: Executor | None = None,
+        stale_after: float = 900.0,
+    ):
+        """Class constructor.
+
+        Args:
+            job_dir (Path): Scratch directory holding a directory for each job
+            max_workers (int):
+                Maximum number of jobs run at once, by every API worker sharing the
+                job directory
+            user_limit (int): Maximum number of queued or running jobs per user
+            ttl (float): Seconds a finished job is kept before it is removed
+            executor (Executor | None, optional):
+                Executor running the jobs. Defaults to None, in which case a process
+                pool is started on first use.
+            stale_after (float, optional):
+                Seconds without progress after which a running job is recorded as
+                failed. Defaults to 900.0.
+        """
+        self.job_dir = job_dir
+        self.max_workers = max_workers
+        self.user_limit = user_limit
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self._executor = executor
+
+    @property
+    def executor(self) -> Executor:
+        """Retrieve the process pool, starting it on first use.
+
+        Workers are spawned rather than forked, as forking a process holding open
+        HDF5 files and running threads is unsafe. Each API worker has its own pool,
+        and jobs wait in it for a slot shared with the other API workers.
+
+        Returns
+        -------
+            Executor: Executor running the jobs
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=get_context("spawn"),
+            )
+        return self._executor
+
+    def job_path(self, job_id: str) -> Path:
+        """Retrieve the directory of a job.
+
+        Args:
+            job_id (str): Job identifier
+
+        Raises
+        ------
+            JobNotFoundError: If the identifier is malformed.
+
+        Returns
+        -------
+            Path: Directory of the job
+        """
+        if not JOB_ID_PATTERN.match(job_id):
+            message = f"Job {job_id} not found."
+            raise JobNotFoundError(message)
+        return self.job_dir / job_id
+
+    def records(self) -> list[dict]:
+        """Read the records of every job.
+
+        Returns
+        -------
+            list[dict]: Job records
+        """
+        records = (read_job_record(path) for path in self.job_paths())
+        return [record for record in records if record is not None]
+
+    def job_paths(self) -> list[Path]:
+        """List the directories of every job, leaving out lock and slot files.
+
+        Returns
+        -------
+            list[Path]: Job directories
+        """
+        if not self.job_dir.is_dir():
+            return []
+        return [
+            path for path in self.job_dir.iterdir() if JOB_ID_PATTERN.match(path.name)
+        ]
+
+    def submit(
+        self,
+        user: str,
+        filename: str,
+        fields: list[str],
+        ranges: npt.NDArray | None = None,
+        response_format: str = "npz",
+    ) -> dict:
+        """Submit an extraction job.
+
+        Args:
+            user (str): User submitting the job
+            filename (str): Path to HDF5 file
+            fields (list[str]): Raw or derived field paths to extract
+            ranges (npt.NDArray | None, optional):
+                Half-open row ranges to extract. Defaults to None, meaning every row.
+            response_format (str, optional): Format of the result. Defaults to "npz".
+
+        Raises
+        ------
+            JobError: For invalid fields, masks or formats.
+            JobLimitError: If the user already has the maximum number of active jobs.
+
+        Returns
+        -------
+            dict: Record of the submitted job
+        """
+        if response_format not in JOB_FORMATS:
+            message = (
+                f"Unknown job format {response_format}, expected one of {JOB_FORMATS}."
+            )
+            raise JobError(message)
+        selected = field_ranges(filename, fields, ranges)
+
+        job_id = uuid.uuid4().hex
+        job_path = self.job_path(job_id)
+        created_at = time.time()
+        record = {
+            "id": job_id,
+            "user": user,
+            "state": "queued",
+            "filename": filename,
+            "fields": fields,
+            "format": response_format,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "created_at": created_at,
+            "updated_at": created_at,
+            "progress": 0.0,
+        }
+
+        self.cleanup()
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        # Other API workers submit jobs for the same user through the same directory
+        with locked(self.job_dir / ".lock"):
+            active = [
+                existing
+                for existing in self.records()
+                if existing.get("user") == user
+                and existing.get("state") in ACTIVE_STATES
+            ]
+            if len(active) >= self.user_limit:
+                message = (
+                    f"At most {self.user_limit} jobs may be queued or running at once."
+                )
+                raise JobLimitError(message)
+            job_path.mkdir()
+            write_job_record(job_path, record)
+
+        future = self.executor.submit(
+            run_job,
+            str(job_path),
+            filename,
+            selected,
+            response_format,
+            get_settings().derived_field_block_size,
+            self.max_workers,
+        )
+        future.add_done_callback(partial(self._job_done, job_path))
+        logger.info(f"Submitted job {job_id} for {user}")
+        return record
+
+    @staticmethod
+    def _job_done(job_path: Path, future: Future) -> None:
+        # Record jobs whose worker died, or which were cancelled, as failed
+        record = read_job_record(job_path)
+        if record is None or record.get("state") in FINISHED_STATES:
+            return
+        error = "Job cancelled." if future.cancelled() else str(future.exception())
+        update_job_record(
+            job_path,
+            state="failed",
+            finished_at=time.time(),
+            error=error,
+        )
+
+    def status(self, job_id: str, user: str) -> dict:
+        """Retrieve the record of one of a user's jobs.
+
+        Args:
+            job_id (str): Job identifier
+            user (str): User requesting the job
+
+        Raises
+        ------
+            JobNotFoundError: If the job does not exist or belongs to another user.
+
+        Returns
+        -------
+            dict: Job record
+        """
+        record = read_job_record(self.job_path(job_id))
+        if record is None or record.get("user") != user:
+            message = f"Job {job_id} not found."
+            raise JobNotFoundError(message)
+        return record
+
+    def result_path(self, job_id: str, user: str) -> Path:
+        """Retrieve the result file of a finished job.
+
+        Args:
+            job_id (str): Job identifier
+            user (str): User requesting the result
+
+        Raises
+        ------
+            JobError: If the job has not finished successfully.
+
+        Returns
+        -------
+            Path: Path to the result file
+        """
+        record = self.status(job_id, user)
+        if record["state"] != "finished":
+            message = f"Job {job_id} is {record['state']}, not finished."
+            raise JobError(message)
+        return self.job_path(job_id) / record["result"]
+
+    def is_stale(self, record: dict, now: float) -> bool:
+        """Check whether an active job will never finish.
+
+        Args:
+            record (dict): Job record
+            now (float): Current time
+
+        Returns
+        -------
+            bool:
+                True if the API worker that submitted the job on this host has
+                exited, or the job is running but has not made progress recently
+        """
+        if record.get("state") not in ACTIVE_STATES:
+            return False
+        if (
+            record.get("host") == socket.gethostname()
+            and record.get("pid") is not None
+            and not process_alive(record["pid"])
+        ):
+            return True
+        return (
+            record.get("state") == "running"
+            and now - record.get("updated_at", now) > self.stale_after
+        )
+
+    def cleanup(self) -> None:
+        """Fail stale jobs, and remove jobs that finished more than the time to live ago."""
+        now = time.time()
+        for job_path in self.job_paths():
+            record = read_job_record(job_path)
+            if record is not None and self.is_stale(record, now):
+                logger.warning(f"Job {record.get('id')} stopped responding")
+                record = update_job_record(
+                    job_path,
+                    state="failed",
+                    finished_at=now,
+                    error="Job stopped responding.",
+                )
+            if record is None:
+                expired = now - job_path.stat().st_mtime > self.ttl
+            else:
+                expired = (
+                    record.get("state") in FINISHED_STATES
+                    and now - record.get("finished_at", now) > self.ttl
+                )
+            if expired:
+                shutil.rmtree(job_path, ignore_errors=True)
+
+    def shutdown(self) -> None:
+        """Stop the process pool, cancelling queued jobs."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+@lru_cache
+def get_job_manager() -> JobManager:
+    """Retrieve the job manager for this worker.
+
+    Returns
+    -------
+        JobManager: Job manager shared by the job routes
+    """
+    settings = get_settings()
+    return JobManager(
+        settings.job_dir or Path(tempfile.gettempdir()) / "swift_api_jobs",
+        settings.job_workers,
+        settings.job_user_limit,
+        settings.job_ttl,
+        stale_after=settings.job_stale_after,
+    )
@@ -0,0 +1,326 @@
+"""Keep spatial masks on the server and refer to them by opaque handles.
+
+A handle records which cells of a snapshot are selected. Clients create one,
+optionally constrain it to regions of the box, and then request the particle row
+ranges it selects for each particle type, without downloading any cell metadata.
+Handles expire after a period without use, and the least recently used handles
+are removed once too many are held. Each handle is written atomically to a file in
+a scratch directory, named by its identifier, so any API worker can use a handle
+created by another. The modification time of the file records when it was last
+used.
+"""
+import os
+import re
+import tempfile
+import time
+import uuid
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+from api.config import get_settings
+from api.processing.apertures import (
+    ApertureError,
+    CellMetadata,
+    inside_aperture,
+    periodic_offsets,
+)
+from api.processing.masks import load_mask
+
+HANDLE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class MaskHandleError(Exception):
+    """Custom exception for mask handle errors."""
+
+
+class MaskHandleNotFoundError(MaskHandleError):
+    """Raised for unknown or expired handles, or handles belonging to another user."""
+
+
+class MaskHandle:
+    """A spatial mask held on the server."""
+
+    def __init__(self, user: str, filename: str, cells: npt.NDArray):
+        """Class constructor.
+
+        Args:
+            user (str): User owning the handle
+            filename (str): Path to HDF5 file
+            cells (npt.NDArray): Boolean array, True for selected cells
+        """
+        self.user = user
+        self.filename = filename
+        self.cells = cells
+
+    def summary(self, handle_id: str) -> dict:
+        """Summarise the cells and particles selected by the handle.
+
+        Args:
+            handle_id (str): Identifier of the handle
+
+        Returns
+        -------
+            dict: Handle identifier, selected cell count and row count per particle type
+        """
+        mask = load_mask(Path(self.filename))
+        metadata = mask.metadata
+        return {
+            "handle": handle_id,
+            "cells_total": int(self.cells.size),
+            "cells_selected": int(np.count_nonzero(self.cells)),
+            "counts": {
+                f"PartType{index}": int(mask.counts[name][self.cells].sum())
+                for index, name in zip(
+                    metadata.present_particle_types,
+                    metadata.present_particle_names,
+                    strict=True,
+                )
+            },
+        }
+
+
+def region_cells(filename: str, region: list[list[float]]) -> npt.NDArray:
+    """Find the cells overlapping a box-shaped region of a periodic box.
+
+    Args:
+        filename (str): Path to HDF5 file
+        region (list[list[float]]):
+            Lower and upper bounds along each axis, in the length units of the cell
+            metadata
+
+    Raises
+    ------
+        MaskHandleError: For malformed regions.
+
+    Returns
+    -------
+        npt.NDArray: Boolean array, True for cells overlapping the region
+    """
+    bounds = np.asarray(region, dtype=np.float64)
+    if bounds.shape != (3, 2) or np.any(bounds[:, 1] < bounds[:, 0]):
+        message = "A region must give lower and upper bounds along each of three axes."
+        raise MaskHandleError(message)
+
+    mask = load_mask(Path(filename))
+    units = mask.centers.units
+    separation = np.abs(
+        periodic_offsets(
+            mask.centers.to(units).value,
+            bounds.mean(axis=1),
+            mask.metadata.boxsize.to(units).value,
+        ),
+    )
+    gaps = np.maximum(separation - 0.5 * mask.cell_size.to(units).value, 0.0)
+    return inside_aperture(gaps, half_widths=0.5 * (bounds[:, 1] - bounds[:, 0]))
+
+
+class MaskHandleStore:
+    """Spatial masks held for clients, with expiry and a limit on their number."""
+
+    def __init__(self, handle_dir: Path, max_handles: int, ttl: float):
+        """Class constructor.
+
+        Args:
+            handle_dir (Path): Scratch directory shared by every API worker
+            max_handles (int): Maximum number of handles held by every worker
+            ttl (float): Seconds a handle is kept after it was last used
+        """
+        self.handle_dir = handle_dir
+        self.max_handles = max_handles
+        self.ttl = ttl
+
+    def handle_path(self, handle_id: str) -> Path:
+        """Retrieve the file holding a handle.
+
+        Args:
+            handle_id (str): Identifier of the handle
+
+        Raises
+        ------
+            MaskHandleNotFoundError: If the identifier is malformed.
+
+        Returns
+        -------
+            Path: Path to the file holding the handle
+        """
+        if not HANDLE_ID_PATTERN.match(handle_id):
+            message = f"Mask handle {handle_id} not found."
+            raise MaskHandleNotFoundError(message)
+        return self.handle_dir / f"{handle_id}.npz"
+
+    @staticmethod
+    def _touch(path: Path) -> None:
+        # Set explicitly, as file systems may record times to a few milliseconds
+        now = time.time_ns()
+        os.utime(path, ns=(now, now))
+
+    def _write(self, handle_id: str, handle: MaskHandle) -> None:
+        path = self.handle_path(handle_id)
+        temporary = path.with_name(f"{handle_id}.{uuid.uuid4().hex}.tmp")
+        with temporary.open("wb") as file:
+            np.savez(
+                file,
+                user=np.array(handle.user),
+                filename=np.array(handle.filename),
+                cells=np.packbits(handle.cells),
+                cells_total=np.array(handle.cells.size),
+            )
+        self._touch(temporary)
+        temporary.replace(path)
+
+    def _expire(self) -> None:
+        now = time.time_ns()
+        handles = []
+        for path in self.handle_dir.glob("*.npz"):
+            try:
+                last_used = path.stat().st_mtime_ns
+            except OSError:
+                continue
+            if now - last_used > self.ttl * 1e9:
+                path.unlink(missing_ok=True)
+            else:
+                handles.append((last_used, path))
+        handles.sort()
+        for _, path in handles[: max(len(handles) - self.max_handles, 0)]:
+            path.unlink(missing_ok=True)
+
+    def create(
+        self,
+        user: str,
+        filename: str,
+        region: list[list[float]] | None = None,
+    ) -> dict:
+        """Create a handle selecting every cell, or the cells within a region.
+
+        Args:
+            user (str): User owning the handle
+            filename (str): Path to HDF5 file
+            region (list[list[float]] | None, optional):
+                Lower and upper bounds along each axis. Defaults to None.
+
+        Returns
+        -------
+            dict: Summary of the new handle
+        """
+        if region is None:
+            cells = np.ones(load_mask(Path(filename)).centers.shape[0], dtype=bool)
+        else:
+            cells = region_cells(filename, region)
+
+        handle_id = uuid.uuid4().hex
+        handle = MaskHandle(user, filename, cells)
+        self.handle_dir.mkdir(parents=True, exist_ok=True)
+        self._write(handle_id, handle)
+        self._expire()
+        return handle.summary(handle_id)
+
+    def get(self, handle_id: str, user: str) -> MaskHandle:
+        """Retrieve one of a user's handles, marking it as used.
+
+        Args:
+            handle_id (str): Identifier of the handle
+            user (str): User requesting the handle
+
+        Raises
+        ------
+            MaskHandleNotFoundError: If the handle does not exist, has expired or
+                belongs to another user.
+
+        Returns
+        -------
+            MaskHandle: Mask handle
+        """
+        path = self.handle_path(handle_id)
+        message = f"Mask handle {handle_id} not found."
+        try:
+            if time.time_ns() - path.stat().st_mtime_ns > self.ttl * 1e9:
+                path.unlink(missing_ok=True)
+                raise MaskHandleNotFoundError(message)
+            with np.load(path) as stored:
+                handle = MaskHandle(
+                    str(stored["user"]),
+                    str(stored["filename"]),
+                    np.unpackbits(
+                        stored["cells"],
+                        count=int(stored["cells_total"]),
+                    ).astype(bool),
+                )
+        except (OSError, ValueError, KeyError) as error:
+            raise MaskHandleNotFoundError(message) from error
+        if handle.user != user:
+            raise MaskHandleNotFoundError(message)
+        try:
+            self._touch(path)
+        except OSError as error:
+            raise MaskHandleNotFoundError(message) from error
+        return handle
+
+    def constrain(self, handle_id: str, user: str, region: list[list[float]]) -> dict:
+        """Restrict a handle to the cells it selects within a region.
+
+        Args:
+            handle_id (str): Identifier of the handle
+            user (str): User owning the handle
+            region (list[list[float]]): Lower and upper bounds along each axis
+
+        Returns
+        -------
+            dict: Summary of the constrained handle
+        """
+        handle = self.get(handle_id, user)
+        handle.cells = handle.cells & region_cells(handle.filename, region)
+        self._write(handle_id, handle)
+        return handle.summary(handle_id)
+
+    def ranges(self, handle_id: str, user: str, part_type: str) -> npt.NDArray:
+        """Retrieve the particle rows selected by a handle.
+
+        Args:
+            handle_id (str): Identifier of the handle
+            user (str): User owning the handle
+            part_type (str): Particle type, e.g. "PartType0"
+
+        Raises
+        ------
+            MaskHandleError: If the particle type is not present in the snapshot.
+
+        Returns
+        -------
+            npt.NDArray: Sorted, disjoint half-open row ranges with shape (N, 2)
+        """
+        handle = self.get(handle_id, user)
+        try:
+            cells = CellMetadata(handle.filename, part_type)
+        except ApertureError as error:
+            raise MaskHandleError(str(error)) from error
+        return cells.cell_ranges(handle.cells)
+
+    def delete(self, handle_id: str, user: str) -> None:
+        """Remove one of a user's handles.
+
+        Args:
+            handle_id (str): Identifier of the handle
+            user (str): User owning the handle
+        """
+        self.get(handle_id, user)
+        self.handle_path(handle_id).unlink(missing_ok=True)
+
+
+@lru_cache
+def get_mask_handle_store() -> MaskHandleStore:
+    """Retrieve the mask handle store.
+
+    Returns
+    -------
+        MaskHandleStore: Store shared by the mask handle routes
+    """
+    settings = get_settings()
+    return MaskHandleStore(
+        settings.mask_handle_dir
+        or Path(tempfile.gettempdir()) / "swift_api_mask_handles",
+        settings.mask_handle_max,
+        settings.mask_handle_ttl,
+    )
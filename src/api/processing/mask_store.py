@@ -0,0 +1,393 @@
+"""Store uploaded masks on the server and refer to them by content hash.
+
+Clients fetching several fields with the same mask upload it once, and then pass
+its identifier with each masked request instead of the mask itself. Masks are
+normalised to merged half-open row ranges of little-endian 64-bit integers, and
+identified by the 20-byte BLAKE2b digest of those bytes, so a client can
+compute the identifier locally and check whether the mask is already stored before
+uploading it. Each user has a quota on the total size of their stored masks, and
+masks expire after a period without use.
+
+Masks are kept in a scratch directory shared by every API worker, as `.npy` files
+named by their identifier, so a mask uploaded by several users is stored once. A
+SQLite index in the same directory records which users stored each mask and when
+they last used it, and is updated in transactions, so quotas hold across workers.
+"""
+import hashlib
+import re
+import sqlite3
+import tempfile
+import time
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+from api.config import get_settings
+from api.processing.data_processing import SWIFTProcessor, SWIFTProcessorError
+
+MASK_DIGEST_SIZE = 20
+MASK_ID_PATTERN = re.compile(rf"^[0-9a-f]{{{2 * MASK_DIGEST_SIZE}}}$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS masks (
+    user TEXT NOT NULL,
+    mask_id TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (user, mask_id)
+)
+"""
+
+
+class MaskStoreError(Exception):
+    """Custom exception for mask store errors."""
+
+
+class MaskNotFoundError(MaskStoreError):
+    """Raised for unknown or expired masks, or masks stored by another user."""
+
+
+class MaskQuotaError(MaskStoreError):
+    """Raised for masks larger than the quota of a user."""
+
+
+def normalise_mask(mask_json: str, data_type: str | None = None) -> npt.NDArray:
+    """Convert a mask to canonical half-open row ranges.
+
+    Ranges are kept in the order given, so the rows of masked arrays are returned
+    in the same order, but empty ranges are dropped and ranges that continue one
+    another are merged.
+
+    Args:
+        mask_json (str): Row ranges as JSON
+        data_type (str | None, optional): Data type of the mask. Defaults to None.
+
+    Raises
+    ------
+        MaskStoreError: For masks that are not a list of valid row ranges.
+
+    Returns
+    -------
+        npt.NDArray: Little-endian int64 ranges with shape (N, 2)
+    """
+    try:
+        mask = SWIFTProcessor.load_ndarray_from_json(mask_json, data_type)
+    except (SWIFTProcessorError, ValueError) as error:
+        raise MaskStoreError(str(error)) from error
+    if mask.size % 2 or not np.all(np.isfinite(mask)) or np.any(mask % 1):
+        message = "A mask must be a list of pairs of integer row numbers."
+        raise MaskStoreError(message)
+
+    ranges = mask.reshape(-1, 2).astype("<i8")
+    if np.any(ranges[:, 0] < 0) or np.any(ranges[:, 1] < ranges[:, 0]):
+        message = "Mask ranges must be non-negative, with each start before its end."
+        raise MaskStoreError(message)
+
+    ranges = ranges[ranges[:, 1] > ranges[:, 0]]
+    if ranges.shape[0] > 1:
+        starts = np.flatnonzero(np.r_[True, ranges[1:, 0] != ranges[:-1, 1]])
+        ends = np.r_[starts[1:], ranges.shape[0]] - 1
+        ranges = np.stack((ranges[starts, 0], ranges[ends, 1]), axis=1)
+    return np.ascontiguousarray(ranges, dtype="<i8")
+
+
+def check_ranges(ranges: npt.NDArray, rows: int, field: str) -> None:
+    """Check that row ranges lie within the field they are applied to.
+
+    Args:
+        ranges (npt.NDArray): Half-open row ranges with shape (N, 2)
+        rows (int): Number of rows in the field
+        field (str): Field path, for error messages
+
+    Raises
+    ------
+        MaskStoreError:
+            For negative ranges, ranges ending before they start, or ranges
+            beyond the end of the field.
+    """
+    if np.any(ranges[:, 0] < 0) or np.any(ranges[:, 1] < ranges[:, 0]):
+        message = "Mask ranges must be non-negative, with each start before its end."
+        raise MaskStoreError(message)
+    if ranges.size and ranges[:, 1].max() > rows:
+        message = f"Mask ranges extend beyond the {rows} rows of {field}."
+        raise MaskStoreError(message)
+
+
+def mask_digest(ranges: npt.NDArray) -> str:
+    """Digest normalised mask ranges into a mask identifier.
+
+    Args:
+        ranges (npt.NDArray): Ranges from `normalise_mask`
+
+    Returns
+    -------
+        str: Hex digest of the ranges
+    """
+    return hashlib.blake2b(
+        np.ascontiguousarray(ranges, dtype="<i8").tobytes(),
+        digest_size=MASK_DIGEST_SIZE,
+    ).hexdigest()
+
+
+class StoredMask:
+    """A normalised mask held on the server."""
+
+    def __init__(self, user: str, ranges: npt.NDArray):
+        """Class constructor.
+
+        Args:
+            user (str): User who uploaded the mask
+            ranges (npt.NDArray): Normalised half-open row ranges
+        """
+        self.user = user
+        self.ranges = ranges
+        self.ranges.setflags(write=False)
+        self.size = int(np.diff(ranges, axis=1).sum())
+
+    def summary(self, mask_id: str) -> dict:
+        """Summarise the stored mask.
+
+        Args:
+            mask_id (str): Identifier of the mask
+
+        Returns
+        -------
+            dict: Identifier, number of rows and ranges, and stored bytes
+        """
+        return {
+            "mask_id": mask_id,
+            "mask_size": self.size,
+            "ranges": int(self.ranges.shape[0]),
+            "bytes": int(self.ranges.nbytes),
+        }
+
+
+class MaskStore:
+    """Uploaded masks, with a per-user quota and expiry."""
+
+    def __init__(self, store_dir: Path, user_bytes: int, ttl: float):
+        """Class constructor.
+
+        Args:
+            store_dir (Path): Scratch directory shared by every API worker
+            user_bytes (int): Maximum total size of the masks stored for each user
+            ttl (float): Seconds a mask is kept after it was last used
+        """
+        self.store_dir = store_dir
+        self.user_bytes = user_bytes
+        self.ttl = ttl
+
+    def mask_path(self, mask_id: str) -> Path:
+        """Retrieve the file holding a mask.
+
+        Args:
+            mask_id (str): Identifier of the mask
+
+        Raises
+        ------
+            MaskNotFoundError: If the identifier is malformed.
+
+        Returns
+        -------
+            Path: Path to the `.npy` file holding the mask ranges
+        """
+        if not MASK_ID_PATTERN.match(mask_id):
+            message = f"Mask {mask_id} not found."
+            raise MaskNotFoundError(message)
+        return self.store_dir / f"{mask_id}.npy"
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # Connections are opened per transaction, so none is shared across a fork
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(
+            self.store_dir / "index.sqlite",
+            timeout=30,
+            isolation_level=None,
+        )
+        try:
+            connection.execute(SCHEMA)
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def _remove(self, connection: sqlite3.Connection, user: str, mask_id: str) -> None:
+        connection.execute(
+            "DELETE FROM masks WHERE user = ? AND mask_id = ?",
+            (user, mask_id),
+        )
+        (users,) = connection.execute(
+            "SELECT COUNT(*) FROM masks WHERE mask_id = ?",
+            (mask_id,),
+        ).fetchone()
+        if not users:
+            self.mask_path(mask_id).unlink(missing_ok=True)
+
+    def _expire(self, connection: sqlite3.Connection) -> None:
+        expired = connection.execute(
+            "SELECT user, mask_id FROM masks WHERE last_used < ?",
+            (time.time() - self.ttl,),
+        ).fetchall()
+        for user, mask_id in expired:
+            self._remove(connection, user, mask_id)
+
+    def _write(self, mask_id: str, ranges: npt.NDArray) -> None:
+        path = self.mask_path(mask_id)
+        if path.is_file():
+            return
+        temporary = path.with_name(f"{mask_id}.{uuid.uuid4().hex}.tmp")
+        with temporary.open("wb") as file:
+            np.save(file, ranges)
+        temporary.replace(path)
+
+    def put(self, user: str, mask_json: str, data_type: str | None = None) -> dict:
+        """Normalise and store a mask, evicting the user's least recently used masks.
+
+        Args:
+            user (str): User uploading the mask
+            mask_json (str): Row ranges as JSON
+            data_type (str | None, optional): Data type of the mask. Defaults to None.
+
+        Raises
+        ------
+            MaskQuotaError: If the mask alone exceeds the quota of a user.
+
+        Returns
+        -------
+            dict: Summary of the stored mask, including its identifier
+        """
+        ranges = normalise_mask(mask_json, data_type)
+        if ranges.nbytes > self.user_bytes:
+            message = (
+                f"Mask of {ranges.nbytes} bytes exceeds the limit of "
+                f"{self.user_bytes} bytes per user."
+            )
+            raise MaskQuotaError(message)
+
+        mask_id = mask_digest(ranges)
+        with self._transaction() as connection:
+            self._expire(connection)
+            stored = connection.execute(
+                "SELECT user, mask_id, bytes FROM masks WHERE user = ? "
+                "ORDER BY last_used",
+                (user,),
+            ).fetchall()
+            used = sum(size for _, _, size in stored)
+            if mask_id not in {stored_id for _, stored_id, _ in stored}:
+                for _, stored_id, size in stored:
+                    if used + ranges.nbytes <= self.user_bytes:
+                        break
+                    self._remove(connection, user, stored_id)
+                    used -= size
+                # Written within the transaction, so no other worker removes it
+                self._write(mask_id, ranges)
+            connection.execute(
+                "INSERT OR REPLACE INTO masks VALUES (?, ?, ?, ?)",
+                (user, mask_id, ranges.nbytes, time.time()),
+            )
+        return StoredMask(user, ranges).summary(mask_id)
+
+    def _get(self, mask_id: str, user: str) -> StoredMask:
+        path = self.mask_path(mask_id)
+        message = f"Mask {mask_id} not found."
+        with self._transaction() as connection:
+            updated = connection.execute(
+                "UPDATE masks SET last_used = ? "
+                "WHERE user = ? AND mask_id = ? AND last_used >= ?",
+                (time.time(), user, mask_id, time.time() - self.ttl),
+            ).rowcount
+        if not updated:
+            raise MaskNotFoundError(message)
+        try:
+            ranges = np.load(path)
+        except (OSError, ValueError) as error:
+            raise MaskNotFoundError(message) from error
+        return StoredMask(user, ranges)
+
+    def get(self, mask_id: str, user: str) -> npt.NDArray:
+        """Retrieve the ranges of one of a user's masks, marking it as used.
+
+        Args:
+            mask_id (str): Identifier of the mask
+            user (str): User requesting the mask
+
+        Raises
+        ------
+            MaskNotFoundError: If the mask is not stored for the user.
+
+        Returns
+        -------
+            npt.NDArray: Read-only half-open row ranges with shape (N, 2)
+        """
+        return self._get(mask_id, user).ranges
+
+    def summary(self, mask_id: str, user: str) -> dict:
+        """Summarise one of a user's masks, marking it as used.
+
+        Args:
+            mask_id (str): Identifier of the mask
+            user (str): User requesting the mask
+
+        Returns
+        -------
+            dict: Identifier, number of rows and ranges, and stored bytes
+        """
+        return self._get(mask_id, user).summary(mask_id)
+
+    def delete(self, mask_id: str, user: str) -> None:
+        """Remove one of a user's masks.
+
+        Args:
+            mask_id (str): Identifier of the mask
+            user (str): User owning the mask
+        """
+        self._get(mask_id, user)
+        with self._transaction() as connection:
+            self._remove(connection, user, mask_id)
+
+    def as_dict(self) -> dict:
+        """Summarise the store contents.
+
+        Returns
+        -------
+            dict: Number of masks and users, and bytes stored
+        """
+        with self._transaction() as connection:
+            self._expire(connection)
+            masks, users, stored = connection.execute(
+                "SELECT COUNT(DISTINCT mask_id), COUNT(DISTINCT user), "
+                "COALESCE(SUM(bytes), 0) FROM masks",
+            ).fetchone()
+        return {
+            "masks": masks,
+            "users": users,
+            "bytes": stored,
+            "user_limit": self.user_bytes,
+        }
+
+
+@lru_cache
+def get_mask_store() -> MaskStore:
+    """Retrieve the mask store.
+
+    Returns
+    -------
+        MaskStore: Store shared by the mask routes
+    """
+    settings = get_settings()
+    return MaskStore(
+        settings.mask_store_dir or Path(tempfile.gettempdir()) / "swift_api_masks",
+        settings.mask_store_user_bytes,
+        settings.mask_store_ttl,
+    )
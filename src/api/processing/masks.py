@@ -1,10 +1,33 @@
 """Handle mask objects on the server side and return to clients."""
+import io
 from pathlib import Path
 
-import cloudpickle
-import swiftsimio as sw
+import numpy as np
 
+from api.lazy import lazy_import
 from api.processing.data_processing import SWIFTProcessor
+from api.processing.result_cache import stamped_lru_cache
+from api.processing.shared_blobs import shared_blob
+
+cloudpickle = lazy_import("cloudpickle")
+sw = lazy_import("swiftsimio")
+
+
+@stamped_lru_cache(maxsize=32)
+def load_mask(filename: Path) -> "sw.SWIFTMask":
+    """Load a SWIFTMask, including the cell metadata, for a file.
+
+    The mask is cached and shared between requests, so it must not be
+    constrained in place.
+
+    Args:
+        filename (Path): Path to file on disk
+
+    Returns
+    -------
+        sw.SWIFTMask: Unconstrained mask for the file
+    """
+    return sw.mask(str(filename))
 
 
 def return_mask_boxsize(filename: Path) -> dict[str, str]:
@@ -17,7 +40,7 @@ def return_mask_boxsize(filename: Path) -> dict[str, str]:
     -------
         dict[str, str]: Dictionary containing boxsize array, data type and unyt units.
     """
-    mask = sw.mask(str(filename.resolve()))
+    mask = load_mask(filename)
     boxsize = mask.metadata.boxsize
 
     payload = SWIFTProcessor.generate_dict_from_ndarray(boxsize)
@@ -25,6 +48,8 @@ def return_mask_boxsize(filename: Path) -> dict[str, str]:
     return payload
 
 
+@shared_blob("mask")
+@stamped_lru_cache(maxsize=32)
 def return_mask(filename: Path) -> bytes:
     """Retrieve the boxsize object from an object mask.
 
@@ -35,6 +60,65 @@ def return_mask(filename: Path) -> bytes:
     -------
         bytes: Pickled SWIFTMask object.
     """
-    mask = sw.mask(str(filename.resolve()))
+    return cloudpickle.dumps(load_mask(filename))
+
+
+@stamped_lru_cache(maxsize=32)
+def encode_cell_metadata(
+    filename: Path,
+    part_types: tuple[str, ...] | None = None,
+) -> bytes:
+    """Encode the cell metadata of a file as a compressed NPZ archive.
+
+    The archive holds `centres`, `cell_size` and `boxsize` in the length units given
+    by `units`, the `part_types` it covers, and `<part type>_offsets` and
+    `<part type>_counts` for each, e.g. `PartType0_offsets`. Members of an NPZ
+    archive are read on access, so clients only load the particle types they use.
+    Unlike the pickled mask, it does not depend on the server's library versions.
+
+    Args:
+        filename (Path): Path to file on disk
+        part_types (tuple[str, ...] | None, optional):
+            Particle types to include, e.g. ("PartType0",). Defaults to None,
+            meaning every particle type present.
+
+    Raises
+    ------
+        KeyError: If a requested particle type is not present in the file.
+
+    Returns
+    -------
+        bytes: NPZ archive of the cell metadata
+    """
+    mask = load_mask(filename)
+    metadata = mask.metadata
+    present = {
+        f"PartType{index}": name
+        for index, name in zip(
+            metadata.present_particle_types,
+            metadata.present_particle_names,
+            strict=True,
+        )
+    }
+    if part_types is None:
+        part_types = tuple(present)
+    missing = [part_type for part_type in part_types if part_type not in present]
+    if missing:
+        message = f"Particle types {missing} not present in {filename}."
+        raise KeyError(message)
+
+    units = mask.centers.units
+    arrays = {
+        "units": np.array(str(units)),
+        "part_types": np.array(part_types, dtype=str),
+        "centres": mask.centers.to(units).value,
+        "cell_size": mask.cell_size.to(units).value,
+        "boxsize": metadata.boxsize.to(units).value,
+    }
+    for part_type in part_types:
+        arrays[f"{part_type}_offsets"] = mask.offsets[present[part_type]]
+        arrays[f"{part_type}_counts"] = mask.counts[present[part_type]]
 
-    return cloudpickle.dumps(mask)
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
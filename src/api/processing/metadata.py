@@ -1,21 +1,22 @@
 """Perform server side metadata processing."""
 import json
+from collections.abc import Callable
 from datetime import datetime
 from functools import lru_cache
 from typing import Any
 
-import cloudpickle
 import numpy as np
-from swiftsimio.reader import (
-    MassTable,
-    SWIFTMetadata,
-    SWIFTParticleTypeMetadata,
-    SWIFTUnits,
-)
-from unyt import unyt_quantity
+import orjson
 
+from api.lazy import lazy_import
+from api.processing.result_cache import stamped_lru_cache
+from api.processing.shared_blobs import shared_blob
 from api.processing.units import RemoteSWIFTUnits
 
+cloudpickle = lazy_import("cloudpickle")
+reader = lazy_import("swiftsimio.reader")
+unyt = lazy_import("unyt")
+
 
 class RemoteSWIFTMetadataError(Exception):
     """Custom error class for metadata serialisation."""
@@ -32,7 +33,7 @@ class SWIFTMetadataEncoder(json.JSONEncoder):
         Returns:
             Any: Serialised object
         """
-        if isinstance(obj, unyt_quantity):
+        if isinstance(obj, unyt.unyt_quantity):
             return obj.to_string()
         if isinstance(obj, np.ndarray):
             return obj.tolist()
@@ -40,9 +41,9 @@ class SWIFTMetadataEncoder(json.JSONEncoder):
             return obj.decode("UTF-8")
         if isinstance(obj, RemoteSWIFTUnits):
             return repr(obj.__dict__)
-        if isinstance(obj, MassTable):
+        if isinstance(obj, reader.MassTable):
             return repr(obj)
-        if isinstance(obj, SWIFTParticleTypeMetadata):
+        if isinstance(obj, reader.SWIFTParticleTypeMetadata):
             return repr(obj)
         if isinstance(obj, np.int32):
             return int(obj)
@@ -54,7 +55,10 @@ class SWIFTMetadataEncoder(json.JSONEncoder):
 
 
 @lru_cache(maxsize=128)
-def create_swift_metadata(filename: str, units: RemoteSWIFTUnits | SWIFTUnits) -> bytes:
+def create_swift_metadata(
+    filename: str,
+    units: "RemoteSWIFTUnits | reader.SWIFTUnits",
+) -> bytes:
     """Return a SWIFTMetadata object, serialised with pickle.
 
     Args:
@@ -69,7 +73,7 @@ def create_swift_metadata(filename: str, units: RemoteSWIFTUnits | SWIFTUnits) -
     -------
         bytes: Pickled SWIFTMetadata object
     """
-    metadata = SWIFTMetadata(filename, units)
+    metadata = reader.SWIFTMetadata(filename, units)
     if hasattr(metadata.units, "_handle"):
         metadata.units._handle = None  # do not serialize file handle
 
@@ -81,6 +85,25 @@ def create_swift_metadata(filename: str, units: RemoteSWIFTUnits | SWIFTUnits) -
         raise RemoteSWIFTMetadataError(message) from error
 
 
+@shared_blob("metadata")
+@stamped_lru_cache(maxsize=128)
+def serialise_swift_metadata(filename: str) -> bytes:
+    """Return the pickled SWIFTMetadata for a file, using the units stored in it.
+
+    Cached per file and its modification time and size, unlike
+    `create_swift_metadata` which is keyed on a units object that is usually
+    created afresh for each request.
+
+    Args:
+        filename (str): File path of specified HDF5 file
+
+    Returns
+    -------
+        bytes: Pickled SWIFTMetadata object
+    """
+    return create_swift_metadata(filename, reader.SWIFTUnits(filename))
+
+
 def reprocess_json(metadata_dictionary: dict, encoder: type[json.JSONEncoder]):
     """Encode and decode a dictionary to JSON to ensure correct formatting.
 
@@ -107,7 +130,7 @@ def create_swift_metadata_dict(filename: str, units: RemoteSWIFTUnits) -> dict:
     -------
         dict: Dictionary containg metadata.
     """
-    metadata = SWIFTMetadata(filename, units)
+    metadata = reader.SWIFTMetadata(filename, units)
 
     metadata_dict = metadata.__dict__
 
@@ -116,3 +139,187 @@ def create_swift_metadata_dict(filename: str, units: RemoteSWIFTUnits) -> dict:
     except TypeError as type_error:
         message = f"Error serialising JSON: {type_error}"
         raise RemoteSWIFTMetadataError(message) from type_error
+
+
+HEADER_ATTRIBUTES = (
+    "header",
+    "boxsize",
+    "num_part",
+    "mass_table",
+    "initial_mass_table",
+    "run_name",
+    "select_output",
+    "output_type",
+    "system_name",
+    "snapshot_date",
+    "time",
+    "dimension",
+    "redshift",
+    "scale_factor",
+    "gas_gamma",
+)
+
+SCHEME_ATTRIBUTES = (
+    "code",
+    "gravity_scheme",
+    "hydro_scheme",
+    "stars_scheme",
+    "subgrid_scheme",
+    "internal_code_units",
+    "policy",
+    "parameters",
+    "runtime_pars",
+    "unused_parameters",
+)
+
+
+def _select_attributes(
+    metadata: "reader.SWIFTMetadata",
+    attributes: tuple[str, ...],
+) -> dict:
+    return {name: getattr(metadata, name, None) for name in attributes}
+
+
+def _header_section(metadata: "reader.SWIFTMetadata") -> dict:
+    section = _select_attributes(metadata, HEADER_ATTRIBUTES)
+    section.update(
+        {
+            name: value
+            for name, value in metadata.__dict__.items()
+            if name.startswith("n_")
+        },
+    )
+    return section
+
+
+def _cosmology_section(metadata: "reader.SWIFTMetadata") -> dict:
+    return {
+        "cosmology": metadata.cosmology_raw,
+        "redshift": metadata.redshift,
+        "scale_factor": metadata.scale_factor,
+    }
+
+
+def _particle_types_section(metadata: "reader.SWIFTMetadata") -> dict:
+    section = {}
+    for name in metadata.present_particle_names:
+        properties = getattr(metadata, f"{name}_properties")
+        section[name] = {
+            "particle_type": properties.particle_type,
+            "field_names": properties.field_names,
+            "field_paths": properties.field_paths,
+            "field_units": [
+                None if unit is None else str(unit.units)
+                for unit in properties.field_units
+            ],
+            "field_descriptions": properties.field_descriptions,
+            "field_compressions": properties.field_compressions,
+            "named_columns": properties.named_columns,
+        }
+    return section
+
+
+METADATA_SECTIONS: dict[str, Callable[["reader.SWIFTMetadata"], Any]] = {
+    "header": _header_section,
+    "cosmology": _cosmology_section,
+    "named_columns": lambda metadata: metadata.named_columns,
+    "units": lambda metadata: dict(metadata.units.__dict__),
+    "schemes": lambda metadata: _select_attributes(metadata, SCHEME_ATTRIBUTES),
+    "particle_types": _particle_types_section,
+}
+
+
+def encode_metadata_value(obj) -> Any:
+    """Convert values orjson cannot serialise natively.
+
+    Used as the `default` argument to `orjson.dumps`. Conversions match
+    `SWIFTMetadataEncoder`.
+
+    Args:
+        obj (_type_): Object to serialise
+
+    Raises
+    ------
+        TypeError: If the object cannot be serialised.
+
+    Returns
+    -------
+        Any: Serialisable representation of the object
+    """
+    if isinstance(obj, unyt.unyt_quantity):
+        return obj.to_string()
+    if isinstance(obj, unyt.unyt_array):
+        return obj.value.tolist()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.bytes_ | bytes):
+        return obj.decode("UTF-8")
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, RemoteSWIFTUnits):
+        return repr(obj.__dict__)
+    if isinstance(obj, reader.MassTable | reader.SWIFTParticleTypeMetadata):
+        return repr(obj)
+    message = f"Type is not JSON serializable: {type(obj).__name__}"
+    raise TypeError(message)
+
+
+@stamped_lru_cache(maxsize=32)
+def load_swift_metadata(filename: str) -> "reader.SWIFTMetadata":
+    """Load and cache a SWIFTMetadata object using the units stored in the file.
+
+    Args:
+        filename (str): File path of specified HDF5 file
+
+    Returns
+    -------
+        SWIFTMetadata: Metadata for the file
+    """
+    return reader.SWIFTMetadata(filename, reader.SWIFTUnits(filename))
+
+
+@stamped_lru_cache(maxsize=256)
+def create_swift_metadata_json(
+    filename: str,
+    sections: tuple[str, ...] | None = None,
+) -> bytes:
+    """Serialise selected sections of a file's metadata to JSON bytes.
+
+    The metadata is encoded once, directly to bytes, and the result is cached until
+    the file changes.
+
+    Args:
+        filename (str): File path of specified HDF5 file
+        sections (tuple[str, ...] | None, optional):
+            Names of sections in METADATA_SECTIONS to include. Defaults to None,
+            which includes every section.
+
+    Raises
+    ------
+        RemoteSWIFTMetadataError: Raised for unknown sections or failed serialisation.
+
+    Returns
+    -------
+        bytes: JSON object mapping section names to their contents
+    """
+    if sections is None:
+        sections = tuple(METADATA_SECTIONS)
+    unknown = [section for section in sections if section not in METADATA_SECTIONS]
+    if unknown:
+        message = (
+            f"Unknown metadata sections {unknown}. "
+            f"Available sections are {list(METADATA_SECTIONS)}."
+        )
+        raise RemoteSWIFTMetadataError(message)
+
+    metadata = load_swift_metadata(filename)
+
+    try:
+        return orjson.dumps(
+            {section: METADATA_SECTIONS[section](metadata) for section in sections},
+            default=encode_metadata_value,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
+    except TypeError as type_error:
+        message = f"Error serialising JSON: {type_error}"
+        raise RemoteSWIFTMetadataError(message) from type_error
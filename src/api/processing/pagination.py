@@ -0,0 +1,276 @@
+"""Split large dataset responses into pages resumed with opaque cursors.
+
+Clients behind proxies that limit response sizes, or retrying after a dropped
+connection, request a field a page at a time. Each page holds as many rows as fit
+in the requested number of bytes of array data, and the response carries a cursor
+for the next page. Cursors are stateless: they record the position within the
+selected rows, the modification time and size of the file and a digest of the
+request, so any worker can resume exactly where the previous page ended without
+reading earlier rows again. Cursors from a file that has since changed, or from a
+different request, are rejected.
+"""
+import base64
+import binascii
+from contextlib import nullcontext
+
+import numpy as np
+import numpy.typing as npt
+import orjson
+
+from api.lazy import lazy_import
+from api.processing.data_processing import SWIFTProcessor, SWIFTProcessorError
+from api.processing.distributed import part_type_index
+from api.processing.mask_store import MaskStoreError, check_ranges
+from api.processing.result_cache import source_stamp
+
+h5py = lazy_import("h5py")
+
+
+class PaginationError(Exception):
+    """Custom exception for pagination errors."""
+
+
+class StaleCursorError(PaginationError):
+    """Raised for cursors issued before the file was modified."""
+
+
+class Page:
+    """The rows of one page of a paginated response."""
+
+    def __init__(
+        self,
+        ranges: npt.NDArray,
+        offset: int,
+        rows: int,
+        total_rows: int,
+        next_cursor: str | None,
+    ):
+        """Class constructor.
+
+        Args:
+            ranges (npt.NDArray): Half-open file row ranges read for the page
+            offset (int): Position of the first row of the page within the selection
+            rows (int): Number of rows in the page
+            total_rows (int): Number of rows in the selection
+            next_cursor (str | None): Cursor for the next page, or None for the last
+        """
+        self.ranges = ranges
+        self.offset = offset
+        self.rows = rows
+        self.total_rows = total_rows
+        self.next_cursor = next_cursor
+
+    def as_dict(self) -> dict:
+        """Summarise the page for the response.
+
+        Returns
+        -------
+            dict: Offset, rows and total rows of the page, and the next cursor
+        """
+        return {
+            "offset": self.offset,
+            "rows": self.rows,
+            "total_rows": self.total_rows,
+            "next_cursor": self.next_cursor,
+        }
+
+
+def encode_cursor(offset: int, stamp: tuple[int, int], request: str) -> str:
+    """Encode the position of the next page as an opaque cursor.
+
+    Args:
+        offset (int): Position of the next row within the selection
+        stamp (tuple[int, int]): Modification time and size of the file
+        request (str): Digest of the request, without pagination parameters
+
+    Returns
+    -------
+        str: URL-safe cursor
+    """
+    content = orjson.dumps(
+        {"offset": offset, "mtime_ns": stamp[0], "size": stamp[1], "request": request},
+    )
+    return base64.urlsafe_b64encode(content).decode("ascii")
+
+
+def decode_cursor(cursor: str, stamp: tuple[int, int], request: str) -> int:
+    """Decode a cursor, checking that it belongs to the request and file.
+
+    Args:
+        cursor (str): Cursor from a previous page
+        stamp (tuple[int, int]): Current modification time and size of the file
+        request (str): Digest of the request, without pagination parameters
+
+    Raises
+    ------
+        PaginationError: For malformed cursors, or cursors from another request.
+        StaleCursorError: If the file changed after the cursor was issued.
+
+    Returns
+    -------
+        int: Position of the next row within the selection
+    """
+    try:
+        content = orjson.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        offset = int(content["offset"])
+        issued = (int(content["mtime_ns"]), int(content["size"]))
+        issued_request = str(content["request"])
+    except (binascii.Error, ValueError, KeyError, TypeError) as error:
+        message = "Malformed pagination cursor."
+        raise PaginationError(message) from error
+
+    if issued_request != request:
+        message = "The pagination cursor was issued for a different request."
+        raise PaginationError(message)
+    if issued != stamp:
+        message = "The file has changed since the pagination cursor was issued."
+        raise StaleCursorError(message)
+    return offset
+
+
+def check_columns(field: str, shape: tuple[int, ...], columns: int) -> None:
+    """Check that a column selector picks one of the columns of a field.
+
+    Args:
+        field (str): Raw field path
+        shape (tuple[int, ...]): Shape of the field
+        columns (int): Column selector
+
+    Raises
+    ------
+        PaginationError: If the field has no columns, or not that many.
+    """
+    if len(shape) == 1:
+        message = f"Field {field} has no columns to select."
+        raise PaginationError(message)
+    if not 0 <= columns < shape[1]:
+        message = f"Column {columns} is outside the {shape[1]} columns of {field}."
+        raise PaginationError(message)
+
+
+def field_rows(
+    filename: str,
+    field: str,
+    columns: int | None = None,
+    handle: "h5py.File | None" = None,
+) -> tuple[int, int]:
+    """Find the number of rows in a field and the bytes each row occupies.
+
+    Derived fields are sized by the coordinates of their particle type. A column
+    selector must pick one of the columns of a raw field.
+
+    Args:
+        filename (str): Path to HDF5 file
+        field (str): Raw or derived field path
+        columns (int | None, optional): Column selector. Defaults to None.
+        handle (h5py.File | None, optional):
+            The file, already open for reading. Defaults to None.
+
+    Raises
+    ------
+        PaginationError: For unknown fields, or columns outside a raw field.
+
+    Returns
+    -------
+        tuple[int, int]: Number of rows, and bytes in each row
+    """
+    try:
+        derived = SWIFTProcessor.is_derived_field(field)
+        source = f"PartType{part_type_index(field)}/Coordinates" if derived else field
+        opened = nullcontext(handle) if handle is not None else h5py.File(filename, "r")
+        with opened as snapshot:
+            dataset = snapshot[source]
+            if columns is not None and not derived:
+                check_columns(field, dataset.shape, columns)
+            row_size = 1 if columns is not None else int(np.prod(dataset.shape[1:]))
+            return int(dataset.shape[0]), dataset.dtype.itemsize * row_size
+    except (KeyError, SWIFTProcessorError) as error:
+        message = f"Field {field} not found in {filename}."
+        raise PaginationError(message) from error
+
+
+def select_rows(ranges: npt.NDArray, offset: int, rows: int) -> npt.NDArray:
+    """Select a run of rows from a set of row ranges.
+
+    Args:
+        ranges (npt.NDArray): Half-open row ranges with shape (N, 2)
+        offset (int): Position of the first row to select within the ranges
+        rows (int): Number of rows to select
+
+    Returns
+    -------
+        npt.NDArray: Half-open row ranges holding the selected rows
+    """
+    ranges = np.asarray(ranges, dtype=np.int64).reshape(-1, 2)
+    ranges = ranges[ranges[:, 1] > ranges[:, 0]]
+    if not rows:
+        return ranges[:0]
+    ends = np.cumsum(ranges[:, 1] - ranges[:, 0])
+    starts = ends - (ranges[:, 1] - ranges[:, 0])
+
+    first = int(np.searchsorted(ends, offset, side="right"))
+    last = int(np.searchsorted(starts, offset + rows, side="left"))
+    selected = ranges[first:last].copy()
+    if len(selected):
+        selected[0, 0] += offset - starts[first]
+        selected[-1, 1] -= ends[last - 1] - (offset + rows)
+    return selected
+
+
+def plan_page(
+    filename: str,
+    field: str,
+    ranges: npt.NDArray | None,
+    page_bytes: int,
+    request: str,
+    cursor: str | None = None,
+    columns: int | None = None,
+) -> Page:
+    """Work out which rows to read for a page.
+
+    Args:
+        filename (str): Path to HDF5 file
+        field (str): Raw or derived field path
+        ranges (npt.NDArray | None): Half-open row ranges of a mask, or None for all rows
+        page_bytes (int): Maximum bytes of array data in the page
+        request (str): Digest of the request, without pagination parameters
+        cursor (str | None, optional):
+            Cursor from the previous page. Defaults to None, for the first page.
+        columns (int | None, optional): Column selector. Defaults to None.
+
+    Raises
+    ------
+        PaginationError: For unknown fields, ranges outside the field, or invalid cursors.
+
+    Returns
+    -------
+        Page: Rows to read, and the cursor of the following page
+    """
+    field_length, row_bytes = field_rows(filename, field, columns)
+    if ranges is None:
+        ranges = np.array([[0, field_length]], dtype=np.int64)
+    ranges = np.asarray(ranges, dtype=np.int64).reshape(-1, 2)
+    try:
+        check_ranges(ranges, field_length, field)
+    except MaskStoreError as error:
+        raise PaginationError(str(error)) from error
+    total_rows = int(np.diff(ranges, axis=1).sum())
+
+    try:
+        stamp = source_stamp(filename)
+    except OSError as error:
+        raise PaginationError(str(error)) from error
+    offset = 0 if cursor is None else decode_cursor(cursor, stamp, request)
+    if not 0 <= offset <= total_rows:
+        message = f"The pagination cursor is outside the {total_rows} selected rows."
+        raise PaginationError(message)
+
+    rows = min(max(page_bytes // max(row_bytes, 1), 1), total_rows - offset)
+    end = offset + rows
+    return Page(
+        select_rows(ranges, offset, rows),
+        offset,
+        rows,
+        total_rows,
+        encode_cursor(end, stamp, request) if end < total_rows else None,
+    )
@@ -0,0 +1,134 @@
+"""Reduce the precision of floating point arrays before they are sent.
+
+Visualisation and quick-look work rarely needs every bit of a float64 coordinate
+or float32 density. Clients can opt in to a lower precision, given as a target
+data type, e.g. "float32" or "float16", optionally followed by the number of
+mantissa bits to keep, e.g. "float32:10". Arrays are never cast to a wider type.
+Dropped mantissa bits are set to zero, truncating towards zero, which bounds the
+relative error by 2**-bits and leaves long runs of zero bits for compression to
+remove. Arrays are converted in blocks, and the largest relative error introduced
+is reported alongside the array.
+"""
+import numpy as np
+import numpy.typing as npt
+
+PRECISION_DTYPES = {
+    "float64": np.dtype(np.float64),
+    "float32": np.dtype(np.float32),
+    "float16": np.dtype(np.float16),
+}
+
+
+class PrecisionError(Exception):
+    """Custom exception for precision reduction errors."""
+
+
+def parse_precision(precision: str) -> tuple[np.dtype, int]:
+    """Parse a requested precision.
+
+    Args:
+        precision (str): Data type name, optionally followed by ":" and mantissa bits
+
+    Raises
+    ------
+        PrecisionError: For unknown data types, or invalid numbers of bits.
+
+    Returns
+    -------
+        tuple[np.dtype, int]: Target data type and number of mantissa bits to keep
+    """
+    name, _, bits = precision.partition(":")
+    if name not in PRECISION_DTYPES:
+        message = (
+            f"Unknown precision {precision}. Use one of {', '.join(PRECISION_DTYPES)}, "
+            "optionally followed by ':' and the number of mantissa bits to keep."
+        )
+        raise PrecisionError(message)
+
+    dtype = PRECISION_DTYPES[name]
+    mantissa = np.finfo(dtype).nmant
+    if not bits:
+        return dtype, mantissa
+    if not bits.isdigit() or not 1 <= int(bits) <= mantissa:
+        message = f"{name} keeps between 1 and {mantissa} mantissa bits, not {bits}."
+        raise PrecisionError(message)
+    return dtype, int(bits)
+
+
+def truncate_mantissa(array: npt.NDArray, bits: int) -> npt.NDArray:
+    """Zero the low mantissa bits of a floating point array, in place.
+
+    Args:
+        array (npt.NDArray): Native byte order floating point array
+        bits (int): Number of mantissa bits to keep
+
+    Returns
+    -------
+        npt.NDArray: The same array, truncated
+    """
+    dropped = np.finfo(array.dtype).nmant - bits
+    if dropped > 0:
+        integers = array.view(f"u{array.dtype.itemsize}")
+        integers &= ~integers.dtype.type((1 << dropped) - 1)
+    return array
+
+
+def reduce_precision(
+    array: npt.NDArray,
+    precision: str,
+    block_size: int,
+) -> tuple[npt.NDArray, dict]:
+    """Convert an array to a lower precision, block by block.
+
+    Arrays that are not floating point are returned unchanged.
+
+    Args:
+        array (npt.NDArray): Array read from a snapshot
+        precision (str): Requested precision, see `parse_precision`
+        block_size (int): Maximum number of rows converted at once
+
+    Raises
+    ------
+        PrecisionError: For invalid precisions, or values outside the target range.
+
+    Returns
+    -------
+        tuple[npt.NDArray, dict]:
+            Converted array in native byte order, and the applied data type, mantissa
+            bits and maximum relative error
+    """
+    dtype, bits = parse_precision(precision)
+    if not np.issubdtype(array.dtype, np.floating):
+        return array, {
+            "dtype": array.dtype.str,
+            "mantissa_bits": None,
+            "max_relative_error": 0.0,
+        }
+
+    source = array.dtype.newbyteorder("=")
+    if dtype.itemsize >= source.itemsize:
+        dtype = source
+    bits = min(bits, np.finfo(dtype).nmant)
+
+    output = np.empty(array.shape, dtype=dtype)
+    max_error = 0.0
+    for start in range(0, array.shape[0], block_size):
+        block = array[start : start + block_size]
+        with np.errstate(over="ignore"):
+            reduced = truncate_mantissa(block.astype(dtype), bits)
+
+        original = block.astype(np.float64)
+        finite = np.isfinite(original)
+        if np.any(finite & ~np.isfinite(reduced)):
+            message = f"Values exceed the range of {dtype.name}."
+            raise PrecisionError(message)
+        nonzero = finite & (original != 0)
+        error = np.abs(reduced[nonzero] - original[nonzero]) / np.abs(original[nonzero])
+        max_error = max(max_error, float(error.max(initial=0.0)))
+        output[start : start + block_size] = reduced
+
+    return output, {
+        "dtype": dtype.str,
+        "mantissa_bits": int(bits),
+        "max_relative_error": max_error,
+    }
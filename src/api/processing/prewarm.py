@@ -0,0 +1,207 @@
+"""Pre-warm per-file caches for frequently requested snapshots.
+
+Building `SWIFTMetadata`, `SWIFTUnits` and the cell metadata held by `sw.mask`,
+and serialising them, is expensive the first time a snapshot is requested by a
+worker. Loading a configured list of snapshots in the background at startup moves
+that cost out of the request path without delaying readiness.
+"""
+import time
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock, Thread
+
+from loguru import logger
+
+from api.processing.catalogue import SnapshotCatalogue
+from api.processing.masks import return_mask
+from api.processing.metadata import serialise_swift_metadata
+from api.processing.units import create_swift_units
+
+
+class WarmupProgress:
+    """Thread-safe record of warm-up progress, reported by the readiness route."""
+
+    def __init__(self):
+        """Class constructor."""
+        self._lock = Lock()
+        self.targets: list[str] = []
+        self.completed: list[str] = []
+        self.failed: dict[str, str] = {}
+        self.current: str | None = None
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+    def start(self, targets: list[str]) -> None:
+        """Mark the start of a warm-up run.
+
+        Args:
+            targets (list[str]): Aliases or paths to warm up
+        """
+        with self._lock:
+            self.targets = list(targets)
+            self.completed = []
+            self.failed = {}
+            self.current = None
+            self.started_at = time.time()
+            self.finished_at = None
+
+    def begin(self, target: str) -> None:
+        """Record that a target is being warmed up.
+
+        Args:
+            target (str): Alias or path
+        """
+        with self._lock:
+            self.current = target
+
+    def complete(self, target: str, error: str | None = None) -> None:
+        """Record that a target has been warmed up, or failed to.
+
+        Args:
+            target (str): Alias or path
+            error (str | None, optional): Failure description. Defaults to None.
+        """
+        with self._lock:
+            if error is None:
+                self.completed.append(target)
+            else:
+                self.failed[target] = error
+            self.current = None
+
+    def finish(self) -> None:
+        """Mark the end of a warm-up run."""
+        with self._lock:
+            self.finished_at = time.time()
+
+    def as_dict(self) -> dict:
+        """Summarise warm-up progress.
+
+        Returns
+        -------
+            dict: Counts of targets, completed and failed snapshots and timings
+        """
+        with self._lock:
+            if self.started_at is None:
+                state = "idle"
+            elif self.finished_at is None:
+                state = "running"
+            else:
+                state = "complete"
+            done = len(self.completed) + len(self.failed)
+            return {
+                "state": state,
+                "total": len(self.targets),
+                "completed": len(self.completed),
+                "failed": dict(self.failed),
+                "current": self.current,
+                "progress": done / len(self.targets) if self.targets else 1.0,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+@lru_cache
+def get_warmup_progress() -> WarmupProgress:
+    """Retrieve the warm-up progress for this worker.
+
+    Returns
+    -------
+        WarmupProgress: Warm-up progress shared with the readiness route
+    """
+    return WarmupProgress()
+
+
+def resolve_target(target: str, catalogue: SnapshotCatalogue) -> str:
+    """Resolve an alias or path to a snapshot path.
+
+    Aliases not yet in the catalogue trigger a single catalogue refresh, as the
+    initial scan may still be running when warm-up starts.
+
+    Args:
+        target (str): Snapshot alias or path
+        catalogue (SnapshotCatalogue): Snapshot catalogue
+
+    Raises
+    ------
+        FileNotFoundError: If the target is neither a known alias nor an existing file.
+
+    Returns
+    -------
+        str: Resolved path to the snapshot
+    """
+    filename = catalogue.get(target)
+    if filename is None and not Path(target).exists():
+        catalogue.refresh()
+        filename = catalogue.get(target)
+    if filename is not None:
+        return filename
+    if Path(target).exists():
+        return str(Path(target).resolve())
+    message = f"No snapshot found for {target}"
+    raise FileNotFoundError(message)
+
+
+def warm_snapshot(filename: str) -> None:
+    """Populate the units, metadata and mask caches for a snapshot.
+
+    Args:
+        filename (str): Resolved path to the snapshot
+    """
+    create_swift_units(Path(filename))
+    serialise_swift_metadata(filename)
+    return_mask(Path(filename))
+
+
+def prewarm_snapshots(
+    targets: list[str],
+    catalogue: SnapshotCatalogue,
+    progress: WarmupProgress,
+) -> None:
+    """Warm up a list of snapshots in turn, recording progress.
+
+    Failures are logged and recorded but do not stop the remaining targets.
+
+    Args:
+        targets (list[str]): Snapshot aliases or paths
+        catalogue (SnapshotCatalogue): Snapshot catalogue used to resolve aliases
+        progress (WarmupProgress): Progress record to update
+    """
+    progress.start(targets)
+    for target in targets:
+        progress.begin(target)
+        start = time.perf_counter()
+        try:
+            warm_snapshot(resolve_target(target, catalogue))
+        except Exception as error:  # noqa: BLE001
+            logger.warning(f"Failed to warm up {target}: {error!r}")
+            progress.complete(target, error=repr(error))
+            continue
+        logger.info(f"Warmed up {target} in {time.perf_counter() - start:.2f}s")
+        progress.complete(target)
+    progress.finish()
+
+
+def start_prewarm(
+    targets: list[str],
+    catalogue: SnapshotCatalogue,
+    progress: WarmupProgress,
+) -> Thread:
+    """Warm up snapshots in a background thread.
+
+    Args:
+        targets (list[str]): Snapshot aliases or paths
+        catalogue (SnapshotCatalogue): Snapshot catalogue used to resolve aliases
+        progress (WarmupProgress): Progress record to update
+
+    Returns
+    -------
+        Thread: The started warm-up thread
+    """
+    thread = Thread(
+        target=prewarm_snapshots,
+        args=(targets, catalogue, progress),
+        name="snapshot-prewarm",
+        daemon=True,
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,400 @@
+"""Cache serialised responses to repeated data requests.
+
+Notebooks that are re-run request the same arrays again and again. Serialised
+responses are kept in memory, least recently used first out, up to a total number
+of bytes. Entries pushed out of memory are spilled to a local scratch directory
+with its own limit, if one is configured. Each worker indexes only the entries it
+spilled itself, so it spills into its own subdirectory, removed when it shuts down
+and by the next worker to start if it does not. Each entry records the modification
+time and size of its source file, and is discarded once either changes.
+"""
+import functools
+import hashlib
+import os
+import shutil
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock
+from typing import BinaryIO
+
+from loguru import logger
+
+from api.config import get_settings
+
+
+class CacheEntry:
+    """A cached response and the state of its source file when it was created."""
+
+    def __init__(self, source: str, stamp: tuple[int, int], size: int):
+        """Class constructor.
+
+        Args:
+            source (str): Path to the file the response was read from
+            stamp (tuple[int, int]): Modification time and size of the source file
+            size (int): Size of the response in bytes
+        """
+        self.source = source
+        self.stamp = stamp
+        self.size = size
+
+
+def source_stamp(source: str) -> tuple[int, int]:
+    """Retrieve the modification time and size of a file.
+
+    Args:
+        source (str): Path to the file
+
+    Returns
+    -------
+        tuple[int, int]: Modification time in nanoseconds and size in bytes
+    """
+    status = Path(source).stat()
+    return status.st_mtime_ns, status.st_size
+
+
+def stamped_lru_cache(maxsize: int = 128) -> Callable[[Callable], Callable]:
+    """Cache a per-file function on the path, modification time and size of the file.
+
+    Like `functools.lru_cache`, but a file replaced on disk under the same path is
+    read afresh instead of being served from the cache. The decorated function
+    takes the path to the file as its first argument.
+
+    Args:
+        maxsize (int, optional): Maximum number of cached results. Defaults to 128.
+
+    Returns
+    -------
+        Callable[[Callable], Callable]: Decorator
+    """
+
+    def decorate(function: Callable) -> Callable:
+        @lru_cache(maxsize=maxsize)
+        def cached(filename, stamp, *args, **kwargs):  # noqa: ARG001
+            return function(filename, *args, **kwargs)
+
+        @functools.wraps(function)
+        def wrapper(filename, *args, **kwargs):
+            return cached(filename, source_stamp(str(filename)), *args, **kwargs)
+
+        wrapper.cache_clear = cached.cache_clear
+        wrapper.cache_info = cached.cache_info
+        return wrapper
+
+    return decorate
+
+
+def process_alive(pid: int) -> bool:
+    """Check whether a process is running on this host.
+
+    Args:
+        pid (int): Process ID
+
+    Returns
+    -------
+        bool: True if the process exists
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def sweep_spill_dirs(disk_dir: Path) -> int:
+    """Remove the spill directories of workers that are no longer running.
+
+    Args:
+        disk_dir (Path): Scratch directory holding a subdirectory per worker
+
+    Returns
+    -------
+        int: Number of directories removed
+    """
+    removed = 0
+    for path in disk_dir.glob("worker-*"):
+        try:
+            pid = int(path.name.removeprefix("worker-"))
+        except ValueError:
+            continue
+        if not process_alive(pid):
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def cache_key(key: Hashable) -> str:
+    """Digest a normalised request into a cache key.
+
+    Args:
+        key (Hashable): Normalised request, e.g. from `coalescing.request_key`
+
+    Returns
+    -------
+        str: Hex digest of the request
+    """
+    return hashlib.blake2b(repr(key).encode(), digest_size=20).hexdigest()
+
+
+class ResultCache:
+    """Two-level LRU cache of response bytes, in memory and on local disk."""
+
+    def __init__(
+        self,
+        memory_bytes: int,
+        disk_dir: Path | None = None,
+        disk_bytes: int = 0,
+    ):
+        """Class constructor.
+
+        Args:
+            memory_bytes (int): Maximum total size of responses held in memory
+            disk_dir (Path | None, optional):
+                Scratch directory for responses spilled from memory, shared by every
+                worker. Defaults to None, in which case evicted responses are
+                discarded.
+            disk_bytes (int, optional):
+                Maximum total size of responses spilled to disk by this worker.
+                Defaults to 0.
+        """
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes if disk_dir is not None else 0
+        self.spill_dir = None
+        if self.disk_bytes:
+            self.spill_dir = disk_dir / f"worker-{os.getpid()}"
+            disk_dir.mkdir(parents=True, exist_ok=True)
+            removed = sweep_spill_dirs(disk_dir)
+            if removed:
+                logger.info(f"Removed {removed} stale spill directories in {disk_dir}")
+            # A directory with this worker's ID was left by an earlier process
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir.mkdir()
+
+        self._lock = Lock()
+        self._memory: OrderedDict[str, tuple[CacheEntry, bytes]] = OrderedDict()
+        self._disk: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._memory_used = 0
+        self._disk_used = 0
+        self._counts = dict.fromkeys(
+            (
+                "memory_hits",
+                "disk_hits",
+                "misses",
+                "memory_evictions",
+                "disk_evictions",
+                "invalidations",
+            ),
+            0,
+        )
+
+    def _disk_path(self, key: str) -> Path:
+        return self.spill_dir / f"{key}.bin"
+
+    def get(self, key: str) -> bytes | None:
+        """Retrieve a cached response, if still valid.
+
+        Args:
+            key (str): Cache key
+
+        Returns
+        -------
+            bytes | None: Cached response, or None on a miss
+        """
+        with self._lock:
+            if key in self._memory:
+                entry, content = self._memory[key]
+                spilled = False
+            elif key in self._disk:
+                entry, content = self._disk[key], None
+                spilled = True
+            else:
+                self._counts["misses"] += 1
+                return None
+
+        try:
+            valid = source_stamp(entry.source) == entry.stamp
+            if valid and spilled:
+                content = self._disk_path(key).read_bytes()
+        except OSError:
+            valid = False
+
+        with self._lock:
+            if not valid:
+                self._counts["invalidations"] += 1
+                self._counts["misses"] += 1
+                self._discard(key)
+                return None
+            if spilled:
+                self._counts["disk_hits"] += 1
+            else:
+                self._counts["memory_hits"] += 1
+                self._memory.move_to_end(key)
+
+        if spilled:
+            self.put(key, entry.source, content, entry.stamp)
+        return content
+
+    def open_spilled(self, key: str, min_bytes: int = 0) -> BinaryIO | None:
+        """Open a valid response spilled to disk, to send it without reading it.
+
+        Responses opened this way stay on disk rather than moving back to memory.
+
+        Args:
+            key (str): Cache key
+            min_bytes (int, optional):
+                Smallest response to open, smaller ones are left to `get`, which
+                moves them back to memory. Defaults to 0.
+
+        Returns
+        -------
+            BinaryIO | None: Open response file, or None if it is not on disk
+        """
+        with self._lock:
+            entry = None if key in self._memory else self._disk.get(key)
+        if entry is None or entry.size < min_bytes:
+            return None
+
+        try:
+            valid = source_stamp(entry.source) == entry.stamp
+            file = self._disk_path(key).open("rb") if valid else None
+        except OSError:
+            valid, file = False, None
+
+        with self._lock:
+            if not valid:
+                self._counts["invalidations"] += 1
+                self._counts["misses"] += 1
+                self._discard(key)
+                return None
+            self._counts["disk_hits"] += 1
+            if key in self._disk:
+                self._disk.move_to_end(key)
+        return file
+
+    def put(
+        self,
+        key: str,
+        source: str,
+        content: bytes,
+        stamp: tuple[int, int] | None = None,
+    ) -> None:
+        """Cache a response.
+
+        Args:
+            key (str): Cache key
+            source (str): Path to the file the response was read from
+            content (bytes): Serialised response
+            stamp (tuple[int, int] | None, optional):
+                Modification time and size of the source file when the response was
+                read. Defaults to None, in which case the current values are used.
+        """
+        if stamp is None:
+            try:
+                stamp = source_stamp(source)
+            except OSError:
+                return
+        entry = CacheEntry(source, stamp, len(content))
+
+        with self._lock:
+            self._discard(key)
+            if entry.size > self.memory_bytes:
+                spill = [(key, entry, content)]
+            else:
+                self._memory[key] = (entry, content)
+                self._memory_used += entry.size
+                spill = []
+                while self._memory_used > self.memory_bytes:
+                    evicted_key, (evicted, evicted_content) = self._memory.popitem(
+                        last=False,
+                    )
+                    self._memory_used -= evicted.size
+                    self._counts["memory_evictions"] += 1
+                    spill.append((evicted_key, evicted, evicted_content))
+
+        for spilled_key, spilled, spilled_content in spill:
+            self._spill(spilled_key, spilled, spilled_content)
+
+    def _spill(self, key: str, entry: CacheEntry, content: bytes) -> None:
+        if entry.size > self.disk_bytes:
+            return
+
+        path = self._disk_path(key)
+        temporary = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            temporary.write_bytes(content)
+            temporary.replace(path)
+        except OSError as error:
+            logger.warning(f"Could not spill cached response to {path}: {error}")
+            temporary.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            if key in self._memory:
+                return
+            if key in self._disk:
+                self._disk_used -= self._disk.pop(key).size
+            self._disk[key] = entry
+            self._disk_used += entry.size
+            while self._disk_used > self.disk_bytes:
+                evicted_key, evicted = self._disk.popitem(last=False)
+                self._disk_used -= evicted.size
+                self._counts["disk_evictions"] += 1
+                self._disk_path(evicted_key).unlink(missing_ok=True)
+
+    def _discard(self, key: str) -> None:
+        if key in self._memory:
+            entry, _ = self._memory.pop(key)
+            self._memory_used -= entry.size
+        if key in self._disk:
+            self._disk_used -= self._disk.pop(key).size
+            self._disk_path(key).unlink(missing_ok=True)
+
+    def close(self) -> None:
+        """Drop the responses spilled to disk and remove this worker's directory."""
+        with self._lock:
+            self._disk.clear()
+            self._disk_used = 0
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def as_dict(self) -> dict:
+        """Summarise the cache contents and hit rate.
+
+        Returns
+        -------
+            dict: Hit, miss, eviction and invalidation counts, and bytes used
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            lookups = counts["memory_hits"] + counts["disk_hits"] + counts["misses"]
+            hits = counts["memory_hits"] + counts["disk_hits"]
+            return {
+                **counts,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "memory_limit": self.memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_used,
+                "disk_limit": self.disk_bytes,
+            }
+
+
+@lru_cache
+def get_result_cache() -> ResultCache:
+    """Retrieve the response cache for this worker.
+
+    Returns
+    -------
+        ResultCache: Cache shared by the data routes
+    """
+    settings = get_settings()
+    return ResultCache(
+        settings.result_cache_bytes,
+        settings.result_cache_dir,
+        settings.result_cache_disk_bytes,
+    )
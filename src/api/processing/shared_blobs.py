@@ -0,0 +1,244 @@
+"""Hold read-only byte strings where forked workers share them without copying.
+
+Under `gunicorn --preload`, state built in the master is shared copy-on-write
+with the workers it forks, until either writes to the page holding it. Reading a
+Python object writes its reference count, so a cache of many small objects is
+copied page by page into every worker as it is used. `SharedBlobs` instead keeps
+its keys and values in an anonymous shared memory map, found through numpy arrays
+of key hashes and offsets, so lookups touch only a handful of objects however
+many entries it holds.
+"""
+import functools
+import hashlib
+import mmap
+from collections.abc import Callable
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+from api.processing.result_cache import source_stamp
+
+SHARED_FUNCTIONS: dict[str, Callable[..., bytes]] = {}
+
+
+def key_hash(key: str) -> int:
+    """Hash a key to 64 bits.
+
+    Args:
+        key (str): Key of an entry
+
+    Returns
+    -------
+        int: Unsigned 64-bit hash
+    """
+    return int.from_bytes(
+        hashlib.blake2b(key.encode(), digest_size=8).digest(),
+        "little",
+    )
+
+
+def blob_key(kind: str, filename: str | Path) -> str:
+    """Build the key of a per-file blob from the file's path, mtime and size.
+
+    Args:
+        kind (str): Name of the blob, e.g. "metadata"
+        filename (str | Path): Path to the file
+
+    Raises
+    ------
+        OSError: If the file cannot be read.
+
+    Returns
+    -------
+        str: Key of the blob
+    """
+    mtime_ns, size = source_stamp(str(filename))
+    return f"{kind}:{filename}:{mtime_ns}:{size}"
+
+
+class SharedBlobs:
+    """Read-only mapping of strings to byte strings, held outside the Python heap.
+
+    Entries are packed once, before workers fork, and replace any packed before.
+    Values are returned as copies.
+    """
+
+    def __init__(self, items: dict[str, bytes] | None = None):
+        """Class constructor.
+
+        Args:
+            items (dict[str, bytes] | None, optional):
+                Entries to pack. Defaults to None, for an empty mapping.
+        """
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._bounds = np.empty((0, 3), dtype=np.int64)
+        self._buffer: mmap.mmap | None = None
+        if items:
+            self.pack(items)
+
+    def pack(self, items: dict[str, bytes]) -> None:
+        """Replace the entries with a new set, packed into shared memory.
+
+        Not thread-safe: entries are packed before the workers sharing them start.
+
+        Args:
+            items (dict[str, bytes]): Entries to pack
+        """
+        entries = sorted(
+            (key_hash(key), key.encode(), bytes(value)) for key, value in items.items()
+        )
+        buffer = mmap.mmap(-1, max(sum(len(k) + len(v) for _, k, v in entries), 1))
+        bounds = np.empty((len(entries), 3), dtype=np.int64)
+        for index, (_, key, value) in enumerate(entries):
+            start = buffer.tell()
+            buffer.write(key)
+            buffer.write(value)
+            bounds[index] = (start, start + len(key), buffer.tell())
+
+        self._hashes = np.array([hashed for hashed, _, _ in entries], dtype=np.uint64)
+        self._bounds = bounds
+        self._buffer = buffer
+
+    def _find(self, key: str) -> int | None:
+        if self._buffer is None:
+            return None
+        hashed = np.uint64(key_hash(key))
+        encoded = key.encode()
+        index = int(np.searchsorted(self._hashes, hashed))
+        while index < len(self._hashes) and self._hashes[index] == hashed:
+            start, key_end, _ = self._bounds[index]
+            if self._buffer[start:key_end] == encoded:
+                return index
+            index += 1
+        return None
+
+    def get(self, key: str) -> bytes | None:
+        """Retrieve a copy of the value of an entry.
+
+        Args:
+            key (str): Key of the entry
+
+        Returns
+        -------
+            bytes | None: Value of the entry, or None if there is none
+        """
+        index = self._find(key)
+        if index is None:
+            return None
+        _, key_end, end = self._bounds[index]
+        return self._buffer[key_end:end]
+
+    def __contains__(self, key: str) -> bool:
+        """Check whether an entry exists.
+
+        Args:
+            key (str): Key of the entry
+
+        Returns
+        -------
+            bool: True if the entry exists
+        """
+        return self._find(key) is not None
+
+    def __len__(self) -> int:
+        """Count the entries.
+
+        Returns
+        -------
+            int: Number of entries
+        """
+        return len(self._hashes)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of shared memory holding the entries.
+
+        Returns
+        -------
+            int: Size of the memory map
+        """
+        return 0 if self._buffer is None else len(self._buffer)
+
+
+@lru_cache
+def get_shared_blobs() -> SharedBlobs:
+    """Retrieve the serialised per-file blobs shared with forked workers.
+
+    Returns
+    -------
+        SharedBlobs: Blobs packed by the gunicorn master, empty otherwise
+    """
+    return SharedBlobs()
+
+
+def shared_blob(
+    kind: str,
+) -> Callable[[Callable[..., bytes]], Callable[..., bytes]]:
+    """Serve a cached per-file blob from the shared blobs, when packed there.
+
+    The decorated function is registered under `kind`, so `pack_shared_blobs` can
+    build its blobs for a list of files. Blobs found in the shared blobs bypass the
+    function, and its cache, entirely. Blobs are keyed on the modification time and
+    size of the file as well as its path, so a file replaced on disk is read afresh.
+
+    Args:
+        kind (str): Name of the blob, e.g. "metadata"
+
+    Returns
+    -------
+        Callable[[Callable[..., bytes]], Callable[..., bytes]]: Decorator
+    """
+
+    def decorate(function: Callable[..., bytes]) -> Callable[..., bytes]:
+        @functools.wraps(function)
+        def wrapper(filename: str | Path) -> bytes:
+            try:
+                blob = get_shared_blobs().get(blob_key(kind, filename))
+            except OSError:
+                blob = None
+            return function(filename) if blob is None else blob
+
+        wrapper.cache_clear = function.cache_clear
+        SHARED_FUNCTIONS[kind] = function
+        return wrapper
+
+    return decorate
+
+
+def pack_shared_blobs(filenames: list[Path]) -> SharedBlobs:
+    """Build every registered blob for some files and pack them for sharing.
+
+    The private caches of the registered functions are cleared afterwards, so the
+    shared copy of each blob is the only one. Files whose blobs cannot be built
+    are logged and skipped.
+
+    Args:
+        filenames (list[Path]): Resolved paths to snapshots
+
+    Returns
+    -------
+        SharedBlobs: The shared blobs, now holding the blobs of the files
+    """
+    items = {}
+    for filename in filenames:
+        try:
+            blobs = {
+                blob_key(kind, filename): function(filename)
+                for kind, function in SHARED_FUNCTIONS.items()
+            }
+        except Exception as error:  # noqa: BLE001
+            logger.warning(f"Failed to build shared blobs for {filename}: {error!r}")
+            continue
+        items.update(blobs)
+
+    shared = get_shared_blobs()
+    shared.pack(items)
+    for function in SHARED_FUNCTIONS.values():
+        function.cache_clear()
+    logger.info(
+        f"Packed {len(shared)} shared blobs for {len(filenames)} snapshots "
+        f"into {shared.nbytes} bytes",
+    )
+    return shared
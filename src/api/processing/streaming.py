@@ -0,0 +1,261 @@
+"""Serve many small requests for one snapshot over a single connection.
+
+Interactive tools send a rapid stream of field, mask and region requests. On a
+streaming connection the client authenticates once and pins a snapshot, which is
+kept open for the lifetime of the connection. Each result is sent as a sequence
+of binary frames, each holding a block of rows no larger than the frame size.
+
+A frame starts with the length of a JSON header as a little-endian unsigned 32-bit
+integer, followed by the header and the raw bytes of the rows. The header gives
+the request identifier and serial number, the data type and shape of the rows in
+the frame, their offset within the result, the total rows and whether the frame is
+the last of its result. Clients acknowledge the frames they have consumed, and no
+more than a window of unacknowledged frames is sent.
+"""
+import asyncio
+import struct
+
+import numpy as np
+import numpy.typing as npt
+import orjson
+
+from api.lazy import lazy_import
+from api.processing.apertures import ApertureError, aperture_ranges
+from api.processing.data_processing import SWIFTProcessor, SWIFTProcessorError
+from api.processing.distributed import part_type_index
+from api.processing.mask_store import (
+    MaskStoreError,
+    check_ranges,
+    get_mask_store,
+    normalise_mask,
+)
+from api.processing.pagination import PaginationError, field_rows
+
+h5py = lazy_import("h5py")
+
+FRAME_HEADER_LENGTH = struct.Struct("<I")
+
+
+class StreamError(Exception):
+    """Custom exception for streaming request errors."""
+
+
+def encode_frame(header: dict, payload: bytes = b"") -> bytes:
+    """Combine a header and payload into a binary frame.
+
+    Args:
+        header (dict): JSON-serialisable frame header
+        payload (bytes, optional): Raw bytes of the rows. Defaults to b"".
+
+    Returns
+    -------
+        bytes: Binary frame
+    """
+    encoded = orjson.dumps(header)
+    return FRAME_HEADER_LENGTH.pack(len(encoded)) + encoded + payload
+
+
+def decode_frame(frame: bytes) -> tuple[dict, npt.NDArray]:
+    """Split a binary frame into its header and rows.
+
+    Args:
+        frame (bytes): Binary frame from `encode_frame`
+
+    Returns
+    -------
+        tuple[dict, npt.NDArray]: Frame header, and the rows it holds
+    """
+    (length,) = FRAME_HEADER_LENGTH.unpack_from(frame)
+    start = FRAME_HEADER_LENGTH.size
+    header = orjson.loads(frame[start : start + length])
+    rows = np.frombuffer(frame[start + length :], dtype=header["dtype"])
+    return header, rows.reshape(header["shape"])
+
+
+class PinnedSnapshot:
+    """A snapshot kept open for the requests of one connection."""
+
+    def __init__(self, filename: str):
+        """Class constructor.
+
+        Args:
+            filename (str): Path to HDF5 file
+        """
+        self.filename = filename
+        self.handle = h5py.File(filename, "r")
+
+    def close(self) -> None:
+        """Close the snapshot."""
+        self.handle.close()
+
+    def row_bytes(self, field: str, columns: int | None = None) -> tuple[int, int]:
+        """Find the number of rows in a field and the bytes each row occupies.
+
+        Args:
+            field (str): Raw or derived field path
+            columns (int | None, optional): Column selector. Defaults to None.
+
+        Raises
+        ------
+            StreamError: For unknown fields.
+
+        Returns
+        -------
+            tuple[int, int]: Number of rows, and bytes in each row
+        """
+        try:
+            return field_rows(self.filename, field, columns, self.handle)
+        except PaginationError as error:
+            raise StreamError(str(error)) from error
+
+    def check_mask(self, ranges: npt.NDArray, field: str) -> npt.NDArray:
+        """Check that the row ranges of a mask lie within a field.
+
+        Args:
+            ranges (npt.NDArray): Half-open row ranges with shape (N, 2)
+            field (str): Raw or derived field path
+
+        Raises
+        ------
+            StreamError: For unknown fields.
+            MaskStoreError: For ranges outside the field.
+
+        Returns
+        -------
+            npt.NDArray: The ranges
+        """
+        rows, _ = self.row_bytes(field)
+        check_ranges(ranges, rows, field)
+        return ranges
+
+    def request_ranges(self, request: dict, user: str) -> npt.NDArray:
+        """Find the rows selected by a field, mask or region request.
+
+        Args:
+            request (dict): Request with its "type" and parameters
+            user (str): User who sent the request, for stored masks
+
+        Raises
+        ------
+            StreamError:
+                For unknown request types, malformed masks or regions, or masks
+                outside the field.
+
+        Returns
+        -------
+            npt.NDArray: Half-open row ranges with shape (N, 2)
+        """
+        try:
+            if request["type"] == "field":
+                rows, _ = self.row_bytes(request["field"])
+                return np.array([[0, rows]], dtype=np.int64)
+            if request["type"] == "mask" and request.get("mask_id"):
+                return self.check_mask(
+                    get_mask_store().get(request["mask_id"], user),
+                    request["field"],
+                )
+            if request["type"] == "mask" and request.get("mask_array_json"):
+                return self.check_mask(
+                    normalise_mask(
+                        request["mask_array_json"],
+                        request.get("mask_data_type"),
+                    ),
+                    request["field"],
+                )
+            if request["type"] == "region":
+                ranges, _ = aperture_ranges(
+                    self.filename,
+                    f"PartType{part_type_index(request['field'])}",
+                    request.get("centre") or [],
+                    request.get("radius"),
+                    request.get("half_widths"),
+                )
+                return ranges
+        except (
+            ApertureError,
+            KeyError,
+            MaskStoreError,
+            SWIFTProcessorError,
+            ValueError,
+        ) as error:
+            raise StreamError(str(error)) from error
+
+        message = f"Cannot serve a {request['type']} request without a mask or region."
+        raise StreamError(message)
+
+    def read(
+        self,
+        field: str,
+        ranges: npt.NDArray,
+        rows: int,
+        columns: int | None = None,
+        centre: list[float] | None = None,
+    ) -> tuple[npt.NDArray, str | None]:
+        """Read rows of a raw or derived field.
+
+        Args:
+            field (str): Raw or derived field path
+            ranges (npt.NDArray): Half-open row ranges to read
+            rows (int): Number of rows in the ranges
+            columns (int | None, optional): Column selector. Defaults to None.
+            centre (list[float] | None, optional):
+                Point to recentre derived fields about. Defaults to None.
+
+        Raises
+        ------
+            StreamError: For unknown fields.
+
+        Returns
+        -------
+            tuple[npt.NDArray, str | None]: Rows, and their units for derived fields
+        """
+        try:
+            if SWIFTProcessor.is_derived_field(field):
+                return SWIFTProcessor.get_array_derived(
+                    self.filename,
+                    field,
+                    ranges,
+                    columns,
+                    centre,
+                )
+            array = SWIFTProcessor.get_array_ranges(
+                self.filename,
+                field,
+                ranges,
+                rows,
+                columns,
+                self.handle,
+            )
+        except SWIFTProcessorError as error:
+            raise StreamError(str(error)) from error
+        return array, None
+
+
+class CreditWindow:
+    """Limit the number of frames sent but not yet acknowledged."""
+
+    def __init__(self, window: int):
+        """Class constructor.
+
+        Args:
+            window (int): Maximum number of unacknowledged frames
+        """
+        self.window = window
+        self.outstanding = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        """Wait until another frame may be sent, and count it as outstanding."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.outstanding < self.window)
+            self.outstanding += 1
+
+    async def release(self, frames: int) -> None:
+        """Acknowledge frames consumed by the client.
+
+        Args:
+            frames (int): Number of frames acknowledged
+        """
+        async with self._condition:
+            self.outstanding = max(self.outstanding - frames, 0)
+            self._condition.notify_all()
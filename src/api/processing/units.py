@@ -1,13 +1,17 @@
 """Handle server-side unit calculation and conversion to JSON."""
 import json
-from functools import lru_cache
 from pathlib import Path
 from typing import Any
 
-import cloudpickle
 from fastapi import HTTPException, status
-from swiftsimio.reader import SWIFTUnits
-from unyt import unyt_quantity
+
+from api.lazy import lazy_import
+from api.processing.result_cache import stamped_lru_cache
+from api.processing.shared_blobs import shared_blob
+
+cloudpickle = lazy_import("cloudpickle")
+reader = lazy_import("swiftsimio.reader")
+unyt = lazy_import("unyt")
 
 
 class RemoteSWIFTUnitsError(Exception):
@@ -67,7 +71,7 @@ class UnytEncoder(json.JSONEncoder):
         Returns:
             Any: Serialised object
         """
-        if isinstance(obj, unyt_quantity):
+        if isinstance(obj, unyt.unyt_quantity):
             return obj.to_string()
         return json.JSONEncoder.default(self, obj)
 
@@ -91,10 +95,10 @@ def convert_swift_units_dict_types(swift_units_dict: dict) -> dict:
     """
     try:
         for key in swift_units_dict:
-            if isinstance(swift_units_dict[key], unyt_quantity):
+            if isinstance(swift_units_dict[key], unyt.unyt_quantity):
                 swift_units_dict[key] = swift_units_dict[key].to_string()
             for unit in swift_units_dict["units"]:
-                if isinstance(swift_units_dict["units"][unit], unyt_quantity):
+                if isinstance(swift_units_dict["units"][unit], unyt.unyt_quantity):
                     swift_units_dict["units"][unit] = swift_units_dict["units"][
                         unit
                     ].to_string()
@@ -117,7 +121,7 @@ def retrieve_units_json_compatible(filename: str) -> dict:
     -------
         dict: JSON-serialisable units dictionary.
     """
-    units = SWIFTUnits(filename)
+    units = reader.SWIFTUnits(filename)
     if hasattr(units, "_handle"):
         units._handle = None  # do not serialize file handle
     return convert_swift_units_dict_types(units.__dict__)
@@ -133,7 +137,7 @@ def retrieve_swiftunits_dict(filename: str) -> dict:
     -------
         dict: Dictionary representation of SWIFTUnits object.
     """
-    return SWIFTUnits(filename).__dict__
+    return reader.SWIFTUnits(filename).__dict__
 
 
 def create_unyt_quantities(swift_unit_dict: dict) -> dict[str, Any]:
@@ -153,12 +157,12 @@ def create_unyt_quantities(swift_unit_dict: dict) -> dict[str, Any]:
     excluded_fields = ["filename", "units"]
     try:
         swift_unit_dict["units"] = {
-            key: unyt_quantity.from_string(value)
+            key: unyt.unyt_quantity.from_string(value)
             for key, value in swift_unit_dict["units"].items()
         }
         swift_unit_dict = {
             key: (
-                unyt_quantity.from_string(value)
+                unyt.unyt_quantity.from_string(value)
                 if key not in excluded_fields
                 else value
             )
@@ -173,7 +177,8 @@ def create_unyt_quantities(swift_unit_dict: dict) -> dict[str, Any]:
     return swift_unit_dict
 
 
-@lru_cache(maxsize=128)
+@shared_blob("units")
+@stamped_lru_cache(maxsize=128)
 def create_swift_units(filename: Path) -> bytes:
     """Return a SWIFTUnits object, serialised with pickle.
 
@@ -188,7 +193,7 @@ def create_swift_units(filename: Path) -> bytes:
     -------
         bytes: Pickled SWIFTUnits object
     """
-    units = SWIFTUnits(filename)
+    units = reader.SWIFTUnits(filename)
 
     try:
         return cloudpickle.dumps(units)
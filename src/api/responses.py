@@ -0,0 +1,141 @@
+"""Responses sending byte segments of files without copying them through Python.
+
+Servers implementing the ASGI zero-copy send extension are handed the file
+descriptor, offset and length of each segment, and move the bytes from the page
+cache to the socket with `os.sendfile`. Other servers, including uvicorn, are sent
+the segments a chunk at a time, read with `os.pread` in a worker thread, so no
+bytes outside the segments are read and no buffered file reads are layered on top.
+"""
+import os
+from pathlib import Path
+from typing import BinaryIO
+
+import anyio
+from starlette.background import BackgroundTask
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+PREAD_CHUNK_BYTES = 1_048_576
+
+
+class FileSegmentsResponse(Response):
+    """Send segments of a file, with `os.sendfile` where the server allows."""
+
+    def __init__(
+        self,
+        file: Path | BinaryIO,
+        segments: list[tuple[int, int]] | None = None,
+        status_code: int = 200,
+        headers: dict[str, str] | None = None,
+        media_type: str | None = None,
+        background: BackgroundTask | None = None,
+    ):
+        """Class constructor.
+
+        Args:
+            file (Path | BinaryIO):
+                File to send from, or an open binary file, which is closed once sent
+            segments (list[tuple[int, int]] | None, optional):
+                Byte offset and length of each segment to send, in order. Defaults
+                to None, for the whole file.
+            status_code (int, optional): HTTP status code. Defaults to 200.
+            headers (dict[str, str] | None, optional): Response headers. Defaults to None.
+            media_type (str | None, optional): Media type. Defaults to None.
+            background (BackgroundTask | None, optional):
+                Task to run once the response is sent. Defaults to None.
+        """
+        self.file = file
+        if segments is None:
+            size = (
+                file.stat().st_size
+                if isinstance(file, Path)
+                else os.fstat(file.fileno()).st_size
+            )
+            segments = [(0, size)]
+        self.segments = [(offset, count) for offset, count in segments if count > 0]
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = background
+        self.init_headers(headers)
+        self.headers["content-length"] = str(sum(count for _, count in self.segments))
+
+    async def __call__(
+        self,
+        scope: Scope,
+        receive: Receive,  # noqa: ARG002
+        send: Send,
+    ) -> None:
+        """Send the response.
+
+        Args:
+            scope (Scope): ASGI connection scope
+            receive (Receive): ASGI receive channel
+            send (Send): ASGI send channel
+        """
+        if isinstance(self.file, Path):
+            file = await anyio.to_thread.run_sync(self.file.open, "rb")
+        else:
+            file = self.file
+        try:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": self.status_code,
+                    "headers": self.raw_headers,
+                },
+            )
+            if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+                await self.send_zerocopy(file.fileno(), send)
+            else:
+                await self.send_chunks(file.fileno(), send)
+        finally:
+            await anyio.to_thread.run_sync(file.close)
+
+        if self.background is not None:
+            await self.background()
+
+    async def send_zerocopy(self, descriptor: int, send: Send) -> None:
+        """Hand each segment to the server to send with `os.sendfile`.
+
+        Args:
+            descriptor (int): Open file descriptor
+            send (Send): ASGI send channel
+        """
+        for index, (offset, count) in enumerate(self.segments):
+            await send(
+                {
+                    "type": ZEROCOPY_EXTENSION,
+                    "file": descriptor,
+                    "offset": offset,
+                    "count": count,
+                    "more_body": index < len(self.segments) - 1,
+                },
+            )
+        if not self.segments:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def send_chunks(self, descriptor: int, send: Send) -> None:
+        """Read each segment with `os.pread` and send it a chunk at a time.
+
+        Args:
+            descriptor (int): Open file descriptor
+            send (Send): ASGI send channel
+        """
+        for offset, count in self.segments:
+            position, end = offset, offset + count
+            while position < end:
+                chunk = await anyio.to_thread.run_sync(
+                    os.pread,
+                    descriptor,
+                    min(PREAD_CHUNK_BYTES, end - position),
+                    position,
+                )
+                if not chunk:
+                    message = "The file was truncated while it was being sent."
+                    raise OSError(message)
+                position += len(chunk)
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True},
+                )
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -10,23 +10,21 @@ from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from loguru import logger
 from pydantic import BaseModel
 
-from api.config import Settings
-from api.virgo_auth import SwiftAuthenticator
+from api.config import Settings, get_settings
+from api.virgo_auth import SwiftAuthenticator, VirgoDBClient
 
 bearer_scheme = HTTPBearer()
 
 
 @lru_cache
-def get_settings() -> Settings:
-    """Retrieve an instance of the Settings object.
-
-    Required by FastAPI when used with Depends.
+def get_virgodb_client() -> VirgoDBClient:
+    """Retrieve the pooled Virgo DB client for this worker.
 
     Returns
     -------
-        Settings: Settings object
+        VirgoDBClient: Client shared by all authentication requests
     """
-    return Settings()
+    return VirgoDBClient(get_settings())
 
 
 router = APIRouter()
@@ -101,7 +99,7 @@ def decode_jwt(token: str, settings: Settings) -> str:
 
 def get_authenticated_user(
     authorisation: HTTPAuthorizationCredentials = Security(bearer_scheme),
-    settings: Settings = get_settings(),
+    settings: Settings = Depends(get_settings),
 ) -> str:
     """Check whether a current user is authenticated.
 
@@ -110,7 +108,8 @@ def get_authenticated_user(
     Args:
         authorisation (HTTPAuthorizationCredentials, optional):
             HTTPAuthorizationCredentials data model. Defaults to Security(bearer_scheme).
-        settings (Settings, optional): Pydantic Settings object. Defaults to get_settings().
+        settings (Settings, optional):
+            Pydantic Settings object. Defaults to Depends(get_settings).
 
     Raises
     ------
@@ -129,10 +128,36 @@ def get_authenticated_user(
     return decode_jwt(authorisation.credentials, settings)
 
 
+def authenticate_token(token: str | None, settings: Settings) -> str:
+    """Check a token sent outside the Authorization header of an HTTP request.
+
+    Used by connections that cannot depend on the bearer scheme, such as WebSockets.
+
+    Args:
+        token (str | None): JWT token provided by user
+        settings (Settings): Settings object containing the JWT secret key
+
+    Raises
+    ------
+        CredentialsException: Raised if no token is provided, or it is invalid.
+
+    Returns
+    -------
+        str: Username on successful authentication.
+    """
+    if not token:
+        raise CredentialsException(
+            status_code=401,
+            detail="No token provided with request.",
+        )
+    return decode_jwt(token, settings)
+
+
 @router.post("/token")
-def generate_token(
+async def generate_token(
     request: TokenRequest,
     settings: Settings = Depends(get_settings),
+    client: VirgoDBClient = Depends(get_virgodb_client),
 ) -> dict:
     """Generate a JWT token for a user on successful VirgoDB authentication.
 
@@ -140,6 +165,8 @@ def generate_token(
         request (TokenRequest): Pydantic model for a token request
         db_url (str, optional):
             Database URL, defined in settings. Defaults to Depends(get_settings).
+        client (VirgoDBClient, optional):
+            Pooled Virgo DB client. Defaults to Depends(get_virgodb_client).
 
     Returns
     -------
@@ -149,9 +176,10 @@ def generate_token(
         request.username,
         request.password,
         settings,
+        client,
     )
 
-    token = swift_authenticator.authenticate_and_generate_jwt()
+    token = await swift_authenticator.authenticate_and_generate_jwt()
     return {"access_token": token}
 
 
@@ -1,25 +1,92 @@
 """Defines routes that return numpy arrays from HDF5 files."""
+import base64
+import tempfile
+import uuid
+from collections.abc import Callable, Iterator
+from functools import partial
+from itertools import chain
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, HTTPException, Response, status
-from pydantic import BaseModel
-from swiftsimio.reader import SWIFTUnits
-
+import numpy as np
+import numpy.typing as npt
+import orjson
+from fastapi import APIRouter, Body, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationInfo, field_validator
+
+from api.config import get_settings
+from api.processing.apertures import ApertureError, aperture_ranges
+from api.processing.byte_ranges import (
+    UnsatisfiableRangeError,
+    content_range,
+    contiguous_offset,
+    entity_tag,
+    file_segments,
+    http_date,
+    iter_array_range,
+    little_endian,
+    parse_range,
+    range_applies,
+)
+from api.processing.catalogue import get_snapshot_catalogue
+from api.processing.coalescing import get_request_flight, request_key
+from api.processing.cutouts import stream_cutouts, validate_batch
 from api.processing.data_processing import (
     SWIFTProcessor,
     SWIFTProcessorError,
-    get_dataset_alias_map,
 )
-from api.processing.masks import return_mask, return_mask_boxsize
-from api.processing.metadata import create_swift_metadata
+from api.processing.export import (
+    ExportError,
+    export_snapshot,
+    group_fields,
+    region_ranges,
+)
+from api.processing.filtering import FilterError, filter_ranges
+from api.processing.integer_codec import (
+    IntegerCodecError,
+    check_encoding,
+    encode_integers,
+)
+from api.processing.mask_handles import (
+    MaskHandleError,
+    MaskHandleNotFoundError,
+    MaskHandleStore,
+    get_mask_handle_store,
+)
+from api.processing.mask_store import (
+    MaskNotFoundError,
+    MaskQuotaError,
+    MaskStore,
+    MaskStoreError,
+    check_ranges,
+    get_mask_store,
+    normalise_mask,
+)
+from api.processing.masks import encode_cell_metadata, return_mask, return_mask_boxsize
+from api.processing.metadata import (
+    RemoteSWIFTMetadataError,
+    create_swift_metadata_json,
+    serialise_swift_metadata,
+)
+from api.processing.pagination import (
+    Page,
+    PaginationError,
+    StaleCursorError,
+    field_rows,
+    plan_page,
+    select_rows,
+)
+from api.processing.precision import PrecisionError, parse_precision, reduce_precision
+from api.processing.result_cache import cache_key, get_result_cache, source_stamp
 from api.processing.units import create_swift_units, retrieve_units_json_compatible
+from api.responses import FileSegmentsResponse
 from api.routers.auth import get_authenticated_user
 
 router = APIRouter(
     prefix="/swiftdata",
 )
 
-dataset_map = get_dataset_alias_map()
+dataset_map = get_snapshot_catalogue()
 
 
 class SWIFTBaseDataSpec(BaseModel):
@@ -46,10 +113,38 @@ class SWIFTMaskedDataSpec(SWIFTBaseDataSpec):
 
     filename: str
     field: str
-    mask_array_json: str
+    mask_id: str | None = None
+    mask_array_json: str | None = Field(default=None, validate_default=True)
     mask_data_type: str | None = None
     mask_size: int
     columns: None | int = None
+    centre: list[float] | None = None
+    precision: str | None = None
+    encoding: str | None = None
+    cursor: str | None = None
+    page_bytes: int | None = Field(default=None, gt=0)
+
+    @field_validator("mask_array_json")
+    @classmethod
+    def require_mask(cls, value: str | None, info: ValidationInfo) -> str | None:
+        """Require either a mask or the identifier of a stored mask.
+
+        Args:
+            value (str | None): Mask as JSON
+            info (ValidationInfo): Fields validated so far
+
+        Raises
+        ------
+            ValueError: If neither a mask nor a mask identifier is given
+
+        Returns
+        -------
+            str | None: Mask as JSON
+        """
+        if value is None and info.data.get("mask_id") is None:
+            message = "Either mask_array_json or mask_id is required."
+            raise ValueError(message)
+        return value
 
 
 class SWIFTUnmaskedDataSpec(SWIFTBaseDataSpec):
@@ -64,6 +159,172 @@ class SWIFTUnmaskedDataSpec(SWIFTBaseDataSpec):
     filename: str | None = None
     field: str
     columns: None | int = None
+    centre: list[float] | None = None
+    precision: str | None = None
+    encoding: str | None = None
+    cursor: str | None = None
+    page_bytes: int | None = Field(default=None, gt=0)
+
+
+class SWIFTMetadataSpec(SWIFTBaseDataSpec):
+    """Data required in each request for JSON metadata.
+
+    A Pydantic model to validate HTTP POST requests.
+
+    Args:
+        BaseModel (_type_): Pydantic BaseModel
+    """
+
+    sections: list[str] | None = None
+
+
+class SWIFTPredicate(BaseModel):
+    """A comparison between a field and a value.
+
+    A Pydantic model to validate HTTP POST requests.
+
+    Args:
+        BaseModel (_type_): Pydantic BaseModel
+    """
+
+    field: str
+    comparison: str
+    value: float
+    column: int | None = None
+
+
+class SWIFTFilterSpec(SWIFTBaseDataSpec):
+    """Data required in each request for predicate filtering.
+
+    A Pydantic model to validate HTTP POST requests.
+
+    Args:
+        BaseModel (_type_): Pydantic BaseModel
+    """
+
+    predicates: list[SWIFTPredicate]
+    combine: str = "and"
+    fields: list[str] | None = None
+
+
+class SWIFTApertureSpec(SWIFTBaseDataSpec):
+    """Data required in each request for an aperture query.
+
+    A Pydantic model to validate HTTP POST requests.
+
+    Args:
+        BaseModel (_type_): Pydantic BaseModel
+    """
+
+    part_type: str = "PartType0"
+    centre: list[float]
+    radius: float | None = None
+    half_widths: list[float] | None = None
+    fields: list[str] = []
+
+
+class SWIFTBatchApertureSpec(SWIFTBaseDataSpec):
+    """Data required in each request for a batch of spherical apertures.
+
+    A Pydantic model to validate HTTP POST requests.
+
+    Args:
+        BaseModel (_type_): Pydantic BaseModel
+    """
+
+    part_type: str = "PartType0"
+    centres: list[list[float]]
+    radii: list[float]
+    fields: list[str] = []
+
+
+class SWIFTExportSpec(SWIFTBaseDataSpec):
+    """Data required in each request to export a subset snapshot.
+
+    Particles are selected either with a mask for each particle type, in the same
+    format as for masked datasets, or with a spatial region.
+
+    A Pydantic model to validate HTTP POST requests.
+
+    Args:
+        BaseModel (_type_): Pydantic BaseModel
+    """
+
+    fields: list[str]
+    masks: dict[str, str] | None = None
+    mask_data_type: str | None = None
+    centre: list[float] | None = None
+    radius: float | None = None
+    half_widths: list[float] | None = None
+
+
+class SWIFTBinaryDataSpec(SWIFTBaseDataSpec):
+    """Data required in each request for an array as raw bytes.
+
+    Rows are selected with a mask, in the same format as for masked datasets, or
+    the identifier of a stored mask. All rows are sent if neither is given.
+
+    A Pydantic model to validate HTTP POST requests.
+
+    Args:
+        BaseModel (_type_): Pydantic BaseModel
+    """
+
+    field: str
+    columns: None | int = None
+    centre: list[float] | None = None
+    mask_id: str | None = None
+    mask_array_json: str | None = None
+    mask_data_type: str | None = None
+
+
+class SWIFTMaskCellsSpec(SWIFTBaseDataSpec):
+    """Data required in each request for compact cell metadata.
+
+    A Pydantic model to validate HTTP POST requests.
+
+    Args:
+        BaseModel (_type_): Pydantic BaseModel
+    """
+
+    part_types: list[str] | None = None
+
+
+class SWIFTMaskHandleSpec(SWIFTBaseDataSpec):
+    """Data required in each request to create a server-held mask.
+
+    A Pydantic model to validate HTTP POST requests.
+
+    Args:
+        BaseModel (_type_): Pydantic BaseModel
+    """
+
+    region: list[list[float]] | None = None
+
+
+class SWIFTRegionSpec(BaseModel):
+    """Data required in each request to constrain a server-held mask.
+
+    A Pydantic model to validate HTTP POST requests.
+
+    Args:
+        BaseModel (_type_): Pydantic BaseModel
+    """
+
+    region: list[list[float]]
+
+
+class SWIFTMaskUploadSpec(BaseModel):
+    """Data required in each request to store a mask for reuse.
+
+    A Pydantic model to validate HTTP POST requests.
+
+    Args:
+        BaseModel (_type_): Pydantic BaseModel
+    """
+
+    mask_array_json: str
+    mask_data_type: str | None = None
 
 
 class SWIFTDataSpecException(HTTPException):
@@ -73,22 +334,44 @@ class SWIFTDataSpecException(HTTPException):
         HTTPException (_type_): HTTPException with status code.
     """
 
-    def __init__(self, status_code: int, detail: str | None = None):
+    def __init__(
+        self,
+        status_code: int,
+        detail: str | None = None,
+        headers: dict[str, str] | None = None,
+    ):
         """Class constructor.
 
         Args:
             status_code (int): HTTP response status code
             detail (str | None, optional):
                 Additional exception details. Defaults to None.
+            headers (dict[str, str] | None, optional):
+                Headers to send with the response. Defaults to None.
         """
         if not detail:
             detail = "Error validating SWIFT particle dataset specification provided."
-        super().__init__(status_code, detail=detail)
+        super().__init__(status_code, detail=detail, headers=headers)
+
+
+@router.get("/catalogue")
+def get_catalogue(
+    _: str = Depends(get_authenticated_user),
+) -> list[dict]:
+    """List the snapshots available in the snapshot catalogue.
+
+    Returns
+    -------
+        list[dict]:
+            Alias, path, modification time, size, particle counts, redshift and
+            available fields of each snapshot.
+    """
+    return dataset_map.records()
 
 
 @router.post("/mask_boxsize")
 def get_mask_boxsize(
-    data_spec: SWIFTBaseDataSpec,
+    data_spec: SWIFTBaseDataSpec = Body(embed=True),
     _: str = Depends(get_authenticated_user),
 ) -> dict:
     """Retrieve mask dimensions.
@@ -108,7 +391,7 @@ def get_mask_boxsize(
 
 @router.post("/filepath")
 def get_filepath_from_alias(
-    data_spec: SWIFTBaseDataSpec,
+    data_spec: SWIFTBaseDataSpec = Body(embed=True),
     _: str = Depends(get_authenticated_user),
 ) -> Path:
     """Retrieve full file path.
@@ -126,7 +409,7 @@ def get_filepath_from_alias(
 
 @router.post("/mask")
 def get_mask(
-    data_spec: SWIFTBaseDataSpec,
+    data_spec: SWIFTBaseDataSpec = Body(embed=True),
     _: str = Depends(get_authenticated_user),
 ) -> bytes:
     """Retrieve SWIFTMask object.
@@ -145,169 +428,1604 @@ def get_mask(
     return Response(content=serialised_mask, media_type="application/octet-stream")
 
 
-def get_file_path(data_spec: SWIFTBaseDataSpec, processor: SWIFTProcessor) -> Path:
-    """Retrieve a file path from a data spec object.
+@router.post("/mask_cells")
+def get_mask_cells(
+    data_spec: SWIFTMaskCellsSpec = Body(embed=True),
+    _: str = Depends(get_authenticated_user),
+) -> Response:
+    """Retrieve the cell metadata of a file as a compact NPZ archive.
 
     Args:
-        data_spec (SWIFTBaseDataSpec): SWIFT minimal data spec object
-        processor (SWIFTProcessor): SWIFTProcessor object.
+        data_spec (SWIFTMaskCellsSpec):
+            File path or alias, and optionally the particle types to include
 
     Raises
     ------
-        SWIFTDataSpecException: HTTP 400 exception on no filename found.
+        SWIFTDataSpecException: Raised for particle types not present in the file
 
     Returns
     -------
-        Path: Path to requested file
+        Response:
+            NPZ archive of cell centres and sizes, the box size and the offsets and
+            counts of each particle type
     """
-    file_path = None
-    if data_spec.filename:
-        file_path = data_spec.filename
-    else:
-        try:
-            file_path = processor.retrieve_filename(data_spec.alias)
-        except SWIFTProcessorError as error:
-            raise SWIFTDataSpecException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="SWIFT dataset alias not found in dataset map.",
-            ) from error
+    processor = SWIFTProcessor(dataset_map)
+    file_path = get_file_path(data_spec, processor)
 
-    if file_path is None:
-        raise SWIFTDataSpecException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="SWIFT filename or file alias not found.",
-        )
-    if not Path(file_path).exists():
+    part_types = None if data_spec.part_types is None else tuple(data_spec.part_types)
+    try:
+        content = encode_cell_metadata(file_path, part_types)
+    except KeyError as error:
         raise SWIFTDataSpecException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"SWIFT filename not found at the provided path: {file_path}.",
-        )
-    return Path(file_path)
+            detail=str(error),
+        ) from error
+    return Response(content=content, media_type="application/octet-stream")
 
 
-@router.post("/masked_dataset")
-def get_masked_array_data(
-    data_spec: SWIFTMaskedDataSpec,
-    _: str = Depends(get_authenticated_user),
-) -> dict:
-    """Retrieve a masked array from a dataset.
+def mask_handle_exception(error: MaskHandleError) -> SWIFTDataSpecException:
+    """Convert a mask handle error into an HTTP exception.
+
+    Args:
+        error (MaskHandleError): Mask handle error
+
+    Returns
+    -------
+        SWIFTDataSpecException: Exception with a 404 for unknown handles, else a 400
+    """
+    status_code = (
+        status.HTTP_404_NOT_FOUND
+        if isinstance(error, MaskHandleNotFoundError)
+        else status.HTTP_400_BAD_REQUEST
+    )
+    return SWIFTDataSpecException(status_code=status_code, detail=str(error))
 
-    Applies masking to an array generated from the HDF5 file
-    and returns the resulting array as JSON.
+
+@router.post("/mask_handles")
+def create_mask_handle(
+    data_spec: SWIFTMaskHandleSpec = Body(embed=True),
+    user: str = Depends(get_authenticated_user),
+    store: MaskHandleStore = Depends(get_mask_handle_store),
+) -> dict:
+    """Create a spatial mask held on the server.
 
     Args:
-        data_spec (SWIFTMaskedDataSpec):
-            Dataset information required in POST request
+        data_spec (SWIFTMaskHandleSpec):
+            File path or alias, and optionally a region to constrain the mask to,
+            as lower and upper bounds along each axis in the units of the cell
+            metadata
+        user (str, optional): Authenticated user. Defaults to Depends(get_authenticated_user).
+        store (MaskHandleStore, optional):
+            Mask handle store. Defaults to Depends(get_mask_handle_store).
 
     Raises
     ------
-        SWIFTDataSpecException:
-            Exceptions raised for incorrectly formatted requests
+        SWIFTDataSpecException: Raised for malformed regions
 
     Returns
     -------
-        dict[str, str]:
-            Numpy ndarray formatted as JSON. The resulting dictionary
-            contains the array and the original data type.
+        dict: Opaque handle, and the cells and rows of each particle type it selects
     """
     processor = SWIFTProcessor(dataset_map)
-
-    file_path = str(get_file_path(data_spec, processor).resolve())
-
-    if not data_spec.mask_array_json:
-        raise SWIFTDataSpecException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No mask information found. \
-            Use the unmasked endpoint if requesting unmasked data.",
-        )
+    file_path = str(get_file_path(data_spec, processor))
 
     try:
-        masked_array = SWIFTProcessor.get_array_masked(
-            file_path,
-            data_spec.field,
-            data_spec.mask_array_json,
-            data_spec.mask_data_type,
-            data_spec.mask_size,
-            data_spec.columns,
-        )
-    except SWIFTProcessorError:
-        raise SWIFTDataSpecException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Field {data_spec.field} not found in the requested file {file_path}.",
-        ) from SWIFTProcessorError
-
-    return processor.generate_dict_from_ndarray(
-        masked_array,
-    )
+        return store.create(user, file_path, data_spec.region)
+    except MaskHandleError as error:
+        raise mask_handle_exception(error) from error
 
 
-@router.post("/unmasked_dataset")
-def get_unmasked_array_data(
-    data_spec: SWIFTUnmaskedDataSpec,
-    _: str = Depends(get_authenticated_user),
+@router.post("/mask_handles/{handle}/constrain")
+def constrain_mask_handle(
+    handle: str,
+    data_spec: SWIFTRegionSpec = Body(embed=True),
+    user: str = Depends(get_authenticated_user),
+    store: MaskHandleStore = Depends(get_mask_handle_store),
 ) -> dict:
-    """Retrieve an unmasked array from a dataset.
-
-    Returns the array generated from the HDF5 file
-    using the data specification provided.
+    """Restrict a server-held mask to a region.
 
     Args:
-        data_spec (SWIFTUnmaskedDataSpec):
-            Dataset information required in POST request
+        handle (str): Mask handle
+        data_spec (SWIFTRegionSpec):
+            Lower and upper bounds along each axis, in the units of the cell metadata
+        user (str, optional): Authenticated user. Defaults to Depends(get_authenticated_user).
+        store (MaskHandleStore, optional):
+            Mask handle store. Defaults to Depends(get_mask_handle_store).
 
     Raises
     ------
-        SWIFTDataSpecException:
-            Exceptions raised for incorrectly formatted requests
+        SWIFTDataSpecException: Raised for unknown handles or malformed regions
 
     Returns
     -------
-        dict[str, str]:
-            Numpy ndarray formatted as JSON. The resulting dictionary
-            contains the array and the original data type.
+        dict: Handle, and the cells and rows of each particle type it now selects
     """
-    processor = SWIFTProcessor(dataset_map)
+    try:
+        return store.constrain(handle, user, data_spec.region)
+    except MaskHandleError as error:
+        raise mask_handle_exception(error) from error
 
-    file_path = str(get_file_path(data_spec, processor).resolve())
 
-    unmasked_array = SWIFTProcessor.get_array_unmasked(
-        file_path,
-        data_spec.field,
-        data_spec.columns,
-    )
+@router.get("/mask_handles/{handle}/ranges")
+def get_mask_handle_ranges(
+    handle: str,
+    part_type: str,
+    user: str = Depends(get_authenticated_user),
+    store: MaskHandleStore = Depends(get_mask_handle_store),
+) -> dict:
+    """Retrieve the rows of a particle type selected by a server-held mask.
 
-    return processor.generate_dict_from_ndarray(
-        unmasked_array,
-    )
+    Args:
+        handle (str): Mask handle
+        part_type (str): Particle type, e.g. "PartType0"
+        user (str, optional): Authenticated user. Defaults to Depends(get_authenticated_user).
+        store (MaskHandleStore, optional):
+            Mask handle store. Defaults to Depends(get_mask_handle_store).
 
+    Raises
+    ------
+        SWIFTDataSpecException: Raised for unknown handles or particle types
 
-@router.post("/metadata_remoteunits")
-def retrieve_metadata_with_remote_units(
-    data_spec: SWIFTBaseDataSpec,
-    _: str = Depends(get_authenticated_user),
-) -> Response:
-    """Retrieve metadata from a file path.
+    Returns
+    -------
+        dict:
+            Half-open row ranges in the same format as masked dataset arrays, which
+            can be sent as the mask of masked dataset requests
+    """
+    try:
+        ranges = store.ranges(handle, user, part_type)
+    except MaskHandleError as error:
+        raise mask_handle_exception(error) from error
+    return SWIFTProcessor.generate_dict_from_ndarray(ranges)
+
+
+@router.delete("/mask_handles/{handle}")
+def delete_mask_handle(
+    handle: str,
+    user: str = Depends(get_authenticated_user),
+    store: MaskHandleStore = Depends(get_mask_handle_store),
+) -> dict:
+    """Remove a server-held mask.
 
     Args:
-        data_spec (SWIFTBaseDataSpec): Base dataspec specifying file path or alias.
+        handle (str): Mask handle
+        user (str, optional): Authenticated user. Defaults to Depends(get_authenticated_user).
+        store (MaskHandleStore, optional):
+            Mask handle store. Defaults to Depends(get_mask_handle_store).
+
+    Raises
+    ------
+        SWIFTDataSpecException: Raised for unknown handles
 
     Returns
     -------
-        dict: Metadata for specified file
+        dict: Identifier of the removed handle
     """
-    processor = SWIFTProcessor(dataset_map)
-    file_path = str(get_file_path(data_spec, processor).resolve())
+    try:
+        store.delete(handle, user)
+    except MaskHandleError as error:
+        raise mask_handle_exception(error) from error
+    return {"handle": handle}
 
-    swift_units = SWIFTUnits(file_path)
 
-    serialised_metadata = create_swift_metadata(file_path, swift_units)
+def mask_store_exception(error: MaskStoreError) -> SWIFTDataSpecException:
+    """Convert a mask store error into an HTTP exception.
 
-    return Response(content=serialised_metadata, media_type="application/octet-stream")
+    Args:
+        error (MaskStoreError): Mask store error
+
+    Returns
+    -------
+        SWIFTDataSpecException: Exception with the matching status code
+    """
+    if isinstance(error, MaskNotFoundError):
+        status_code = status.HTTP_404_NOT_FOUND
+    elif isinstance(error, MaskQuotaError):
+        status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    else:
+        status_code = status.HTTP_400_BAD_REQUEST
+    return SWIFTDataSpecException(status_code=status_code, detail=str(error))
+
+
+@router.post("/masks")
+def upload_mask(
+    data_spec: SWIFTMaskUploadSpec = Body(embed=True),
+    user: str = Depends(get_authenticated_user),
+    store: MaskStore = Depends(get_mask_store),
+) -> dict:
+    """Store a mask on the server, to be referred to by its identifier.
+
+    Args:
+        data_spec (SWIFTMaskUploadSpec): Mask as JSON and its data type
+        user (str, optional): Authenticated user. Defaults to Depends(get_authenticated_user).
+        store (MaskStore, optional): Mask store. Defaults to Depends(get_mask_store).
+
+    Raises
+    ------
+        SWIFTDataSpecException: Raised for malformed masks, or masks over the quota
+
+    Returns
+    -------
+        dict: Mask identifier, number of rows and ranges, and stored bytes
+    """
+    try:
+        return store.put(user, data_spec.mask_array_json, data_spec.mask_data_type)
+    except MaskStoreError as error:
+        raise mask_store_exception(error) from error
+
+
+@router.get("/masks/{mask_id}")
+def get_stored_mask(
+    mask_id: str,
+    user: str = Depends(get_authenticated_user),
+    store: MaskStore = Depends(get_mask_store),
+) -> dict:
+    """Check whether a mask is stored, before uploading it.
+
+    Args:
+        mask_id (str): Mask identifier
+        user (str, optional): Authenticated user. Defaults to Depends(get_authenticated_user).
+        store (MaskStore, optional): Mask store. Defaults to Depends(get_mask_store).
+
+    Raises
+    ------
+        SWIFTDataSpecException: Raised with a 404 if the mask is not stored
+
+    Returns
+    -------
+        dict: Mask identifier, number of rows and ranges, and stored bytes
+    """
+    try:
+        return store.summary(mask_id, user)
+    except MaskStoreError as error:
+        raise mask_store_exception(error) from error
+
+
+@router.delete("/masks/{mask_id}")
+def delete_stored_mask(
+    mask_id: str,
+    user: str = Depends(get_authenticated_user),
+    store: MaskStore = Depends(get_mask_store),
+) -> dict:
+    """Remove a stored mask.
+
+    Args:
+        mask_id (str): Mask identifier
+        user (str, optional): Authenticated user. Defaults to Depends(get_authenticated_user).
+        store (MaskStore, optional): Mask store. Defaults to Depends(get_mask_store).
+
+    Raises
+    ------
+        SWIFTDataSpecException: Raised for unknown masks
+
+    Returns
+    -------
+        dict: Identifier of the removed mask
+    """
+    try:
+        store.delete(mask_id, user)
+    except MaskStoreError as error:
+        raise mask_store_exception(error) from error
+    return {"mask_id": mask_id}
+
+
+def get_file_path(data_spec: SWIFTBaseDataSpec, processor: SWIFTProcessor) -> Path:
+    """Retrieve a file path from a data spec object.
+
+    Args:
+        data_spec (SWIFTBaseDataSpec): SWIFT minimal data spec object
+        processor (SWIFTProcessor): SWIFTProcessor object.
+
+    Raises
+    ------
+        SWIFTDataSpecException: HTTP 400 exception on no filename found.
+
+    Paths found in the snapshot catalogue are returned without touching the
+    filesystem, other paths are checked for existence and resolved.
+
+    Returns
+    -------
+        Path: Resolved path to requested file
+    """
+    file_path = None
+    if data_spec.filename:
+        file_path = data_spec.filename
+    else:
+        try:
+            file_path = processor.retrieve_filename(data_spec.alias)
+        except SWIFTProcessorError as error:
+            raise SWIFTDataSpecException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="SWIFT dataset alias not found in dataset map.",
+            ) from error
+
+    if file_path is None:
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="SWIFT filename or file alias not found.",
+        )
+    if processor.is_indexed(file_path):
+        return Path(file_path)
+    if not Path(file_path).exists():
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"SWIFT filename not found at the provided path: {file_path}.",
+        )
+    return Path(file_path).resolve()
+
+
+def is_derived_field(field: str) -> bool:
+    """Check whether a requested field is computed from the derived field registry.
+
+    Args:
+        field (str): Field path
+
+    Raises
+    ------
+        SWIFTDataSpecException: If the derived field is not defined for the particle type.
+
+    Returns
+    -------
+        bool: True for derived fields
+    """
+    try:
+        return SWIFTProcessor.is_derived_field(field)
+    except SWIFTProcessorError as error:
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(error),
+        ) from error
+
+
+def check_array_options(precision: str | None, encoding: str | None) -> None:
+    """Check a requested precision and encoding before any data is read.
+
+    Args:
+        precision (str | None): Requested precision, if any
+        encoding (str | None): Requested integer encoding, if any
+
+    Raises
+    ------
+        SWIFTDataSpecException: For invalid precisions or encodings
+    """
+    try:
+        if precision is not None:
+            parse_precision(precision)
+        if encoding is not None:
+            check_encoding(encoding)
+    except (PrecisionError, IntegerCodecError) as error:
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(error),
+        ) from error
+
+
+def format_array(
+    array: npt.NDArray,
+    precision: str | None = None,
+    encoding: str | None = None,
+) -> dict:
+    """Format an array for the response, optionally at a reduced precision or encoded.
+
+    Reduced precision arrays are left as arrays for orjson to write, which uses the
+    shortest representation of float32 values. orjson cannot write float16, so
+    float16 values are written through float32, which holds them exactly. Encoded
+    integer arrays are sent as base64 text, with their shape.
+
+    Args:
+        array (npt.NDArray): Array read from the file
+        precision (str | None, optional):
+            Reduced precision to send the array at. Defaults to None.
+        encoding (str | None, optional):
+            Encoding to send an integer array with. Defaults to None.
+
+    Raises
+    ------
+        SWIFTDataSpecException:
+            For invalid precisions or encodings, values outside their range or
+            encodings of arrays that are not integers
+
+    Returns
+    -------
+        dict: Array, its data type and, if reduced or encoded, how
+    """
+    if encoding is not None:
+        try:
+            content = encode_integers(array, encoding)
+        except IntegerCodecError as error:
+            raise SWIFTDataSpecException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(error),
+            ) from error
+        return {
+            "array": base64.b64encode(content).decode("ascii"),
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "encoding": encoding,
+        }
+
+    if precision is None:
+        return SWIFTProcessor.generate_dict_from_ndarray(array)
+
+    try:
+        reduced, applied = reduce_precision(
+            array,
+            precision,
+            get_settings().precision_block_size,
+        )
+    except PrecisionError as error:
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(error),
+        ) from error
+
+    written = reduced.dtype.newbyteorder("=")
+    if reduced.dtype == np.float16:
+        written = np.dtype(np.float32)
+    return {
+        "array": np.ascontiguousarray(reduced, dtype=written),
+        "dtype": reduced.dtype.str,
+        "precision": applied,
+    }
+
+
+def get_derived_array_data(
+    file_path: str,
+    field: str,
+    mask_json: str | None = None,
+    mask_data_type: str | None = None,
+    columns: int | None = None,
+    centre: list[float] | None = None,
+    ranges: npt.NDArray | None = None,
+    precision: str | None = None,
+    encoding: str | None = None,
+) -> dict:
+    """Compute a derived field and format it for the response.
+
+    Args:
+        file_path (str): Path to HDF5 file
+        field (str): Derived field path
+        mask_json (str | None, optional): Array mask as JSON. Defaults to None.
+        mask_data_type (str | None, optional): Data type of the mask. Defaults to None.
+        columns (int | None, optional): Column selector. Defaults to None.
+        centre (list[float] | None, optional):
+            Point to periodically recentre coordinates about. Defaults to None.
+        ranges (npt.NDArray | None, optional):
+            Row ranges to use instead of the mask. Defaults to None.
+        precision (str | None, optional):
+            Reduced precision to send the array at. Defaults to None.
+        encoding (str | None, optional):
+            Encoding to send an integer array with. Defaults to None.
+
+    Raises
+    ------
+        SWIFTDataSpecException: If the field or one of its inputs is unavailable.
+
+    Returns
+    -------
+        dict: Array, data type and units of the derived field
+    """
+    try:
+        if ranges is None and mask_json:
+            ranges = SWIFTProcessor.load_ndarray_from_json(mask_json, mask_data_type)
+        array, units = SWIFTProcessor.get_array_derived(
+            file_path,
+            field,
+            ranges,
+            columns,
+            centre,
+        )
+    except SWIFTProcessorError as error:
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(error),
+        ) from error
+
+    response = format_array(array, precision, encoding)
+    response["units"] = units
+    return response
+
+
+def read_and_cache_json(
+    digest: str,
+    file_path: str,
+    read: Callable[[str, SWIFTBaseDataSpec], dict],
+    data_spec: SWIFTBaseDataSpec,
+) -> bytes:
+    """Read a response, serialise it as JSON and store it in the result cache.
+
+    Args:
+        digest (str): Cache key of the request
+        file_path (str): Path to HDF5 file
+        read (Callable[[str, SWIFTBaseDataSpec], dict]): Function building the response
+        data_spec (SWIFTBaseDataSpec): Dataset information from the request
+
+    Returns
+    -------
+        bytes: Serialised response
+    """
+    try:
+        stamp = source_stamp(file_path)
+    except OSError:
+        stamp = None
+    content = orjson.dumps(
+        read(file_path, data_spec),
+        option=orjson.OPT_SERIALIZE_NUMPY,
+    )
+    if stamp is not None:
+        get_result_cache().put(digest, file_path, content, stamp)
+    return content
+
+
+def cached_json_response(
+    key: tuple,
+    file_path: str,
+    read: Callable[[str, SWIFTBaseDataSpec], dict],
+    data_spec: SWIFTBaseDataSpec,
+) -> Response:
+    """Serve a response from the result cache, or read it once for concurrent requests.
+
+    Large responses spilled to disk are sent straight from their cache file.
+
+    Args:
+        key (tuple): Normalised request from `request_key`
+        file_path (str): Path to HDF5 file
+        read (Callable[[str, SWIFTBaseDataSpec], dict]): Function building the response
+        data_spec (SWIFTBaseDataSpec): Dataset information from the request
+
+    Returns
+    -------
+        Response: JSON response
+    """
+    digest = cache_key(key)
+    cache = get_result_cache()
+    spilled = cache.open_spilled(digest, get_settings().result_cache_sendfile_bytes)
+    if spilled is not None:
+        return FileSegmentsResponse(spilled, media_type="application/json")
+    content = cache.get(digest)
+    if content is None:
+        content = get_request_flight().do(
+            key,
+            read_and_cache_json,
+            digest,
+            file_path,
+            read,
+            data_spec,
+        )
+    return Response(content=content, media_type="application/json")
+
+
+@router.post("/masked_dataset")
+def get_masked_array_data(
+    data_spec: SWIFTMaskedDataSpec = Body(embed=True),
+    user: str = Depends(get_authenticated_user),
+    store: MaskStore = Depends(get_mask_store),
+) -> Response:
+    """Retrieve a masked array from a dataset.
+
+    Applies masking to an array generated from the HDF5 file
+    and returns the resulting array as JSON. The mask is either
+    sent with the request, or identifies a mask stored with `/masks`.
+
+    Args:
+        data_spec (SWIFTMaskedDataSpec):
+            Dataset information required in POST request
+        user (str, optional): Authenticated user. Defaults to Depends(get_authenticated_user).
+        store (MaskStore, optional): Mask store. Defaults to Depends(get_mask_store).
+
+    Raises
+    ------
+        SWIFTDataSpecException:
+            Exceptions raised for incorrectly formatted requests
+
+    Returns
+    -------
+        Response:
+            Numpy ndarray formatted as JSON. The resulting object
+            contains the array and the original data type.
+    """
+    processor = SWIFTProcessor(dataset_map)
+
+    file_path = str(get_file_path(data_spec, processor))
+
+    check_array_options(data_spec.precision, data_spec.encoding)
+    if data_spec.mask_id:
+        try:
+            ranges = store.get(data_spec.mask_id, user)
+        except MaskStoreError as error:
+            raise mask_store_exception(error) from error
+        if int(np.diff(ranges, axis=1).sum()) != data_spec.mask_size:
+            raise SWIFTDataSpecException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Mask {data_spec.mask_id} does not select {data_spec.mask_size} rows.",
+            )
+        check_mask_ranges(
+            ranges,
+            field_length(file_path, data_spec.field),
+            data_spec.field,
+        )
+        mask = data_spec.mask_id
+        read = partial(read_masked_array_data, ranges=ranges)
+    elif data_spec.mask_array_json:
+        rows = field_length(file_path, data_spec.field)
+        check_mask_ranges(
+            load_mask_ranges(data_spec.mask_array_json, data_spec.mask_data_type),
+            rows,
+            data_spec.field,
+        )
+        mask = data_spec.mask_array_json
+        ranges = None
+        read = read_masked_array_data
+    else:
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No mask information found. \
+            Use the unmasked endpoint if requesting unmasked data.",
+        )
+
+    key = request_key(
+        file_path,
+        data_spec.field,
+        data_spec.columns,
+        mask,
+        mask_data_type=data_spec.mask_data_type,
+        mask_size=data_spec.mask_size,
+        centre=data_spec.centre,
+        precision=data_spec.precision,
+        encoding=data_spec.encoding,
+    )
+    if data_spec.cursor is not None or data_spec.page_bytes is not None:
+        if ranges is None:
+            ranges = load_mask_ranges(
+                data_spec.mask_array_json,
+                data_spec.mask_data_type,
+            )
+        return paginated_response(key, file_path, data_spec, ranges)
+    return cached_json_response(key, file_path, read, data_spec)
+
+
+def read_masked_array_data(
+    file_path: str,
+    data_spec: SWIFTMaskedDataSpec,
+    ranges: npt.NDArray | None = None,
+) -> dict:
+    """Read a masked array and format it for the response.
+
+    Args:
+        file_path (str): Path to HDF5 file
+        data_spec (SWIFTMaskedDataSpec): Dataset information from the request
+        ranges (npt.NDArray | None, optional):
+            Row ranges of a stored mask, used instead of the mask in the request.
+            Defaults to None.
+
+    Raises
+    ------
+        SWIFTDataSpecException: If the field is not found in the file
+
+    Returns
+    -------
+        dict: Numpy ndarray formatted as JSON, with its original data type
+    """
+    if is_derived_field(data_spec.field):
+        return get_derived_array_data(
+            file_path,
+            data_spec.field,
+            data_spec.mask_array_json,
+            data_spec.mask_data_type,
+            data_spec.columns,
+            data_spec.centre,
+            ranges,
+            data_spec.precision,
+            data_spec.encoding,
+        )
+
+    try:
+        if ranges is not None:
+            masked_array = SWIFTProcessor.get_array_ranges(
+                file_path,
+                data_spec.field,
+                ranges,
+                data_spec.mask_size,
+                data_spec.columns,
+            )
+        else:
+            masked_array = SWIFTProcessor.get_array_masked(
+                file_path,
+                data_spec.field,
+                data_spec.mask_array_json,
+                data_spec.mask_data_type,
+                data_spec.mask_size,
+                data_spec.columns,
+            )
+    except SWIFTProcessorError:
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Field {data_spec.field} not found in the requested file {file_path}.",
+        ) from SWIFTProcessorError
+
+    return format_array(
+        masked_array,
+        data_spec.precision,
+        data_spec.encoding,
+    )
+
+
+@router.post("/unmasked_dataset")
+def get_unmasked_array_data(
+    data_spec: SWIFTUnmaskedDataSpec = Body(embed=True),
+    _: str = Depends(get_authenticated_user),
+) -> Response:
+    """Retrieve an unmasked array from a dataset.
+
+    Returns the array generated from the HDF5 file
+    using the data specification provided.
+
+    Args:
+        data_spec (SWIFTUnmaskedDataSpec):
+            Dataset information required in POST request
+
+    Raises
+    ------
+        SWIFTDataSpecException:
+            Exceptions raised for incorrectly formatted requests
+
+    Returns
+    -------
+        Response:
+            Numpy ndarray formatted as JSON. The resulting object
+            contains the array and the original data type.
+    """
+    processor = SWIFTProcessor(dataset_map)
+
+    file_path = str(get_file_path(data_spec, processor))
+
+    check_array_options(data_spec.precision, data_spec.encoding)
+    key = request_key(
+        file_path,
+        data_spec.field,
+        data_spec.columns,
+        centre=data_spec.centre,
+        precision=data_spec.precision,
+        encoding=data_spec.encoding,
+    )
+    if data_spec.cursor is not None or data_spec.page_bytes is not None:
+        return paginated_response(key, file_path, data_spec)
+    return cached_json_response(key, file_path, read_unmasked_array_data, data_spec)
+
+
+def read_unmasked_array_data(
+    file_path: str,
+    data_spec: SWIFTUnmaskedDataSpec,
+) -> dict:
+    """Read an unmasked array and format it for the response.
+
+    Args:
+        file_path (str): Path to HDF5 file
+        data_spec (SWIFTUnmaskedDataSpec): Dataset information from the request
+
+    Returns
+    -------
+        dict: Numpy ndarray formatted as JSON, with its original data type
+    """
+    if is_derived_field(data_spec.field):
+        return get_derived_array_data(
+            file_path,
+            data_spec.field,
+            columns=data_spec.columns,
+            centre=data_spec.centre,
+            precision=data_spec.precision,
+            encoding=data_spec.encoding,
+        )
+
+    unmasked_array = SWIFTProcessor.get_array_unmasked(
+        file_path,
+        data_spec.field,
+        data_spec.columns,
+    )
+
+    return format_array(
+        unmasked_array,
+        data_spec.precision,
+        data_spec.encoding,
+    )
+
+
+def load_mask_ranges(mask_json: str, mask_data_type: str | None) -> npt.NDArray:
+    """Load the row ranges of a mask sent with a request.
+
+    Args:
+        mask_json (str): Row ranges as JSON
+        mask_data_type (str | None): Data type of the mask
+
+    Raises
+    ------
+        SWIFTDataSpecException: For malformed masks
+
+    Returns
+    -------
+        npt.NDArray: Half-open row ranges with shape (N, 2)
+    """
+    try:
+        return normalise_mask(mask_json, mask_data_type)
+    except MaskStoreError as error:
+        raise mask_store_exception(error) from error
+
+
+def field_length(file_path: str, field: str) -> int:
+    """Find the number of rows in a raw or derived field.
+
+    Args:
+        file_path (str): Path to HDF5 file
+        field (str): Raw or derived field path
+
+    Raises
+    ------
+        SWIFTDataSpecException: For unknown fields
+
+    Returns
+    -------
+        int: Number of rows in the field
+    """
+    try:
+        rows, _ = field_rows(file_path, field)
+    except PaginationError as error:
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(error),
+        ) from error
+    return rows
+
+
+def check_mask_ranges(ranges: npt.NDArray, rows: int, field: str) -> None:
+    """Check that the row ranges of a mask lie within a field.
+
+    Args:
+        ranges (npt.NDArray): Half-open row ranges with shape (N, 2)
+        rows (int): Number of rows in the field
+        field (str): Field path, for error messages
+
+    Raises
+    ------
+        SWIFTDataSpecException:
+            HTTP 400 for negative ranges, ranges ending before they start, or
+            ranges beyond the end of the field
+    """
+    try:
+        check_ranges(ranges, rows, field)
+    except MaskStoreError as error:
+        raise mask_store_exception(error) from error
+
+
+def paginated_response(
+    key: tuple,
+    file_path: str,
+    data_spec: SWIFTMaskedDataSpec | SWIFTUnmaskedDataSpec,
+    ranges: npt.NDArray | None = None,
+) -> Response:
+    """Serve one page of a dataset, starting at the cursor of the request.
+
+    Args:
+        key (tuple): Normalised request from `request_key`, without pagination
+        file_path (str): Path to HDF5 file
+        data_spec (SWIFTMaskedDataSpec | SWIFTUnmaskedDataSpec):
+            Dataset information from the request
+        ranges (npt.NDArray | None, optional):
+            Half-open row ranges of the mask. Defaults to None, for every row.
+
+    Raises
+    ------
+        SWIFTDataSpecException:
+            For unknown fields or invalid cursors, with a 409 for cursors issued
+            before the file changed
+
+    Returns
+    -------
+        Response: JSON response with the page of the array and the next cursor
+    """
+    try:
+        page = plan_page(
+            file_path,
+            data_spec.field,
+            ranges,
+            data_spec.page_bytes or get_settings().dataset_page_bytes,
+            cache_key(key),
+            data_spec.cursor,
+            data_spec.columns,
+        )
+    except PaginationError as error:
+        raise SWIFTDataSpecException(
+            status_code=(
+                status.HTTP_409_CONFLICT
+                if isinstance(error, StaleCursorError)
+                else status.HTTP_400_BAD_REQUEST
+            ),
+            detail=str(error),
+        ) from error
+
+    return cached_json_response(
+        (*key, page.offset, page.rows),
+        file_path,
+        partial(read_array_page, page=page),
+        data_spec,
+    )
+
+
+def read_array_page(
+    file_path: str,
+    data_spec: SWIFTMaskedDataSpec | SWIFTUnmaskedDataSpec,
+    page: Page,
+) -> dict:
+    """Read one page of an array and format it for the response.
+
+    Args:
+        file_path (str): Path to HDF5 file
+        data_spec (SWIFTMaskedDataSpec | SWIFTUnmaskedDataSpec):
+            Dataset information from the request
+        page (Page): Rows of the page
+
+    Raises
+    ------
+        SWIFTDataSpecException: If the field is not found in the file
+
+    Returns
+    -------
+        dict: Page of the array formatted as JSON, with its position and next cursor
+    """
+    if is_derived_field(data_spec.field):
+        response = get_derived_array_data(
+            file_path,
+            data_spec.field,
+            columns=data_spec.columns,
+            centre=data_spec.centre,
+            ranges=page.ranges,
+            precision=data_spec.precision,
+            encoding=data_spec.encoding,
+        )
+    else:
+        try:
+            array = SWIFTProcessor.get_array_ranges(
+                file_path,
+                data_spec.field,
+                page.ranges,
+                page.rows,
+                data_spec.columns,
+            )
+        except SWIFTProcessorError as error:
+            raise SWIFTDataSpecException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(error),
+            ) from error
+        response = format_array(array, data_spec.precision, data_spec.encoding)
+
+    response.update(page.as_dict())
+    return response
+
+
+def requested_span(
+    request: Request,
+    size: int,
+    etag: str,
+    last_modified: str,
+) -> tuple[int, int] | None:
+    """Find the byte range requested with the `Range` and `If-Range` headers.
+
+    Args:
+        request (Request): Incoming request
+        size (int): Size of the result in bytes
+        etag (str): Entity tag of the result
+        last_modified (str): Modification date of the result
+
+    Raises
+    ------
+        SWIFTDataSpecException: HTTP 416 for ranges outside the result
+
+    Returns
+    -------
+        tuple[int, int] | None: Half-open byte range, or None for the whole result
+    """
+    header = request.headers.get("range")
+    if header is None or not range_applies(
+        request.headers.get("if-range"),
+        etag,
+        last_modified,
+    ):
+        return None
+    try:
+        return parse_range(header, size)
+    except UnsatisfiableRangeError as error:
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail=str(error),
+            headers={"content-range": content_range(None, size)},
+        ) from error
+
+
+def partial_content(
+    span: tuple[int, int] | None,
+    size: int,
+    headers: dict[str, str],
+) -> tuple[tuple[int, int], int, dict[str, str]]:
+    """Work out the bytes, status and headers of a whole result or a range of it.
+
+    Args:
+        span (tuple[int, int] | None): Requested byte range, or None for all bytes
+        size (int): Size of the result in bytes
+        headers (dict[str, str]): Headers describing the result
+
+    Returns
+    -------
+        tuple[tuple[int, int], int, dict[str, str]]:
+            Half-open byte range to send, HTTP 206 for ranges or otherwise HTTP 200,
+            and the response headers
+    """
+    headers = {**headers, "accept-ranges": "bytes"}
+    if span is None:
+        return (0, size), status.HTTP_200_OK, headers
+    headers["content-range"] = content_range(span, size)
+    return span, status.HTTP_206_PARTIAL_CONTENT, headers
+
+
+def ranged_response(
+    content: Callable[[int, int], Iterator[bytes]],
+    size: int,
+    span: tuple[int, int] | None,
+    media_type: str,
+    headers: dict[str, str],
+) -> StreamingResponse:
+    """Stream a whole computed result, or one byte range of it.
+
+    Args:
+        content (Callable[[int, int], Iterator[bytes]]):
+            Function producing the bytes in a half-open byte range
+        size (int): Size of the result in bytes
+        span (tuple[int, int] | None): Requested byte range, or None for all bytes
+        media_type (str): Media type of the result
+        headers (dict[str, str]): Headers describing the result
+
+    Returns
+    -------
+        StreamingResponse: HTTP 206 response for ranges, otherwise HTTP 200
+    """
+    span, status_code, headers = partial_content(span, size, headers)
+    headers["content-length"] = str(span[1] - span[0])
+    return StreamingResponse(
+        content(*span),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+def ranged_file_response(
+    request: Request,
+    path: Path,
+    media_type: str,
+    filename: str,
+) -> FileSegmentsResponse:
+    """Serve a result file, from the start of any requested range.
+
+    Args:
+        request (Request): Incoming request, with any `Range` and `If-Range` headers
+        path (Path): File holding the result
+        media_type (str): Media type of the result
+        filename (str): Name to save the result as
+
+    Returns
+    -------
+        FileSegmentsResponse: The file, or the requested range of it
+    """
+    mtime_ns, size = source_stamp(str(path))
+    etag = entity_tag(str(path), mtime_ns, size)
+    last_modified = http_date(mtime_ns)
+    span, status_code, headers = partial_content(
+        requested_span(request, size, etag, last_modified),
+        size,
+        {
+            "etag": etag,
+            "last-modified": last_modified,
+            "content-disposition": f'attachment; filename="{filename}"',
+        },
+    )
+    return FileSegmentsResponse(
+        path,
+        [(span[0], span[1] - span[0])],
+        status_code,
+        headers,
+        media_type,
+    )
+
+
+def read_array_rows(
+    file_path: str,
+    data_spec: SWIFTBinaryDataSpec,
+    ranges: npt.NDArray,
+    rows: int,
+) -> tuple[npt.NDArray, str | None]:
+    """Read the rows of a raw or derived field in some row ranges.
+
+    Args:
+        file_path (str): Path to HDF5 file
+        data_spec (SWIFTBinaryDataSpec): Dataset information from the request
+        ranges (npt.NDArray): Half-open row ranges to read
+        rows (int): Number of rows in the ranges
+
+    Raises
+    ------
+        SWIFTDataSpecException: If the field is not found in the file
+
+    Returns
+    -------
+        tuple[npt.NDArray, str | None]: Rows, and their units for derived fields
+    """
+    try:
+        if is_derived_field(data_spec.field):
+            return SWIFTProcessor.get_array_derived(
+                file_path,
+                data_spec.field,
+                ranges,
+                data_spec.columns,
+                data_spec.centre,
+            )
+        array = SWIFTProcessor.get_array_ranges(
+            file_path,
+            data_spec.field,
+            ranges,
+            rows,
+            data_spec.columns,
+        )
+    except SWIFTProcessorError as error:
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(error),
+        ) from error
+    return array, None
+
+
+@router.post("/array_bytes")
+def get_array_bytes(
+    request: Request,
+    data_spec: SWIFTBinaryDataSpec = Body(embed=True),
+    user: str = Depends(get_authenticated_user),
+    store: MaskStore = Depends(get_mask_store),
+) -> Response:
+    """Retrieve an array as raw bytes, resumable with `Range` requests.
+
+    The array is sent as C-order little-endian bytes, described by the
+    `X-Array-Dtype` and `X-Array-Shape` headers, with `X-Array-Units` for derived
+    fields. Ranges of the array are computed by reading only the rows they overlap.
+    Raw fields stored contiguously without compression are sent straight from the
+    snapshot file.
+
+    Args:
+        request (Request): Incoming request, with any `Range` and `If-Range` headers
+        data_spec (SWIFTBinaryDataSpec):
+            Dataset information required in POST request
+        user (str, optional): Authenticated user. Defaults to Depends(get_authenticated_user).
+        store (MaskStore, optional): Mask store. Defaults to Depends(get_mask_store).
+
+    Raises
+    ------
+        SWIFTDataSpecException:
+            Exceptions raised for incorrectly formatted requests or masks outside
+            the field, or HTTP 416 for ranges outside the array
+
+    Returns
+    -------
+        Response: Raw bytes of the array, or the requested range of them
+    """
+    processor = SWIFTProcessor(dataset_map)
+    file_path = str(get_file_path(data_spec, processor))
+    length = field_length(file_path, data_spec.field)
+
+    if data_spec.mask_id:
+        try:
+            ranges = store.get(data_spec.mask_id, user)
+        except MaskStoreError as error:
+            raise mask_store_exception(error) from error
+        mask = data_spec.mask_id
+    elif data_spec.mask_array_json:
+        ranges = load_mask_ranges(data_spec.mask_array_json, data_spec.mask_data_type)
+        mask = data_spec.mask_array_json
+    else:
+        ranges = np.array([[0, length]], dtype=np.int64)
+        mask = None
+    check_mask_ranges(ranges, length, data_spec.field)
+    total_rows = int(np.diff(ranges, axis=1).sum())
+
+    probe = select_rows(ranges, 0, 1) if total_rows else np.array([[0, 1]])
+    first_row, units = read_array_rows(file_path, data_spec, probe, 1)
+    first_row = little_endian(first_row)
+    row_bytes = first_row.nbytes
+    size = total_rows * row_bytes
+
+    stamp = source_stamp(file_path)
+    key = request_key(
+        file_path,
+        data_spec.field,
+        data_spec.columns,
+        mask,
+        response_format="bytes",
+        mask_data_type=data_spec.mask_data_type,
+        centre=data_spec.centre,
+    )
+    etag = entity_tag(cache_key(key), stamp)
+    last_modified = http_date(stamp[0])
+    span = requested_span(request, size, etag, last_modified)
+
+    headers = {
+        "etag": etag,
+        "last-modified": last_modified,
+        "x-array-dtype": first_row.dtype.str,
+        "x-array-shape": ",".join(map(str, (total_rows, *first_row.shape[1:]))),
+    }
+    if units is not None:
+        headers["x-array-units"] = str(units)
+
+    def read(row_ranges: npt.NDArray, rows: int) -> npt.NDArray:
+        array, _ = read_array_rows(file_path, data_spec, row_ranges, rows)
+        return array
+
+    offset = None
+    if not is_derived_field(data_spec.field) and data_spec.columns is None:
+        offset = contiguous_offset(file_path, data_spec.field)
+    if offset is not None:
+        span, status_code, headers = partial_content(span, size, headers)
+        return FileSegmentsResponse(
+            Path(file_path),
+            file_segments(ranges, offset, row_bytes, *span),
+            status_code,
+            headers,
+            "application/octet-stream",
+        )
+
+    block_rows = max(get_settings().dataset_page_bytes // row_bytes, 1)
+    return ranged_response(
+        partial(iter_array_range, read, ranges, row_bytes, block_rows=block_rows),
+        size,
+        span,
+        "application/octet-stream",
+        headers,
+    )
+
+
+def get_fields_in_ranges(
+    file_path: str,
+    fields: list[str],
+    ranges: npt.NDArray,
+    rows: int,
+) -> dict:
+    """Read raw or derived fields for the rows within a set of ranges.
+
+    Args:
+        file_path (str): Path to HDF5 file
+        fields (list[str]): Field paths to read
+        ranges (npt.NDArray): Half-open row ranges
+        rows (int): Total number of rows in the ranges
+
+    Raises
+    ------
+        SWIFTDataSpecException: If a field is not found in the file.
+
+    Returns
+    -------
+        dict: Array and data type of each field, and units of derived fields
+    """
+    response = {}
+    for field in fields:
+        try:
+            if is_derived_field(field):
+                array, units = SWIFTProcessor.get_array_derived(
+                    file_path,
+                    field,
+                    ranges,
+                )
+                response[field] = SWIFTProcessor.generate_dict_from_ndarray(array)
+                response[field]["units"] = units
+                continue
+            array = SWIFTProcessor.get_array_ranges(file_path, field, ranges, rows)
+        except SWIFTProcessorError as error:
+            raise SWIFTDataSpecException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(error),
+            ) from error
+        response[field] = SWIFTProcessor.generate_dict_from_ndarray(array)
+    return response
+
+
+@router.post("/filter")
+def get_filtered_data(
+    data_spec: SWIFTFilterSpec = Body(embed=True),
+    _: str = Depends(get_authenticated_user),
+) -> dict:
+    """Select particles satisfying comparison predicates on their fields.
+
+    Args:
+        data_spec (SWIFTFilterSpec):
+            Predicates, how to combine them, and optionally the fields to return
+            for the selected particles.
+
+    Raises
+    ------
+        SWIFTDataSpecException:
+            Exceptions raised for invalid predicates or unknown fields
+
+    Returns
+    -------
+        dict:
+            Ranges of matching rows in the same format as masked dataset arrays,
+            statistics on the rows read and, if requested, each selected field.
+    """
+    processor = SWIFTProcessor(dataset_map)
+    file_path = str(get_file_path(data_spec, processor))
+
+    try:
+        ranges, stats = filter_ranges(
+            file_path,
+            [predicate.model_dump() for predicate in data_spec.predicates],
+            data_spec.combine,
+        )
+    except FilterError as error:
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(error),
+        ) from error
+
+    response = {
+        "ranges": processor.generate_dict_from_ndarray(ranges),
+        "stats": stats,
+    }
+    if data_spec.fields is None:
+        return response
+
+    response["fields"] = get_fields_in_ranges(
+        file_path,
+        data_spec.fields,
+        ranges,
+        stats["rows_matched"],
+    )
+    return response
+
+
+@router.post("/aperture")
+def get_aperture_data(
+    data_spec: SWIFTApertureSpec = Body(embed=True),
+    _: str = Depends(get_authenticated_user),
+) -> dict:
+    """Select particles of one type within a spherical or box aperture.
+
+    Args:
+        data_spec (SWIFTApertureSpec):
+            Particle type, aperture centre and either a radius or box half widths,
+            in the units of the particle coordinates, and the fields to return.
+
+    Raises
+    ------
+        SWIFTDataSpecException:
+            Exceptions raised for invalid apertures or unknown fields
+
+    Returns
+    -------
+        dict:
+            Ranges of rows inside the aperture in the same format as masked
+            dataset arrays, statistics on the cells and rows read, and each
+            requested field for the selected particles.
+    """
+    processor = SWIFTProcessor(dataset_map)
+    file_path = str(get_file_path(data_spec, processor))
+
+    for field in data_spec.fields:
+        if not field.strip("/").startswith(f"{data_spec.part_type}/"):
+            raise SWIFTDataSpecException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Field {field} is not a {data_spec.part_type} field.",
+            )
+
+    try:
+        ranges, stats = aperture_ranges(
+            file_path,
+            data_spec.part_type,
+            data_spec.centre,
+            data_spec.radius,
+            data_spec.half_widths,
+        )
+    except ApertureError as error:
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(error),
+        ) from error
+
+    return {
+        "ranges": processor.generate_dict_from_ndarray(ranges),
+        "stats": stats,
+        "fields": get_fields_in_ranges(
+            file_path,
+            data_spec.fields,
+            ranges,
+            stats["rows_matched"],
+        ),
+    }
+
+
+@router.post("/apertures")
+def get_batch_aperture_data(
+    data_spec: SWIFTBatchApertureSpec = Body(embed=True),
+    _: str = Depends(get_authenticated_user),
+) -> StreamingResponse:
+    """Select particles of one type within each of a batch of spherical apertures.
+
+    Args:
+        data_spec (SWIFTBatchApertureSpec):
+            Particle type, aperture centres and radii in the units of the particle
+            coordinates, and the fields to return for each aperture.
+
+    Raises
+    ------
+        SWIFTDataSpecException:
+            Exceptions raised for invalid apertures or unknown fields
+
+    Returns
+    -------
+        StreamingResponse:
+            Newline-delimited JSON. The first line holds statistics on the cells and
+            rows read, then each line holds the index of an aperture, the ranges of
+            its rows and the requested fields for them.
+    """
+    processor = SWIFTProcessor(dataset_map)
+    file_path = str(get_file_path(data_spec, processor))
+
+    try:
+        validate_batch(
+            file_path,
+            data_spec.part_type,
+            data_spec.centres,
+            data_spec.radii,
+            data_spec.fields,
+        )
+        lines = stream_cutouts(
+            file_path,
+            data_spec.part_type,
+            data_spec.centres,
+            data_spec.radii,
+            data_spec.fields,
+        )
+        header = next(lines)
+    except ApertureError as error:
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(error),
+        ) from error
+
+    return StreamingResponse(
+        chain((header,), lines),
+        media_type="application/x-ndjson",
+    )
+
+
+def export_ranges(file_path: str, data_spec: SWIFTExportSpec) -> dict[str, npt.NDArray]:
+    """Find the rows of each particle type selected by an export request.
+
+    Args:
+        file_path (str): Path to HDF5 file
+        data_spec (SWIFTExportSpec): Export request
+
+    Raises
+    ------
+        ExportError: For invalid masks or regions.
+
+    Returns
+    -------
+        dict[str, npt.NDArray]: Half-open row ranges for each particle type
+    """
+    if (data_spec.masks is None) == (data_spec.centre is None):
+        message = "Exactly one of masks or a region centre is required."
+        raise ExportError(message)
+    if data_spec.centre is not None:
+        return region_ranges(
+            file_path,
+            list(group_fields(data_spec.fields)),
+            data_spec.centre,
+            data_spec.radius,
+            data_spec.half_widths,
+        )
+    try:
+        return {
+            part_type: normalise_mask(mask_json, data_spec.mask_data_type)
+            for part_type, mask_json in data_spec.masks.items()
+        }
+    except MaskStoreError as error:
+        raise ExportError(str(error)) from error
+
+
+@router.post("/export")
+def export_subset_snapshot(
+    data_spec: SWIFTExportSpec = Body(embed=True),
+    _: str = Depends(get_authenticated_user),
+) -> FileSegmentsResponse:
+    """Export selected particles to a new SWIFT-compatible snapshot file.
+
+    Args:
+        data_spec (SWIFTExportSpec):
+            Fields to export, and either a mask for each particle type or a spatial
+            region in the units of the particle coordinates.
+
+    Raises
+    ------
+        SWIFTDataSpecException:
+            Exceptions raised for invalid selections or unknown fields
+
+    Returns
+    -------
+        FileSegmentsResponse:
+            HDF5 file readable with `swiftsimio.load`, already removed from the
+            export directory
+    """
+    processor = SWIFTProcessor(dataset_map)
+    file_path = str(get_file_path(data_spec, processor))
+    settings = get_settings()
+
+    export_dir = settings.export_dir or Path(tempfile.gettempdir())
+    export_dir.mkdir(parents=True, exist_ok=True)
+    output_path = export_dir / f"export_{uuid.uuid4().hex}.hdf5"
+    try:
+        export_snapshot(
+            file_path,
+            output_path,
+            data_spec.fields,
+            export_ranges(file_path, data_spec),
+            settings.derived_field_block_size,
+            settings.export_compression,
+        )
+        export = output_path.open("rb")
+    except ExportError as error:
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(error),
+        ) from error
+    finally:
+        # The open file is still sent, and its space is freed once it is closed,
+        # even if the client disconnects before the response is complete
+        output_path.unlink(missing_ok=True)
+
+    return FileSegmentsResponse(
+        export,
+        headers={
+            "content-disposition": (
+                f'attachment; filename="{Path(file_path).stem}_subset.hdf5"'
+            ),
+        },
+        media_type="application/x-hdf5",
+    )
+
+
+@router.post("/metadata_remoteunits")
+def retrieve_metadata_with_remote_units(
+    data_spec: SWIFTBaseDataSpec = Body(embed=True),
+    _: str = Depends(get_authenticated_user),
+) -> Response:
+    """Retrieve metadata from a file path.
+
+    Args:
+        data_spec (SWIFTBaseDataSpec): Base dataspec specifying file path or alias.
+
+    Returns
+    -------
+        dict: Metadata for specified file
+    """
+    processor = SWIFTProcessor(dataset_map)
+    file_path = str(get_file_path(data_spec, processor))
+
+    serialised_metadata = get_request_flight().do(
+        request_key(file_path, response_format="pickle"),
+        serialise_swift_metadata,
+        file_path,
+    )
+
+    return Response(content=serialised_metadata, media_type="application/octet-stream")
 
 
 @router.post("/metadata")
 def retrieve_metadata(
-    data_spec: SWIFTBaseDataSpec,
+    data_spec: SWIFTBaseDataSpec = Body(embed=True),
     _: str = Depends(get_authenticated_user),
 ) -> Response:
     """Retrieve metadata from a file path.
@@ -320,18 +2038,55 @@ def retrieve_metadata(
         dict: Metadata for specified file
     """
     processor = SWIFTProcessor(dataset_map)
-    file_path = str(get_file_path(data_spec, processor).resolve())
-
-    swift_units = SWIFTUnits(file_path)
+    file_path = str(get_file_path(data_spec, processor))
 
-    serialised_metadata = create_swift_metadata(file_path, swift_units)
+    serialised_metadata = get_request_flight().do(
+        request_key(file_path, response_format="pickle"),
+        serialise_swift_metadata,
+        file_path,
+    )
 
     return Response(content=serialised_metadata, media_type="application/octet-stream")
 
 
+@router.post("/metadata_json")
+def retrieve_metadata_json(
+    data_spec: SWIFTMetadataSpec = Body(embed=True),
+    _: str = Depends(get_authenticated_user),
+) -> Response:
+    """Retrieve selected sections of a file's metadata as JSON.
+
+    Args:
+        data_spec (SWIFTMetadataSpec):
+            Dataspec specifying file path or alias, and optionally the metadata
+            sections to return. All sections are returned if none are given.
+
+    Raises
+    ------
+        SWIFTDataSpecException: Raised for unknown metadata sections
+
+    Returns
+    -------
+        Response: JSON object mapping section names to their contents
+    """
+    processor = SWIFTProcessor(dataset_map)
+    file_path = str(get_file_path(data_spec, processor))
+
+    sections = None if data_spec.sections is None else tuple(data_spec.sections)
+    try:
+        content = create_swift_metadata_json(file_path, sections)
+    except RemoteSWIFTMetadataError as error:
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(error),
+        ) from error
+
+    return Response(content=content, media_type="application/json")
+
+
 @router.post("/units_dict")
 def retrieve_units_dict(
-    data_spec: SWIFTBaseDataSpec,
+    data_spec: SWIFTBaseDataSpec = Body(embed=True),
     _: str = Depends(get_authenticated_user),
 ) -> dict:
     """Retrieve units for the specified file.
@@ -345,14 +2100,14 @@ def retrieve_units_dict(
     """
     processor = SWIFTProcessor(dataset_map)
 
-    file_path = str(get_file_path(data_spec, processor).resolve())
+    file_path = str(get_file_path(data_spec, processor))
 
     return retrieve_units_json_compatible(file_path)
 
 
 @router.post("/units")
 def retrieve_units(
-    data_spec: SWIFTBaseDataSpec,
+    data_spec: SWIFTBaseDataSpec = Body(embed=True),
     _: str = Depends(get_authenticated_user),
 ) -> dict:
     """Retrieve units for the specified file.
@@ -366,7 +2121,7 @@ def retrieve_units(
     """
     processor = SWIFTProcessor(dataset_map)
 
-    file_path = get_file_path(data_spec, processor).resolve()
+    file_path = get_file_path(data_spec, processor)
 
     serialised_units = create_swift_units(file_path)
 
@@ -0,0 +1,176 @@
+"""Defines routes to submit and follow background extraction jobs."""
+from fastapi import APIRouter, Body, Depends, Request, status
+
+from api.processing.data_processing import SWIFTProcessor
+from api.processing.jobs import (
+    JobError,
+    JobLimitError,
+    JobManager,
+    JobNotFoundError,
+    get_job_manager,
+)
+from api.processing.mask_store import MaskStoreError, normalise_mask
+from api.responses import FileSegmentsResponse
+from api.routers.auth import get_authenticated_user
+from api.routers.file_processing import (
+    SWIFTBaseDataSpec,
+    SWIFTDataSpecException,
+    dataset_map,
+    get_file_path,
+    mask_store_exception,
+    ranged_file_response,
+)
+
+router = APIRouter(
+    prefix="/jobs",
+)
+
+
+class SWIFTJobSpec(SWIFTBaseDataSpec):
+    """Data required in each request to submit an extraction job.
+
+    A Pydantic model to validate HTTP POST requests.
+
+    Args:
+        BaseModel (_type_): Pydantic BaseModel
+    """
+
+    fields: list[str]
+    mask_array_json: str | None = None
+    mask_data_type: str | None = None
+    format: str = "npz"  # noqa: A003
+
+
+def job_exception(error: JobError) -> SWIFTDataSpecException:
+    """Convert a job error into an HTTP exception.
+
+    Args:
+        error (JobError): Job error
+
+    Returns
+    -------
+        SWIFTDataSpecException: Exception with the matching status code
+    """
+    if isinstance(error, JobNotFoundError):
+        status_code = status.HTTP_404_NOT_FOUND
+    elif isinstance(error, JobLimitError):
+        status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    else:
+        status_code = status.HTTP_400_BAD_REQUEST
+    return SWIFTDataSpecException(status_code=status_code, detail=str(error))
+
+
+@router.post("", status_code=status.HTTP_202_ACCEPTED)
+def submit_job(
+    data_spec: SWIFTJobSpec = Body(embed=True),
+    user: str = Depends(get_authenticated_user),
+    manager: JobManager = Depends(get_job_manager),
+) -> dict:
+    """Submit an extraction job to run in the background.
+
+    Args:
+        data_spec (SWIFTJobSpec):
+            File path or alias, fields to extract, an optional mask and the result
+            format
+        user (str, optional): Authenticated user. Defaults to Depends(get_authenticated_user).
+        manager (JobManager, optional): Job manager. Defaults to Depends(get_job_manager).
+
+    Raises
+    ------
+        SWIFTDataSpecException:
+            Raised for invalid specs or masks, or when the user has too many active
+            jobs
+
+    Returns
+    -------
+        dict: Record of the submitted job, including its identifier
+    """
+    processor = SWIFTProcessor(dataset_map)
+    file_path = str(get_file_path(data_spec, processor))
+
+    try:
+        ranges = None
+        if data_spec.mask_array_json:
+            ranges = normalise_mask(data_spec.mask_array_json, data_spec.mask_data_type)
+        return manager.submit(
+            user,
+            file_path,
+            data_spec.fields,
+            ranges,
+            data_spec.format,
+        )
+    except MaskStoreError as error:
+        raise mask_store_exception(error) from error
+    except JobError as error:
+        raise job_exception(error) from error
+
+
+@router.get("/{job_id}")
+def get_job_status(
+    job_id: str,
+    user: str = Depends(get_authenticated_user),
+    manager: JobManager = Depends(get_job_manager),
+) -> dict:
+    """Report the state and progress of a job.
+
+    Args:
+        job_id (str): Job identifier
+        user (str, optional): Authenticated user. Defaults to Depends(get_authenticated_user).
+        manager (JobManager, optional): Job manager. Defaults to Depends(get_job_manager).
+
+    Raises
+    ------
+        SWIFTDataSpecException: Raised for unknown jobs
+
+    Returns
+    -------
+        dict: Job record with its state, progress and any error
+    """
+    try:
+        return manager.status(job_id, user)
+    except JobError as error:
+        raise job_exception(error) from error
+
+
+@router.get("/{job_id}/result")
+def get_job_result(
+    request: Request,
+    job_id: str,
+    user: str = Depends(get_authenticated_user),
+    manager: JobManager = Depends(get_job_manager),
+) -> FileSegmentsResponse:
+    """Download the result of a finished job.
+
+    Downloads can be resumed with `Range` requests, which are served straight
+    from the requested bytes of the result file.
+
+    Args:
+        request (Request): Incoming request, with any `Range` and `If-Range` headers
+        job_id (str): Job identifier
+        user (str, optional): Authenticated user. Defaults to Depends(get_authenticated_user).
+        manager (JobManager, optional): Job manager. Defaults to Depends(get_job_manager).
+
+    Raises
+    ------
+        SWIFTDataSpecException: Raised for unknown or unfinished jobs
+
+    Returns
+    -------
+        FileSegmentsResponse: Result file of the job, or the requested range of it
+    """
+    try:
+        path = manager.result_path(job_id, user)
+    except JobNotFoundError as error:
+        raise job_exception(error) from error
+    except JobError as error:
+        raise SWIFTDataSpecException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(error),
+        ) from error
+
+    return ranged_file_response(
+        request,
+        path,
+        "application/octet-stream",
+        f"{job_id}{path.suffix}",
+    )
@@ -0,0 +1,80 @@
+"""Defines routes reporting the health of the API and its dependencies."""
+from fastapi import APIRouter, Depends
+
+from api.processing.coalescing import SingleFlight, get_request_flight
+from api.processing.mask_store import MaskStore, get_mask_store
+from api.processing.result_cache import ResultCache, get_result_cache
+from api.routers.auth import get_virgodb_client
+from api.virgo_auth import VirgoDBClient
+
+router = APIRouter(
+    prefix="/monitoring",
+)
+
+
+@router.get("/upstream")
+def upstream_metrics(
+    client: VirgoDBClient = Depends(get_virgodb_client),
+) -> dict:
+    """Report latency and circuit breaker state for upstream services.
+
+    Args:
+        client (VirgoDBClient, optional):
+            Pooled Virgo DB client. Defaults to Depends(get_virgodb_client).
+
+    Returns
+    -------
+        dict: Latency histogram and circuit breaker state per upstream service
+    """
+    return {"virgodb": client.stats()}
+
+
+@router.get("/coalescing")
+def coalescing_metrics(
+    flight: SingleFlight = Depends(get_request_flight),
+) -> dict:
+    """Report how often identical concurrent data requests shared one read.
+
+    Args:
+        flight (SingleFlight, optional):
+            Coalescer shared by the data routes. Defaults to Depends(get_request_flight).
+
+    Returns
+    -------
+        dict: Requests that ran, requests that waited for another and those in flight
+    """
+    return flight.as_dict()
+
+
+@router.get("/result_cache")
+def result_cache_metrics(
+    cache: ResultCache = Depends(get_result_cache),
+) -> dict:
+    """Report hit rate, evictions and size of the array response cache.
+
+    Args:
+        cache (ResultCache, optional):
+            Cache shared by the data routes. Defaults to Depends(get_result_cache).
+
+    Returns
+    -------
+        dict: Hit, miss, eviction and invalidation counts, and bytes used
+    """
+    return cache.as_dict()
+
+
+@router.get("/mask_store")
+def mask_store_metrics(
+    store: MaskStore = Depends(get_mask_store),
+) -> dict:
+    """Report the number and size of masks uploaded for reuse.
+
+    Args:
+        store (MaskStore, optional):
+            Store shared by the mask routes. Defaults to Depends(get_mask_store).
+
+    Returns
+    -------
+        dict: Number of masks and users, and bytes stored
+    """
+    return store.as_dict()
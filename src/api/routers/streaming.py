@@ -0,0 +1,345 @@
+"""Defines a WebSocket route serving many requests for one snapshot.
+
+The client opens the connection with a JSON "open" message giving a token, unless
+one is sent in the Authorization header, and the alias or filename of a snapshot.
+It then sends "field", "mask" and "region" requests, each with an identifier, and
+receives the rows of each as binary frames (see `api.processing.streaming`). A
+request reusing the identifier of an unfinished request supersedes it, and
+"cancel" messages stop a request. "ack" messages acknowledge consumed frames.
+"""
+import asyncio
+from typing import Literal
+
+import numpy as np
+import orjson
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from loguru import logger
+from pydantic import BaseModel, Field, ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from api.config import get_settings
+from api.processing.data_processing import SWIFTProcessor
+from api.processing.pagination import select_rows
+from api.processing.streaming import (
+    CreditWindow,
+    PinnedSnapshot,
+    StreamError,
+    encode_frame,
+)
+from api.routers.auth import authenticate_token
+from api.routers.file_processing import SWIFTBaseDataSpec, dataset_map, get_file_path
+
+router = APIRouter(
+    prefix="/swiftdata",
+)
+
+
+class SWIFTStreamOpen(SWIFTBaseDataSpec):
+    """Message opening a streaming connection.
+
+    A Pydantic model to validate WebSocket messages.
+
+    Args:
+        BaseModel (_type_): Pydantic BaseModel
+    """
+
+    type: Literal["open"]  # noqa: A003
+    token: str | None = None
+    window: int | None = Field(default=None, gt=0)
+
+
+class SWIFTStreamRequest(BaseModel):
+    """Message requesting the rows of a field, optionally masked or in a region.
+
+    A Pydantic model to validate WebSocket messages.
+
+    Args:
+        BaseModel (_type_): Pydantic BaseModel
+    """
+
+    type: Literal["field", "mask", "region"]  # noqa: A003
+    id: str  # noqa: A003
+    field: str
+    columns: int | None = None
+    mask_array_json: str | None = None
+    mask_data_type: str | None = None
+    mask_id: str | None = None
+    centre: list[float] | None = None
+    radius: float | None = None
+    half_widths: list[float] | None = None
+
+
+class SWIFTStreamControl(BaseModel):
+    """Message cancelling a request, or acknowledging frames.
+
+    A Pydantic model to validate WebSocket messages.
+
+    Args:
+        BaseModel (_type_): Pydantic BaseModel
+    """
+
+    type: Literal["cancel", "ack"]  # noqa: A003
+    id: str | None = None  # noqa: A003
+    frames: int = Field(default=1, gt=0)
+
+
+class StreamSession:
+    """The requests in flight on one streaming connection."""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user: str,
+        snapshot: PinnedSnapshot,
+        frame_bytes: int,
+        window: int,
+    ):
+        """Class constructor.
+
+        Args:
+            websocket (WebSocket): Accepted connection
+            user (str): Authenticated user
+            snapshot (PinnedSnapshot): Snapshot pinned by the connection
+            frame_bytes (int): Maximum bytes of rows in each frame
+            window (int): Maximum number of unacknowledged frames
+        """
+        self.websocket = websocket
+        self.user = user
+        self.snapshot = snapshot
+        self.frame_bytes = frame_bytes
+        self.credit = CreditWindow(window)
+        self._send_lock = asyncio.Lock()
+        self._tasks: dict[str, tuple[int, asyncio.Task]] = {}
+        self._serial = 0
+
+    async def send_json(self, message: dict) -> None:
+        """Send a text message.
+
+        Args:
+            message (dict): JSON-serialisable message
+        """
+        async with self._send_lock:
+            await self.websocket.send_json(message)
+
+    async def send_error(
+        self,
+        request_id: str | None,
+        serial: int | None,
+        detail: str,
+    ) -> None:
+        """Tell the client that a message or request failed.
+
+        Args:
+            request_id (str | None): Identifier of the request, if known
+            serial (int | None): Serial number of the request, if it was accepted
+            detail (str): Description of the failure
+        """
+        message = {"type": "error", "id": request_id, "detail": detail}
+        if serial is not None:
+            message["serial"] = serial
+        await self.send_json(message)
+
+    async def send_frame(self, header: dict, payload: bytes) -> None:
+        """Send a binary frame once the client has acknowledged enough frames.
+
+        Args:
+            header (dict): Frame header
+            payload (bytes): Raw bytes of the rows
+        """
+        await self.credit.acquire()
+        async with self._send_lock:
+            await self.websocket.send_bytes(encode_frame(header, payload))
+
+    async def run(self) -> None:
+        """Handle messages until the client disconnects.
+
+        Binary messages from the client are answered with an "error" message.
+        """
+        try:
+            while True:
+                try:
+                    text = await self.websocket.receive_text()
+                except KeyError:
+                    # Binary messages have no "text"
+                    await self.send_error(None, None, "Messages must be JSON text.")
+                    continue
+                await self.handle(text)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            tasks = [task for _, task in self._tasks.values()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await run_in_threadpool(self.snapshot.close)
+
+    async def handle(self, text: str) -> None:
+        """Dispatch one message from the client.
+
+        Messages that are not valid JSON are answered with an "error" message.
+
+        Args:
+            text (str): JSON message
+        """
+        try:
+            message = orjson.loads(text)
+        except orjson.JSONDecodeError as error:
+            await self.send_error(None, None, f"Messages must be JSON: {error}")
+            return
+        kind = message.get("type") if isinstance(message, dict) else None
+        try:
+            if kind in ("cancel", "ack"):
+                control = SWIFTStreamControl.model_validate(message)
+                if control.type == "ack":
+                    await self.credit.release(control.frames)
+                elif control.id is not None:
+                    await self.cancel(control.id)
+            else:
+                await self.submit(SWIFTStreamRequest.model_validate(message))
+        except ValidationError as error:
+            request_id = message.get("id") if isinstance(message, dict) else None
+            await self.send_error(request_id, None, str(error))
+
+    async def cancel(self, request_id: str) -> None:
+        """Cancel an unfinished request.
+
+        Args:
+            request_id (str): Identifier of the request
+        """
+        entry = self._tasks.pop(request_id, None)
+        if entry is None:
+            return
+        serial, task = entry
+        task.cancel()
+        await self.send_json({"type": "cancelled", "id": request_id, "serial": serial})
+
+    async def submit(self, request: SWIFTStreamRequest) -> None:
+        """Start serving a request, superseding any with the same identifier.
+
+        Args:
+            request (SWIFTStreamRequest): Validated request
+        """
+        await self.cancel(request.id)
+        self._serial += 1
+        serial = self._serial
+        await self.send_json({"type": "accepted", "id": request.id, "serial": serial})
+        self._tasks[request.id] = (
+            serial,
+            asyncio.create_task(self.serve(request, serial)),
+        )
+
+    async def serve(self, request: SWIFTStreamRequest, serial: int) -> None:
+        """Send the rows selected by a request, a frame at a time.
+
+        A request that fails is answered with an "error" message rather than left
+        without a reply.
+
+        Args:
+            request (SWIFTStreamRequest): Validated request
+            serial (int): Serial number distinguishing superseded requests
+        """
+        try:
+            ranges = await run_in_threadpool(
+                self.snapshot.request_ranges,
+                request.model_dump(),
+                self.user,
+            )
+            _, row_bytes = await run_in_threadpool(
+                self.snapshot.row_bytes,
+                request.field,
+                request.columns,
+            )
+            total_rows = int(np.diff(ranges, axis=1).sum())
+            frame_rows = max(self.frame_bytes // max(row_bytes, 1), 1)
+
+            offset = 0
+            while True:
+                rows = min(frame_rows, total_rows - offset)
+                array, units = await run_in_threadpool(
+                    self.snapshot.read,
+                    request.field,
+                    select_rows(ranges, offset, rows),
+                    rows,
+                    request.columns,
+                    request.centre,
+                )
+                array = np.ascontiguousarray(array)
+                final = offset + rows >= total_rows
+                header = {
+                    "id": request.id,
+                    "serial": serial,
+                    "dtype": array.dtype.str,
+                    "shape": list(array.shape),
+                    "offset": offset,
+                    "rows": rows,
+                    "total_rows": total_rows,
+                    "final": final,
+                    "units": units,
+                }
+                await self.send_frame(header, array.tobytes())
+                offset += rows
+                if final:
+                    break
+        except StreamError as error:
+            await self.send_error(request.id, serial, str(error))
+        except Exception as error:  # noqa: BLE001
+            logger.warning(f"Stream request {request.id} failed: {error!r}")
+            await self.send_error(request.id, serial, "Failed to read the request.")
+        finally:
+            if self._tasks.get(request.id, (None,))[0] == serial:
+                del self._tasks[request.id]
+
+
+def bearer_token(websocket: WebSocket) -> str | None:
+    """Read a bearer token from the Authorization header of a connection.
+
+    Args:
+        websocket (WebSocket): Connection
+
+    Returns
+    -------
+        str | None: Token, if one was sent
+    """
+    scheme, _, token = websocket.headers.get("authorization", "").partition(" ")
+    return token if scheme.lower() == "bearer" and token else None
+
+
+@router.websocket("/stream")
+async def stream_snapshot(websocket: WebSocket) -> None:
+    """Serve field, mask and region requests for one snapshot over a WebSocket.
+
+    Args:
+        websocket (WebSocket): Connection
+    """
+    await websocket.accept()
+    settings = get_settings()
+    try:
+        opening = SWIFTStreamOpen.model_validate(await websocket.receive_json())
+        user = authenticate_token(opening.token or bearer_token(websocket), settings)
+        file_path = str(get_file_path(opening, SWIFTProcessor(dataset_map)))
+        snapshot = await run_in_threadpool(PinnedSnapshot, file_path)
+    except WebSocketDisconnect:
+        return
+    except (HTTPException, OSError, ValidationError, ValueError) as error:
+        detail = error.detail if isinstance(error, HTTPException) else str(error)
+        await websocket.send_json({"type": "error", "id": None, "detail": detail})
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    window = min(opening.window or settings.stream_window, settings.stream_window)
+    await websocket.send_json(
+        {
+            "type": "opened",
+            "filename": file_path,
+            "frame_bytes": settings.stream_frame_bytes,
+            "window": window,
+        },
+    )
+    session = StreamSession(
+        websocket,
+        user,
+        snapshot,
+        settings.stream_frame_bytes,
+        window,
+    )
+    await session.run()
@@ -1,16 +1,20 @@
 """Module to handle authentiation against the database server."""
-import json
+import hashlib
+import math
+import secrets
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from pathlib import Path
+from http.cookiejar import CookieJar, DefaultCookiePolicy
 
+import httpx
 import jwt
-import requests
 from fastapi import HTTPException, status
 from loguru import logger
-from requests import Session
-from requests.utils import cookiejar_from_dict, dict_from_cookiejar
 
+from api.circuit_breaker import CircuitBreaker, CircuitBreakerOpenError
 from api.config import Settings
+from api.metrics import LatencyHistogram
 
 
 class SWIFTAuthenticatorException(HTTPException):
@@ -20,17 +24,226 @@ class SWIFTAuthenticatorException(HTTPException):
         HTTPException (_type_): HTTPException with status code.
     """
 
-    def __init__(self, status_code: int, detail: str | None = None):
+    def __init__(
+        self,
+        status_code: int,
+        detail: str | None = None,
+        headers: dict[str, str] | None = None,
+    ):
         """Class constructor.
 
         Args:
             status_code (int): HTTP response status code
             detail (str | None, optional):
                 Additional exception details. Defaults to None.
+            headers (dict[str, str] | None, optional):
+                Additional response headers. Defaults to None.
         """
         if not detail:
             detail = "Error authenticating current user."
-        super().__init__(status_code, detail=detail)
+        super().__init__(status_code, detail=detail, headers=headers)
+
+
+class VirgoDBClient:
+    """Pooled, persistent HTTP client for requests to the Virgo DB.
+
+    A single instance is shared by every authentication request handled by a worker,
+    so TCP and TLS connections are kept alive and reused between requests. Session
+    cookies returned by the Virgo DB are held in memory rather than in a file shared
+    between workers, keyed by a hash of the username and password that obtained
+    them, so they are only sent again with the same credentials.
+
+    Requests are bounded by connect and read timeouts and pass through a circuit
+    breaker, so a slow or unavailable Virgo DB fails fast instead of holding
+    requests open. Request latencies are recorded in `latency`.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        """Class constructor.
+
+        Args:
+            settings (Settings): Pydantic Settings object
+            transport (httpx.AsyncBaseTransport | None, optional):
+                Transport used by the underlying client. Defaults to None,
+                in which case the default connection pool is used.
+        """
+        self.limits = httpx.Limits(
+            max_connections=settings.db_max_connections,
+            max_keepalive_connections=settings.db_max_keepalive_connections,
+            keepalive_expiry=settings.db_keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(
+            settings.db_timeout,
+            connect=settings.db_connect_timeout,
+            read=settings.db_read_timeout,
+        )
+        self.max_cookie_users = settings.db_max_cookie_users
+        self.transport = transport
+
+        self._client: httpx.AsyncClient | None = None
+        self._cookies: OrderedDict[str, httpx.Cookies] = OrderedDict()
+        self._cookie_key = secrets.token_bytes(32)
+
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.db_breaker_failure_threshold,
+            recovery_time=settings.db_breaker_recovery_time,
+            half_open_max_calls=settings.db_breaker_half_open_max_calls,
+        )
+        self.latency = LatencyHistogram()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Retrieve the underlying client, creating it on first use.
+
+        The client's own cookie jar rejects all cookies so that no session
+        state is shared between users of the pooled connections.
+
+        Returns
+        -------
+            httpx.AsyncClient: Pooled asynchronous HTTP client
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                transport=self.transport,
+                cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+            )
+        return self._client
+
+    def credentials_key(self, username: str, password: str) -> str:
+        """Derive the key under which a user's session cookies are stored.
+
+        The hash is keyed with a secret generated for this client, so stored keys
+        cannot be used to test guesses of a password.
+
+        Args:
+            username (str): VirgoDB username
+            password (str): VirgoDB password
+
+        Returns
+        -------
+            str: Hex digest identifying the credentials
+        """
+        credentials = username.encode() + b"\0" + password.encode()
+        return hashlib.blake2b(credentials, key=self._cookie_key).hexdigest()
+
+    def get_cookies(self, username: str, password: str) -> httpx.Cookies:
+        """Retrieve in-memory session cookies for a user's credentials.
+
+        Args:
+            username (str): VirgoDB username
+            password (str): VirgoDB password
+
+        Returns
+        -------
+            httpx.Cookies:
+                Cookies from a previous session with the same credentials, if any.
+        """
+        key = self.credentials_key(username, password)
+        cookies = self._cookies.get(key)
+        if cookies is None:
+            logger.info(
+                "No previous session cookies found - creating new session cookies",
+            )
+            return httpx.Cookies()
+        self._cookies.move_to_end(key)
+        return cookies
+
+    def save_cookies(
+        self,
+        username: str,
+        password: str,
+        cookies: httpx.Cookies,
+    ) -> None:
+        """Store session cookies for a user's credentials in memory.
+
+        The least recently used entries are dropped once more than
+        `max_cookie_users` sets of credentials have cookies stored.
+
+        Args:
+            username (str): VirgoDB username
+            password (str): VirgoDB password
+            cookies (httpx.Cookies): Cookies to store
+        """
+        key = self.credentials_key(username, password)
+        self._cookies[key] = cookies
+        self._cookies.move_to_end(key)
+        while len(self._cookies) > self.max_cookie_users:
+            self._cookies.popitem(last=False)
+
+    async def get(self, url: str, username: str, password: str) -> httpx.Response:
+        """Send an authenticated GET request on behalf of a user.
+
+        Transport errors, timeouts and server errors count as failures
+        towards opening the circuit breaker. Calls ending in any other exception,
+        including cancellation, release their circuit breaker probe slot.
+
+        Args:
+            url (str): URL to request
+            username (str): VirgoDB username
+            password (str): VirgoDB password
+
+        Raises
+        ------
+            CircuitBreakerOpenError: If the circuit breaker is open.
+            httpx.HTTPError: On transport errors or timeouts.
+
+        Returns
+        -------
+            httpx.Response: Response from the server
+        """
+        cookies = self.get_cookies(username, password)
+        request = self.client.build_request("GET", url)
+        cookies.set_cookie_header(request)
+
+        self.breaker.before_call()
+        start = time.perf_counter()
+        try:
+            response = await self.client.send(request, auth=(username, password))
+        except httpx.TimeoutException:
+            self.breaker.record_failure()
+            self.latency.observe(time.perf_counter() - start, "timeout")
+            raise
+        except httpx.HTTPError:
+            self.breaker.record_failure()
+            self.latency.observe(time.perf_counter() - start, "error")
+            raise
+        except BaseException:
+            # Cancelled, or failed locally: the call says nothing about the Virgo DB
+            self.breaker.release()
+            raise
+
+        if response.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR:
+            self.breaker.record_failure()
+            self.latency.observe(time.perf_counter() - start, "server_error")
+        else:
+            self.breaker.record_success()
+            self.latency.observe(time.perf_counter() - start, "success")
+
+        if response.status_code == status.HTTP_200_OK:
+            cookies.extract_cookies(response)
+            self.save_cookies(username, password, cookies)
+        return response
+
+    def stats(self) -> dict:
+        """Summarise upstream latency and circuit breaker state.
+
+        Returns
+        -------
+            dict: Latency histogram and circuit breaker state
+        """
+        return {"latency": self.latency.as_dict(), "circuit": self.breaker.as_dict()}
+
+    async def aclose(self) -> None:
+        """Close the underlying client and any pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
 
 class SwiftAuthenticator:
@@ -41,21 +254,25 @@ class SwiftAuthenticator:
         username: str,
         password: str,
         settings: Settings,
-        cookies_file: Path = Path(__file__).parent.resolve() / "cookie_jar.txt",
+        client: VirgoDBClient,
     ):
         """Class constructor for authenticator object.
 
         Args:
-            settings (str, optional): Pydantic Settings object
+            username (str): VirgoDB username
+            password (str): VirgoDB password
+            settings (Settings): Pydantic Settings object
+            client (VirgoDBClient): Pooled client shared between requests
         """
         self.username = username
         self.password = password
         self.db_url = settings.db_url
 
-        self.cookies_file = cookies_file
+        self.client = client
+        self.retry_after: float | None = None
         self.jwt_secret = settings.jwt_secret_key.get_secret_value()
 
-    def validate_credentials(self, session: Session) -> int:
+    async def validate_credentials(self) -> int:
         """Validate user credentials.
 
         Return an appropriate status code to denote
@@ -66,70 +283,33 @@ class SwiftAuthenticator:
             int: Denotes status of authentication request
         """
         try:
-            response = session.get(
-                self.db_url,
-                auth=(self.username, self.password),
-                cookies=session.cookies,
-            )
+            response = await self.client.get(self.db_url, self.username, self.password)
             if response.status_code == status.HTTP_200_OK:
                 logger.info("Authentication successful.")
-                self.save_cookies(session)
             elif response.status_code == status.HTTP_401_UNAUTHORIZED:
                 message = "Unauthorised user."
                 logger.error(message)
             return response.status_code
-        except requests.exceptions.RequestException as exception:
+        except CircuitBreakerOpenError as exception:
+            logger.warning(f"Virgo DB request rejected: {exception}")
+            self.retry_after = exception.retry_after
+            return status.HTTP_503_SERVICE_UNAVAILABLE
+        except httpx.TimeoutException as exception:
+            logger.error(f"Virgo DB request timed out: {exception!r}")
+            return status.HTTP_504_GATEWAY_TIMEOUT
+        except httpx.HTTPError as exception:
             logger.error("Malformed URL in request.")
             logger.error(exception)
             return status.HTTP_404_NOT_FOUND
 
-    def authenticate(self) -> int:
+    async def authenticate(self) -> int:
         """Authenticate against the VirgoDB server.
 
         Returns
         -------
             int: HTTP status code of authentication request
         """
-        session = Session()
-        session = self.load_cookies(session)
-        return self.validate_credentials(session)
-
-    def save_cookies(self, session: requests.Session) -> requests.Session:
-        """Save cookies associated with a session object.
-
-        Args:
-            session (requests.session): Requests session object
-
-        Returns
-        -------
-            Session: Updated requests session object
-        """
-        logger.info(f"Saving cookies to {self.cookies_file}")
-        with self.cookies_file.open("w") as cookies:
-            json.dump(dict_from_cookiejar(session.cookies), cookies)
-        return session
-
-    def load_cookies(self, session: Session) -> Session:
-        """Load cookies associated with a previous session, if they exist.
-
-        Args:
-            session (Session): Current session object
-
-        Returns
-        -------
-            Session: Session object updated with previously saved cookies
-        """
-        if self.cookies_file.exists():
-            logger.info(
-                f"Cookies from previous session found in {self.cookies_file}",
-            )
-            with self.cookies_file.open("r") as cookies:
-                session.cookies.update(cookiejar_from_dict(json.load(cookies)))
-        else:
-            logger.info(
-                "No previous session cookies found - creating new session cookies",
-            )
-        return session
+        return await self.validate_credentials()
 
     def generate_token(self) -> str:
         """Generate a JWT token.
@@ -145,22 +325,40 @@ class SwiftAuthenticator:
             algorithm="HS256",
         )
 
-    def authenticate_and_generate_jwt(self) -> str:
+    async def authenticate_and_generate_jwt(self) -> str:
         """Authenticate using JWT and store the token.
 
         Raises
         ------
-            SWIFTAuthenticatorException: _description_
+            SWIFTAuthenticatorException:
+                HTTP 401 on failed authentication, HTTP 503 if the Virgo DB is
+                unavailable or HTTP 504 if it timed out.
 
         Returns
         -------
             str: Generated JWT token
         """
-        auth_status = self.authenticate()
+        auth_status = await self.authenticate()
 
         if auth_status == status.HTTP_200_OK:
             return self.generate_token()
 
+        if auth_status == status.HTTP_503_SERVICE_UNAVAILABLE:
+            headers = None
+            if self.retry_after is not None:
+                headers = {"Retry-After": str(math.ceil(self.retry_after))}
+            raise SWIFTAuthenticatorException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="VirgoDB is currently unavailable.",
+                headers=headers,
+            )
+
+        if auth_status == status.HTTP_504_GATEWAY_TIMEOUT:
+            raise SWIFTAuthenticatorException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="Timed out waiting for VirgoDB.",
+            )
+
         raise SWIFTAuthenticatorException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication status was not HTTP 200!",
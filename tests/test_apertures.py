@@ -0,0 +1,95 @@
+import h5py
+import numpy as np
+import pytest
+from api.processing.apertures import (
+    ApertureError,
+    CellMetadata,
+    aperture_ranges,
+    candidate_cells,
+    inside_aperture,
+    periodic_offsets,
+    validate_aperture,
+)
+
+
+def rows_in_ranges(ranges: np.ndarray) -> np.ndarray:
+    return np.concatenate(
+        [np.arange(start, end) for start, end in ranges] or [np.empty(0, np.int64)],
+    )
+
+
+def test_periodic_offsets():
+    positions = np.array([[0.5, 9.5, 5.0]])
+    boxsize = np.array([10.0, 10.0, 10.0])
+
+    offsets = periodic_offsets(positions, np.array([9.5, 0.5, 5.0]), boxsize)
+
+    assert np.allclose(offsets, [[1.0, -1.0, 0.0]])
+
+
+def test_inside_aperture():
+    offsets = np.array([[1.0, 0.0, 0.0], [1.0, 1.0, 0.0], [0.0, 0.0, 2.5]])
+
+    assert inside_aperture(offsets, radius=1.2).tolist() == [True, False, False]
+    assert inside_aperture(offsets, half_widths=np.array([1.0, 1.0, 3.0])).tolist() == [
+        True,
+        True,
+        True,
+    ]
+
+
+@pytest.mark.parametrize(
+    ("centre", "radius", "half_widths"),
+    [
+        ([0.0, 0.0], 1.0, None),
+        ([0.0, 0.0, 0.0], None, None),
+        ([0.0, 0.0, 0.0], 1.0, [1.0, 1.0, 1.0]),
+        ([0.0, 0.0, 0.0], -1.0, None),
+        ([0.0, 0.0, 0.0], None, [1.0, -1.0, 1.0]),
+    ],
+)
+def test_validate_aperture_failure(centre, radius, half_widths):
+    with pytest.raises(ApertureError):
+        validate_aperture(centre, radius, half_widths)
+
+
+def test_candidate_cells_periodic(template_swift_data_path):
+    cells = CellMetadata(str(template_swift_data_path), "PartType0")
+    corner = np.zeros(3)
+    radius = 0.1 * cells.cell_size.min()
+
+    selected = candidate_cells(cells, corner, radius=radius)
+
+    expected_cells = 8
+    assert np.count_nonzero(selected) == expected_cells
+
+
+@pytest.mark.parametrize(
+    ("radius", "half_widths"),
+    [(None, [1.0, 0.5, 2.0]), (1.5, None)],
+)
+def test_aperture_ranges_exact(template_swift_data_path, radius, half_widths):
+    filename = str(template_swift_data_path)
+    cells = CellMetadata(filename, "PartType0")
+    centre = list(cells.boxsize * [0.95, 0.03, 0.5])
+
+    ranges, stats = aperture_ranges(filename, "PartType0", centre, radius, half_widths)
+
+    with h5py.File(filename, "r") as handle:
+        coordinates = handle["PartType0/Coordinates"][:] * cells.scale
+    offsets = periodic_offsets(coordinates, np.array(centre), cells.boxsize)
+    expected = np.flatnonzero(
+        inside_aperture(
+            offsets,
+            radius,
+            None if half_widths is None else np.array(half_widths),
+        ),
+    )
+    assert np.array_equal(rows_in_ranges(ranges), expected)
+    assert stats["rows_matched"] == expected.size
+    assert stats["rows_read"] < coordinates.shape[0]
+
+
+def test_aperture_ranges_failure_part_type(template_swift_data_path):
+    with pytest.raises(ApertureError):
+        aperture_ranges(str(template_swift_data_path), "PartType3", [0, 0, 0], 1.0)
@@ -1,13 +1,26 @@
+import base64
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import cloudpickle
+import h5py
+import numpy as np
 import pytest
 import swiftsimio as sw
+from api.config import get_settings
 from api.main import app
 from api.processing.data_processing import SWIFTProcessor
+from api.processing.integer_codec import decode_integers
+from api.processing.jobs import get_job_manager
+from api.processing.streaming import PinnedSnapshot, decode_frame
 from api.routers.file_processing import (
     SWIFTBaseDataSpec,
     SWIFTDataSpecException,
+    SWIFTExportSpec,
+    export_subset_snapshot,
     get_file_path,
 )
 from fastapi import status
@@ -24,6 +37,19 @@ def test_ping():
     assert response.json() == {"ping": "pong"}
 
 
+def test_ready():
+    response = client.get("/ready")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == "ready"
+    assert response.json()["warmup"]["state"] == "idle"
+
+
+def test_upstream_metrics():
+    response = client.get("/monitoring/upstream")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["virgodb"]["circuit"]["state"] == "closed"
+
+
 def test_get_mask_boxsize_success(
     template_swift_data_path,
     mock_auth_client_success_jwt_decode,
@@ -433,3 +459,905 @@ def test_retrieve_units(template_swift_data_path, mock_auth_client_success_jwt_d
 
     assert isinstance(response.json(), dict)
     assert response.json()["time"] == expected_time
+
+
+def test_retrieve_metadata_json_sections(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "sections": ["cosmology", "named_columns"],
+        },
+    }
+
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/metadata_json",
+        json=payload,
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/json"
+    assert set(response.json()) == {"cosmology", "named_columns"}
+    assert "redshift" in response.json()["cosmology"]
+
+
+def test_retrieve_metadata_json_unknown_section(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "sections": ["not_a_section"],
+        },
+    }
+
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/metadata_json",
+        json=payload,
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_masked_array_data_derived_field(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "field": "PartType0/radius",
+            "mask_array_json": "[[0, 5], [10, 12]]",
+            "mask_data_type": "int64",
+            "mask_size": 7,
+            "centre": [1.0, 1.0, 1.0],
+        },
+    }
+    expected_array_length = 7
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/masked_dataset",
+        json=payload,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()["array"]) == expected_array_length
+    assert response.json()["units"] == "Mpc"
+
+
+def test_get_unmasked_array_data_derived_field_wrong_part_type(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "field": "PartType1/temperature",
+        },
+    }
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/unmasked_dataset",
+        json=payload,
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_filtered_data(tmp_path, mock_auth_client_success_jwt_decode):
+    snapshot = tmp_path / "snapshot.hdf5"
+    with h5py.File(snapshot, "w") as handle:
+        handle.create_dataset("PartType0/Densities", data=np.arange(10.0), chunks=(2,))
+        handle.create_dataset("PartType0/Masses", data=np.arange(10.0) * 2)
+
+    payload = {
+        "data_spec": {
+            "filename": str(snapshot),
+            "predicates": [
+                {"field": "PartType0/Densities", "comparison": ">", "value": 6.5},
+            ],
+            "fields": ["PartType0/Masses"],
+        },
+    }
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/filter",
+        json=payload,
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["ranges"]["array"] == [[7, 10]]
+    assert response.json()["fields"]["PartType0/Masses"]["array"] == [14.0, 16.0, 18.0]
+
+
+def test_get_filtered_data_invalid_comparison(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "predicates": [
+                {"field": "PartType0/Masses", "comparison": "~", "value": 1.0},
+            ],
+        },
+    }
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/filter",
+        json=payload,
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_aperture_data(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "part_type": "PartType0",
+            "centre": [1.0, 1.0, 1.0],
+            "radius": 1.0,
+            "fields": ["PartType0/Masses", "PartType0/radius"],
+        },
+    }
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/aperture",
+        json=payload,
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    rows_matched = response.json()["stats"]["rows_matched"]
+    assert len(response.json()["fields"]["PartType0/Masses"]["array"]) == rows_matched
+    assert len(response.json()["fields"]["PartType0/radius"]["array"]) == rows_matched
+
+
+def test_get_aperture_data_wrong_part_type_field(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "part_type": "PartType0",
+            "centre": [1.0, 1.0, 1.0],
+            "radius": 1.0,
+            "fields": ["PartType1/Masses"],
+        },
+    }
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/aperture",
+        json=payload,
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_batch_aperture_data(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    centres = [[1.0, 1.0, 1.0], [5.0, 5.0, 5.0]]
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "part_type": "PartType0",
+            "centres": centres,
+            "radii": [1.0],
+            "fields": ["PartType0/Masses"],
+        },
+    }
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/apertures",
+        json=payload,
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == len(centres) + 1
+    for line in lines[1:]:
+        assert len(line["fields"]["PartType0/Masses"]["array"]) == line["count"]
+
+
+def test_get_batch_aperture_data_wrong_part_type(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "part_type": "PartType9",
+            "centres": [[1.0, 1.0, 1.0]],
+            "radii": [1.0],
+        },
+    }
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/apertures",
+        json=payload,
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_unmasked_array_data_cached(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "field": "PartType0/Masses",
+        },
+    }
+    hits = client.get("/monitoring/result_cache").json()["memory_hits"]
+
+    first = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/unmasked_dataset",
+        json=payload,
+    )
+    second = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/unmasked_dataset",
+        json=payload,
+    )
+
+    assert first.status_code == second.status_code == status.HTTP_200_OK
+    assert first.content == second.content
+    assert client.get("/monitoring/result_cache").json()["memory_hits"] > hits
+
+
+def test_submit_job(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+    tmp_path,
+    mocker,
+):
+    manager = get_job_manager()
+    mocker.patch.object(manager, "job_dir", tmp_path)
+    mocker.patch.object(manager, "_executor", ThreadPoolExecutor(max_workers=1))
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "fields": ["PartType0/Masses"],
+            "mask_array_json": "[[0, 10], [20, 30]]",
+            "mask_data_type": "int64",
+        },
+    }
+    response = mock_auth_client_success_jwt_decode.post("/jobs", json=payload)
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    job_id = response.json()["id"]
+
+    for _ in range(500):
+        record = mock_auth_client_success_jwt_decode.get(f"/jobs/{job_id}").json()
+        if record["state"] == "finished":
+            break
+        time.sleep(0.01)
+    assert record["state"] == "finished"
+
+    response = mock_auth_client_success_jwt_decode.get(f"/jobs/{job_id}/result")
+    assert response.status_code == status.HTTP_200_OK
+    with np.load(io.BytesIO(response.content)) as result:
+        assert result["PartType0/Masses"].shape == (record["rows_total"],)
+
+    resumed = mock_auth_client_success_jwt_decode.get(
+        f"/jobs/{job_id}/result",
+        headers={"Range": "bytes=100-", "If-Range": response.headers["etag"]},
+    )
+    assert resumed.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.content[:100] + resumed.content == response.content
+
+    response = mock_auth_client_success_jwt_decode.get(f"/jobs/{'0' * 32}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.parametrize("mask", ["[[4990, 5100]]", "[1, 2, 3]", "[[10, 5]]"])
+def test_submit_job_invalid_mask(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+    tmp_path,
+    mocker,
+    mask,
+):
+    manager = get_job_manager()
+    mocker.patch.object(manager, "job_dir", tmp_path)
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "fields": ["PartType0/Masses"],
+            "mask_array_json": mask,
+        },
+    }
+
+    response = mock_auth_client_success_jwt_decode.post("/jobs", json=payload)
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert not manager.job_paths()
+
+
+def test_export_subset_snapshot(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+    tmp_path,
+):
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "fields": ["PartType0/Coordinates", "PartType0/Masses"],
+            "centre": [5.0, 5.0, 5.0],
+            "radius": 2.0,
+        },
+    }
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/export",
+        json=payload,
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    output_path = tmp_path / "subset.hdf5"
+    output_path.write_bytes(response.content)
+    data = sw.load(str(output_path))
+    assert data.gas.masses.shape == (data.metadata.n_gas,)
+
+
+def test_export_subset_snapshot_abandoned(template_swift_data_path, tmp_path, mocker):
+    export_dir = tmp_path / "exports"
+    mocker.patch.object(get_settings(), "export_dir", export_dir)
+    data_spec = SWIFTExportSpec(
+        filename=str(template_swift_data_path),
+        fields=["PartType0/Masses"],
+        masks={"PartType0": "[[0, 10]]"},
+    )
+
+    response = export_subset_snapshot(data_spec, "test_user")
+    try:
+        # Never sent, as if the client disconnected first
+        assert not any(export_dir.iterdir())
+        assert response.file.read(8) == b"\x89HDF\r\n\x1a\n"
+    finally:
+        response.file.close()
+
+
+def test_export_subset_snapshot_no_selection(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "fields": ["PartType0/Masses"],
+        },
+    }
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/export",
+        json=payload,
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.parametrize("mask", ["[[10, 5]]", f"[[0, {10**9}]]", "[[0, 1, 2]]"])
+def test_export_subset_snapshot_invalid_mask(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+    mask,
+):
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "fields": ["PartType0/Masses"],
+            "masks": {"PartType0": mask},
+        },
+    }
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/export",
+        json=payload,
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_mask_cells(template_swift_data_path, mock_auth_client_success_jwt_decode):
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "part_types": ["PartType0"],
+        },
+    }
+
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/mask_cells",
+        json=payload,
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    with np.load(io.BytesIO(response.content)) as cells:
+        assert cells["PartType0_counts"].shape == (cells["centres"].shape[0],)
+
+
+def test_mask_handle_workflow(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "region": [[0.0, 6.0], [0.0, 6.0], [0.0, 6.0]],
+        },
+    }
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/mask_handles",
+        json=payload,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    handle = response.json()["handle"]
+
+    response = mock_auth_client_success_jwt_decode.post(
+        f"/swiftdata/mask_handles/{handle}/constrain",
+        json={"data_spec": {"region": [[0.0, 3.0], [0.0, 3.0], [0.0, 3.0]]}},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    rows = response.json()["counts"]["PartType0"]
+
+    response = mock_auth_client_success_jwt_decode.get(
+        f"/swiftdata/mask_handles/{handle}/ranges",
+        params={"part_type": "PartType0"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    ranges = np.asarray(response.json()["array"])
+    assert np.diff(ranges, axis=1).sum() == rows
+
+    response = mock_auth_client_success_jwt_decode.delete(
+        f"/swiftdata/mask_handles/{handle}",
+    )
+    assert response.status_code == status.HTTP_200_OK
+    response = mock_auth_client_success_jwt_decode.get(
+        f"/swiftdata/mask_handles/{handle}/ranges",
+        params={"part_type": "PartType0"},
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_get_masked_array_data_stored_mask(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    mask = {"mask_array_json": "[[0, 5], [10, 12]]", "mask_data_type": "int64"}
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/masks",
+        json={"data_spec": mask},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    mask_id = response.json()["mask_id"]
+
+    response = mock_auth_client_success_jwt_decode.get(f"/swiftdata/masks/{mask_id}")
+    assert response.status_code == status.HTTP_200_OK
+    mask_size = response.json()["mask_size"]
+
+    payload = {
+        "filename": str(template_swift_data_path),
+        "field": "PartType0/Masses",
+        "mask_size": mask_size,
+    }
+    stored = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/masked_dataset",
+        json={"data_spec": {**payload, "mask_id": mask_id}},
+    )
+    sent = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/masked_dataset",
+        json={"data_spec": {**payload, **mask}},
+    )
+    assert stored.status_code == status.HTTP_200_OK
+    assert stored.json()["array"] == sent.json()["array"]
+    assert len(stored.json()["array"]) == mask_size
+
+    response = mock_auth_client_success_jwt_decode.delete(f"/swiftdata/masks/{mask_id}")
+    assert response.status_code == status.HTTP_200_OK
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/masked_dataset",
+        json={"data_spec": {**payload, "mask_id": mask_id}},
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_get_masked_array_data_stored_mask_beyond_field(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/masks",
+        json={"data_spec": {"mask_array_json": "[[4990, 5100]]"}},
+    )
+    mask_id = response.json()["mask_id"]
+    payload = {
+        "filename": str(template_swift_data_path),
+        "field": "PartType0/Masses",
+        "mask_id": mask_id,
+        "mask_size": 110,
+    }
+
+    whole = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/masked_dataset",
+        json={"data_spec": payload},
+    )
+    paged = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/masked_dataset",
+        json={"data_spec": {**payload, "page_bytes": 64}},
+    )
+
+    assert whole.status_code == status.HTTP_400_BAD_REQUEST
+    assert "beyond the 5000 rows" in whole.json()["detail"]
+    assert paged.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_unmasked_array_data_precision(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    payload = {
+        "filename": str(template_swift_data_path),
+        "field": "PartType0/Coordinates",
+    }
+
+    full = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/unmasked_dataset",
+        json={"data_spec": payload},
+    )
+    reduced = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/unmasked_dataset",
+        json={"data_spec": {**payload, "precision": "float16"}},
+    )
+    invalid = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/unmasked_dataset",
+        json={"data_spec": {**payload, "precision": "float8"}},
+    )
+
+    assert reduced.status_code == status.HTTP_200_OK
+    assert len(reduced.content) < len(full.content)
+    precision = reduced.json()["precision"]
+    assert reduced.json()["dtype"] == precision["dtype"] == "<f2"
+    array = np.asarray(reduced.json()["array"], dtype=reduced.json()["dtype"])
+    original = np.asarray(full.json()["array"])
+    error = np.abs(array - original)[original != 0] / np.abs(original[original != 0])
+    assert error.max() <= precision["max_relative_error"]
+    assert invalid.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_unmasked_array_data_encoding(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    payload = {
+        "filename": str(template_swift_data_path),
+        "field": "PartType0/ParticleIDs",
+    }
+
+    full = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/unmasked_dataset",
+        json={"data_spec": payload},
+    )
+    encoded = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/unmasked_dataset",
+        json={"data_spec": {**payload, "encoding": "delta-varint"}},
+    )
+    floats = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/unmasked_dataset",
+        json={
+            "data_spec": {
+                **payload,
+                "field": "PartType0/Masses",
+                "encoding": "delta-varint",
+            },
+        },
+    )
+
+    assert encoded.status_code == status.HTTP_200_OK
+    assert len(encoded.content) < len(full.content)
+    response = encoded.json()
+    decoded = decode_integers(
+        base64.b64decode(response["array"]),
+        response["dtype"],
+        tuple(response["shape"]),
+    )
+    assert decoded.tolist() == full.json()["array"]
+    assert floats.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_array_data_paginated(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    payload = {
+        "filename": str(template_swift_data_path),
+        "field": "PartType0/ParticleIDs",
+        "page_bytes": 8 * 1500,
+    }
+
+    pages = [
+        mock_auth_client_success_jwt_decode.post(
+            "/swiftdata/unmasked_dataset",
+            json={"data_spec": payload},
+        ).json(),
+    ]
+    while pages[-1]["next_cursor"] is not None:
+        cursor = pages[-1]["next_cursor"]
+        pages.append(
+            mock_auth_client_success_jwt_decode.post(
+                "/swiftdata/unmasked_dataset",
+                json={"data_spec": {**payload, "cursor": cursor}},
+            ).json(),
+        )
+    masked = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/masked_dataset",
+        json={
+            "data_spec": {
+                **payload,
+                "mask_array_json": "[[0, 5], [10, 12]]",
+                "mask_size": 7,
+                "page_bytes": 8 * 4,
+            },
+        },
+    ).json()
+    mismatched = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/unmasked_dataset",
+        json={
+            "data_spec": {
+                **payload,
+                "field": "PartType0/Masses",
+                "cursor": pages[0]["next_cursor"],
+            },
+        },
+    )
+
+    assert [page["rows"] for page in pages] == [1500, 1500, 1500, 500]
+    ids = [value for page in pages for value in page["array"]]
+    with h5py.File(template_swift_data_path, "r") as handle:
+        assert ids == handle["PartType0/ParticleIDs"][:].tolist()
+        expected = handle["PartType0/ParticleIDs"][:4].tolist()
+    assert masked["array"] == expected
+    assert masked["total_rows"] == 7  # noqa: PLR2004
+    assert mismatched.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_stream_snapshot(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+    mocker,
+):
+    mocker.patch.object(get_settings(), "stream_frame_bytes", 8 * 1000)
+    with mock_auth_client_success_jwt_decode.websocket_connect(
+        "/swiftdata/stream",
+    ) as websocket:
+        websocket.send_json(
+            {"type": "open", "filename": str(template_swift_data_path), "window": 2},
+        )
+        opened = websocket.receive_json()
+        websocket.send_json(
+            {"type": "field", "id": "ids", "field": "PartType0/ParticleIDs"},
+        )
+        accepted = websocket.receive_json()
+
+        frames = []
+        while not frames or not frames[-1][0]["final"]:
+            frames.append(decode_frame(websocket.receive_bytes()))
+            websocket.send_json({"type": "ack", "frames": 1})
+
+        websocket.send_json({"type": "mask", "id": "ids", "field": "PartType0/Masses"})
+        websocket.send_json({"type": "cancel", "id": "ids"})
+        messages = [websocket.receive_json(), websocket.receive_json()]
+        websocket.send_json(
+            {"type": "region", "id": "bad", "field": "PartType0/Masses"},
+        )
+        error = websocket.receive_json()
+        while error["type"] != "error":
+            error = websocket.receive_json()
+
+    assert opened["window"] == 2  # noqa: PLR2004
+    assert accepted == {"type": "accepted", "id": "ids", "serial": 1}
+    assert len(frames) == 5  # noqa: PLR2004
+    assert [header["offset"] for header, _ in frames] == [0, 1000, 2000, 3000, 4000]
+    np.testing.assert_array_equal(
+        np.concatenate([rows for _, rows in frames]),
+        np.arange(1, 5001),
+    )
+    assert messages[0] == {"type": "accepted", "id": "ids", "serial": 2}
+    assert messages[1]["type"] in ("cancelled", "error")
+    assert error["id"] == "bad"
+
+
+def test_stream_snapshot_invalid_columns(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    with mock_auth_client_success_jwt_decode.websocket_connect(
+        "/swiftdata/stream",
+    ) as websocket:
+        websocket.send_json({"type": "open", "filename": str(template_swift_data_path)})
+        websocket.receive_json()
+        websocket.send_json(
+            {
+                "type": "field",
+                "id": "columns",
+                "field": "PartType0/Coordinates",
+                "columns": 7,
+            },
+        )
+        accepted = websocket.receive_json()
+        error = websocket.receive_json()
+
+    assert error == {
+        "type": "error",
+        "id": "columns",
+        "serial": accepted["serial"],
+        "detail": "Column 7 is outside the 3 columns of PartType0/Coordinates.",
+    }
+
+
+def test_stream_snapshot_malformed_messages(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    with mock_auth_client_success_jwt_decode.websocket_connect(
+        "/swiftdata/stream",
+    ) as websocket:
+        websocket.send_json({"type": "open", "filename": str(template_swift_data_path)})
+        websocket.receive_json()
+        websocket.send_text("{not json")
+        invalid = websocket.receive_json()
+        websocket.send_bytes(b"\x00\x01")
+        binary = websocket.receive_json()
+        websocket.send_json(
+            {"type": "mask", "id": "ids", "field": "PartType0/ParticleIDs"},
+        )
+        accepted = websocket.receive_json()
+
+    assert invalid["type"] == "error"
+    assert invalid["id"] is None
+    assert binary == {
+        "type": "error",
+        "id": None,
+        "detail": "Messages must be JSON text.",
+    }
+    assert accepted == {"type": "accepted", "id": "ids", "serial": 1}
+
+
+def test_stream_snapshot_failed_read(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+    mocker,
+):
+    mocker.patch.object(PinnedSnapshot, "read", side_effect=IndexError("index"))
+    with mock_auth_client_success_jwt_decode.websocket_connect(
+        "/swiftdata/stream",
+    ) as websocket:
+        websocket.send_json({"type": "open", "filename": str(template_swift_data_path)})
+        websocket.receive_json()
+        websocket.send_json(
+            {"type": "field", "id": "ids", "field": "PartType0/ParticleIDs"},
+        )
+        accepted = websocket.receive_json()
+        error = websocket.receive_json()
+
+    assert error["type"] == "error"
+    assert error["id"] == "ids"
+    assert error["serial"] == accepted["serial"]
+
+
+def test_stream_snapshot_unauthenticated(template_swift_data_path):
+    client = TestClient(app)
+    with client.websocket_connect("/swiftdata/stream") as websocket:
+        websocket.send_json({"type": "open", "filename": str(template_swift_data_path)})
+        error = websocket.receive_json()
+
+    assert error["type"] == "error"
+
+
+def test_get_array_bytes(template_swift_data_path, mock_auth_client_success_jwt_decode):
+    data_spec = {
+        "filename": str(template_swift_data_path),
+        "field": "PartType0/Coordinates",
+        "mask_array_json": "[[0, 5], [10, 12]]",
+    }
+    with h5py.File(template_swift_data_path, "r") as snapshot:
+        expected = np.concatenate(
+            [
+                snapshot["PartType0/Coordinates"][0:5],
+                snapshot["PartType0/Coordinates"][10:12],
+            ],
+        )
+
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/array_bytes",
+        json={"data_spec": data_spec},
+    )
+    resumed = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/array_bytes",
+        json={"data_spec": data_spec},
+        headers={"Range": "bytes=30-99", "If-Range": response.headers["etag"]},
+    )
+    stale = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/array_bytes",
+        json={"data_spec": data_spec},
+        headers={"Range": "bytes=30-99", "If-Range": '"stale"'},
+    )
+    unsatisfiable = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/array_bytes",
+        json={"data_spec": data_spec},
+        headers={"Range": "bytes=1000-"},
+    )
+
+    array = np.frombuffer(response.content, dtype=response.headers["x-array-dtype"])
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["x-array-shape"] == "7,3"
+    np.testing.assert_array_equal(array.reshape(7, 3), expected)
+    assert resumed.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert resumed.headers["content-range"] == f"bytes 30-99/{len(response.content)}"
+    assert resumed.content == response.content[30:100]
+    assert stale.status_code == status.HTTP_200_OK
+    assert stale.content == response.content
+    assert unsatisfiable.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+
+
+def test_get_array_bytes_contiguous(tmp_path, mock_auth_client_success_jwt_decode):
+    filename = tmp_path / "contiguous.hdf5"
+    with h5py.File(filename, "w") as snapshot:
+        snapshot["PartType0/Masses"] = np.arange(100, dtype="<f8")
+    data_spec = {
+        "filename": str(filename),
+        "field": "PartType0/Masses",
+        "mask_array_json": "[[0, 5], [10, 20]]",
+    }
+
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/array_bytes",
+        json={"data_spec": data_spec},
+        headers={"Range": "bytes=12-59"},
+    )
+
+    expected = np.concatenate([np.arange(5), np.arange(10, 20)]).astype("<f8").tobytes()
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.content == expected[12:60]
+
+
+@pytest.mark.parametrize("mask", ["[[10, 5]]", "[[-5, 5]]", "[[0, 101]]"])
+def test_get_array_bytes_invalid_mask(
+    tmp_path,
+    mock_auth_client_success_jwt_decode,
+    mask,
+):
+    filename = tmp_path / "contiguous.hdf5"
+    with h5py.File(filename, "w") as snapshot:
+        snapshot["PartType0/Masses"] = np.arange(100, dtype="<f8")
+    data_spec = {
+        "filename": str(filename),
+        "field": "PartType0/Masses",
+        "mask_array_json": mask,
+    }
+
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/array_bytes",
+        json={"data_spec": data_spec},
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_masked_array_data_mask_beyond_field(
+    template_swift_data_path,
+    mock_auth_client_success_jwt_decode,
+):
+    payload = {
+        "data_spec": {
+            "filename": str(template_swift_data_path),
+            "field": "PartType0/Masses",
+            "mask_array_json": "[[4990, 5100]]",
+            "mask_size": 110,
+        },
+    }
+
+    response = mock_auth_client_success_jwt_decode.post(
+        "/swiftdata/masked_dataset",
+        json=payload,
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "beyond the 5000 rows" in response.json()["detail"]
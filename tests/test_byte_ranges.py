@@ -0,0 +1,89 @@
+import h5py
+import numpy as np
+import pytest
+from api.processing.byte_ranges import (
+    UnsatisfiableRangeError,
+    contiguous_offset,
+    entity_tag,
+    file_segments,
+    iter_array_range,
+    parse_range,
+    range_applies,
+    row_span,
+)
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        ("bytes=0-99", (0, 100)),
+        ("bytes=100-", (100, 1000)),
+        ("bytes=-100", (900, 1000)),
+        ("bytes=900-5000", (900, 1000)),
+        ("bytes=-5000", (0, 1000)),
+        ("bytes=0-9, 20-29", None),
+        ("bytes=9-0", None),
+        ("items=0-9", None),
+        ("bytes=a-b", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(UnsatisfiableRangeError):
+        parse_range(header, 1000)
+
+
+def test_range_applies():
+    etag = entity_tag("request", (1, 2))
+    last_modified = "Thu, 01 Jan 1970 00:00:00 GMT"
+
+    assert etag == entity_tag("request", (1, 2))
+    assert etag != entity_tag("request", (1, 3))
+    assert range_applies(None, etag, last_modified)
+    assert range_applies(etag, etag, last_modified)
+    assert range_applies(last_modified, etag, last_modified)
+    assert not range_applies('"stale"', etag, last_modified)
+    assert not range_applies(f"W/{etag}", etag, last_modified)
+
+
+def test_iter_array_range():
+    data = np.arange(60, dtype=">f8").reshape(20, 3)
+    ranges = np.array([[0, 5], [10, 20]])
+    selected = np.concatenate([data[0:5], data[10:20]]).astype("<f8").tobytes()
+    reads = []
+
+    def read(row_ranges, rows):
+        reads.append(rows)
+        return np.concatenate([data[start:end] for start, end in row_ranges])
+
+    content = b"".join(iter_array_range(read, ranges, 24, 50, 301, block_rows=4))
+
+    assert row_span(50, 301, 24) == (2, 11)
+    assert content == selected[50:301]
+    assert reads == [4, 4, 3]
+
+
+def test_file_segments():
+    ranges = np.array([[0, 5], [10, 20]])
+
+    assert file_segments(ranges, 1000, 8, 12, 60) == [(1012, 28), (1080, 20)]
+    assert file_segments(ranges, 1000, 8, 0, 40) == [(1000, 40)]
+
+
+def test_contiguous_offset(tmp_path, template_swift_data_path):
+    filename = tmp_path / "contiguous.hdf5"
+    with h5py.File(filename, "w") as snapshot:
+        snapshot["PartType0/Masses"] = np.arange(10, dtype="<f8")
+        snapshot["PartType0/Big"] = np.arange(10, dtype=">f8")
+
+    offset = contiguous_offset(str(filename), "PartType0/Masses")
+    with filename.open("rb") as snapshot:
+        snapshot.seek(offset)
+        assert np.frombuffer(snapshot.read(80), dtype="<f8").tolist() == list(range(10))
+    assert contiguous_offset(str(filename), "PartType0/Big") is None
+    assert contiguous_offset(str(filename), "PartType0/Unknown") is None
+    assert contiguous_offset(str(template_swift_data_path), "PartType0/Masses") is None
@@ -0,0 +1,151 @@
+import os
+from pathlib import Path
+
+import h5py
+import numpy as np
+import pytest
+from api.processing.catalogue import (
+    SnapshotCatalogue,
+    SnapshotCatalogueError,
+    read_snapshot_info,
+)
+from api.processing.data_processing import SWIFTProcessor
+
+
+def write_snapshot(filename: Path, n_gas: int, redshift: float = 0.5) -> Path:
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    with h5py.File(filename, "w") as handle:
+        header = handle.create_group("Header")
+        header.attrs["NumPart_Total"] = np.array([n_gas, 0, 0, 0, 0, 0, 0])
+        header.attrs["NumPart_Total_HighWord"] = np.zeros(7, dtype=np.int64)
+        header.attrs["Redshift"] = np.array([redshift])
+        gas = handle.create_group("PartType0")
+        gas.create_dataset("Densities", data=np.ones(n_gas))
+        gas.create_dataset("Coordinates", data=np.zeros((n_gas, 3)))
+    return filename
+
+
+def test_read_snapshot_info(tmp_path):
+    snapshot = write_snapshot(tmp_path / "snap_0001.hdf5", 10)
+
+    info = read_snapshot_info(snapshot)
+
+    expected_count = 10
+    expected_redshift = 0.5
+    assert info["particle_counts"]["PartType0"] == expected_count
+    assert info["redshift"] == expected_redshift
+    assert info["fields"] == ["PartType0/Coordinates", "PartType0/Densities"]
+
+
+def test_read_snapshot_info_failure_not_swift(tmp_path):
+    not_a_snapshot = tmp_path / "not_a_snapshot.hdf5"
+    not_a_snapshot.write_text("plain text")
+
+    with pytest.raises(SnapshotCatalogueError):
+        read_snapshot_info(not_a_snapshot)
+
+
+def test_catalogue_refresh_incremental(tmp_path):
+    root = tmp_path / "snapshots"
+    first = write_snapshot(root / "run_a" / "snap_0001.hdf5", 10)
+    second = write_snapshot(root / "run_a" / "snap_0002.hdf5", 20)
+
+    catalogue = SnapshotCatalogue([root])
+    assert catalogue.refresh() == {"added": 2, "updated": 0, "removed": 0}
+    assert catalogue.get("run_a/snap_0001") == str(first.resolve())
+    assert catalogue.contains_path(second.resolve())
+
+    assert catalogue.refresh() == {"added": 0, "updated": 0, "removed": 0}
+
+    second.unlink()
+    write_snapshot(root / "run_a" / "snap_0003.hdf5", 5)
+    write_snapshot(first, 40)
+    os.utime(first, (2, 2))
+
+    assert catalogue.refresh() == {"added": 1, "updated": 1, "removed": 1}
+    assert catalogue.get("run_a/snap_0002") is None
+    records = {record["alias"]: record for record in catalogue.records()}
+    expected_count = 40
+    assert records["run_a/snap_0001"]["particle_counts"]["PartType0"] == expected_count
+
+
+def test_catalogue_persists_between_instances(tmp_path):
+    root = tmp_path / "snapshots"
+    snapshot = write_snapshot(root / "snap_0001.hdf5", 10)
+    index_path = tmp_path / "catalogue.sqlite"
+
+    SnapshotCatalogue([root], index_path=index_path).refresh()
+    catalogue = SnapshotCatalogue([root], index_path=index_path)
+
+    assert catalogue.get("snap_0001") == str(snapshot.resolve())
+
+
+def test_catalogue_polling(tmp_path):
+    root = tmp_path / "snapshots"
+    write_snapshot(root / "snap_0001.hdf5", 10)
+    catalogue = SnapshotCatalogue([root])
+
+    catalogue.start_polling(0)
+    catalogue.stop_polling()
+
+    assert catalogue.get("snap_0001") is not None
+
+
+def test_processor_uses_catalogue(tmp_path):
+    root = tmp_path / "snapshots"
+    snapshot = write_snapshot(root / "snap_0001.hdf5", 10)
+    catalogue = SnapshotCatalogue([root])
+    catalogue.refresh()
+
+    processor = SWIFTProcessor(catalogue)
+
+    assert processor.retrieve_filename("snap_0001") == str(snapshot.resolve())
+    assert processor.is_indexed(str(snapshot.resolve()))
+    assert not processor.is_indexed(str(tmp_path / "elsewhere.hdf5"))
+
+
+def test_catalogue_freeze(tmp_path):
+    snapshot = write_snapshot(tmp_path / "run" / "snap_0001.hdf5", 10)
+    catalogue = SnapshotCatalogue([tmp_path])
+    catalogue.refresh()
+
+    assert catalogue.freeze() == 1
+    assert catalogue.get("run/snap_0001") == str(snapshot.resolve())
+    assert catalogue.get("run/unknown", "missing") == "missing"
+    assert catalogue.contains_path(snapshot.resolve())
+
+    added = write_snapshot(tmp_path / "run" / "snap_0002.hdf5", 5)
+    catalogue.refresh()
+
+    assert catalogue.get("run/snap_0002") == str(added.resolve())
+
+
+def test_catalogue_freeze_shared_index(tmp_path):
+    snapshot = write_snapshot(tmp_path / "snapshots" / "snap_0001.hdf5", 10)
+    index_path = tmp_path / "index.sqlite"
+    catalogue = SnapshotCatalogue([tmp_path / "snapshots"], index_path=index_path)
+    catalogue.refresh()
+    catalogue.freeze()
+
+    added = write_snapshot(tmp_path / "snapshots" / "snap_0002.hdf5", 5)
+    other = SnapshotCatalogue([tmp_path / "snapshots"], index_path=index_path)
+    other.refresh()
+    unchanged = catalogue.refresh()
+
+    assert not any(unchanged.values())
+    assert catalogue.get("snap_0001") == str(snapshot.resolve())
+    assert catalogue.get("snap_0002") == str(added.resolve())
+
+
+@pytest.mark.parametrize("persistent", [False, True])
+def test_catalogue_after_fork(tmp_path, persistent):
+    snapshot = write_snapshot(tmp_path / "snap_0001.hdf5", 10)
+    index_path = tmp_path / "index.sqlite" if persistent else None
+    catalogue = SnapshotCatalogue([tmp_path], index_path=index_path)
+    catalogue.refresh()
+    inherited = catalogue._connection
+
+    catalogue.after_fork()
+
+    assert catalogue._connection is not inherited
+    assert catalogue.get("snap_0001") == str(snapshot.resolve())
@@ -0,0 +1,93 @@
+import pytest
+from api.circuit_breaker import CircuitBreaker, CircuitBreakerOpenError
+
+
+def fake_clock(start: float = 0.0):
+    now = [start]
+
+    def clock() -> float:
+        return now[0]
+
+    return now, clock
+
+
+def test_circuit_opens_after_threshold():
+    breaker = CircuitBreaker(
+        failure_threshold=2,
+        recovery_time=10,
+        clock=fake_clock()[1],
+    )
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitBreakerOpenError) as error:
+        breaker.before_call()
+
+    expected_retry_after = 10
+    assert error.value.retry_after == expected_retry_after
+    assert breaker.as_dict()["rejected"] == 1
+
+
+def test_circuit_success_resets_failures():
+    breaker = CircuitBreaker(
+        failure_threshold=2,
+        recovery_time=10,
+        clock=fake_clock()[1],
+    )
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_half_open_probe_closes_on_success():
+    now, clock = fake_clock()
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=10, clock=clock)
+    breaker.record_failure()
+
+    now[0] = 10.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    breaker.before_call()
+    with pytest.raises(CircuitBreakerOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after > 0
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_half_open_probe_reopens_on_failure():
+    now, clock = fake_clock()
+    breaker = CircuitBreaker(failure_threshold=3, recovery_time=10, clock=clock)
+    for _ in range(3):
+        breaker.record_failure()
+
+    now[0] = 15.0
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitBreakerOpenError):
+        breaker.before_call()
+
+
+def test_circuit_half_open_probe_released():
+    now, clock = fake_clock()
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=10, clock=clock)
+    breaker.record_failure()
+
+    now[0] = 10.0
+    breaker.before_call()
+    breaker.release()
+
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
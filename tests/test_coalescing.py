@@ -0,0 +1,93 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+
+import pytest
+from api.processing.coalescing import SingleFlight, request_key
+
+
+def test_single_flight_shares_result():
+    flight = SingleFlight()
+    started, release = Event(), Event()
+    calls = []
+
+    def compute() -> list[int]:
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return [1, 2, 3]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        leader = executor.submit(flight.do, "key", compute)
+        started.wait(5)
+        followers = [executor.submit(flight.do, "key", compute) for _ in range(3)]
+        while flight.as_dict()["followers"] < len(followers):
+            time.sleep(0.01)
+        release.set()
+        results = [leader.result(5)] + [follower.result(5) for follower in followers]
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flight.as_dict() == {"leaders": 1, "followers": 3, "in_flight": 0}
+
+
+def test_single_flight_propagates_errors():
+    flight = SingleFlight()
+    started, release = Event(), Event()
+
+    def fail() -> None:
+        started.set()
+        release.wait(5)
+        message = "read failed"
+        raise OSError(message)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(flight.do, "key", fail)
+        started.wait(5)
+        follower = executor.submit(flight.do, "key", fail)
+        while flight.as_dict()["followers"] < 1:
+            time.sleep(0.01)
+        release.set()
+        with pytest.raises(OSError, match="read failed"):
+            leader.result(5)
+        with pytest.raises(OSError, match="read failed"):
+            follower.result(5)
+
+    assert flight.as_dict()["in_flight"] == 0
+    assert flight.do("key", lambda: "recovered") == "recovered"
+
+
+def test_single_flight_different_keys_run_separately():
+    flight = SingleFlight()
+
+    assert flight.do("first", lambda: 1) == 1
+    assert flight.do("second", lambda: 2) == 2  # noqa: PLR2004
+    assert flight.as_dict()["leaders"] == 2  # noqa: PLR2004
+
+
+def test_request_key():
+    key = request_key(
+        "snap.hdf5",
+        "PartType0/Masses",
+        None,
+        '{"mask": 1}',
+        centre=[1.0],
+    )
+
+    assert key == request_key(
+        "snap.hdf5",
+        "PartType0/Masses",
+        None,
+        '{"mask": 1}',
+        centre=[1.0],
+    )
+    assert hash(key) is not None
+    assert key != request_key("snap.hdf5", "PartType0/Masses", None, '{"mask": 2}')
+    assert key != request_key(
+        "snap.hdf5",
+        "PartType0/Masses",
+        None,
+        '{"mask": 1}',
+        response_format="npy",
+        centre=[1.0],
+    )
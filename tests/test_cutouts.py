@@ -0,0 +1,90 @@
+import numpy as np
+import orjson
+import pytest
+from api.processing.apertures import ApertureError, CellMetadata, aperture_ranges
+from api.processing.cutouts import (
+    assign_particles,
+    block_boundaries,
+    stream_cutouts,
+    validate_batch,
+)
+
+
+def rows_in_ranges(ranges) -> np.ndarray:
+    return np.concatenate(
+        [np.arange(start, end) for start, end in ranges] or [np.empty(0, np.int64)],
+    )
+
+
+def test_block_boundaries():
+    counts = np.array([3, 4, 10, 1, 1])
+
+    assert block_boundaries(counts, 8) == [(0, 2), (2, 3), (3, 5)]
+
+
+@pytest.mark.parametrize("block_size", [64, 1_048_576])
+def test_assign_particles_matches_single_apertures(
+    template_swift_data_path,
+    block_size,
+):
+    filename = str(template_swift_data_path)
+    cells = CellMetadata(filename, "PartType0")
+    rng = np.random.default_rng(42)
+    centres = rng.uniform(0.0, cells.boxsize, size=(20, 3))
+    radii = rng.uniform(0.2, 2.0, size=20)
+
+    apertures, rows, stats = assign_particles(
+        filename,
+        cells,
+        centres,
+        radii,
+        block_size,
+    )
+
+    assert stats["rows_matched"] == rows.size
+    for index, (centre, radius) in enumerate(zip(centres, radii, strict=True)):
+        expected, _ = aperture_ranges(filename, "PartType0", list(centre), radius)
+        assert np.array_equal(rows[apertures == index], rows_in_ranges(expected))
+
+
+def test_stream_cutouts(template_swift_data_path):
+    filename = str(template_swift_data_path)
+    centres = [[1.0, 1.0, 1.0], [9.5, 9.5, 9.5], [5.0, 5.0, 5.0]]
+    radii = [1.0, 1.5, 0.0]
+    fields = ["PartType0/Masses", "PartType0/radius"]
+
+    lines = [
+        orjson.loads(line)
+        for line in stream_cutouts(filename, "PartType0", centres, radii, fields)
+    ]
+
+    assert lines[0]["apertures"] == len(centres)
+    assert [line["index"] for line in lines[1:]] == list(range(len(centres)))
+    for line, centre, radius in zip(lines[1:], centres, radii, strict=True):
+        expected, stats = aperture_ranges(filename, "PartType0", centre, radius)
+        assert line["count"] == stats["rows_matched"]
+        assert np.array_equal(rows_in_ranges(line["ranges"]), rows_in_ranges(expected))
+        for field in fields:
+            assert len(line["fields"][field]["array"]) == line["count"]
+
+
+@pytest.mark.parametrize(
+    ("centres", "radii", "fields"),
+    [
+        ([], [1.0], []),
+        ([[0.0, 0.0]], [1.0], []),
+        ([[0.0, 0.0, 0.0]], [1.0, 2.0], []),
+        ([[0.0, 0.0, 0.0]], [-1.0], []),
+        ([[0.0, 0.0, 0.0]], [1.0], ["PartType1/Masses"]),
+        ([[0.0, 0.0, 0.0]], [1.0], ["PartType0/NotAField"]),
+    ],
+)
+def test_validate_batch_failure(template_swift_data_path, centres, radii, fields):
+    with pytest.raises(ApertureError):
+        validate_batch(
+            str(template_swift_data_path),
+            "PartType0",
+            centres,
+            radii,
+            fields,
+        )
@@ -0,0 +1,143 @@
+import shutil
+
+import h5py
+import numpy as np
+import pytest
+from api.processing.derived_fields import (
+    DerivedFieldError,
+    compute_derived_field,
+    get_derived_field,
+    iterate_blocks,
+    recentre,
+)
+from unyt import unyt_array
+
+
+def test_get_derived_field():
+    part_type, derived_field = get_derived_field("PartType0/temperature")
+
+    assert part_type == "PartType0"
+    assert derived_field.units == "K"
+    assert get_derived_field("PartType0/Coordinates") is None
+    assert get_derived_field("PartType0/not_a_derived_field") is None
+
+
+def test_get_derived_field_failure_part_type():
+    with pytest.raises(DerivedFieldError) as error:
+        get_derived_field("PartType1/temperature")
+
+    assert "only defined for" in str(error.value)
+
+
+def test_iterate_blocks():
+    ranges = np.array([[0, 3], [10, 20], [30, 31]])
+
+    blocks = list(iterate_blocks(ranges, 4))
+
+    assert [block.tolist() for block, _, _ in blocks] == [
+        [[0, 3]],
+        [[10, 14]],
+        [[14, 18]],
+        [[18, 20], [30, 31]],
+    ]
+    assert [(start, end) for _, start, end in blocks] == [
+        (0, 3),
+        (3, 7),
+        (7, 11),
+        (11, 14),
+    ]
+
+
+def test_recentre_periodic():
+    coordinates = unyt_array([[0.5, 9.5, 5.0]], "Mpc")
+    centre = unyt_array([9.5, 0.5, 5.0], "Mpc")
+    boxsize = unyt_array([10.0, 10.0, 10.0], "Mpc")
+
+    result = recentre(coordinates, centre, boxsize)
+
+    assert np.allclose(result.to("Mpc").value, [[1.0, -1.0, 0.0]])
+
+
+def test_compute_derived_field_radius_blocks(template_swift_data_path):
+    filename = str(template_swift_data_path)
+    centre = [1.0, 2.0, 3.0]
+
+    radius, units = compute_derived_field(
+        filename,
+        "PartType0/radius",
+        centre=centre,
+        block_size=100,
+    )
+    relative, _ = compute_derived_field(
+        filename,
+        "PartType0/relative_coordinates",
+        centre=centre,
+    )
+
+    with h5py.File(filename, "r") as handle:
+        expected_rows = handle["PartType0/Coordinates"].shape[0]
+    assert radius.shape == (expected_rows,)
+    assert units == "Mpc"
+    assert np.allclose(radius, np.sqrt((relative**2).sum(axis=1)))
+
+
+def test_compute_derived_field_masked(template_swift_data_path):
+    filename = str(template_swift_data_path)
+    ranges = np.array([[3, 8], [20, 22]])
+
+    masked, units = compute_derived_field(filename, "PartType0/speed", ranges)
+    unmasked, _ = compute_derived_field(filename, "PartType0/speed")
+
+    expected_rows = np.r_[3:8, 20:22]
+    assert np.allclose(masked, unmasked[expected_rows])
+    assert units == str(unyt_array(1.0, "Mpc/Gyr").units)
+
+
+def test_compute_derived_field_temperature_units(template_swift_data_path):
+    temperature, units = compute_derived_field(
+        str(template_swift_data_path),
+        "PartType0/temperature",
+        np.array([[0, 10]]),
+    )
+
+    expected_rows = 10
+    assert units == "K"
+    assert temperature.shape == (expected_rows,)
+    assert np.all(temperature >= 0)
+
+
+def test_compute_derived_field_failure_not_derived(template_swift_data_path):
+    with pytest.raises(DerivedFieldError):
+        compute_derived_field(str(template_swift_data_path), "PartType0/Coordinates")
+
+
+def test_compute_derived_field_scale_factor(template_swift_data_path, tmp_path):
+    filename = tmp_path / "scaled.hdf5"
+    shutil.copyfile(template_swift_data_path, filename)
+    with h5py.File(filename, "r+") as handle:
+        handle["PartType0/InternalEnergy"].attrs["a-scale exponent"] = np.array([-2])
+        scale_factor = handle["Cosmology"].attrs["Scale-factor"][0]
+        coordinates = handle["PartType0/Coordinates"][:10]
+        boxsize = handle["Header"].attrs["BoxSize"]
+
+    comoving, _ = compute_derived_field(
+        str(template_swift_data_path),
+        "PartType0/temperature",
+        np.array([[0, 10]]),
+    )
+    physical, _ = compute_derived_field(
+        str(filename),
+        "PartType0/temperature",
+        np.array([[0, 10]]),
+    )
+    radius, units = compute_derived_field(
+        str(filename),
+        "PartType0/radius",
+        np.array([[0, 10]]),
+        centre=[1.0, 2.0, 3.0],
+    )
+
+    relative = (coordinates - [1.0, 2.0, 3.0] + boxsize / 2) % boxsize - boxsize / 2
+    assert np.allclose(physical, comoving * scale_factor**-2)
+    assert units == "Mpc"
+    assert np.allclose(radius, scale_factor * np.sqrt((relative**2).sum(axis=1)))
@@ -0,0 +1,180 @@
+from pathlib import Path
+
+import h5py
+import numpy as np
+import pytest
+from api.processing.data_processing import SWIFTProcessor
+from api.processing.distributed import (
+    DistributedSnapshot,
+    distributed_file_paths,
+    load_distributed_snapshot,
+    part_type_index,
+    split_ranges,
+)
+
+
+def write_distributed_snapshot(directory: Path, counts: list[int]) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    master = directory / "snap_0042.hdf5"
+    total = sum(counts)
+    coordinates = np.arange(total * 3, dtype=np.float64).reshape(total, 3)
+    masses = np.arange(total, dtype=np.float32)
+
+    coordinates_layout = h5py.VirtualLayout(shape=(total, 3), dtype=np.float64)
+    masses_layout = h5py.VirtualLayout(shape=(total,), dtype=np.float32)
+    start = 0
+    for index, count in enumerate(counts):
+        sub_file = directory / f"snap_0042.{index}.hdf5"
+        with h5py.File(sub_file, "w") as handle:
+            header = handle.create_group("Header")
+            header.attrs["NumFilesPerSnapshot"] = len(counts)
+            header.attrs["NumPart_ThisFile"] = np.array([count, 0, 0, 0, 0, 0, 0])
+            gas = handle.create_group("PartType0")
+            gas.create_dataset(
+                "Coordinates",
+                data=coordinates[start : start + count],
+                chunks=(2, 3),
+            )
+            gas.create_dataset("Masses", data=masses[start : start + count])
+        coordinates_layout[start : start + count] = h5py.VirtualSource(
+            sub_file.name,
+            "PartType0/Coordinates",
+            shape=(count, 3),
+        )
+        masses_layout[start : start + count] = h5py.VirtualSource(
+            sub_file.name,
+            "PartType0/Masses",
+            shape=(count,),
+        )
+        start += count
+
+    with h5py.File(master, "w") as handle:
+        header = handle.create_group("Header")
+        header.attrs["NumFilesPerSnapshot"] = len(counts)
+        header.attrs["NumPart_ThisFile"] = np.array([total, 0, 0, 0, 0, 0, 0])
+        gas = handle.create_group("PartType0")
+        gas.create_virtual_dataset("Coordinates", coordinates_layout)
+        gas.create_virtual_dataset("Masses", masses_layout)
+    return master
+
+
+def test_split_ranges():
+    ranges = np.array([[2, 7], [9, 10], [12, 15]])
+    offsets = np.array([0, 5, 10, 20])
+
+    pieces = split_ranges(ranges, offsets)
+
+    assert pieces[0][0].tolist() == [[2, 5]]
+    assert pieces[0][1].tolist() == [0]
+    assert pieces[1][0].tolist() == [[0, 2], [4, 5]]
+    assert pieces[1][1].tolist() == [3, 5]
+    assert pieces[2][0].tolist() == [[2, 5]]
+    assert pieces[2][1].tolist() == [6]
+
+
+def test_distributed_file_paths(tmp_path):
+    master = write_distributed_snapshot(tmp_path, [5, 7, 3])
+
+    files = distributed_file_paths(master)
+
+    assert [path.name for path in files] == [
+        "snap_0042.0.hdf5",
+        "snap_0042.1.hdf5",
+        "snap_0042.2.hdf5",
+    ]
+    assert distributed_file_paths(files[0]) is None
+
+
+def test_distributed_file_paths_missing_sub_file(tmp_path):
+    master = write_distributed_snapshot(tmp_path, [5, 7, 3])
+    (tmp_path / "snap_0042.1.hdf5").unlink()
+
+    assert distributed_file_paths(master) is None
+
+
+def test_distributed_snapshot_read_ranges(tmp_path):
+    master = write_distributed_snapshot(tmp_path, [5, 7, 3])
+    snapshot = DistributedSnapshot(distributed_file_paths(master))
+    ranges = np.array([[12, 14], [1, 3], [4, 11]])
+
+    expected_rows = np.concatenate(
+        [np.arange(12, 14), np.arange(1, 3), np.arange(4, 11)],
+    )
+    with h5py.File(master, "r") as handle:
+        expected = handle["PartType0/Coordinates"][:][expected_rows]
+
+    result = snapshot.read_ranges(
+        "PartType0/Coordinates",
+        ranges,
+        output_shape=(expected_rows.size, 3),
+        output_type=np.float64,
+    )
+
+    assert np.array_equal(result, expected)
+
+
+def test_distributed_snapshot_read_all_columns(tmp_path):
+    master = write_distributed_snapshot(tmp_path, [5, 7, 3])
+    snapshot = DistributedSnapshot(distributed_file_paths(master), max_workers=2)
+
+    result = snapshot.read_all("PartType0/Coordinates", np.s_[1])
+
+    with h5py.File(master, "r") as handle:
+        assert np.array_equal(result, handle["PartType0/Coordinates"][:, 1])
+
+
+def test_distributed_snapshot_read_all_empty_sub_file(tmp_path):
+    master = write_distributed_snapshot(tmp_path, [2, 7, 3])
+    with h5py.File(tmp_path / "snap_0042.0.hdf5", "r+") as handle:
+        handle["Header"].attrs["NumPart_ThisFile"] = np.zeros(7, dtype=np.int64)
+        del handle["PartType0"]
+    snapshot = DistributedSnapshot(distributed_file_paths(master))
+
+    assert snapshot.read_all("PartType0/Masses").tolist() == list(range(2, 12))
+    result = snapshot.read_all("PartType0/Coordinates", np.s_[1])
+    assert result.tolist() == list(range(7, 36, 3))
+    with pytest.raises(KeyError):
+        snapshot.read_all("PartType0/Missing")
+
+
+def test_load_distributed_snapshot_replaced(tmp_path):
+    master = write_distributed_snapshot(tmp_path, [5, 7, 3])
+    assert load_distributed_snapshot(str(master)).offsets[-1, 0] == 15  # noqa: PLR2004
+
+    for sub_file in tmp_path.glob("snap_0042.*.hdf5"):
+        sub_file.unlink()
+    master = write_distributed_snapshot(tmp_path, [4, 4])
+    assert load_distributed_snapshot(str(master)).offsets[-1, 0] == 8  # noqa: PLR2004
+
+
+def test_get_array_masked_distributed(tmp_path):
+    master = write_distributed_snapshot(tmp_path, [5, 7, 3])
+    load_distributed_snapshot.cache_clear()
+
+    result = SWIFTProcessor.get_array_masked(
+        str(master),
+        "PartType0/Masses",
+        "[[3, 8], [13, 15]]",
+        "int64",
+        7,
+    )
+
+    assert result.tolist() == [3, 4, 5, 6, 7, 13, 14]
+
+
+def test_get_array_unmasked_distributed(tmp_path):
+    master = write_distributed_snapshot(tmp_path, [5, 7, 3])
+    load_distributed_snapshot.cache_clear()
+
+    result = SWIFTProcessor.get_array_unmasked(str(master), "PartType0/Masses")
+
+    assert result.tolist() == list(range(15))
+    assert SWIFTProcessor.get_array_unmasked(str(master), "PartType0/Missing") is None
+
+
+def test_part_type_index():
+    expected_index = 4
+    assert part_type_index("PartType4/Masses") == expected_index
+
+    with pytest.raises(KeyError):
+        part_type_index("Cells/Centres")
@@ -0,0 +1,101 @@
+import h5py
+import numpy as np
+import pytest
+import swiftsimio as sw
+from api.processing.export import (
+    ExportError,
+    export_snapshot,
+    group_fields,
+    region_ranges,
+)
+
+
+def test_group_fields():
+    grouped = group_fields(
+        ["PartType0/Masses", "/PartType1/Coordinates", "PartType0/Masses"],
+    )
+
+    assert grouped == {
+        "PartType0": ["PartType0/Masses"],
+        "PartType1": ["PartType1/Coordinates"],
+    }
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [[], ["Header/BoxSize"], ["PartType0/temperature"]],
+)
+def test_group_fields_failure(fields):
+    with pytest.raises(ExportError):
+        group_fields(fields)
+
+
+def test_export_snapshot(template_swift_data_path, tmp_path):
+    filename = str(template_swift_data_path)
+    output_path = tmp_path / "subset.hdf5"
+    ranges = {
+        "PartType0": np.array([[10, 100], [200, 250]]),
+        "PartType1": np.empty((0, 2), dtype=np.int64),
+    }
+    fields = ["PartType0/Masses", "PartType0/Coordinates", "PartType1/Masses"]
+
+    counts = export_snapshot(filename, output_path, fields, ranges, block_size=64)
+
+    rows = np.r_[10:100, 200:250]
+    assert counts == {"PartType0": rows.size, "PartType1": 0}
+    with h5py.File(filename, "r") as source, h5py.File(output_path, "r") as output:
+        assert "Cells" not in output
+        assert output["Header"].attrs["NumPart_ThisFile"][0] == rows.size
+        assert output["PartType0/Masses"].compression == "gzip"
+        assert np.array_equal(
+            output["PartType0/Masses"],
+            source["PartType0/Masses"][rows],
+        )
+        assert dict(output["PartType0/Masses"].attrs) == dict(
+            source["PartType0/Masses"].attrs,
+        )
+        assert output["PartType1/Masses"].shape == (0,)
+
+    data = sw.load(str(output_path))
+    assert data.gas.coordinates.shape == (rows.size, 3)
+
+
+def test_export_snapshot_region(template_swift_data_path, tmp_path):
+    filename = str(template_swift_data_path)
+    ranges = region_ranges(filename, ["PartType0"], [5.0, 5.0, 5.0], radius=2.0)
+
+    counts = export_snapshot(
+        filename,
+        tmp_path / "subset.hdf5",
+        ["PartType0/Coordinates"],
+        ranges,
+        block_size=64,
+    )
+
+    assert counts["PartType0"] == np.diff(ranges["PartType0"], axis=1).sum()
+
+
+def test_export_snapshot_missing_selection(template_swift_data_path, tmp_path):
+    with pytest.raises(ExportError):
+        export_snapshot(
+            str(template_swift_data_path),
+            tmp_path / "subset.hdf5",
+            ["PartType1/Masses"],
+            {"PartType0": np.array([[0, 10]])},
+            block_size=64,
+        )
+
+
+@pytest.mark.parametrize(
+    "ranges",
+    [np.array([[10, 5]]), np.array([[-5, 5]]), np.array([[0, 10**9]])],
+)
+def test_export_snapshot_invalid_ranges(template_swift_data_path, tmp_path, ranges):
+    with pytest.raises(ExportError):
+        export_snapshot(
+            str(template_swift_data_path),
+            tmp_path / "subset.hdf5",
+            ["PartType0/Masses"],
+            {"PartType0": ranges},
+            block_size=64,
+        )
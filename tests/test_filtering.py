@@ -0,0 +1,164 @@
+from pathlib import Path
+
+import h5py
+import numpy as np
+import pytest
+from api.processing.filtering import (
+    FilterError,
+    build_zone_map,
+    filter_ranges,
+    get_zone_map,
+    intersect_ranges,
+    union_ranges,
+    zone_map_path,
+)
+
+
+def write_filter_snapshot(filename: Path) -> Path:
+    rows = 100
+    with h5py.File(filename, "w") as handle:
+        gas = handle.create_group("PartType0")
+        gas.create_dataset(
+            "Densities",
+            data=np.arange(rows, dtype=np.float64),
+            chunks=(10,),
+        )
+        gas.create_dataset(
+            "Temperatures",
+            data=np.tile(np.arange(10, dtype=np.float32), 10),
+            chunks=(20,),
+        )
+        gas.create_dataset(
+            "Coordinates",
+            data=np.stack([np.arange(rows)] * 3, axis=1).astype(np.float64),
+            chunks=(25, 3),
+        )
+    return filename
+
+
+def expected_ranges(selected: np.ndarray) -> list[list[int]]:
+    rows = np.flatnonzero(selected)
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    return [[int(group[0]), int(group[-1]) + 1] for group in np.split(rows, breaks)]
+
+
+def test_build_zone_map_follows_chunks(tmp_path):
+    snapshot = write_filter_snapshot(tmp_path / "snapshot.hdf5")
+
+    with h5py.File(snapshot, "r") as handle:
+        zone_map = build_zone_map(handle["PartType0/Densities"], block_rows=25)
+
+    expected_zone_rows = 10
+    assert zone_map.zone_rows == expected_zone_rows
+    assert zone_map.minimum.tolist() == list(range(0, 100, 10))
+    assert zone_map.maximum.tolist() == list(range(9, 100, 10))
+
+
+def test_get_zone_map_persisted(tmp_path):
+    snapshot = write_filter_snapshot(tmp_path / "snapshot.hdf5")
+
+    get_zone_map(str(snapshot), "PartType0/Densities")
+
+    assert zone_map_path(str(snapshot), "PartType0/Densities").is_file()
+
+
+def test_filter_ranges_and_skips_zones(tmp_path):
+    snapshot = write_filter_snapshot(tmp_path / "snapshot.hdf5")
+    predicates = [
+        {"field": "PartType0/Densities", "comparison": ">=", "value": 35.0},
+        {"field": "PartType0/Densities", "comparison": "<", "value": 52.0},
+        {"field": "PartType0/Temperatures", "comparison": "!=", "value": 7.0},
+    ]
+
+    ranges, stats = filter_ranges(str(snapshot), predicates, "and", block_size=7)
+
+    densities = np.arange(100)
+    temperatures = np.tile(np.arange(10), 10)
+    selected = (
+        (densities >= predicates[0]["value"])
+        & (densities < predicates[1]["value"])
+        & (temperatures != predicates[2]["value"])
+    )
+    assert ranges.tolist() == expected_ranges(selected)
+    expected_rows_read = 30
+    assert stats["rows_read"] == expected_rows_read
+    assert stats["rows_matched"] == np.count_nonzero(selected)
+
+
+def test_filter_ranges_or_column(tmp_path):
+    snapshot = write_filter_snapshot(tmp_path / "snapshot.hdf5")
+    predicates = [
+        {
+            "field": "PartType0/Coordinates",
+            "comparison": "<",
+            "value": 5.0,
+            "column": 1,
+        },
+        {"field": "PartType0/Densities", "comparison": ">", "value": 95.0},
+    ]
+
+    ranges, _ = filter_ranges(str(snapshot), predicates, "or")
+
+    assert ranges.tolist() == [[0, 5], [96, 100]]
+
+
+def test_filter_ranges_no_matches(tmp_path):
+    snapshot = write_filter_snapshot(tmp_path / "snapshot.hdf5")
+    predicates = [{"field": "PartType0/Densities", "comparison": ">", "value": 1e3}]
+
+    ranges, stats = filter_ranges(str(snapshot), predicates)
+
+    assert ranges.shape == (0, 2)
+    assert stats["zones_read"] == 0
+
+
+@pytest.mark.parametrize(
+    "predicates",
+    [
+        [],
+        [{"field": "PartType0/Densities", "comparison": "~", "value": 1.0}],
+        [{"field": "PartType0/Missing", "comparison": "<", "value": 1.0}],
+        [{"field": "PartType0/Coordinates", "comparison": "<", "value": 1.0}],
+        [
+            {
+                "field": "PartType0/Densities",
+                "comparison": "<",
+                "value": 1.0,
+                "column": 0,
+            },
+        ],
+        [
+            {
+                "field": "PartType0/Coordinates",
+                "comparison": "<",
+                "value": 1.0,
+                "column": 5,
+            },
+        ],
+        [
+            {
+                "field": "PartType0/Coordinates",
+                "comparison": "<",
+                "value": 1.0,
+                "column": -1,
+            },
+        ],
+        [
+            {"field": "PartType0/Densities", "comparison": "<", "value": 1.0},
+            {"field": "PartType1/Densities", "comparison": "<", "value": 1.0},
+        ],
+    ],
+)
+def test_filter_ranges_failure(tmp_path, predicates):
+    snapshot = write_filter_snapshot(tmp_path / "snapshot.hdf5")
+
+    with pytest.raises(FilterError):
+        filter_ranges(str(snapshot), predicates)
+
+
+def test_intersect_and_union_ranges():
+    first = np.array([[0, 5], [8, 12]])
+    second = np.array([[3, 9], [11, 20]])
+
+    assert intersect_ranges(first, second).tolist() == [[3, 5], [8, 9], [11, 12]]
+    assert union_ranges(first, second).tolist() == [[0, 20]]
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from api.processing.integer_codec import (
+    IntegerCodecError,
+    check_encoding,
+    decode_integers,
+    encode_integers,
+)
+
+
+@pytest.mark.parametrize(
+    "array",
+    [
+        np.arange(1, 5001, dtype=np.int64),
+        np.array([], dtype=np.int64),
+        np.array([np.iinfo(np.int64).min, np.iinfo(np.int64).max, 0, -1]),
+        np.array([np.iinfo(np.uint64).max, 0, 5], dtype=np.uint64),
+        np.array([[3, 1], [2, 7]], dtype=">i4"),
+    ],
+)
+def test_integer_round_trip(array):
+    decoded = decode_integers(encode_integers(array), array.dtype, array.shape)
+
+    assert decoded.dtype == array.dtype
+    assert np.array_equal(decoded, array)
+
+
+def test_encode_integers_sorted_ids():
+    ids = np.arange(2**40, 2**40 + 10_000, dtype=np.int64)
+    ids[::7] += 3
+
+    encoded = encode_integers(ids)
+
+    assert len(encoded) < ids.nbytes / 4
+    assert np.array_equal(decode_integers(encoded, ids.dtype), ids)
+
+
+def test_encode_integers_failure():
+    with pytest.raises(IntegerCodecError):
+        encode_integers(np.linspace(0.0, 1.0, 5))
+    with pytest.raises(IntegerCodecError):
+        check_encoding("bitpack")
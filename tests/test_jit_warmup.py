@@ -0,0 +1,47 @@
+import numba
+import numpy as np
+from api.processing import jit_warmup
+from api.processing.jit_warmup import (
+    enable_jit_cache,
+    jit_functions,
+    start_jit_warmup,
+    warm_jit,
+)
+
+
+def test_jit_functions():
+    functions = jit_functions()
+
+    assert "extract_ranges_from_chunks" in functions
+    assert "ranges_from_array" in functions
+    assert "read_ranges_from_file" not in functions
+
+
+def test_enable_jit_cache(tmp_path, mocker):
+    function = mocker.Mock()
+    mocker.patch.object(jit_warmup, "jit_functions", return_value={"reader": function})
+    mocker.patch.object(numba.config, "CACHE_DIR", "")
+
+    assert enable_jit_cache(tmp_path / "numba") == ["reader"]
+    assert str(tmp_path / "numba") == numba.config.CACHE_DIR
+    assert (tmp_path / "numba").is_dir()
+    function.enable_caching.assert_called_once()
+
+
+def test_warm_jit():
+    extract = jit_functions()["extract_ranges_from_chunks"]
+
+    assert warm_jit(["float32"]) >= 0
+    compiled = {signature[0] for signature in extract.signatures}
+    assert numba.typeof(np.zeros(1, dtype=np.float32)) in compiled
+    assert numba.typeof(np.zeros((1, 3), dtype=np.float32)) in compiled
+
+
+def test_start_jit_warmup(tmp_path, mocker):
+    enable = mocker.patch.object(jit_warmup, "enable_jit_cache")
+    warm = mocker.patch.object(jit_warmup, "warm_jit")
+
+    start_jit_warmup(tmp_path, ["float32"]).join(timeout=5)
+
+    enable.assert_called_once_with(tmp_path)
+    warm.assert_called_once_with(["float32"])
@@ -0,0 +1,178 @@
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Thread
+
+import h5py
+import numpy as np
+import pytest
+from api.processing.jobs import (
+    JobError,
+    JobLimitError,
+    JobManager,
+    JobNotFoundError,
+    acquire_slot,
+    field_ranges,
+    read_job_record,
+    run_job,
+    write_job_record,
+)
+
+
+def wait_for_job(manager: JobManager, job_id: str, user: str) -> dict:
+    for _ in range(500):
+        record = manager.status(job_id, user)
+        if record["state"] in ("finished", "failed"):
+            return record
+        time.sleep(0.01)
+    return record
+
+
+def test_field_ranges_unmasked(template_swift_data_path):
+    filename = str(template_swift_data_path)
+    ranges = field_ranges(filename, ["PartType0/Masses", "PartType1/speed"], None)
+
+    with h5py.File(filename, "r") as handle:
+        assert ranges["PartType0/Masses"].tolist() == [
+            [0, handle["PartType0/Masses"].shape[0]],
+        ]
+        assert ranges["PartType1/speed"].tolist() == [
+            [0, handle["PartType1/Coordinates"].shape[0]],
+        ]
+
+
+@pytest.mark.parametrize(
+    ("fields", "ranges"),
+    [
+        ([], None),
+        (["Header/BoxSize"], None),
+        (["PartType0/NotAField"], None),
+        (["PartType1/temperature"], None),
+        (["PartType0/Masses", "PartType1/Masses"], np.array([[0, 10]])),
+        (["PartType0/Masses"], np.array([[4990, 5100]])),
+        (["PartType0/temperature"], np.array([[10, 5]])),
+    ],
+)
+def test_field_ranges_failure(template_swift_data_path, fields, ranges):
+    with pytest.raises(JobError):
+        field_ranges(str(template_swift_data_path), fields, ranges)
+
+
+def test_run_job(template_swift_data_path, tmp_path):
+    filename = str(template_swift_data_path)
+    ranges = np.array([[10, 100], [200, 250]])
+    fields = ["PartType0/Masses", "PartType0/Coordinates", "PartType0/speed"]
+    (tmp_path / "job.json").write_text("{}")
+
+    run_job(str(tmp_path), filename, dict.fromkeys(fields, ranges), "npz", 64)
+
+    record = read_job_record(tmp_path)
+    assert record["state"] == "finished"
+    assert record["progress"] == 1.0  # noqa: PLR2004
+    assert record["rows_done"] == record["rows_total"]
+    assert "PartType0/speed" in record["units"]
+    rows = np.r_[10:100, 200:250]
+    with np.load(tmp_path / record["result"]) as result, h5py.File(filename) as handle:
+        assert np.array_equal(
+            result["PartType0/Masses"],
+            handle["PartType0/Masses"][rows],
+        )
+        assert np.array_equal(
+            result["PartType0/Coordinates"],
+            handle["PartType0/Coordinates"][rows],
+        )
+        assert result["PartType0/speed"].shape == rows.shape
+
+
+def test_job_manager(template_swift_data_path, tmp_path):
+    manager = JobManager(tmp_path, 1, 1, 3600.0, ThreadPoolExecutor(max_workers=1))
+
+    record = manager.submit("user", str(template_swift_data_path), ["PartType0/Masses"])
+    record = wait_for_job(manager, record["id"], "user")
+
+    assert record["state"] == "finished"
+    with np.load(manager.result_path(record["id"], "user")) as result:
+        assert result["PartType0/Masses"].shape == (record["rows_total"],)
+    with pytest.raises(JobNotFoundError):
+        manager.status(record["id"], "another_user")
+    with pytest.raises(JobNotFoundError):
+        manager.status("../../etc", "user")
+
+
+def test_job_manager_user_limit(template_swift_data_path, tmp_path):
+    executor = ThreadPoolExecutor(max_workers=1)
+    release = Event()
+    executor.submit(release.wait, 5)
+    manager = JobManager(tmp_path, 1, 1, 3600.0, executor)
+    filename = str(template_swift_data_path)
+
+    queued = manager.submit("user", filename, ["PartType0/Masses"])
+    with pytest.raises(JobLimitError):
+        manager.submit("user", filename, ["PartType0/Masses"])
+    with pytest.raises(JobError):
+        manager.result_path(queued["id"], "user")
+    manager.submit("another_user", filename, ["PartType0/Masses"])
+
+    release.set()
+    assert wait_for_job(manager, queued["id"], "user")["state"] == "finished"
+
+
+def test_job_manager_cleanup(template_swift_data_path, tmp_path):
+    manager = JobManager(tmp_path, 1, 1, 0.0, ThreadPoolExecutor(max_workers=1))
+    record = manager.submit("user", str(template_swift_data_path), ["PartType0/Masses"])
+    wait_for_job(manager, record["id"], "user")
+
+    manager.cleanup()
+
+    assert not (tmp_path / record["id"]).exists()
+
+
+def test_job_manager_cleanup_stale(template_swift_data_path, tmp_path, mocker):
+    manager = JobManager(tmp_path, 1, 1, 3600.0, stale_after=60.0)
+    now = time.time()
+    records = {
+        "a" * 32: {"state": "queued", "host": socket.gethostname(), "pid": 1},
+        "b" * 32: {"state": "running", "updated_at": now - 120.0},
+        "c" * 32: {"state": "running", "updated_at": now},
+    }
+    for job_id, record in records.items():
+        (tmp_path / job_id).mkdir()
+        write_job_record(tmp_path / job_id, {"id": job_id, "user": "user", **record})
+    mocker.patch("api.processing.jobs.process_alive", return_value=False)
+
+    manager.cleanup()
+
+    states = {job_id: manager.status(job_id, "user")["state"] for job_id in records}
+    assert states == {"a" * 32: "failed", "b" * 32: "failed", "c" * 32: "running"}
+    with pytest.raises(JobLimitError):
+        manager.submit("user", str(template_swift_data_path), ["PartType0/Masses"])
+
+
+def test_acquire_slot(tmp_path):
+    first = acquire_slot(tmp_path, 1)
+    acquired = Event()
+
+    def wait_for_slot():
+        with acquire_slot(tmp_path, 1):
+            acquired.set()
+
+    thread = Thread(target=wait_for_slot)
+    thread.start()
+    assert not acquired.wait(0.1)
+
+    first.close()
+    assert acquired.wait(5)
+    thread.join()
+
+
+def test_job_manager_slots(template_swift_data_path, tmp_path):
+    slot = acquire_slot(tmp_path, 1)
+    manager = JobManager(tmp_path, 1, 1, 0.0, ThreadPoolExecutor(max_workers=1))
+
+    record = manager.submit("user", str(template_swift_data_path), ["PartType0/Masses"])
+    time.sleep(0.1)
+    assert manager.status(record["id"], "user")["state"] == "queued"
+
+    slot.close()
+    assert wait_for_job(manager, record["id"], "user")["state"] == "finished"
+    assert [path.name for path in manager.job_paths()] == [record["id"]]
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from api.processing.apertures import CellMetadata
+from api.processing.mask_handles import (
+    MaskHandleError,
+    MaskHandleNotFoundError,
+    MaskHandleStore,
+    region_cells,
+)
+
+
+def test_region_cells(template_swift_data_path):
+    filename = str(template_swift_data_path)
+    cells = CellMetadata(filename, "PartType0")
+    size = cells.cell_size[0]
+
+    inside = region_cells(filename, [[0.1 * size, 0.2 * size]] * 3)
+    periodic = region_cells(filename, [[-0.2 * size, -0.1 * size]] * 3)
+
+    assert np.count_nonzero(inside) == 1
+    assert np.count_nonzero(periodic) == 1
+    assert not np.array_equal(inside, periodic)
+
+
+@pytest.mark.parametrize(
+    "region",
+    [[[0.0, 1.0], [0.0, 1.0]], [[1.0, 0.0], [0.0, 1.0], [0.0, 1.0]]],
+)
+def test_region_cells_failure(template_swift_data_path, region):
+    with pytest.raises(MaskHandleError):
+        region_cells(str(template_swift_data_path), region)
+
+
+def test_mask_handle_store(template_swift_data_path, tmp_path):
+    filename = str(template_swift_data_path)
+    store = MaskHandleStore(tmp_path, max_handles=8, ttl=3600.0)
+
+    summary = store.create("user", filename)
+    assert summary["cells_selected"] == summary["cells_total"]
+    handle = summary["handle"]
+
+    constrained = store.constrain(handle, "user", [[0.0, 4.0], [0.0, 4.0], [0.0, 4.0]])
+    assert 0 < constrained["cells_selected"] < summary["cells_total"]
+
+    ranges = store.ranges(handle, "user", "PartType0")
+    assert np.diff(ranges, axis=1).sum() == constrained["counts"]["PartType0"]
+
+    with pytest.raises(MaskHandleNotFoundError):
+        store.get(handle, "another_user")
+    with pytest.raises(MaskHandleError):
+        store.ranges(handle, "user", "PartType4")
+    store.delete(handle, "user")
+    with pytest.raises(MaskHandleNotFoundError):
+        store.get(handle, "user")
+
+
+def test_mask_handle_store_eviction(template_swift_data_path, tmp_path):
+    filename = str(template_swift_data_path)
+    store = MaskHandleStore(tmp_path, max_handles=2, ttl=3600.0)
+
+    first = store.create("user", filename)["handle"]
+    second = store.create("user", filename)["handle"]
+    store.get(first, "user")
+    store.create("user", filename)
+
+    store.get(first, "user")
+    with pytest.raises(MaskHandleNotFoundError):
+        store.get(second, "user")
+
+
+def test_mask_handle_store_expiry(template_swift_data_path, tmp_path):
+    store = MaskHandleStore(tmp_path, max_handles=8, ttl=0.0)
+    handle = store.create("user", str(template_swift_data_path))["handle"]
+
+    with pytest.raises(MaskHandleNotFoundError):
+        store.get(handle, "user")
+
+
+def test_mask_handle_store_shared(template_swift_data_path, tmp_path):
+    store = MaskHandleStore(tmp_path, max_handles=8, ttl=3600.0)
+    other_worker = MaskHandleStore(tmp_path, max_handles=8, ttl=3600.0)
+
+    handle = store.create("user", str(template_swift_data_path))["handle"]
+    constrained = other_worker.constrain(
+        handle,
+        "user",
+        [[0.0, 4.0], [0.0, 4.0], [0.0, 4.0]],
+    )
+
+    assert np.count_nonzero(store.get(handle, "user").cells) == (
+        constrained["cells_selected"]
+    )
+    with pytest.raises(MaskHandleNotFoundError):
+        store.get("../" + handle[3:], "user")
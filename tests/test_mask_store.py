@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from api.processing.mask_store import (
+    MaskNotFoundError,
+    MaskQuotaError,
+    MaskStore,
+    MaskStoreError,
+    check_ranges,
+    mask_digest,
+    normalise_mask,
+)
+
+
+def test_normalise_mask():
+    ranges = normalise_mask("[[0.0, 5.0], [5.0, 8.0], [9.0, 9.0], [2.0, 3.0]]")
+
+    assert ranges.dtype == np.dtype("<i8")
+    assert ranges.tolist() == [[0, 8], [2, 3]]
+    assert mask_digest(ranges) == mask_digest(normalise_mask("[[0, 8], [2, 3]]"))
+    assert mask_digest(ranges) != mask_digest(normalise_mask("[[2, 3], [0, 8]]"))
+
+
+@pytest.mark.parametrize(
+    "mask_json",
+    ["[[0, 1], [2]]", "[0, 1, 2]", "[[0.5, 2]]", "[[4, 2]]", "[[-1, 2]]"],
+)
+def test_normalise_mask_failure(mask_json):
+    with pytest.raises(MaskStoreError):
+        normalise_mask(mask_json)
+
+
+def test_check_ranges():
+    check_ranges(np.array([[0, 5], [8, 10]]), 10, "PartType0/Masses")
+    check_ranges(np.zeros((0, 2), dtype=np.int64), 0, "PartType0/Masses")
+
+    with pytest.raises(MaskStoreError, match="beyond the 10 rows"):
+        check_ranges(np.array([[0, 5], [8, 11]]), 10, "PartType0/Masses")
+    with pytest.raises(MaskStoreError, match="non-negative"):
+        check_ranges(np.array([[5, 2]]), 10, "PartType0/Masses")
+
+
+def test_mask_store(tmp_path):
+    store = MaskStore(tmp_path, user_bytes=1024, ttl=3600.0)
+
+    summary = store.put("user", "[[0, 5], [10, 12]]")
+    mask_id = summary["mask_id"]
+    assert summary["mask_size"] == 7  # noqa: PLR2004
+    assert store.put("user", "[[0, 5], [10, 12]]") == summary
+    assert store.get(mask_id, "user").tolist() == [[0, 5], [10, 12]]
+    assert store.summary(mask_id, "user") == summary
+
+    with pytest.raises(MaskNotFoundError):
+        store.get(mask_id, "another_user")
+    store.delete(mask_id, "user")
+    with pytest.raises(MaskNotFoundError):
+        store.get(mask_id, "user")
+    assert store.as_dict()["bytes"] == 0
+
+
+def test_mask_store_quota(tmp_path):
+    store = MaskStore(tmp_path, user_bytes=40, ttl=3600.0)
+
+    first = store.put("user", "[[0, 1], [2, 3]]")["mask_id"]
+    other = store.put("another_user", "[[0, 1], [2, 3]]")["mask_id"]
+    second = store.put("user", "[[4, 5]]")["mask_id"]
+
+    with pytest.raises(MaskNotFoundError):
+        store.get(first, "user")
+    assert store.get(second, "user").tolist() == [[4, 5]]
+    assert store.get(other, "another_user").shape == (2, 2)
+    with pytest.raises(MaskQuotaError):
+        store.put("user", "[[0, 1], [2, 3], [4, 5], [6, 7]]")
+
+
+def test_mask_store_expiry(tmp_path):
+    store = MaskStore(tmp_path, user_bytes=1024, ttl=0.0)
+
+    mask_id = store.put("user", "[[0, 5]]")["mask_id"]
+
+    with pytest.raises(MaskNotFoundError):
+        store.get(mask_id, "user")
+
+
+def test_mask_store_shared(tmp_path):
+    store = MaskStore(tmp_path, user_bytes=40, ttl=3600.0)
+    other_worker = MaskStore(tmp_path, user_bytes=40, ttl=3600.0)
+
+    first = store.put("user", "[[0, 1], [2, 3]]")["mask_id"]
+    shared = other_worker.put("another_user", "[[0, 1], [2, 3]]")["mask_id"]
+    assert other_worker.get(first, "user").tolist() == [[0, 1], [2, 3]]
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+
+    other_worker.put("user", "[[4, 5]]")
+    with pytest.raises(MaskNotFoundError):
+        store.get(first, "user")
+    assert store.get(shared, "another_user").shape == (2, 2)
+    assert store.as_dict()["bytes"] == 48  # noqa: PLR2004
+    with pytest.raises(MaskNotFoundError):
+        store.get("../index", "user")
@@ -1,9 +1,14 @@
+import io
+import os
+import shutil
 from pathlib import Path
 
 import cloudpickle
+import h5py
 import numpy as np
+import pytest
 import swiftsimio as sw
-from api.processing.masks import return_mask, return_mask_boxsize
+from api.processing.masks import encode_cell_metadata, return_mask, return_mask_boxsize
 from unyt import Unit
 
 
@@ -28,3 +33,48 @@ def test_return_mask_success(template_swift_data_path: Path):
     test_mask = cloudpickle.loads(test_mask_bytes)
 
     assert canonical_mask.metadata.named_columns == test_mask.metadata.named_columns
+
+
+def test_encode_cell_metadata(template_swift_data_path: Path):
+    canonical_mask = sw.mask(str(template_swift_data_path))
+
+    encoded = encode_cell_metadata(template_swift_data_path)
+
+    with np.load(io.BytesIO(encoded)) as cells:
+        assert cells["part_types"].tolist() == ["PartType0", "PartType1"]
+        assert str(cells["units"]) == str(canonical_mask.centers.units)
+        assert np.array_equal(cells["centres"], canonical_mask.centers.value)
+        assert np.array_equal(cells["PartType0_offsets"], canonical_mask.offsets["gas"])
+        assert np.array_equal(
+            cells["PartType1_counts"],
+            canonical_mask.counts["dark_matter"],
+        )
+
+
+def test_encode_cell_metadata_part_types(template_swift_data_path: Path):
+    encoded = encode_cell_metadata(template_swift_data_path, ("PartType1",))
+
+    with np.load(io.BytesIO(encoded)) as cells:
+        assert "PartType1_offsets" in cells
+        assert "PartType0_offsets" not in cells
+    assert len(encoded) < len(return_mask(template_swift_data_path))
+    with pytest.raises(KeyError):
+        encode_cell_metadata(template_swift_data_path, ("PartType4",))
+
+
+def test_encode_cell_metadata_replaced_file(
+    template_swift_data_path: Path,
+    tmp_path: Path,
+):
+    filename = tmp_path / "snapshot.hdf5"
+    shutil.copy(template_swift_data_path, filename)
+    with np.load(io.BytesIO(encode_cell_metadata(filename))) as cells:
+        centres = cells["centres"]
+
+    with h5py.File(filename, "r+") as handle:
+        handle["Cells/Centres"][...] += 1.0
+    status = filename.stat()
+    os.utime(filename, ns=(status.st_atime_ns, status.st_mtime_ns + 10**9))
+
+    with np.load(io.BytesIO(encode_cell_metadata(filename))) as cells:
+        assert np.allclose(cells["centres"], centres + 1.0)
@@ -1,16 +1,23 @@
 import json
+import os
+import shutil
 from datetime import datetime
 from pathlib import Path
 from pickle import UnpicklingError
 
 import cloudpickle
+import h5py
 import numpy as np
+import orjson
 import pytest
 from api.processing.metadata import (
+    METADATA_SECTIONS,
     RemoteSWIFTMetadataError,
     SWIFTMetadataEncoder,
     create_swift_metadata,
     create_swift_metadata_dict,
+    create_swift_metadata_json,
+    encode_metadata_value,
 )
 from api.processing.units import RemoteSWIFTUnits, create_unyt_quantities
 from swiftsimio.reader import MassTable
@@ -183,3 +190,64 @@ def test_create_swift_metadata_failure_unpickle_truncated(
         cloudpickle.loads(metadata_bytes[:-1])
 
     assert "data was truncated" in error.value.__str__()
+
+
+def test_create_swift_metadata_json_all_sections(template_swift_data_path: Path):
+    test_filename = str(template_swift_data_path.resolve())
+
+    metadata_bytes = create_swift_metadata_json(test_filename)
+    assert isinstance(metadata_bytes, bytes)
+
+    metadata = orjson.loads(metadata_bytes)
+    assert set(metadata) == set(METADATA_SECTIONS)
+    assert "redshift" in metadata["header"]
+    assert "gas" in metadata["particle_types"]
+
+
+def test_create_swift_metadata_json_selected_sections(template_swift_data_path: Path):
+    test_filename = str(template_swift_data_path.resolve())
+
+    metadata = orjson.loads(
+        create_swift_metadata_json(test_filename, ("cosmology",)),
+    )
+    assert list(metadata) == ["cosmology"]
+    assert set(metadata["cosmology"]) == {"cosmology", "redshift", "scale_factor"}
+
+
+def test_create_swift_metadata_json_unknown_section(template_swift_data_path: Path):
+    test_filename = str(template_swift_data_path.resolve())
+
+    with pytest.raises(RemoteSWIFTMetadataError) as error:
+        create_swift_metadata_json(test_filename, ("not_a_section",))
+
+    assert "Unknown metadata sections" in str(error.value)
+
+
+def test_create_swift_metadata_json_replaced_file(
+    template_swift_data_path: Path,
+    tmp_path: Path,
+):
+    test_filename = str(tmp_path / "snapshot.hdf5")
+    shutil.copy(template_swift_data_path, test_filename)
+    metadata = orjson.loads(create_swift_metadata_json(test_filename, ("header",)))
+
+    with h5py.File(test_filename, "r+") as handle:
+        handle["Header"].attrs["Redshift"] = [metadata["header"]["redshift"] + 1.0]
+    status = Path(test_filename).stat()
+    os.utime(test_filename, ns=(status.st_atime_ns, status.st_mtime_ns + 10**9))
+
+    replaced = orjson.loads(create_swift_metadata_json(test_filename, ("header",)))
+    assert replaced["header"]["redshift"] == metadata["header"]["redshift"] + 1.0
+
+
+def test_encode_metadata_value():
+    test_quantity = unyt_quantity(1.0, "Mpc")
+    test_array = np.array([1, 2, 3])
+    test_bytes = np.bytes_(b"gas")
+
+    assert encode_metadata_value(test_quantity) == test_quantity.to_string()
+    assert encode_metadata_value(test_array) == [1, 2, 3]
+    assert encode_metadata_value(test_bytes) == "gas"
+
+    with pytest.raises(TypeError):
+        encode_metadata_value(object())
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from api.processing.pagination import (
+    PaginationError,
+    StaleCursorError,
+    decode_cursor,
+    encode_cursor,
+    field_rows,
+    plan_page,
+    select_rows,
+)
+
+
+@pytest.mark.parametrize(
+    ("offset", "rows", "expected"),
+    [
+        (0, 5, [[0, 5]]),
+        (3, 3, [[3, 5], [10, 11]]),
+        (5, 2, [[10, 12]]),
+        (6, 10, [[11, 12], [20, 29]]),
+        (3, 0, []),
+        (17, 0, []),
+    ],
+)
+def test_select_rows(offset, rows, expected):
+    ranges = np.array([[0, 5], [7, 7], [10, 12], [20, 30]])
+
+    assert select_rows(ranges, offset, rows).tolist() == expected
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(42, (123, 456), "request")
+
+    assert decode_cursor(cursor, (123, 456), "request") == 42  # noqa: PLR2004
+    with pytest.raises(StaleCursorError):
+        decode_cursor(cursor, (124, 456), "request")
+    with pytest.raises(PaginationError):
+        decode_cursor(cursor, (123, 456), "another_request")
+    with pytest.raises(PaginationError):
+        decode_cursor("not a cursor", (123, 456), "request")
+
+
+def test_field_rows(template_swift_data_path):
+    filename = str(template_swift_data_path)
+
+    assert field_rows(filename, "PartType0/Coordinates") == (5000, 24)
+    assert field_rows(filename, "PartType0/Coordinates", columns=0) == (5000, 8)
+    with pytest.raises(PaginationError):
+        field_rows(filename, "PartType0/Unknown")
+    with pytest.raises(PaginationError):
+        field_rows(filename, "PartType0/Coordinates", columns=7)
+    with pytest.raises(PaginationError):
+        field_rows(filename, "PartType0/Masses", columns=0)
+
+
+def test_plan_page(template_swift_data_path):
+    filename = str(template_swift_data_path)
+    ranges = np.array([[0, 100], [200, 300]])
+
+    pages = [plan_page(filename, "PartType0/Masses", ranges, 8 * 60, "request")]
+    while pages[-1].next_cursor is not None:
+        pages.append(
+            plan_page(
+                filename,
+                "PartType0/Masses",
+                ranges,
+                8 * 60,
+                "request",
+                pages[-1].next_cursor,
+            ),
+        )
+
+    assert [page.rows for page in pages] == [60, 60, 60, 20]
+    assert np.concatenate([page.ranges for page in pages]).tolist() == [
+        [0, 60],
+        [60, 100],
+        [200, 220],
+        [220, 280],
+        [280, 300],
+    ]
+    assert pages[-1].as_dict()["total_rows"] == 200  # noqa: PLR2004
+
+
+@pytest.mark.parametrize("ranges", [[[4995, 5100]], [[10, 5]]])
+def test_plan_page_ranges_outside_field(template_swift_data_path, ranges):
+    with pytest.raises(PaginationError, match="Mask ranges"):
+        plan_page(
+            str(template_swift_data_path),
+            "PartType0/Masses",
+            np.array(ranges),
+            64,
+            "request",
+        )
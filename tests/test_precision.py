@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from api.processing.precision import (
+    PrecisionError,
+    parse_precision,
+    reduce_precision,
+    truncate_mantissa,
+)
+
+
+def test_parse_precision():
+    assert parse_precision("float16") == (np.dtype(np.float16), 10)
+    assert parse_precision("float32:12") == (np.dtype(np.float32), 12)
+
+
+@pytest.mark.parametrize(
+    "precision",
+    ["float8", "float32:0", "float16:11", "float32:x"],
+)
+def test_parse_precision_failure(precision):
+    with pytest.raises(PrecisionError):
+        parse_precision(precision)
+
+
+def test_truncate_mantissa():
+    array = np.array([1.0 + 2.0**-20, -3.0 - 2.0**-8], dtype=np.float32)
+
+    truncated = truncate_mantissa(array.copy(), 10)
+
+    assert truncated.tolist() == [1.0, -3.0 - 2.0**-8]
+
+
+@pytest.mark.parametrize(
+    ("precision", "dtype", "bits"),
+    [("float32", "<f4", 23), ("float16", "<f2", 10), ("float64:8", "<f8", 8)],
+)
+def test_reduce_precision(precision, dtype, bits):
+    array = np.random.default_rng(0).uniform(-100.0, 100.0, (1000, 3))
+
+    reduced, applied = reduce_precision(array, precision, block_size=64)
+
+    assert reduced.shape == array.shape
+    assert applied["dtype"] == dtype
+    assert applied["mantissa_bits"] == bits
+    error = np.abs(reduced - array) / np.abs(array)
+    assert applied["max_relative_error"] == pytest.approx(error.max())
+    assert applied["max_relative_error"] < 2.0**-bits
+
+
+def test_reduce_precision_never_widens():
+    array = np.linspace(1.0, 2.0, 10, dtype=">f4")
+
+    reduced, applied = reduce_precision(array, "float64", block_size=4)
+
+    assert applied["dtype"] == "<f4"
+    assert np.array_equal(reduced, array)
+
+
+def test_reduce_precision_integers():
+    array = np.arange(10)
+
+    reduced, applied = reduce_precision(array, "float16", block_size=4)
+
+    assert reduced is array
+    assert applied["mantissa_bits"] is None
+
+
+def test_reduce_precision_overflow():
+    with pytest.raises(PrecisionError):
+        reduce_precision(np.array([1.0e6]), "float16", block_size=4)
@@ -0,0 +1,53 @@
+from pathlib import Path
+
+import h5py
+import numpy as np
+from api import preload
+from api.config import get_settings
+from api.preload import after_fork, close_hdf5_files, preload_app
+from api.processing.catalogue import SnapshotCatalogue
+from api.routers import auth
+
+
+def test_preload_app(template_swift_data_path, mocker):
+    settings = get_settings()
+    mocker.patch.object(
+        settings,
+        "prewarm_snapshots",
+        [str(template_swift_data_path), "x"],
+    )
+    mocker.patch.object(settings, "jit_warmup_dtypes", ["float32"])
+    catalogue = SnapshotCatalogue([])
+    mocker.patch.object(preload, "get_snapshot_catalogue", return_value=catalogue)
+    prepare_jit = mocker.patch.object(preload, "prepare_jit")
+    pack_shared_blobs = mocker.patch.object(preload, "pack_shared_blobs")
+
+    preload_app()
+
+    assert prepare_jit.call_args.args[1] == ["float32"]
+    pack_shared_blobs.assert_called_once_with(
+        [Path(template_swift_data_path).resolve()],
+    )
+    assert catalogue._frozen is not None
+
+
+def test_close_hdf5_files(tmp_path, mocker):
+    handle = h5py.File(tmp_path / "open.hdf5", "w")
+    dataset = handle.create_dataset("data", data=np.arange(3))
+    mocker.patch.object(h5py.h5f, "get_obj_ids", return_value=[handle.id])
+
+    assert close_hdf5_files() == 1
+    assert not handle.id.valid
+    assert not dataset.id.valid
+
+
+def test_after_fork(mocker):
+    catalogue = mocker.Mock()
+    mocker.patch.object(preload, "get_snapshot_catalogue", return_value=catalogue)
+    mocker.patch.object(preload, "logger")
+    client = auth.get_virgodb_client()
+
+    after_fork()
+
+    catalogue.after_fork.assert_called_once()
+    assert auth.get_virgodb_client() is not client
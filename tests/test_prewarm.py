@@ -0,0 +1,64 @@
+from pathlib import Path
+
+import pytest
+from api.processing.catalogue import SnapshotCatalogue
+from api.processing.prewarm import (
+    WarmupProgress,
+    prewarm_snapshots,
+    resolve_target,
+    start_prewarm,
+)
+
+
+def test_resolve_target_alias(template_swift_data_path: Path):
+    catalogue = SnapshotCatalogue([template_swift_data_path.parent])
+
+    filename = resolve_target(template_swift_data_path.stem, catalogue)
+
+    assert filename == str(template_swift_data_path.resolve())
+
+
+def test_resolve_target_path(tmp_path: Path):
+    snapshot = tmp_path / "snapshot.hdf5"
+    snapshot.touch()
+
+    assert resolve_target(str(snapshot), SnapshotCatalogue([])) == str(snapshot)
+
+
+def test_resolve_target_failure(tmp_path: Path):
+    with pytest.raises(FileNotFoundError):
+        resolve_target("no_such_alias", SnapshotCatalogue([tmp_path]))
+
+
+def test_prewarm_snapshots_records_progress(mocker, tmp_path: Path):
+    snapshot = tmp_path / "snapshot.hdf5"
+    snapshot.touch()
+    warm_snapshot = mocker.patch("api.processing.prewarm.warm_snapshot")
+    progress = WarmupProgress()
+
+    prewarm_snapshots(
+        [str(snapshot), "no_such_alias"],
+        SnapshotCatalogue([tmp_path]),
+        progress,
+    )
+
+    warm_snapshot.assert_called_once_with(str(snapshot))
+    summary = progress.as_dict()
+    expected_progress = 1.0
+    assert summary["state"] == "complete"
+    assert summary["completed"] == 1
+    assert "no_such_alias" in summary["failed"]
+    assert summary["progress"] == expected_progress
+
+
+def test_start_prewarm_runs_in_background(mocker, tmp_path: Path):
+    snapshot = tmp_path / "snapshot.hdf5"
+    snapshot.touch()
+    mocker.patch("api.processing.prewarm.warm_snapshot")
+    progress = WarmupProgress()
+
+    assert progress.as_dict()["state"] == "idle"
+
+    start_prewarm([str(snapshot)], SnapshotCatalogue([]), progress).join()
+
+    assert progress.as_dict()["completed"] == 1
@@ -0,0 +1,44 @@
+import asyncio
+
+from api.responses import ZEROCOPY_EXTENSION, FileSegmentsResponse
+
+
+def send_response(response, extensions):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    async def receive():
+        return {"type": "http.request"}
+
+    scope = {"type": "http", "extensions": extensions}
+    asyncio.run(response(scope, receive, send))
+    return messages
+
+
+def test_file_segments_response(tmp_path):
+    path = tmp_path / "result.bin"
+    path.write_bytes(bytes(range(256)))
+
+    response = FileSegmentsResponse(path, [(10, 20), (100, 5)])
+    messages = send_response(response, {})
+
+    assert response.headers["content-length"] == "25"
+    assert messages[0]["type"] == "http.response.start"
+    assert b"".join(message.get("body", b"") for message in messages[1:]) == (
+        bytes(range(10, 30)) + bytes(range(100, 105))
+    )
+    assert messages[-1]["more_body"] is False
+
+
+def test_file_segments_response_zerocopy(tmp_path):
+    path = tmp_path / "result.bin"
+    path.write_bytes(bytes(range(256)))
+
+    messages = send_response(FileSegmentsResponse(path), {ZEROCOPY_EXTENSION: {}})
+
+    assert [
+        (message["type"], message["offset"], message["count"], message["more_body"])
+        for message in messages[1:]
+    ] == [(ZEROCOPY_EXTENSION, 0, 256, False)]
@@ -0,0 +1,143 @@
+import os
+
+from api.processing.result_cache import (
+    ResultCache,
+    cache_key,
+    stamped_lru_cache,
+    sweep_spill_dirs,
+)
+
+
+def test_cache_key():
+    key = ("snap.hdf5", "PartType0/Masses", None, None, "json", ())
+
+    assert cache_key(key) == cache_key(key)
+    assert cache_key(key) != cache_key(("snap.hdf5", "PartType0/Masses"))
+
+
+def test_stamped_lru_cache(tmp_path):
+    source = tmp_path / "snap.hdf5"
+    source.write_bytes(b"snapshot")
+    calls = []
+
+    @stamped_lru_cache(maxsize=4)
+    def read(filename, suffix=b""):
+        calls.append(filename)
+        return filename.read_bytes() + suffix
+
+    assert read(source) == b"snapshot"
+    assert read(source) == b"snapshot"
+    assert read(source, suffix=b"!") == b"snapshot!"
+    assert len(calls) == 2  # noqa: PLR2004
+
+    source.write_bytes(b"replaced snapshot")
+    assert read(source) == b"replaced snapshot"
+    assert len(calls) == 3  # noqa: PLR2004
+
+    read.cache_clear()
+    assert read.cache_info().currsize == 0
+
+
+def test_result_cache_memory_lru(tmp_path):
+    source = tmp_path / "snap.hdf5"
+    source.write_bytes(b"snapshot")
+    cache = ResultCache(memory_bytes=10)
+
+    cache.put("first", str(source), b"12345")
+    cache.put("second", str(source), b"12345")
+    assert cache.get("first") == b"12345"
+    cache.put("third", str(source), b"12345")
+
+    assert cache.get("second") is None
+    assert cache.get("first") == b"12345"
+    assert cache.get("third") == b"12345"
+    stats = cache.as_dict()
+    assert stats["memory_evictions"] == 1
+    assert stats["memory_bytes"] == len(b"12345") * 2
+    assert stats["misses"] == 1
+
+
+def test_result_cache_disk_spill(tmp_path):
+    source = tmp_path / "snap.hdf5"
+    source.write_bytes(b"snapshot")
+    cache = ResultCache(memory_bytes=10, disk_dir=tmp_path / "cache", disk_bytes=10)
+
+    for key in ("first", "second", "third", "fourth"):
+        cache.put(key, str(source), b"12345")
+
+    stats = cache.as_dict()
+    assert stats["memory_evictions"] == stats["disk_entries"] == 2  # noqa: PLR2004
+    assert len(list(cache.spill_dir.glob("*.bin"))) == stats["disk_entries"]
+
+    assert cache.get("first") == b"12345"
+    assert cache.as_dict()["disk_hits"] == 1
+
+    cache.put("fifth", str(source), b"12345")
+    cache.put("sixth", str(source), b"12345")
+    assert cache.as_dict()["disk_evictions"] > 0
+    assert cache.as_dict()["disk_bytes"] <= cache.disk_bytes
+
+
+def test_result_cache_spill_dirs(tmp_path, mocker):
+    source = tmp_path / "snap.hdf5"
+    source.write_bytes(b"snapshot")
+    disk_dir = tmp_path / "cache"
+    for pid in (1, 2):
+        (disk_dir / f"worker-{pid}").mkdir(parents=True)
+        (disk_dir / f"worker-{pid}" / "stale.bin").write_bytes(b"stale")
+    mocker.patch(
+        "api.processing.result_cache.process_alive",
+        side_effect=lambda pid: pid in (1, os.getpid()),
+    )
+
+    cache = ResultCache(memory_bytes=4, disk_dir=disk_dir, disk_bytes=10)
+    cache.put("first", str(source), b"12345")
+
+    assert sorted(path.name for path in disk_dir.iterdir()) == sorted(
+        ["worker-1", cache.spill_dir.name],
+    )
+    assert sweep_spill_dirs(disk_dir) == 0
+
+    cache.close()
+    assert not cache.spill_dir.exists()
+    assert cache.get("first") is None
+
+
+def test_result_cache_invalidated_on_modification(tmp_path):
+    source = tmp_path / "snap.hdf5"
+    source.write_bytes(b"snapshot")
+    cache = ResultCache(memory_bytes=100)
+    cache.put("key", str(source), b"12345")
+
+    status = source.stat()
+    os.utime(source, ns=(status.st_atime_ns, status.st_mtime_ns + 1_000_000_000))
+
+    assert cache.get("key") is None
+    assert cache.as_dict()["invalidations"] == 1
+    assert cache.as_dict()["memory_entries"] == 0
+
+
+def test_result_cache_skips_oversized_responses(tmp_path):
+    source = tmp_path / "snap.hdf5"
+    source.write_bytes(b"snapshot")
+    cache = ResultCache(memory_bytes=4, disk_dir=tmp_path / "cache", disk_bytes=4)
+
+    cache.put("key", str(source), b"12345")
+
+    assert cache.get("key") is None
+    assert cache.as_dict()["memory_bytes"] == cache.as_dict()["disk_bytes"] == 0
+
+
+def test_result_cache_open_spilled(tmp_path):
+    source = tmp_path / "snap.hdf5"
+    source.write_bytes(b"snapshot")
+    cache = ResultCache(memory_bytes=4, disk_dir=tmp_path / "cache", disk_bytes=10)
+
+    cache.put("large", str(source), b"12345")
+    cache.put("small", str(source), b"123")
+
+    assert cache.open_spilled("large", min_bytes=5).read() == b"12345"
+    assert cache.open_spilled("large", min_bytes=6) is None
+    assert cache.open_spilled("small") is None
+    assert cache.as_dict()["disk_hits"] == 1
+    assert cache.get("large") == b"12345"
@@ -0,0 +1,78 @@
+from functools import lru_cache
+from pathlib import Path
+
+from api.processing import shared_blobs
+from api.processing.metadata import serialise_swift_metadata
+from api.processing.shared_blobs import (
+    SharedBlobs,
+    blob_key,
+    pack_shared_blobs,
+    shared_blob,
+)
+
+
+def test_shared_blobs():
+    blobs = SharedBlobs({"a": b"first", "b": b"", "long key": b"x" * 10_000})
+
+    assert len(blobs) == 3  # noqa: PLR2004
+    assert blobs.get("a") == b"first"
+    assert blobs.get("b") == b""
+    assert blobs.get("long key") == b"x" * 10_000
+    assert blobs.get("c") is None
+    assert "b" in blobs
+    assert "c" not in blobs
+
+
+def test_shared_blobs_empty():
+    blobs = SharedBlobs()
+
+    assert len(blobs) == 0
+    assert blobs.nbytes == 0
+    assert blobs.get("a") is None
+
+
+def test_shared_blobs_hash_collision(mocker):
+    mocker.patch.object(shared_blobs, "key_hash", return_value=1)
+    blobs = SharedBlobs({"a": b"first", "b": b"second"})
+
+    assert blobs.get("a") == b"first"
+    assert blobs.get("b") == b"second"
+    assert blobs.get("c") is None
+
+
+def test_shared_blob_decorator(tmp_path, mocker):
+    mocker.patch.dict(shared_blobs.SHARED_FUNCTIONS)
+    mocker.patch.object(shared_blobs, "get_shared_blobs", return_value=SharedBlobs())
+    first, second = tmp_path / "a", tmp_path / "b"
+    first.write_bytes(b"first")
+    second.write_bytes(b"second")
+    calls = []
+
+    @shared_blob("test")
+    @lru_cache
+    def build(filename: Path) -> bytes:
+        calls.append(filename)
+        return filename.read_bytes()
+
+    assert build(first) == b"first"
+    shared_blobs.get_shared_blobs().pack({blob_key("test", second): b"shared"})
+    assert build(second) == b"shared"
+    assert calls == [first]
+    assert shared_blobs.SHARED_FUNCTIONS["test"] is build.__wrapped__
+
+    second.write_bytes(b"replaced")
+    assert build(second) == b"replaced"
+    assert calls == [first, second]
+
+
+def test_pack_shared_blobs(template_swift_data_path, mocker):
+    mocker.patch.object(shared_blobs, "get_shared_blobs", return_value=SharedBlobs())
+    filename = Path(template_swift_data_path)
+
+    shared = pack_shared_blobs([filename, Path("/missing.hdf5")])
+
+    assert len(shared) == len(shared_blobs.SHARED_FUNCTIONS)
+    key = blob_key("metadata", filename)
+    assert key in shared
+    assert serialise_swift_metadata(str(filename)) == shared.get(key)
+    assert shared_blobs.get_shared_blobs() is shared
@@ -0,0 +1,31 @@
+from api.importtime import HEAVY_MODULES, profile_imports, summarise, total_seconds
+
+# Importing the application may take this many times as long as importing the
+# frameworks it is built on, measured the same way on the same machine
+BASELINE_MODULES = "fastapi, numpy"
+STARTUP_BUDGET_RATIO = 4.0
+
+
+def test_import_defers_heavy_modules():
+    records = profile_imports("api.main")
+    imported = {record.module.split(".")[0] for record in records}
+
+    assert "api.main" in {record.module for record in records}
+    assert not imported.intersection(HEAVY_MODULES), summarise(records)
+
+
+def test_import_time_budget():
+    baseline = total_seconds(profile_imports(BASELINE_MODULES))
+    records = profile_imports("api.main")
+
+    budget = STARTUP_BUDGET_RATIO * baseline
+    assert total_seconds(records) < budget, summarise(records)
+
+
+def test_summarise():
+    records = profile_imports("json")
+    summary = summarise(records, count=3)
+
+    assert summary.startswith("Total import time:")
+    assert "Heavy modules imported: none" in summary
+    assert len(summary.splitlines()) == 6  # noqa: PLR2004
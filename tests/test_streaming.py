@@ -0,0 +1,104 @@
+import asyncio
+
+import numpy as np
+import pytest
+from api.processing.derived_fields import compute_derived_field
+from api.processing.streaming import (
+    CreditWindow,
+    PinnedSnapshot,
+    StreamError,
+    decode_frame,
+    encode_frame,
+)
+
+
+def test_frame_round_trip():
+    array = np.arange(12, dtype=np.float32).reshape(4, 3)
+    header = {"id": "a", "dtype": array.dtype.str, "shape": list(array.shape)}
+
+    decoded_header, decoded = decode_frame(encode_frame(header, array.tobytes()))
+
+    assert decoded_header == header
+    np.testing.assert_array_equal(decoded, array)
+
+
+def test_pinned_snapshot(template_swift_data_path):
+    snapshot = PinnedSnapshot(str(template_swift_data_path))
+    try:
+        field = snapshot.request_ranges(
+            {"type": "field", "field": "PartType0/ParticleIDs"},
+            "test_user",
+        )
+        mask = snapshot.request_ranges(
+            {
+                "type": "mask",
+                "field": "PartType0/ParticleIDs",
+                "mask_array_json": "[[2, 5]]",
+            },
+            "test_user",
+        )
+        array, units = snapshot.read("PartType0/ParticleIDs", mask, 3)
+
+        assert field.tolist() == [[0, 5000]]
+        assert array.tolist() == [3, 4, 5]
+        assert units is None
+        assert snapshot.row_bytes("PartType0/Coordinates") == (5000, 24)
+        with pytest.raises(StreamError):
+            snapshot.request_ranges(
+                {"type": "mask", "field": "PartType0/Masses"},
+                "test_user",
+            )
+        with pytest.raises(StreamError):
+            snapshot.row_bytes("PartType0/Unknown")
+        for mask_json in ("[[4990, 5100]]", "[[10, 5]]"):
+            with pytest.raises(StreamError, match="Mask ranges"):
+                snapshot.request_ranges(
+                    {
+                        "type": "mask",
+                        "field": "PartType0/ParticleIDs",
+                        "mask_array_json": mask_json,
+                    },
+                    "test_user",
+                )
+    finally:
+        snapshot.close()
+
+
+def test_pinned_snapshot_derived_centre(template_swift_data_path):
+    snapshot = PinnedSnapshot(str(template_swift_data_path))
+    ranges = np.array([[0, 10]])
+    try:
+        centred, units = snapshot.read(
+            "PartType0/radius",
+            ranges,
+            10,
+            centre=[1.0, 2.0, 3.0],
+        )
+        uncentred, _ = snapshot.read("PartType0/radius", ranges, 10)
+    finally:
+        snapshot.close()
+
+    expected, _ = compute_derived_field(
+        str(template_swift_data_path),
+        "PartType0/radius",
+        ranges,
+        centre=[1.0, 2.0, 3.0],
+    )
+    assert units == "Mpc"
+    np.testing.assert_allclose(centred, expected)
+    assert not np.allclose(centred, uncentred)
+
+
+def test_credit_window():
+    async def exercise():
+        credit = CreditWindow(2)
+        await credit.acquire()
+        await credit.acquire()
+        waiting = asyncio.create_task(credit.acquire())
+        await asyncio.sleep(0)
+        blocked = not waiting.done()
+        await credit.release(1)
+        await asyncio.wait_for(waiting, timeout=1)
+        return blocked, credit.outstanding
+
+    assert asyncio.run(exercise()) == (True, 2)
@@ -1,25 +1,29 @@
-import json
+import asyncio
 from datetime import datetime, timedelta, timezone
-from pathlib import Path
 
+import httpx
 import jwt
 import pytest
 from api.routers.auth import CredentialsException, decode_jwt
-from api.virgo_auth import SwiftAuthenticator
+from api.virgo_auth import (
+    SwiftAuthenticator,
+    SWIFTAuthenticatorException,
+    VirgoDBClient,
+)
 from fastapi import status
 from freezegun import freeze_time
-from requests import Session
-from requests.exceptions import RequestException
 
 
-def test_authenticate_success(mock_settings, mocker):
-    cookie_save = mocker.patch.object(
-        SwiftAuthenticator,
-        "save_cookies",
-        return_value=Session,
-    )
-    mock_get = mocker.patch.object(Session, "get")
-    type(mock_get.return_value).status_code = mocker.PropertyMock(return_value=200)
+def mock_virgodb_client(settings, handler) -> VirgoDBClient:
+    return VirgoDBClient(settings, transport=httpx.MockTransport(handler))
+
+
+def test_authenticate_success(mock_settings):
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.headers["Authorization"].startswith("Basic ")
+        return httpx.Response(200, headers={"Set-Cookie": "SESSIONID=TESTSESSION"})
+
+    client = mock_virgodb_client(mock_settings, handler)
 
     test_user = "test_user"
     test_pass = "test_pass"  # noqa: S105
@@ -27,22 +31,20 @@ def test_authenticate_success(mock_settings, mocker):
         test_user,
         test_pass,
         mock_settings,
+        client,
     )
 
-    result = auth.authenticate()
+    result = asyncio.run(auth.authenticate())
 
-    cookie_save.assert_called_once()
     assert result == status.HTTP_200_OK
+    assert client.get_cookies(test_user, test_pass)["SESSIONID"] == "TESTSESSION"
 
 
-def test_authenticate_failure_auth(mock_settings, mocker):
-    cookie_save = mocker.patch.object(
-        SwiftAuthenticator,
-        "save_cookies",
-        return_value=Session,
-    )
-    mock_get = mocker.patch.object(Session, "get")
-    type(mock_get.return_value).status_code = mocker.PropertyMock(return_value=401)
+def test_authenticate_failure_auth(mock_settings):
+    def handler(_: httpx.Request) -> httpx.Response:
+        return httpx.Response(401, headers={"Set-Cookie": "SESSIONID=TESTSESSION"})
+
+    client = mock_virgodb_client(mock_settings, handler)
 
     test_user = "test_user"
     test_pass = "test_pass"  # noqa: S105
@@ -51,22 +53,21 @@ def test_authenticate_failure_auth(mock_settings, mocker):
         test_user,
         test_pass,
         mock_settings,
+        client,
     )
 
-    result = auth.authenticate()
+    result = asyncio.run(auth.authenticate())
 
-    cookie_save.assert_not_called()
+    assert "SESSIONID" not in client.get_cookies(test_user, test_pass)
     assert result == status.HTTP_401_UNAUTHORIZED
 
 
-def test_authenticate_failure_bad_url(mock_settings, mocker):
-    cookie_save = mocker.patch.object(
-        SwiftAuthenticator,
-        "save_cookies",
-        return_value=Session,
-    )
-    mock_get = mocker.patch.object(Session, "get", side_effect=RequestException)
-    type(mock_get.return_value).status_code = mocker.PropertyMock(return_value=401)
+def test_authenticate_failure_bad_url(mock_settings):
+    def handler(request: httpx.Request) -> httpx.Response:
+        message = "Unable to connect"
+        raise httpx.ConnectError(message, request=request)
+
+    client = mock_virgodb_client(mock_settings, handler)
 
     test_user = "test_user"
     test_pass = "test_pass"  # noqa: S105
@@ -75,74 +76,126 @@ def test_authenticate_failure_bad_url(mock_settings, mocker):
         test_user,
         test_pass,
         mock_settings,
+        client,
     )
 
-    result = auth.authenticate()
+    result = asyncio.run(auth.authenticate())
 
-    cookie_save.assert_not_called()
     assert result == status.HTTP_404_NOT_FOUND
 
 
-def test_save_cookies_success(temp_out_dir, mock_settings):
-    test_session = Session()
-    test_session.cookies.set("SESSIONID", "TESTSESSION", domain="test")
-    test_cookies = Path(temp_out_dir / "temp_cookies.txt")
+def test_cookies_sent_on_subsequent_requests(mock_settings):
+    received_cookies = []
 
-    test_user = "test_user"
-    test_pass = "test_pass"  # noqa: S105
+    def handler(request: httpx.Request) -> httpx.Response:
+        received_cookies.append(request.headers.get("Cookie"))
+        return httpx.Response(200, headers={"Set-Cookie": "SESSIONID=TESTSESSION"})
 
-    auth = SwiftAuthenticator(
-        test_user,
-        test_pass,
-        mock_settings,
-        cookies_file=test_cookies,
-    )
+    client = mock_virgodb_client(mock_settings, handler)
 
-    auth.save_cookies(test_session)
-    with test_cookies.open("r") as cookies:
-        contents = json.load(cookies)
-        assert contents["SESSIONID"] == "TESTSESSION"
+    async def authenticate_twice():
+        for _ in range(2):
+            await client.get(mock_settings.db_url, "test_user", "test_pass")
+        await client.get(mock_settings.db_url, "another_user", "another_pass")
+        await client.aclose()
 
+    asyncio.run(authenticate_twice())
 
-def test_save_cookies_failure(temp_out_dir, mock_settings):
-    test_session = Session()
-    test_cookies = Path(temp_out_dir / "cookies.txt")
+    assert received_cookies == [None, "SESSIONID=TESTSESSION", None]
 
-    test_user = "test_user"
-    test_pass = "test_pass"  # noqa: S105
 
-    auth = SwiftAuthenticator(
-        test_user,
-        test_pass,
-        mock_settings,
-        cookies_file=test_cookies,
-    )
-    auth.save_cookies(test_session)
-    with test_cookies.open("r") as cookies:
-        contents = json.load(cookies)
-        assert "SESSIONID" not in contents
+def test_cookies_stored_per_user_with_limit(mock_settings):
+    mock_settings.db_max_cookie_users = 2
+    client = VirgoDBClient(mock_settings)
 
+    for user in ["first_user", "second_user", "third_user"]:
+        cookies = httpx.Cookies()
+        cookies.set("SESSIONID", user)
+        client.save_cookies(user, "password", cookies)
 
-def test_load_cookies(mock_settings, data_path):
-    test_session = Session()
-    test_cookies = Path(data_path / "cookies.txt")
+    assert "SESSIONID" not in client.get_cookies("first_user", "password")
+    assert client.get_cookies("second_user", "password")["SESSIONID"] == "second_user"
+    assert client.get_cookies("third_user", "password")["SESSIONID"] == "third_user"
 
-    test_user = "test_user"
-    test_pass = "test_pass"  # noqa: S105
 
-    auth = SwiftAuthenticator(
-        test_user,
-        test_pass,
-        mock_settings,
-        cookies_file=test_cookies,
-    )
+def test_cookies_not_sent_with_other_password(mock_settings):
+    received_cookies = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        received_cookies.append(request.headers.get("Cookie"))
+        return httpx.Response(200, headers={"Set-Cookie": "SESSIONID=TESTSESSION"})
+
+    client = mock_virgodb_client(mock_settings, handler)
+
+    async def authenticate():
+        await client.get(mock_settings.db_url, "test_user", "test_pass")
+        await client.get(mock_settings.db_url, "test_user", "wrong_pass")
+        await client.aclose()
+
+    asyncio.run(authenticate())
+
+    assert received_cookies == [None, None]
+
+
+def test_authenticate_timeout(mock_settings):
+    def handler(request: httpx.Request) -> httpx.Response:
+        message = "Read timed out"
+        raise httpx.ReadTimeout(message, request=request)
+
+    client = mock_virgodb_client(mock_settings, handler)
+    auth = SwiftAuthenticator("test_user", "test_pass", mock_settings, client)
+
+    with pytest.raises(SWIFTAuthenticatorException) as error:
+        asyncio.run(auth.authenticate_and_generate_jwt())
+
+    assert error.value.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+    assert client.stats()["latency"]["outcomes"] == {"timeout": 1}
+
+
+def test_authenticate_circuit_open_fails_fast(mock_settings):
+    mock_settings.db_breaker_failure_threshold = 2
+    calls = []
+
+    def handler(_: httpx.Request) -> httpx.Response:
+        calls.append(1)
+        return httpx.Response(502)
+
+    client = mock_virgodb_client(mock_settings, handler)
+    auth = SwiftAuthenticator("test_user", "test_pass", mock_settings, client)
+
+    for _ in range(2):
+        assert asyncio.run(auth.authenticate()) == status.HTTP_502_BAD_GATEWAY
+
+    with pytest.raises(SWIFTAuthenticatorException) as error:
+        asyncio.run(auth.authenticate_and_generate_jwt())
+
+    assert len(calls) == 2  # noqa: PLR2004
+    assert error.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert "Retry-After" in error.value.headers
+    assert client.stats()["circuit"]["state"] == "open"
+
+
+def test_cancelled_probe_releases_circuit(mock_settings):
+    mock_settings.db_breaker_failure_threshold = 1
+    mock_settings.db_breaker_recovery_time = 0
+    responses = [httpx.Response(502), asyncio.CancelledError(), httpx.Response(200)]
+
+    def handler(_: httpx.Request) -> httpx.Response:
+        response = responses.pop(0)
+        if isinstance(response, BaseException):
+            raise response
+        return response
+
+    client = mock_virgodb_client(mock_settings, handler)
 
-    auth.load_cookies(test_session)
+    async def authenticate():
+        await client.get(mock_settings.db_url, "test_user", "test_pass")
+        with pytest.raises(asyncio.CancelledError):
+            await client.get(mock_settings.db_url, "test_user", "test_pass")
+        return await client.get(mock_settings.db_url, "test_user", "test_pass")
 
-    cookies_dict = test_session.cookies.get_dict()
-    assert len(cookies_dict.keys()) == 1
-    assert "SESSIONID" in cookies_dict
-    assert cookies_dict["SESSIONID"] == "TESTSESSION"
+    assert asyncio.run(authenticate()).status_code == status.HTTP_200_OK
+    assert client.stats()["circuit"]["state"] == "closed"
 
 
 @freeze_time("2022-01-01")
@@ -154,6 +207,7 @@ def test_generate_token(mock_settings):
         test_user,
         test_pass,
         mock_settings,
+        VirgoDBClient(mock_settings),
     )
 
     generated_token = auth.generate_token()